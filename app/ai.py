@@ -0,0 +1,177 @@
+"""AI intake triage and progress-note summaries (docs/ai-workflows.md, 1 and 3).
+
+Neither runs on the request path. Creating a referral queues a
+`referral_triage` job and a progress note with a meeting summary queues a
+`note_summary` job, in the same transaction as the insert; the handlers here
+run on the `jobs` workers, read the record, ask the model, and write the
+output back onto the row. Each write is also an audit event by SYSTEM_USER
+that names the model, so every model output can be traced.
+
+`model` is the deterministic `LocalModel` unless another is installed with
+`set_model()`; a hosted model is any object with the same `name`, `triage()`
+and `summarize_note()`. Outputs are suggestions for a coordinator to
+confirm: nothing here changes a referral's status, risk level or
+assignment.
+"""
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+from typing import Any, Callable, Protocol
+
+from app import audit, jobs, records  # records imports this module; use it by attribute at call time
+from app.db import get_db
+
+TRIAGE = "referral_triage"
+NOTE_SUMMARY = "note_summary"
+SYSTEM_USER = "system:ai"
+
+SCHEMA = """
+ALTER TABLE referrals ADD COLUMN ai_summary TEXT;
+ALTER TABLE referrals ADD COLUMN ai_priority_score REAL;
+ALTER TABLE referrals ADD COLUMN ai_triage TEXT;
+ALTER TABLE referrals ADD COLUMN ai_generated_at TEXT;
+ALTER TABLE progress_notes ADD COLUMN ai_summary TEXT;
+ALTER TABLE progress_notes ADD COLUMN ai_action_items TEXT;
+ALTER TABLE progress_notes ADD COLUMN ai_generated_at TEXT;
+"""
+
+
+class Model(Protocol):
+    name: str
+
+    def triage(self, referral: dict[str, Any]) -> dict[str, Any]: ...
+
+    def summarize_note(self, note: dict[str, Any]) -> dict[str, Any]: ...
+
+
+RISK_POINTS = {"low": 10, "medium": 35, "high": 60, "critical": 85}
+URGENCY_TIERS = ((80, "critical"), (55, "high"), (30, "medium"), (0, "low"))
+FIRST_TOUCH = {
+    "housing": "Share emergency housing and rental assistance resources",
+    "finances": "Offer a financial coaching session",
+    "transportation": "Check eligibility for transit or ride assistance",
+    "legal": "Refer to record-clearance legal aid",
+    "childcare": "Share childcare subsidy and provider options",
+    "health": "Connect with the employee assistance program",
+}
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_ACTION = re.compile(r"\b(will|follow[- ]up|schedule[sd]?|next step|plan(?:s|ned)? to|needs? to|call|submit|apply)\b", re.I)
+
+
+class LocalModel:
+    """Rule-based stand-in: the same input always gives the same output, with no network."""
+
+    name = "local-rules-v1"
+
+    def triage(self, referral: dict[str, Any]) -> dict[str, Any]:
+        codes = referral["support_category_codes"]
+        score = RISK_POINTS.get(referral["risk_level"], 10) + 5 * min(len(codes), 3)
+        score += 5 if referral["assigned_coordinator_id"] is None else 0
+        score = min(score, 100)
+        urgency = next(tier for floor, tier in URGENCY_TIERS if score >= floor)
+        actions = [FIRST_TOUCH.get(code, f"Identify resources for {code.replace('_', ' ')}") for code in codes]
+        if urgency in ("high", "critical"):
+            actions.insert(0, "Make first contact within one business day")
+        missing = [name for name in ("assigned_coordinator_id",) if referral[name] is None]
+        if not codes:
+            missing.append("support_category_codes")
+        needs = ", ".join(code.replace("_", " ") for code in codes) or "not specified"
+        return {
+            "summary": (
+                f"{referral['source_type'].replace('_', ' ').capitalize()} {referral['intake_path'].replace('_', ' ')} "
+                f"at {referral['risk_level']} risk; support needed: {needs}."
+            ),
+            "priority_score": float(score),
+            "urgency": urgency,
+            "confidence": round(0.6 + 0.1 * min(len(codes), 3), 2),
+            "first_touch_actions": actions,
+            "missing_info": missing,
+        }
+
+    def summarize_note(self, note: dict[str, Any]) -> dict[str, Any]:
+        sentences = [s.strip() for s in _SENTENCE.split((note["summary_of_meeting"] or "").strip()) if s.strip()]
+        return {
+            "summary": " ".join(sentences[:2])[:280],
+            "action_items": [
+                {"text": s.rstrip("."), "owner_id": note["coordinator_id"], "due_date": None}
+                for s in sentences
+                if _ACTION.search(s)
+            ][:5],
+        }
+
+
+model: Model = LocalModel()
+
+
+def set_model(new: Model) -> Model:
+    """Install the model later jobs use; returns the previous one."""
+    global model
+    previous, model = model, new
+    return previous
+
+
+def queue_triage(cur: sqlite3.Cursor, tenant_id: str, referral_ids: list[str]) -> None:
+    jobs.enqueue(cur, tenant_id, TRIAGE, referral_ids)
+
+
+def queue_summaries(cur: sqlite3.Cursor, tenant_id: str, note_ids: list[str]) -> None:
+    jobs.enqueue(cur, tenant_id, NOTE_SUMMARY, note_ids)
+
+
+def _load(job: jobs.Job, sql: str) -> dict[str, Any] | None:
+    conn = get_db(job.path)
+    try:
+        row = conn.execute(sql, (job.entity_id, job.tenant_id)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row is not None else None
+
+
+def _store(job: jobs.Job, table: str, entity_type: str, fields: dict[str, Any], model_name: str) -> Callable[[sqlite3.Cursor], None]:
+    def store(cur: sqlite3.Cursor) -> None:
+        now = records.utcnow()
+        values = {**fields, "ai_generated_at": now}
+        cur.execute(
+            f"UPDATE {table} SET {', '.join(f'{name}=?' for name in values)} WHERE id=? AND tenant_id=?",
+            (*values.values(), job.entity_id, job.tenant_id),
+        )
+        auth = {"tenant_id": job.tenant_id, "user_id": SYSTEM_USER}
+        audit.emit(cur, auth, entity_type, "update", [(job.entity_id, {**values, "ai_model": model_name})], now)
+
+    return store
+
+
+def triage_referral(job: jobs.Job) -> Callable[[sqlite3.Cursor], None] | None:
+    referral = _load(
+        job,
+        "SELECT intake_path, source_type, risk_level, support_category_codes, assigned_coordinator_id"
+        " FROM referrals WHERE id=? AND tenant_id=?",
+    )
+    if referral is None:
+        return None
+    referral["support_category_codes"] = [c for c in referral["support_category_codes"].split(",") if c]
+    current = model
+    output = current.triage(referral)
+    details = {k: v for k, v in output.items() if k not in ("summary", "priority_score")}
+    fields = {
+        "ai_summary": output["summary"],
+        "ai_priority_score": output["priority_score"],
+        "ai_triage": json.dumps(details, sort_keys=True),
+    }
+    return _store(job, "referrals", "referral", fields, current.name)
+
+
+def summarize_note(job: jobs.Job) -> Callable[[sqlite3.Cursor], None] | None:
+    note = _load(job, "SELECT coordinator_id, summary_of_meeting FROM progress_notes WHERE id=? AND tenant_id=?")
+    if note is None or not note["summary_of_meeting"]:
+        return None
+    current = model
+    output = current.summarize_note(note)
+    fields = {"ai_summary": output["summary"], "ai_action_items": json.dumps(output["action_items"])}
+    return _store(job, "progress_notes", "progress_note", fields, current.name)
+
+
+jobs.register(TRIAGE, triage_referral)
+jobs.register(NOTE_SUMMARY, summarize_note)
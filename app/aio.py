@@ -0,0 +1,321 @@
+"""asyncio serving mode with persistent connections and pipelining.
+
+The event loop owns the sockets: it parses each request head and body,
+then runs the unmodified `AppHandler.do_*` method on a bounded thread pool
+(all SQLite work is blocking) and writes the response back before reading
+the next request from the same connection. Pipelined requests are answered
+in order. Handlers see the usual `headers`, `rfile` and `wfile` attributes,
+so routes, auth and the JSON contract are shared with the threaded server.
+
+Bodies are read into memory up to FAIR_CHANCE_MAX_BODY_BYTES (default 1 MiB);
+larger ones are answered 413 without being read. Routes the handler class
+marks with `streams_body(command, path)` (the bulk imports) are exempt when
+they send a Content-Length: their `rfile` pulls the body from the socket as
+the handler reads it, as with the threaded server. Chunked bodies are always
+buffered, so they are always capped.
+
+`AsyncHTTPServer` mirrors the `socketserver` surface (`serve_forever`,
+`shutdown`, `server_close`) so it can be swapped in wherever
+`ThreadingHTTPServer` is used.
+"""
+from __future__ import annotations
+
+import asyncio
+import http.client
+import io
+from http import HTTPStatus
+import os
+import socket
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from typing import Any
+
+AIO_WORKERS = int(os.environ.get("FAIR_CHANCE_AIO_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+AIO_MAX_PENDING = int(os.environ.get("FAIR_CHANCE_AIO_MAX_PENDING", str(AIO_WORKERS * 4)))
+KEEPALIVE_TIMEOUT = float(os.environ.get("FAIR_CHANCE_KEEPALIVE_TIMEOUT", "30"))
+MAX_BODY_BYTES = int(os.environ.get("FAIR_CHANCE_MAX_BODY_BYTES", str(1 << 20)))
+MAX_HEADER_BYTES = 64 * 1024
+OUTPUT_FLUSH_BYTES = 64 * 1024
+INPUT_CHUNK_BYTES = 64 * 1024
+
+
+class _BadRequest(Exception):
+    status = HTTPStatus.BAD_REQUEST
+
+
+class _TooLarge(_BadRequest):
+    status = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+class _StreamInput:
+    """`rfile` for a streamed body on a worker thread: reads pull at most `length` bytes from the connection."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader, length: int) -> None:
+        self._loop = loop
+        self._reader = reader
+        self._unread = length
+        self._buffer = bytearray()
+
+    @property
+    def remaining(self) -> int:
+        return self._unread + len(self._buffer)
+
+    def _fill(self) -> bool:
+        if self._unread <= 0:
+            return False
+        read = asyncio.wait_for(self._reader.read(min(self._unread, INPUT_CHUNK_BYTES)), KEEPALIVE_TIMEOUT)
+        data = asyncio.run_coroutine_threadsafe(read, self._loop).result()
+        if not data:
+            self._unread = 0  # the client went away mid-body
+            return False
+        self._unread -= len(data)
+        self._buffer += data
+        return True
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        while (size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        return self._take(len(self._buffer) if size < 0 else size)
+
+    def readline(self, limit: int = -1) -> bytes:
+        while True:
+            end = self._buffer.find(b"\n") + 1
+            if end:
+                break
+            if 0 <= limit <= len(self._buffer) or not self._fill():
+                end = len(self._buffer)
+                break
+        return self._take(end if limit < 0 else min(end, limit))
+
+
+class _StreamOutput:
+    """`wfile` for a handler running on a worker thread.
+
+    Small responses are buffered and written by the event loop once the
+    handler returns; large or streamed responses are pushed to the socket
+    (with backpressure) whenever the buffer passes OUTPUT_FLUSH_BYTES.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter) -> None:
+        self._loop = loop
+        self._writer = writer
+        self._buffer = bytearray()
+        self.bytes_written = 0
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= OUTPUT_FLUSH_BYTES:
+            push = asyncio.wait_for(self._push(self.take()), KEEPALIVE_TIMEOUT)
+            try:
+                asyncio.run_coroutine_threadsafe(push, self._loop).result()
+            except asyncio.TimeoutError:
+                # The client stopped reading: drop the connection rather than hold this worker thread.
+                self._loop.call_soon_threadsafe(self._writer.transport.abort)
+                raise ConnectionAbortedError("client stopped reading the response") from None
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data, self._buffer = bytes(self._buffer), bytearray()
+        return data
+
+    async def _push(self, data: bytes) -> None:
+        self._writer.write(data)
+        await self._writer.drain()
+
+
+class AsyncHTTPServer:
+    def __init__(
+        self,
+        server_address: tuple[str, int],
+        handler_class: type[BaseHTTPRequestHandler],
+        max_workers: int = AIO_WORKERS,
+        max_pending: int = AIO_MAX_PENDING,
+        sock: socket.socket | None = None,
+    ) -> None:
+        self.handler_class = handler_class
+        self.socket = sock or socket.create_server(server_address, backlog=1024)
+        self.server_address = self.socket.getsockname()[:2]
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aio-handler")
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stop: asyncio.Event | None = None
+        self._shutdown_requested = False
+        self._stopped = threading.Event()
+        self._stopped.set()
+
+    def serve_forever(self) -> None:
+        self._stopped.clear()
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._stopped.set()
+
+    def shutdown(self) -> None:
+        self._shutdown_requested = True
+        loop, stop = self._loop, self._stop
+        if loop is not None and stop is not None:
+            loop.call_soon_threadsafe(stop.set)
+        self._stopped.wait()
+
+    def server_close(self) -> None:
+        self.socket.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        connections: set[asyncio.Task[Any]] = set()
+
+        async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            task = asyncio.current_task()
+            connections.add(task)
+            try:
+                await self._connection(reader, writer)
+            finally:
+                connections.discard(task)
+
+        server = await asyncio.start_server(on_connect, sock=self.socket, limit=MAX_HEADER_BYTES)
+        try:
+            if not self._shutdown_requested:
+                await self._stop.wait()
+        finally:
+            server.close()
+            for task in list(connections):
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            self._loop = None
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername") or ("", 0)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(b"HTTP/1.1 431 Request Header Fields Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    return
+                try:
+                    handler = await self._build_handler(head, reader, writer, peer)
+                except _BadRequest as exc:
+                    detail = str(exc).encode("utf-8")
+                    writer.write(
+                        f"HTTP/1.1 {exc.status.value} {exc.status.phrase}\r\n".encode("ascii")
+                        + b"Content-Type: text/plain\r\nConnection: close\r\n"
+                        + f"Content-Length: {len(detail)}\r\n\r\n".encode("ascii")
+                        + detail
+                    )
+                    return
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                async with self._slots:
+                    await self._loop.run_in_executor(self._executor, self._dispatch, handler)
+                if isinstance(handler.rfile, _StreamInput) and handler.rfile.remaining:
+                    handler.close_connection = True  # the rest of the body is still in front of the next request
+                writer.write(handler.wfile.take())
+                try:
+                    await asyncio.wait_for(writer.drain(), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, ConnectionError):
+                    return
+                if handler.close_connection:
+                    return
+        finally:
+            writer.close()
+
+    async def _build_handler(
+        self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, peer: tuple[str, int]
+    ) -> BaseHTTPRequestHandler:
+        request_line, _, header_block = head.partition(b"\r\n")
+        try:
+            command, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise _BadRequest("Malformed request line")
+        if not version.startswith("HTTP/1."):
+            raise _BadRequest("Unsupported HTTP version")
+        try:
+            headers = http.client.parse_headers(io.BytesIO(header_block))
+        except http.client.HTTPException:
+            raise _BadRequest("Malformed headers")
+
+        chunked = "chunked" in headers.get("Transfer-Encoding", "").lower()
+        try:
+            length = 0 if chunked else int(headers.get("Content-Length", "0"))
+        except ValueError:
+            raise _BadRequest("Invalid Content-Length")
+        streams = getattr(self.handler_class, "streams_body", None)
+        streamed = not chunked and streams is not None and streams(command, target)
+        if length > MAX_BODY_BYTES and not streamed:
+            raise _TooLarge(f"Request body is larger than {MAX_BODY_BYTES} bytes")
+        if headers.get("Expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        if chunked:
+            body = await self._read_chunked(reader)
+            del headers["Transfer-Encoding"]
+            del headers["Content-Length"]
+            headers["Content-Length"] = str(len(body))
+        elif not streamed:
+            body = await reader.readexactly(length) if length > 0 else b""
+
+        connection = headers.get("Connection", "").lower()
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.server = self
+        handler.client_address = peer[:2]
+        handler.command = command
+        handler.path = target
+        handler.request_version = version
+        handler.requestline = request_line.decode("latin-1")
+        handler.raw_requestline = request_line + b"\r\n"
+        handler.headers = headers
+        handler.rfile = _StreamInput(self._loop, reader, length) if streamed else io.BytesIO(body)
+        handler.wfile = _StreamOutput(self._loop, writer)
+        handler.close_connection = connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive")
+        return handler
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        body = bytearray()
+        while True:
+            size_line = await reader.readuntil(b"\r\n")
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise _BadRequest("Malformed chunk size")
+            if size == 0:
+                # Skip optional trailers up to the terminating blank line.
+                while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass
+                return bytes(body)
+            if len(body) + size > MAX_BODY_BYTES:
+                raise _TooLarge(f"Request body is larger than {MAX_BODY_BYTES} bytes")
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+
+    @staticmethod
+    def _dispatch(handler: BaseHTTPRequestHandler) -> None:
+        method = getattr(handler, "do_" + handler.command, None)
+        try:
+            if method is None:
+                handler.send_error(501, f"Unsupported method ({handler.command!r})")
+            else:
+                method()
+        except ConnectionError:
+            handler.close_connection = True  # the client is gone; there is no one to send a 500 to
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+            if handler.wfile.bytes_written == 0:
+                handler.send_error(500)
+            handler.close_connection = True
@@ -0,0 +1,348 @@
+"""KPI alert rules, evaluated incrementally.
+
+A rule is a single comparison such as `referral_response_rate < 0.8` or
+`time_to_case_assignment_hours > 24`. Conditions are parsed once into
+compiled predicates (cached by condition text), so evaluation is a dict
+lookup and a comparison.
+
+Tenant metrics (the `/api/v1/kpis` figures) are re-evaluated inside the
+write transaction that changed one of their inputs, for that tenant and
+only for rules that read the written table. SLA metrics are per record:
+when a referral is written, a deadline row (`due_at = submitted_at +
+threshold`) goes into `alert_deadlines`; responding to the referral deletes
+it. `sweep()` fires whatever is overdue by walking the `due_at` index from
+the oldest entry, so its cost is the number of due deadlines rather than
+the number of referrals. A background sweeper runs it every
+FAIR_CHANCE_ALERT_SWEEP_SECONDS.
+
+Fired alerts stay `firing` until their condition clears, then become
+`resolved`; both are kept in `alerts`.
+
+  python -m app.alerts sweep [--db PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import operator
+import os
+import re
+import sqlite3
+import sys
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from app import kpis
+from app.ids import new_id
+
+SWEEP_INTERVAL_SECONDS = float(os.environ.get("FAIR_CHANCE_ALERT_SWEEP_SECONDS", "60"))
+SWEEP_BATCH = 500
+SEVERITIES = ("low", "medium", "high", "critical")
+TENANT_WIDE = "*"
+
+# Tenant metric -> tables whose writes can change it.
+TENANT_METRICS: dict[str, tuple[str, ...]] = {
+    "intake_volume": ("referrals",),
+    "case_open_count": ("cases",),
+    "employee_engagement_count": ("progress_notes",),
+    "referral_response_rate": ("referrals", "cases"),
+    "progress_note_submission_rate": ("progress_notes",),
+}
+# Per-referral SLA metric: hours from submission until a case is opened from it.
+DEADLINE_METRICS = ("time_to_case_assignment_hours",)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alert_rules_tenant ON alert_rules(tenant_id);
+CREATE TABLE IF NOT EXISTS alerts (
+    id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    rule_id TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    value REAL,
+    fired_at TEXT NOT NULL,
+    resolved_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_open ON alerts(rule_id, entity_id) WHERE status = 'firing';
+CREATE INDEX IF NOT EXISTS idx_alerts_tenant_status ON alerts(tenant_id, status, fired_at);
+CREATE TABLE IF NOT EXISTS alert_deadlines (
+    rule_id TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    due_at TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    PRIMARY KEY (rule_id, entity_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_alert_deadlines_due ON alert_deadlines(due_at);
+CREATE INDEX IF NOT EXISTS idx_alert_deadlines_entity ON alert_deadlines(tenant_id, entity_id);
+"""
+
+_CONDITION = re.compile(r"^\s*([a-z_][a-z0-9_]*)\s*(<=|>=|==|!=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$")
+_OPERATORS: dict[str, Callable[[float, float], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+
+@dataclass(frozen=True)
+class Condition:
+    metric: str
+    op: str
+    threshold: float
+    predicate: Callable[[float], bool]
+
+    @property
+    def deadline(self) -> bool:
+        return self.metric in DEADLINE_METRICS
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_condition(text: str) -> Condition:
+    """Parse `metric <op> number` into a predicate; raises ValueError."""
+    match = _CONDITION.match(text)
+    if not match:
+        raise ValueError("condition must look like `metric > 24` (operators: < <= > >= == !=)")
+    metric, op, raw = match.groups()
+    if metric not in TENANT_METRICS and metric not in DEADLINE_METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; choose from {sorted([*TENANT_METRICS, *DEADLINE_METRICS])}")
+    if metric in DEADLINE_METRICS and op not in (">", ">="):
+        raise ValueError(f"{metric} only supports > and >= (it fires when a deadline passes)")
+    threshold = float(raw)
+    compare = _OPERATORS[op]
+    return Condition(metric, op, threshold, lambda value: compare(value, threshold))
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    name: str
+    severity: str
+    condition: Condition
+
+
+def _now() -> str:
+    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+
+def _parse_ts(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def _format_ts(value: datetime) -> str:
+    return value.replace(microsecond=0).isoformat() + "Z"
+
+
+def rules_for(cur: sqlite3.Cursor, tenant_id: str) -> list[Rule]:
+    cur.execute("SELECT id, name, severity, condition FROM alert_rules WHERE tenant_id=?", (tenant_id,))
+    return [Rule(r[0], r[1], r[2], compile_condition(r[3])) for r in cur.fetchall()]
+
+
+def create_rule(cur: sqlite3.Cursor, tenant_id: str, body: Any) -> dict[str, Any]:
+    """Validate and store a rule, then evaluate it once; raises ValueError on bad input."""
+    if not isinstance(body, dict) or not isinstance(body.get("name"), str) or not isinstance(body.get("condition"), str):
+        raise ValueError("name and condition are required strings")
+    severity = body.get("severity", "medium")
+    if severity not in SEVERITIES:
+        raise ValueError(f"severity must be one of {list(SEVERITIES)}")
+    condition = compile_condition(body["condition"])
+    rule = Rule(new_id(), body["name"], severity, condition)
+    cur.execute(
+        "INSERT INTO alert_rules(id,tenant_id,name,condition,severity,created_at) VALUES(?,?,?,?,?,?)",
+        (rule.id, tenant_id, rule.name, body["condition"].strip(), severity, _now()),
+    )
+    if condition.deadline:
+        # Start the clock for referrals that are already waiting.
+        cur.execute(
+            "SELECT id, submitted_at FROM referrals WHERE tenant_id=? AND first_response_at IS NULL", (tenant_id,)
+        )
+        _schedule(cur, tenant_id, [rule], cur.fetchall())
+    else:
+        _evaluate_tenant(cur, tenant_id, [rule])
+    return {"id": rule.id, "name": rule.name, "condition": body["condition"].strip(), "severity": severity}
+
+
+def list_rules(cur: sqlite3.Cursor, tenant_id: str) -> list[dict[str, Any]]:
+    cur.execute("SELECT id, name, condition, severity, created_at FROM alert_rules WHERE tenant_id=? ORDER BY created_at", (tenant_id,))
+    return [dict(zip(("id", "name", "condition", "severity", "created_at"), row)) for row in cur.fetchall()]
+
+
+def list_alerts(cur: sqlite3.Cursor, tenant_id: str, status: str = "firing", limit: int = 100) -> list[dict[str, Any]]:
+    cur.execute(
+        """
+        SELECT a.id, a.rule_id, r.name, r.severity, a.entity_id, a.status, a.value, a.fired_at, a.resolved_at
+        FROM alerts a JOIN alert_rules r ON r.id = a.rule_id
+        WHERE a.tenant_id=? AND a.status=? ORDER BY a.fired_at DESC LIMIT ?
+        """,
+        (tenant_id, status, limit),
+    )
+    keys = ("id", "rule_id", "rule_name", "severity", "entity_id", "status", "value", "fired_at", "resolved_at")
+    return [dict(zip(keys, row)) for row in cur.fetchall()]
+
+
+def _fire(cur: sqlite3.Cursor, tenant_id: str, rule_id: str, entity_id: str, value: float, at: str) -> None:
+    cur.execute(
+        "INSERT INTO alerts(id,tenant_id,rule_id,entity_id,status,value,fired_at) VALUES(?,?,?,?,'firing',?,?) "
+        "ON CONFLICT(rule_id, entity_id) WHERE status = 'firing' DO UPDATE SET value=excluded.value",
+        (new_id(), tenant_id, rule_id, entity_id, value, at),
+    )
+
+
+def _resolve(cur: sqlite3.Cursor, rule_ids: Iterable[str], entity_id: str, at: str) -> None:
+    cur.executemany(
+        "UPDATE alerts SET status='resolved', resolved_at=? WHERE rule_id=? AND entity_id=? AND status='firing'",
+        [(at, rule_id, entity_id) for rule_id in rule_ids],
+    )
+
+
+def _evaluate_tenant(cur: sqlite3.Cursor, tenant_id: str, rules: list[Rule]) -> None:
+    if not rules:
+        return
+    values = kpis.kpi_payload(kpis.read_counters(cur, tenant_id))
+    now = _now()
+    for rule in rules:
+        value = values[rule.condition.metric]
+        if rule.condition.predicate(value):
+            _fire(cur, tenant_id, rule.id, TENANT_WIDE, value, now)
+        else:
+            _resolve(cur, [rule.id], TENANT_WIDE, now)
+
+
+def _schedule(cur: sqlite3.Cursor, tenant_id: str, rules: list[Rule], referrals: Iterable[tuple[str, str]]) -> None:
+    rows = []
+    for referral_id, submitted_at in referrals:
+        started = _parse_ts(submitted_at)
+        for rule in rules:
+            due = started + timedelta(hours=rule.condition.threshold)
+            rows.append((rule.id, referral_id, tenant_id, _format_ts(due), submitted_at))
+    cur.executemany(
+        "INSERT OR REPLACE INTO alert_deadlines(rule_id,entity_id,tenant_id,due_at,started_at) VALUES(?,?,?,?,?)", rows
+    )
+
+
+def on_write(
+    cur: sqlite3.Cursor,
+    tenant_id: str,
+    table: str,
+    opened: Iterable[tuple[str, str]] = (),
+    closed: Iterable[str] = (),
+) -> None:
+    """Re-evaluate the tenant's rules affected by a write to `table`, in the writer's transaction.
+
+    `opened` are `(referral_id, submitted_at)` pairs that start an SLA clock;
+    `closed` are referral ids whose clock stops (their alerts resolve).
+    """
+    rules = rules_for(cur, tenant_id)
+    if not rules:
+        return
+    deadline_rules = [r for r in rules if r.condition.deadline]
+    if deadline_rules:
+        opened, closed = list(opened), list(closed)
+        if opened:
+            _schedule(cur, tenant_id, deadline_rules, opened)
+        if closed:
+            now = _now()
+            cur.executemany(
+                "DELETE FROM alert_deadlines WHERE tenant_id=? AND entity_id=?", [(tenant_id, c) for c in closed]
+            )
+            for referral_id in closed:
+                _resolve(cur, [r.id for r in deadline_rules], referral_id, now)
+    _evaluate_tenant(
+        cur, tenant_id, [r for r in rules if not r.condition.deadline and table in TENANT_METRICS[r.condition.metric]]
+    )
+
+
+def sweep(cur: sqlite3.Cursor, now: str | None = None, batch: int = SWEEP_BATCH) -> int:
+    """Fire alerts for deadlines at or before `now`, oldest first; returns how many fired."""
+    now = now or _now()
+    cur.execute(
+        "SELECT rule_id, entity_id, tenant_id, started_at FROM alert_deadlines WHERE due_at <= ? ORDER BY due_at LIMIT ?",
+        (now, batch),
+    )
+    due = cur.fetchall()
+    current = _parse_ts(now)
+    for rule_id, entity_id, tenant_id, started_at in due:
+        hours = round((current - _parse_ts(started_at)).total_seconds() / 3600, 2)
+        _fire(cur, tenant_id, rule_id, entity_id, hours, now)
+    cur.executemany("DELETE FROM alert_deadlines WHERE rule_id=? AND entity_id=?", [(r[0], r[1]) for r in due])
+    return len(due)
+
+
+_sweeper: threading.Thread | None = None
+_sweeper_stop = threading.Event()
+
+
+def start_sweeper(interval: float = SWEEP_INTERVAL_SECONDS) -> None:
+    """Run `sweep` through the write queue every `interval` seconds until `stop_sweeper()`."""
+    global _sweeper
+    from app import shards
+    from app.writer import run_write
+
+    def loop() -> None:
+        while not _sweeper_stop.wait(interval):
+            # Every tenant shard has its own deadlines; idle ones are closed again after their sweep.
+            for path in shards.all_paths():
+                try:
+                    while run_write(lambda cur: sweep(cur), path) == SWEEP_BATCH:
+                        pass
+                except Exception as exc:  # keep sweeping; the next tick retries
+                    print(f"alert sweep failed: {exc}", file=sys.stderr)
+                finally:
+                    shards.release(path)
+
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(target=loop, name="alert-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_sweeper() -> None:
+    global _sweeper
+    _sweeper_stop.set()
+    if _sweeper is not None:
+        _sweeper.join(5)
+        _sweeper = None
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db import DB_PATH, get_db
+    from app.migrations import migrate
+
+    parser = argparse.ArgumentParser(prog="python -m app.alerts", description="Fire overdue SLA alerts.")
+    parser.add_argument("command", choices=["sweep"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = get_db(args.db)
+    try:
+        migrate(conn)
+        fired = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            count = sweep(conn.cursor())
+            conn.commit()
+            fired += count
+            if count < SWEEP_BATCH:
+                break
+        print(json.dumps({"fired": fired}))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""Hot/cold archival of closed cases with their progress notes and referrals.
+
+With archiving on, every connection to a database file also attaches
+`<file>-archive` as schema `archive`. The archive holds copies of the case
+tables (`TABLES`, same columns and indexes, kept in step by `migrate()`).
+`run()` walks `cases` in rowid order, `BATCH` rows per write transaction. It
+moves each case that is closed (status not in `kpis.OPEN_CASE_STATUSES`),
+was opened before the retention cutoff and has no note on or after it. The
+case's notes and their area-of-need links go with it. Its referral goes too,
+once no hot case points at that referral.
+
+Each batch is two write units. The first copies rows into the archive,
+committed with synchronous=FULL. The second deletes from the hot tables
+only the rows whose archived copy is still identical. The two files commit
+separately, so a crash in between leaves rows in both places, never in
+neither. Readers prefer the hot copy and the next run finishes the move. A
+case that changes between the two units (reopened, a new note) stays hot.
+
+`?include=archive` on the list endpoints and exports unions both sides (see
+`listing.build_query`). `source()` does the same for the KPI counter and
+rollup recomputes, so `verify`/`rebuild` still match the incrementally kept
+totals, and for cohort and coordinator KPIs, so archiving never changes a
+KPI. Each batch invalidates the cached responses of the tenants it touched.
+Search and alert deadlines describe the active caseload and only see hot
+rows. Notes can no longer be filed against an archived case.
+
+  FAIR_CHANCE_ARCHIVE                 on: attach archives, run the archiver in `serve()`
+  FAIR_CHANCE_ARCHIVE_RETENTION_DAYS  closed cases idle this long move (default 730)
+  FAIR_CHANCE_ARCHIVE_BATCH           cases scanned per write transaction (default 200)
+  FAIR_CHANCE_ARCHIVE_INTERVAL        seconds between background runs (default 3600)
+
+  python -m app.archive run [--db PATH] [--retention-days N] [--batch N]
+  python -m app.archive stats [--db PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Sequence
+
+ENABLED = os.environ.get("FAIR_CHANCE_ARCHIVE", "off") == "on"
+RETENTION_DAYS = float(os.environ.get("FAIR_CHANCE_ARCHIVE_RETENTION_DAYS", "730"))
+BATCH = int(os.environ.get("FAIR_CHANCE_ARCHIVE_BATCH", "200"))
+INTERVAL_SECONDS = float(os.environ.get("FAIR_CHANCE_ARCHIVE_INTERVAL", "3600"))
+SUFFIX = "-archive"
+
+TABLES = ("referrals", "referral_support_categories", "cases", "progress_notes", "progress_note_areas_of_need")
+
+# Row identity for `source()`'s dedupe; link tables have no `id`.
+_KEYS = {"referral_support_categories": ("referral_id", "code"), "progress_note_areas_of_need": ("note_id", "code")}
+
+_CREATE = re.compile(r"^CREATE (UNIQUE )?(TABLE|INDEX) (\"?\w+\"?)")
+
+_stats_lock = threading.Lock()
+_stats: dict[str, Any] = {"runs": 0, "batches": 0, "moved": dict.fromkeys(TABLES, 0), "seconds": 0.0, "last_run": None}
+
+
+def path_for(path: Path | str) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + SUFFIX)
+
+
+def attach(conn: sqlite3.Connection, path: Path | str) -> None:
+    """Attach `path`'s archive as schema `archive` when archiving is on (outside any transaction)."""
+    if not ENABLED:
+        return
+    conn.execute("ATTACH DATABASE ? AS archive", (str(path_for(path)),))
+    conn.execute("PRAGMA archive.journal_mode=WAL")
+    conn.execute(f"PRAGMA archive.cache_size={conn.execute('PRAGMA main.cache_size').fetchone()[0]}")
+    # A batch's copy must be durable before the hot delete that follows it commits.
+    conn.execute("PRAGMA archive.synchronous=FULL")
+
+
+def attached(cur: sqlite3.Cursor) -> bool:
+    return any(row[1] == "archive" for row in cur.execute("PRAGMA database_list").fetchall())
+
+
+def has_table(cur: sqlite3.Cursor, table: str) -> bool:
+    return attached(cur) and cur.execute(
+        "SELECT 1 FROM archive.sqlite_master WHERE type='table' AND name=?", (table,)
+    ).fetchone() is not None
+
+
+def sync_schema(cur: sqlite3.Cursor) -> None:
+    """Create, widen or re-index the archive copies of `TABLES` to match the hot schema; no-op when detached."""
+    if not attached(cur):
+        return
+    for table in TABLES:
+        hot = cur.execute(
+            "SELECT type, name, sql FROM main.sqlite_master WHERE tbl_name=? AND type IN ('table','index') AND sql IS NOT NULL "
+            "ORDER BY type='index'",
+            (table,),
+        ).fetchall()
+        if not hot:
+            continue
+        cold = dict(cur.execute("SELECT name, sql FROM archive.sqlite_master WHERE tbl_name=?", (table,)).fetchall())
+        for kind, name, sql in hot:
+            if name in cold and (kind == "table" or cold[name] == sql):
+                continue
+            if name in cold:
+                cur.execute(f"DROP INDEX archive.{name}")
+            cur.execute(_CREATE.sub(lambda m: f"CREATE {m[1] or ''}{m[2]} archive.{m[3]}", sql, count=1))
+        archived = {row[1] for row in cur.execute(f"PRAGMA archive.table_info({table})").fetchall()}
+        for _, column, declared, *_ in cur.execute(f"PRAGMA main.table_info({table})").fetchall():
+            if column not in archived:
+                cur.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column} {declared}")
+        hot_names = {name for _, name, _ in hot}
+        for name in set(cold) - hot_names:
+            if cold[name] is not None:
+                cur.execute(f"DROP INDEX archive.{name}")
+
+
+def source(cur: sqlite3.Cursor, table: str, columns: Sequence[str]) -> str:
+    """`table`, or its hot and archived rows as one subquery when an archive is attached."""
+    if not has_table(cur, table):
+        return table
+    selected = ", ".join(columns)
+    same = " AND ".join(f"h.{key} = a.{key}" for key in _KEYS.get(table, ("id",)))
+    return (
+        f"(SELECT {selected} FROM main.{table} UNION ALL SELECT {selected} FROM archive.{table} a "
+        f"WHERE NOT EXISTS (SELECT 1 FROM main.{table} h WHERE {same}))"
+    )
+
+
+def _columns(cur: sqlite3.Cursor, table: str) -> list[str]:
+    return [row[1] for row in cur.execute(f"PRAGMA main.table_info({table})").fetchall()]
+
+
+def _identical(cur: sqlite3.Cursor, table: str, key: str) -> str:
+    """SQL condition: the hot `table` row has an archived copy with the same values in every column."""
+    same = " AND ".join(f"a.{c} IS {table}.{c}" for c in _columns(cur, table) if c != key)
+    return f"EXISTS (SELECT 1 FROM archive.{table} a WHERE a.{key} = {table}.{key} AND {same})"
+
+
+def cutoff_for(retention_days: float, now: datetime | None = None) -> str:
+    moment = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def copy_batch(cur: sqlite3.Cursor, after: int, batch: int, cutoff: str) -> tuple[int | None, list[str]]:
+    """Copy the next `batch` cases' archivable ones (and their rows) into the archive.
+
+    Returns the last rowid scanned (None once past the end) and the copied case ids.
+    """
+    from app.kpis import OPEN_CASE_STATUSES  # kpis reads through `source()`
+
+    last = cur.execute(
+        "SELECT MAX(rowid) FROM (SELECT rowid FROM main.cases WHERE rowid > ? ORDER BY rowid LIMIT ?)", (after, batch)
+    ).fetchone()[0]
+    if last is None:
+        return None, []
+    case_ids = [row[0] for row in cur.execute(
+        f"SELECT c.id FROM main.cases c WHERE c.rowid > ? AND c.rowid <= ? "
+        f"AND c.case_status NOT IN ({','.join('?' * len(OPEN_CASE_STATUSES))}) AND c.opened_at < ? "
+        "AND NOT EXISTS (SELECT 1 FROM main.progress_notes n WHERE n.case_id = c.id AND n.interaction_at >= ?)",
+        (after, last, *OPEN_CASE_STATUSES, cutoff, cutoff),
+    ).fetchall()]
+    if not case_ids:
+        return last, []
+    cases = json.dumps(case_ids)
+    # A referral moves with its last case; while any other hot case points at it, it stays.
+    referrals = json.dumps([row[0] for row in cur.execute(
+        "SELECT DISTINCT c.referral_id FROM main.cases c WHERE c.id IN (SELECT value FROM json_each(?1)) "
+        "AND c.referral_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM main.cases o "
+        "WHERE o.referral_id = c.referral_id AND o.id NOT IN (SELECT value FROM json_each(?1)))",
+        (cases,),
+    ).fetchall()])
+    notes = json.dumps([row[0] for row in cur.execute(
+        "SELECT id FROM main.progress_notes WHERE case_id IN (SELECT value FROM json_each(?))", (cases,)
+    ).fetchall()])
+    for table, key, ids in (
+        ("referrals", "id", referrals),
+        ("referral_support_categories", "referral_id", referrals),
+        ("cases", "id", cases),
+        ("progress_notes", "id", notes),
+        ("progress_note_areas_of_need", "note_id", notes),
+    ):
+        if key != "id":
+            # Link rows are replaced as a set, so codes removed since an earlier copy do not linger.
+            cur.execute(f"DELETE FROM archive.{table} WHERE {key} IN (SELECT value FROM json_each(?))", (ids,))
+        columns = ",".join(_columns(cur, table))
+        cur.execute(
+            f"INSERT OR REPLACE INTO archive.{table}({columns}) SELECT {columns} FROM main.{table} "
+            f"WHERE {key} IN (SELECT value FROM json_each(?))",
+            (ids,),
+        )
+    return last, case_ids
+
+
+def delete_batch(cur: sqlite3.Cursor, case_ids: list[str]) -> dict[str, int]:
+    """Delete copied cases from the hot tables, skipping any that changed since `copy_batch`."""
+    cases = json.dumps(case_ids)
+    # Still identical to its copy, and so is every hot note of it (a note filed since then has none).
+    ready = json.dumps([row[0] for row in cur.execute(
+        f"SELECT id FROM main.cases WHERE id IN (SELECT value FROM json_each(?)) AND {_identical(cur, 'cases', 'id')} "
+        "AND NOT EXISTS (SELECT 1 FROM main.progress_notes WHERE progress_notes.case_id = cases.id "
+        f"AND NOT {_identical(cur, 'progress_notes', 'id')})",
+        (cases,),
+    ).fetchall()])
+    moved = dict.fromkeys(TABLES, 0)
+    gone: list[tuple[str, str]] = []
+    notes = cur.execute(
+        "DELETE FROM main.progress_notes WHERE case_id IN (SELECT value FROM json_each(?)) RETURNING tenant_id, id", (ready,)
+    ).fetchall()
+    moved["progress_notes"] = len(notes)
+    gone.extend((tenant, note_id) for tenant, note_id in notes)
+    moved["progress_note_areas_of_need"] = cur.execute(
+        "DELETE FROM main.progress_note_areas_of_need WHERE note_id IN (SELECT value FROM json_each(?))",
+        (json.dumps([row[1] for row in notes]),),
+    ).rowcount
+    removed = cur.execute(
+        "DELETE FROM main.cases WHERE id IN (SELECT value FROM json_each(?)) RETURNING tenant_id, id, referral_id", (ready,)
+    ).fetchall()
+    moved["cases"] = len(removed)
+    gone.extend((tenant, case_id) for tenant, case_id, _ in removed)
+    candidates = json.dumps(sorted({referral for _, _, referral in removed if referral is not None}))
+    removed_referrals = cur.execute(
+        f"DELETE FROM main.referrals WHERE id IN (SELECT value FROM json_each(?)) AND {_identical(cur, 'referrals', 'id')} "
+        "AND NOT EXISTS (SELECT 1 FROM main.cases WHERE cases.referral_id = referrals.id) RETURNING tenant_id, id",
+        (candidates,),
+    ).fetchall()
+    moved["referrals"] = len(removed_referrals)
+    gone.extend((tenant, referral_id) for tenant, referral_id in removed_referrals)
+    moved["referral_support_categories"] = cur.execute(
+        "DELETE FROM main.referral_support_categories WHERE referral_id IN (SELECT value FROM json_each(?))",
+        (json.dumps([row[1] for row in removed_referrals]),),
+    ).rowcount
+    # Pending SLA deadlines of archived rows would otherwise fire against rows no longer there.
+    cur.executemany("DELETE FROM alert_deadlines WHERE tenant_id=? AND entity_id=?", gone)
+    return moved
+
+
+def _tenants_of(cur: sqlite3.Cursor, case_ids: list[str]) -> set[str]:
+    return {row[0] for row in cur.execute(
+        "SELECT DISTINCT tenant_id FROM archive.cases WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(case_ids),)
+    ).fetchall()}
+
+
+def run(
+    path: Path | str | None = None, retention_days: float = RETENTION_DAYS, batch: int = BATCH, now: datetime | None = None
+) -> dict[str, Any]:
+    """Archive everything due in one database file, batch by batch through its write queue; returns a report."""
+    from app.cache import response_cache
+    from app.writer import run_write
+
+    if not ENABLED:
+        raise RuntimeError("Archiving is off; set FAIR_CHANCE_ARCHIVE=on")
+    cutoff = cutoff_for(retention_days, now)
+    started = time.perf_counter()
+    run_write(sync_schema, path)
+    moved = dict.fromkeys(TABLES, 0)
+    after, batches = 0, 0
+    while True:
+        last, case_ids = run_write(lambda cur: copy_batch(cur, after, batch, cutoff), path)
+        if last is None:
+            break
+        if case_ids:
+            counts, tenants = run_write(lambda cur: (delete_batch(cur, case_ids), _tenants_of(cur, case_ids)), path)
+            for table, count in counts.items():
+                moved[table] += count
+            # Cached KPI bodies were computed before the move; do not serve them across it.
+            for tenant in tenants:
+                response_cache.invalidate(tenant)
+        after, batches = last, batches + 1
+    seconds = time.perf_counter() - started
+    report = {
+        "cutoff": cutoff,
+        "batches": batches,
+        "moved": moved,
+        "seconds": round(seconds, 3),
+        "cases_per_s": round(moved["cases"] / seconds, 1) if seconds else 0.0,
+        "rows_per_s": round(sum(moved.values()) / seconds, 1) if seconds else 0.0,
+    }
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["batches"] += batches
+        _stats["seconds"] += seconds
+        for table, count in moved.items():
+            _stats["moved"][table] += count
+        _stats["last_run"] = report
+    return report
+
+
+def sizes(conn: sqlite3.Connection) -> dict[str, dict[str, Any]]:
+    """Rows and B-tree bytes (table plus its indexes) of each archived table, hot and cold."""
+    cur = conn.cursor()
+    schemas = ("main", "archive") if attached(cur) else ("main",)
+    report: dict[str, dict[str, Any]] = {}
+    for schema in schemas:
+        pages = dict(cur.execute(
+            f"SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat(?) s JOIN {schema}.sqlite_schema m ON m.name = s.name "
+            "GROUP BY m.tbl_name",
+            (schema,),
+        ).fetchall())
+        for table in TABLES:
+            if schema == "archive" and not has_table(cur, table):
+                continue
+            rows = cur.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+            report.setdefault(table, {})[schema] = {"rows": rows, "bytes": pages.get(table, 0)}
+    return report
+
+
+_archiver: threading.Thread | None = None
+_archiver_stop = threading.Event()
+
+
+def start(interval: float = INTERVAL_SECONDS) -> None:
+    """Run `run()` over every database file every `interval` seconds until `stop()`."""
+    global _archiver
+    from app import shards
+
+    def loop() -> None:
+        while not _archiver_stop.wait(interval):
+            for path in shards.all_paths():
+                try:
+                    run(path)
+                except Exception as exc:  # keep going; the next tick retries
+                    print(f"archive run failed: {exc}", file=sys.stderr)
+                finally:
+                    shards.release(path)
+
+    _archiver_stop.clear()
+    _archiver = threading.Thread(target=loop, name="archiver", daemon=True)
+    _archiver.start()
+
+
+def stop(timeout: float = 5) -> None:
+    global _archiver
+    _archiver_stop.set()
+    if _archiver is not None:
+        _archiver.join(timeout)
+        _archiver = None
+
+
+def stats() -> dict[str, Any]:
+    with _stats_lock:
+        return {"enabled": ENABLED, **_stats, "moved": dict(_stats["moved"]), "seconds": round(_stats["seconds"], 3)}
+
+
+def main(argv: list[str] | None = None) -> int:
+    # Under `python -m` this file is `__main__`; connections consult the imported `app.archive`.
+    from app import archive
+    from app.db import DB_PATH, get_db
+    from app.migrations import migrate
+
+    parser = argparse.ArgumentParser(prog="python -m app.archive", description="Archive closed cases or report table sizes.")
+    parser.add_argument("command", choices=["run", "stats"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--retention-days", type=float, default=RETENTION_DAYS)
+    parser.add_argument("--batch", type=int, default=BATCH)
+    args = parser.parse_args(argv)
+
+    archive.ENABLED = True
+    conn = get_db(args.db)
+    try:
+        migrate(conn)
+        if args.command == "run":
+            before = archive.sizes(conn)
+            report = archive.run(args.db, args.retention_days, args.batch)
+            after = archive.sizes(conn)
+            report["hot_bytes"] = {
+                table: {"before": before[table]["main"]["bytes"], "after": after[table]["main"]["bytes"]} for table in TABLES
+            }
+            print(json.dumps(report, indent=2))
+        else:
+            print(json.dumps(archive.sizes(conn), indent=2))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""Append-only audit log for employee, referral, case and progress-note writes.
+
+`records.ingest_*` call `emit()` for every row they create or change, with
+the actor, tenant, entity, action and a `{field: [old, new]}` diff. Events
+are buffered per write transaction through the writer's `TransactionHooks`,
+so a unit that rolls back to its savepoint drops its events and nothing is
+recorded for an aborted batch. The buffer is flushed to one of two sinks:
+
+  db     one `executemany` into `audit_events` inside the same transaction
+         as the writes, after the batch's last unit (atomic with the data)
+  file   after commit, to rotating append-only segment files under
+         FAIR_CHANCE_AUDIT_DIR; one `<crc32> <json>` line per event
+
+With the file sink, FAIR_CHANCE_AUDIT_DURABILITY picks when events reach
+the disk:
+
+  batch  (default) a background flusher appends every FLUSH_INTERVAL_MS;
+         `close()` (called by `close_writers()` on clean shutdown) drains
+         and fsyncs the buffer, so only a crash can lose the last interval
+  sync   the writer thread appends and fsyncs each batch before the
+         callers' requests return
+
+`query()` serves the tenant-scoped, time-ordered API from whichever sink is
+configured.
+
+  python -m app.audit verify [--dir PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Iterator
+from uuid import uuid4
+
+from app import writer
+
+SINK = os.environ.get("FAIR_CHANCE_AUDIT_SINK", "db")
+DURABILITY = os.environ.get("FAIR_CHANCE_AUDIT_DURABILITY", "batch")
+AUDIT_DIR = Path(os.environ.get("FAIR_CHANCE_AUDIT_DIR", Path(__file__).resolve().parent.parent / "audit"))
+FLUSH_INTERVAL_MS = float(os.environ.get("FAIR_CHANCE_AUDIT_FLUSH_MS", "200"))
+SEGMENT_BYTES = int(os.environ.get("FAIR_CHANCE_AUDIT_SEGMENT_BYTES", str(64 << 20)))
+
+COLUMNS = ("id", "tenant_id", "occurred_at", "actor_id", "entity_type", "entity_id", "action", "diff")
+FILTERS = ("entity_type", "entity_id", "actor_id", "action")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_events (
+    id TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    occurred_at TEXT NOT NULL,
+    actor_id TEXT NOT NULL,
+    entity_type TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    diff TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_events_tenant_time ON audit_events(tenant_id, occurred_at, id);
+CREATE INDEX IF NOT EXISTS idx_audit_events_tenant_entity ON audit_events(tenant_id, entity_id, occurred_at, id);
+CREATE TRIGGER IF NOT EXISTS audit_events_no_update BEFORE UPDATE ON audit_events BEGIN
+    SELECT RAISE(ABORT, 'audit_events is append-only');
+END;
+CREATE TRIGGER IF NOT EXISTS audit_events_no_delete BEFORE DELETE ON audit_events BEGIN
+    SELECT RAISE(ABORT, 'audit_events is append-only');
+END;
+"""
+
+_INSERT = f"INSERT INTO audit_events({','.join(COLUMNS)}) VALUES({','.join('?' * len(COLUMNS))})"
+
+Event = tuple[str, str, str, str, str, str, str, str]
+
+
+def diff_of(columns: tuple[str, ...], row: tuple[Any, ...], skip: tuple[str, ...] = ("id", "tenant_id")) -> dict[str, list[Any]]:
+    """Creation diff: every non-null column goes from None to its value."""
+    return {c: [None, v] for c, v in zip(columns, row) if v is not None and c not in skip}
+
+
+def _event_id() -> str:
+    """Nanosecond prefix, so events sharing an `occurred_at` second still sort in emission order."""
+    return f"{time.time_ns():016x}{uuid4().hex[:16]}"
+
+
+def _event(auth: dict[str, str], entity_type: str, entity_id: str, action: str, diff: dict[str, Any], at: str) -> Event:
+    return (_event_id(), auth["tenant_id"], at, auth["user_id"], entity_type, entity_id, action, json.dumps(diff, default=str))
+
+
+class SegmentLog:
+    """Rotating append-only segment files, one active segment per process.
+
+    A segment is named `<first occurred_at>_<pid>_<seq>.log`, so a time-range
+    read only opens segments that can overlap the range. Each line carries the
+    CRC32 of its JSON; torn or corrupted lines are skipped on read.
+    """
+
+    def __init__(self, directory: Path, segment_bytes: int = SEGMENT_BYTES) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._file: Any = None
+        self._size = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _open(self, first_at: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._seq += 1
+        stamp = first_at.replace("-", "").replace(":", "")
+        self._file = open(self.directory / f"{stamp}_{os.getpid()}_{self._seq:06d}.log", "ab")
+        self._size = 0
+
+    def append(self, events: list[Event], sync: bool = False) -> None:
+        if not events:
+            return
+        with self._lock:
+            if self._file is None or self._size >= self.segment_bytes:
+                self._close_file()
+                self._open(events[0][2])
+            lines = []
+            for event in events:
+                payload = json.dumps(dict(zip(COLUMNS, event)), separators=(",", ":")).encode("utf-8")
+                lines.append(b"%08x %s\n" % (zlib.crc32(payload), payload))
+            data = b"".join(lines)
+            self._file.write(data)
+            self._size += len(data)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_file()
+
+    def segments(self) -> list[tuple[str, Path]]:
+        """`(first occurred_at stamp, path)` for every segment, oldest first."""
+        if not self.directory.exists():
+            return []
+        return sorted((p.name.split("_", 1)[0], p) for p in self.directory.glob("*.log"))
+
+    @staticmethod
+    def read(path: Path) -> Iterator[dict[str, Any] | None]:
+        """Decoded events of one segment, None for each line that fails its checksum."""
+        with path.open("rb") as handle:
+            for line in handle:
+                crc, _, payload = line.rstrip(b"\n").partition(b" ")
+                try:
+                    ok = line.endswith(b"\n") and int(crc, 16) == zlib.crc32(payload)
+                    yield json.loads(payload) if ok else None
+                except ValueError:
+                    yield None
+
+    def scan(self, tenant_id: str, start: str | None, end: str | None) -> Iterator[dict[str, Any]]:
+        """The tenant's events in `(occurred_at, id)` order, read lazily.
+
+        Events take their time and id inside the write transaction and each
+        process appends them in commit order, so every chain is already sorted.
+        """
+        chains: dict[str, list[tuple[str, Path]]] = {}
+        for first, path in self.segments():
+            chains.setdefault(path.name.split("_")[1], []).append((first, path))
+        return heapq.merge(
+            *(self._scan_chain(chain, tenant_id, start, end) for chain in chains.values()),
+            key=lambda e: (e["occurred_at"], e["id"]),
+        )
+
+    def _scan_chain(self, chain: list[tuple[str, Path]], tenant_id: str, start: str | None, end: str | None) -> Iterator[dict[str, Any]]:
+        stamp = lambda value: value.replace("-", "").replace(":", "")  # noqa: E731
+        for i, (first, path) in enumerate(chain):
+            # A process writes its segments in order, so the next one's first event bounds this one.
+            following = chain[i + 1][0] if i + 1 < len(chain) else None
+            if end is not None and first >= stamp(end):
+                return
+            if start is not None and following is not None and following < stamp(start):
+                continue
+            for event in self.read(path):
+                if event is not None and event["tenant_id"] == tenant_id:
+                    yield event
+
+
+class AuditLog:
+    def __init__(self, sink: str = SINK, durability: str = DURABILITY, directory: Path = AUDIT_DIR) -> None:
+        if sink not in ("db", "file") or durability not in ("batch", "sync"):
+            raise ValueError(f"Unsupported audit sink/durability: {sink}/{durability}")
+        self.sink = sink
+        self.durability = durability
+        self.segments = SegmentLog(directory)
+        self._local = threading.local()
+        self._buffer: deque[Event] = deque()
+        self._wakeup = threading.Event()
+        self._flusher: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.emitted = self.written = self.flushes = 0
+
+    # Collection
+
+    def emit(self, cur: sqlite3.Cursor, events: list[Event]) -> None:
+        if not events:
+            return
+        pending = getattr(self._local, "pending", None)
+        with self._lock:
+            self.emitted += len(events)
+        if pending is not None:
+            pending.extend(events)
+        elif self.sink == "db":
+            # Outside the writer (scripts, tests): the caller owns the transaction, so write now.
+            cur.executemany(_INSERT, events)
+            self._count_written(len(events))
+        else:
+            self._enqueue(events)
+
+    # writer.TransactionHooks
+
+    def begin(self) -> None:
+        self._local.pending = []
+
+    def savepoint(self) -> int:
+        return len(self._local.pending)
+
+    def rollback_to(self, mark: int) -> None:
+        del self._local.pending[mark:]
+
+    def before_commit(self, cur: sqlite3.Cursor) -> None:
+        if self.sink == "db" and self._local.pending:
+            cur.executemany(_INSERT, self._local.pending)
+
+    def after_commit(self) -> None:
+        pending, self._local.pending = self._local.pending, None
+        if not pending:
+            return
+        if self.sink == "db":
+            self._count_written(len(pending))
+        elif self.durability == "sync":
+            self.segments.append(pending, sync=True)
+            self._count_written(len(pending))
+        else:
+            self._enqueue(pending)
+
+    def abort(self) -> None:
+        self._local.pending = None
+
+    def close(self) -> None:
+        """Drain the buffer to disk and fsync; the flusher restarts on the next event."""
+        with self._lock:
+            flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            self._wakeup.set()
+            flusher.join()
+        self.flush()
+        self.segments.close()
+
+    # File sink
+
+    def _enqueue(self, events: list[Event]) -> None:
+        self._buffer.extend(events)
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        me = threading.current_thread()
+        while self._flusher is me:
+            self._wakeup.wait(FLUSH_INTERVAL_MS / 1000)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        events = []
+        while self._buffer:
+            try:
+                events.append(self._buffer.popleft())
+            except IndexError:
+                break
+        self.segments.append(events)
+        self._count_written(len(events))
+        return len(events)
+
+    def _count_written(self, n: int) -> None:
+        if n:
+            with self._lock:
+                self.written += n
+                self.flushes += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sink": self.sink,
+                "durability": self.durability,
+                "emitted": self.emitted,
+                "written": self.written,
+                "flushes": self.flushes,
+                "buffered": len(self._buffer),
+                "avg_flush_size": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+            }
+
+
+log = AuditLog()
+writer.register_hooks(log)
+
+
+def configure(sink: str = SINK, durability: str = DURABILITY, directory: Path = AUDIT_DIR) -> AuditLog:
+    """Swap the process-wide audit log (tests, benchmarks); flushes the old one first."""
+    global log
+    log.close()
+    writer.unregister_hooks(log)
+    log = AuditLog(sink, durability, directory)
+    writer.register_hooks(log)
+    return log
+
+
+def emit(cur: sqlite3.Cursor, auth: dict[str, str], entity_type: str, action: str, changes: list[tuple[str, dict[str, Any]]], at: str) -> None:
+    """Record one `action` event per `(entity_id, diff)` pair."""
+    log.emit(cur, [_event(auth, entity_type, entity_id, action, diff, at) for entity_id, diff in changes])
+
+
+def query(cur: sqlite3.Cursor, tenant_id: str, params: dict[str, str]) -> dict[str, Any]:
+    """Oldest-first events for one tenant, optionally bounded by `from`/`to` and filtered by entity or actor."""
+    # Imported here: records emits through this module, and listing imports records.
+    from app.listing import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, encode_cursor
+    from app.records import ApiError, _is_iso_date, _is_iso_datetime
+
+    filters: dict[str, str] = {}
+    bounds: dict[str, str] = {}
+    after, limit = None, DEFAULT_LIMIT
+    for name, value in params.items():
+        if name in FILTERS:
+            filters[name] = value
+        elif name in ("from", "to"):
+            if not (_is_iso_date(value) or _is_iso_datetime(value)):
+                raise ApiError(400, f"{name} must be an ISO date or datetime")
+            bounds[name] = value
+        elif name == "cursor":
+            after = decode_cursor(value)
+        elif name == "limit":
+            if not value.isdigit() or not 1 <= int(value) <= MAX_LIMIT:
+                raise ApiError(400, f"limit must be between 1 and {MAX_LIMIT}")
+            limit = int(value)
+        else:
+            raise ApiError(400, f"Unsupported query parameter: {name}")
+    start, end = bounds.get("from"), bounds.get("to")
+
+    if log.sink == "file":
+        log.flush()
+        # Segments before the cursor's page can be skipped like those before `from`.
+        lower = after[0] if after is not None and (start is None or after[0] > start) else start
+        rows = list(itertools.islice(
+            (
+                e for e in log.segments.scan(tenant_id, lower, end)
+                if (start is None or e["occurred_at"] >= start)
+                and (end is None or e["occurred_at"] < end)
+                and (after is None or (e["occurred_at"], e["id"]) > after)
+                and all(e[k] == v for k, v in filters.items())
+            ),
+            limit + 1,
+        ))
+    else:
+        where, args = ["tenant_id = ?"], [tenant_id]
+        for name, value in filters.items():
+            where.append(f"{name} = ?")
+            args.append(value)
+        if start is not None:
+            where.append("occurred_at >= ?")
+            args.append(start)
+        if end is not None:
+            where.append("occurred_at < ?")
+            args.append(end)
+        if after is not None:
+            where.append("(occurred_at, id) > (?, ?)")
+            args.extend(after)
+        cur.execute(
+            f"SELECT {','.join(COLUMNS)} FROM audit_events WHERE {' AND '.join(where)} ORDER BY occurred_at, id LIMIT ?",
+            (*args, limit + 1),
+        )
+        rows = [dict(zip(COLUMNS, row)) for row in cur.fetchall()]
+    page = rows[:limit]
+    for row in page:
+        if isinstance(row["diff"], str):
+            row["diff"] = json.loads(row["diff"])
+    more = len(rows) > limit
+    return {"items": page, "next_cursor": encode_cursor(page[-1]["occurred_at"], page[-1]["id"]) if more else None}
+
+
+def stats() -> dict[str, Any]:
+    return log.stats()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.audit", description="Check audit segment files.")
+    parser.add_argument("command", choices=["verify"])
+    parser.add_argument("--dir", type=Path, default=AUDIT_DIR)
+    args = parser.parse_args(argv)
+    report = []
+    for _, path in SegmentLog(args.dir).segments():
+        events = list(SegmentLog.read(path))
+        report.append({"segment": path.name, "events": len(events), "corrupt": sum(e is None for e in events)})
+    print(json.dumps({"segments": report}, indent=2))
+    return 1 if any(r["corrupt"] for r in report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""Bearer-token verification with a cache of verified claims.
+
+Tokens are checked by a chain of verifiers:
+
+  DevTokenVerifier   the fixed tokens in `DEV_TOKENS` (`founder-admin-token`,
+                     ...), for local use and tests; on by default only
+                     while no FAIR_CHANCE_AUTH_SECRET is set
+  HmacVerifier       compact HS256 JWTs signed with FAIR_CHANCE_AUTH_SECRET,
+                     carrying `sub`, `tenant_id`, `role`, `exp` and `jti`;
+                     `issue_token()` and `python -m app.auth mint` create them
+                     offline
+
+An SSO verifier plugs in by implementing `verify(token) -> Claims | None` and
+being passed to `configure()`. Tokens that verify are cached in a bounded
+LRU keyed by the SHA-256 of the token, so a busy client pays for signature
+and claim checks once per token instead of once per request. Cached entries
+are dropped when they expire or when their `jti` is revoked; revocations
+live in process memory until the token would have expired anyway. Under the
+pre-fork server they are also published to a table in shared memory
+(`share_revocations()`), so a logout handled by one worker holds in all.
+
+  FAIR_CHANCE_AUTH_SECRET       HMAC key; signed tokens are rejected when unset
+  FAIR_CHANCE_AUTH_MAX_TTL      longest accepted token lifetime in seconds
+                                (default 86400); revocations are kept no longer
+  FAIR_CHANCE_AUTH_CACHE_SIZE   cached tokens per process (default 10000)
+  FAIR_CHANCE_DEV_TOKENS        1 or 0 (default 1 without a secret, 0 with one)
+
+  python -m app.auth mint --user u-coord --tenant tenant-acme --role coordinator [--ttl 3600]
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import binascii
+import hashlib
+import heapq
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+ROLES = {"company_admin", "coordinator", "manager"}
+DEFAULT_TTL_SECONDS = 3600
+CLOCK_SKEW_SECONDS = 30
+MAX_TTL_SECONDS = int(os.environ.get("FAIR_CHANCE_AUTH_MAX_TTL", "86400"))
+CACHE_SIZE = int(os.environ.get("FAIR_CHANCE_AUTH_CACHE_SIZE", "10000"))
+
+DEV_TOKENS = {
+    "founder-admin-token": {"user_id": "u-admin", "tenant_id": "tenant-acme", "role": "company_admin"},
+    "coordinator-token": {"user_id": "u-coord", "tenant_id": "tenant-acme", "role": "coordinator"},
+    "manager-token": {"user_id": "u-manager", "tenant_id": "tenant-acme", "role": "manager"},
+}
+
+_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b"=").decode("ascii")
+
+
+class AuthError(Exception):
+    pass
+
+
+class RevocationsFull(Exception):
+    """The shared revocation table has no room; the token is revoked in this process only."""
+
+
+class RevocationLog(Protocol):
+    """Revocations shared between processes, as (token id digest, expires_at) pairs."""
+
+    def publish(self, digest: bytes, expires_at: float) -> None: ...
+    def changes(self) -> list[tuple[bytes, float]] | None: ...
+
+
+def token_id_digest(token_id: str) -> bytes:
+    return hashlib.sha256(token_id.encode("utf-8")).digest()[:16]
+
+
+@dataclass(frozen=True)
+class Claims:
+    user_id: str
+    tenant_id: str
+    role: str
+    expires_at: float | None = None
+    token_id: str | None = None
+
+    def as_auth(self) -> dict[str, str]:
+        return {"user_id": self.user_id, "tenant_id": self.tenant_id, "role": self.role}
+
+
+class Verifier(Protocol):
+    def verify(self, token: str) -> Claims | None:
+        """Claims for a token this verifier recognises, None for one it does not; AuthError if it is invalid."""
+
+
+class DevTokenVerifier:
+    def __init__(self, tokens: dict[str, dict[str, str]] | None = None) -> None:
+        self.tokens = DEV_TOKENS if tokens is None else tokens
+
+    def verify(self, token: str) -> Claims | None:
+        claims = self.tokens.get(token)
+        return Claims(**claims) if claims else None
+
+
+def _b64decode(part: str) -> bytes:
+    return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+class HmacVerifier:
+    def __init__(self, secret: str | bytes) -> None:
+        self.key = secret.encode("utf-8") if isinstance(secret, str) else secret
+
+    def sign(self, payload: dict[str, Any]) -> str:
+        signing_input = f"{_HEADER}.{_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))}"
+        signature = hmac.new(self.key, signing_input.encode("ascii"), hashlib.sha256).digest()
+        return f"{signing_input}.{_b64encode(signature)}"
+
+    def verify(self, token: str) -> Claims | None:
+        if token.count(".") != 2:
+            return None
+        header, payload, signature = token.split(".")
+        try:
+            head = json.loads(_b64decode(header))
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            return None
+        if not isinstance(head, dict) or head.get("alg") != "HS256":
+            return None  # not ours; another verifier may accept it
+        expected = hmac.new(self.key, f"{header}.{payload}".encode("ascii", "replace"), hashlib.sha256).digest()
+        try:
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                raise AuthError("Bad signature")
+            body = json.loads(_b64decode(payload))
+        except (binascii.Error, ValueError, UnicodeDecodeError):
+            raise AuthError("Malformed token")
+        if not isinstance(body, dict):
+            raise AuthError("Malformed token")
+        sub, tenant, role, exp, jti = (body.get(k) for k in ("sub", "tenant_id", "role", "exp", "jti"))
+        if not all(isinstance(v, str) and v for v in (sub, tenant, jti)) or role not in ROLES:
+            raise AuthError("Token is missing required claims")
+        if isinstance(exp, bool) or not isinstance(exp, (int, float)):
+            raise AuthError("Token has no expiry")
+        if exp <= time.time() - CLOCK_SKEW_SECONDS:
+            raise AuthError("Token expired")
+        if exp > time.time() + MAX_TTL_SECONDS + CLOCK_SKEW_SECONDS:
+            raise AuthError("Token lifetime is too long")
+        nbf = body.get("nbf")
+        if isinstance(nbf, (int, float)) and nbf > time.time() + CLOCK_SKEW_SECONDS:
+            raise AuthError("Token not yet valid")
+        return Claims(sub, tenant, role, float(exp), jti)
+
+
+class ClaimsCache:
+    """LRU of verified claims keyed by token digest, with per-entry expiry."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, Claims] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expired = 0
+
+    def get(self, digest: bytes, now: float) -> Claims | None:
+        with self._lock:
+            claims = self._entries.get(digest)
+            if claims is None:
+                self.misses += 1
+                return None
+            if claims.expires_at is not None and claims.expires_at <= now - CLOCK_SKEW_SECONDS:
+                del self._entries[digest]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, digest: bytes, claims: Claims) -> None:
+        with self._lock:
+            self._entries[digest] = claims
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard_revoked(self, digests: set[bytes]) -> int:
+        with self._lock:
+            stale = [d for d, c in self._entries.items() if c.token_id is not None and token_id_digest(c.token_id) in digests]
+            for digest in stale:
+                del self._entries[digest]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expired = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
+
+
+class Authenticator:
+    def __init__(self, verifiers: list[Verifier], cache: ClaimsCache | None = None) -> None:
+        self.verifiers = verifiers
+        self.cache = cache or ClaimsCache()
+        self._revoked: dict[bytes, float] = {}
+        self._expiries: list[tuple[float, bytes]] = []  # heap over `_revoked`, soonest expiry first
+        self._lock = threading.Lock()
+        self._shared: RevocationLog | None = None
+        self.rejected = 0
+
+    def share_revocations(self, log: RevocationLog) -> None:
+        self._shared = log
+        self._sync_revocations()
+
+    def _sync_revocations(self) -> None:
+        changes = self._shared.changes() if self._shared is not None else None
+        if changes:
+            with self._lock:
+                for digest, until in changes:
+                    self._add_revoked(digest, until)
+                self._prune_revoked(time.time())
+            self.cache.discard_revoked({digest for digest, _ in changes})
+
+    def authenticate(self, token: str) -> Claims | None:
+        now = time.time()
+        if self._shared is not None:
+            self._sync_revocations()
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        claims = self.cache.get(digest, now)
+        if claims is not None:
+            return claims
+        for verifier in self.verifiers:
+            try:
+                claims = verifier.verify(token)
+            except AuthError:
+                break
+            if claims is not None:
+                self.cache.put(digest, claims)
+                # Checked after the put so a revoke() racing with this request cannot leave the token cached.
+                if claims.token_id is not None and self.is_revoked(claims.token_id, now):
+                    self.cache.discard_revoked({token_id_digest(claims.token_id)})
+                    break
+                return claims
+        with self._lock:
+            self.rejected += 1
+        return None
+
+    def verify(self, token: str) -> Claims | None:
+        """Claims of a token that verifies, ignoring the cache and revocations (for checks before revoking it)."""
+        for verifier in self.verifiers:
+            try:
+                claims = verifier.verify(token)
+            except AuthError:
+                return None
+            if claims is not None:
+                return claims
+        return None
+
+    def revoke(self, token_id: str, expires_at: float | None = None) -> None:
+        """Reject `token_id` from now on, until `expires_at` (when the token would stop working anyway).
+
+        No accepted token outlives MAX_TTL_SECONDS, so the entry never needs to be kept longer than that.
+        """
+        digest = token_id_digest(token_id)
+        now = time.time()
+        ceiling = now + MAX_TTL_SECONDS + CLOCK_SKEW_SECONDS
+        until = ceiling if expires_at is None else min(expires_at, ceiling)
+        with self._lock:
+            self._add_revoked(digest, until)
+            self._prune_revoked(now)
+        self.cache.discard_revoked({digest})
+        if self._shared is not None:
+            try:
+                self._shared.publish(digest, until)
+            except OverflowError as exc:
+                raise RevocationsFull(str(exc)) from exc
+
+    def _add_revoked(self, digest: bytes, until: float) -> None:
+        self._revoked[digest] = until
+        heapq.heappush(self._expiries, (until, digest))
+
+    def _prune_revoked(self, now: float) -> None:
+        while self._expiries and self._expiries[0][0] < now - CLOCK_SKEW_SECONDS:
+            until, digest = heapq.heappop(self._expiries)
+            # A digest revoked again since keeps its later entry.
+            if self._revoked.get(digest) == until:
+                del self._revoked[digest]
+
+    def is_revoked(self, token_id: str, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        digest = token_id_digest(token_id)
+        with self._lock:
+            until = self._revoked.get(digest)
+            if until is not None and until < now - CLOCK_SKEW_SECONDS:
+                del self._revoked[digest]
+                until = None
+            return until is not None
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            extra = {"revoked": len(self._revoked), "rejected": self.rejected}
+        return {**self.cache.stats(), **extra}
+
+
+def _default_verifiers(secret: str | None) -> list[Verifier]:
+    verifiers: list[Verifier] = []
+    # Well-known dev tokens next to real signed ones would let anyone in as an admin; opt in explicitly.
+    if os.environ.get("FAIR_CHANCE_DEV_TOKENS", "0" if secret else "1") != "0":
+        verifiers.append(DevTokenVerifier())
+    if secret:
+        verifiers.append(HmacVerifier(secret))
+    return verifiers
+
+
+authenticator = Authenticator(_default_verifiers(os.environ.get("FAIR_CHANCE_AUTH_SECRET")))
+
+
+def configure(verifiers: list[Verifier] | None = None, secret: str | None = None, cache_size: int = CACHE_SIZE) -> Authenticator:
+    """Replace the process-wide authenticator (tests, or wiring in an SSO verifier)."""
+    global authenticator
+    if verifiers is None:
+        verifiers = _default_verifiers(secret or os.environ.get("FAIR_CHANCE_AUTH_SECRET"))
+    authenticator = Authenticator(verifiers, ClaimsCache(cache_size))
+    return authenticator
+
+
+def bearer_claims(header: str | None) -> Claims | None:
+    if not header or not header.startswith("Bearer "):
+        return None
+    return authenticator.authenticate(header.replace("Bearer ", "", 1).strip())
+
+
+def parse_auth(header: str | None) -> dict[str, str] | None:
+    claims = bearer_claims(header)
+    return claims.as_auth() if claims else None
+
+
+def verify_token(token: str) -> Claims | None:
+    return authenticator.verify(token)
+
+
+def revoke(token_id: str, expires_at: float | None = None) -> None:
+    authenticator.revoke(token_id, expires_at)
+
+
+def cache_stats() -> dict[str, Any]:
+    return authenticator.stats()
+
+
+def issue_token(
+    user_id: str, tenant_id: str, role: str, ttl_seconds: int = DEFAULT_TTL_SECONDS, secret: str | None = None
+) -> str:
+    secret = secret or os.environ.get("FAIR_CHANCE_AUTH_SECRET")
+    if not secret:
+        raise AuthError("FAIR_CHANCE_AUTH_SECRET is not set")
+    if role not in ROLES:
+        raise AuthError(f"role must be one of {sorted(ROLES)}")
+    if ttl_seconds > MAX_TTL_SECONDS:
+        raise AuthError(f"ttl must be at most {MAX_TTL_SECONDS} seconds")
+    now = int(time.time())
+    payload = {"sub": user_id, "tenant_id": tenant_id, "role": role, "iat": now, "exp": now + ttl_seconds, "jti": uuid.uuid4().hex}
+    return HmacVerifier(secret).sign(payload)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.auth", description="Mint signed bearer tokens.")
+    parser.add_argument("command", choices=["mint"])
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--role", required=True, choices=sorted(ROLES))
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL_SECONDS, help="lifetime in seconds")
+    args = parser.parse_args(argv)
+    try:
+        print(issue_token(args.user, args.tenant, args.role, args.ttl))
+    except AuthError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
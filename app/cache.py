@@ -0,0 +1,142 @@
+"""Tenant-scoped cache of serialized read responses.
+
+Entries are keyed by tenant and a route-specific key and hold the encoded
+body plus its ETag. Writers call `invalidate(tenant_id)` after committing;
+each tenant carries a generation number so a reader that started before an
+invalidation cannot repopulate the cache with a stale body. Under the
+pre-fork server the generations live in shared memory (`share_generations()`),
+so a write handled by one worker invalidates the tenant in every worker.
+
+Each tenant keeps at most FAIR_CHANCE_RESPONSE_CACHE_SIZE entries (default
+256), least recently used first out; callers build keys from validated,
+canonical parameters so equivalent requests share one entry.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+CACHE_SIZE = int(os.environ.get("FAIR_CHANCE_RESPONSE_CACHE_SIZE", "256"))
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+class Generations(Protocol):
+    def get(self, key: str) -> int: ...
+    def bump(self, key: str) -> int: ...
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int = CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: dict[str, OrderedDict[str, CachedResponse]] = {}
+        self._generations: dict[str, int] = {}
+        self._shared: Generations | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+        self.evictions = 0
+
+    def share_generations(self, shared: Generations) -> None:
+        with self._lock:
+            self._shared = shared
+            self._entries.clear()
+            self._generations.clear()
+
+    def generation(self, tenant_id: str) -> int:
+        if self._shared is not None:
+            return self._shared.get(tenant_id)
+        return self._generations.get(tenant_id, 0)
+
+    def _sync(self, tenant_id: str) -> int:
+        """Drop the tenant's entries if another process invalidated it; returns the current generation."""
+        current = self._shared.get(tenant_id)
+        if self._generations.get(tenant_id) != current:
+            self._generations[tenant_id] = current
+            self._entries.pop(tenant_id, None)
+        return current
+
+    def get(self, tenant_id: str, key: str) -> CachedResponse | None:
+        with self._lock:
+            if self._shared is not None:
+                self._sync(tenant_id)
+            entries = self._entries.get(tenant_id)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None:
+                self.misses += 1
+            else:
+                entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, tenant_id: str, key: str, body: bytes, generation: int) -> CachedResponse:
+        """Store `body` unless the tenant was invalidated since `generation` was read."""
+        entry = CachedResponse(body, make_etag(body))
+        with self._lock:
+            current = self._sync(tenant_id) if self._shared is not None else self._generations.get(tenant_id, 0)
+            if current == generation:
+                entries = self._entries.setdefault(tenant_id, OrderedDict())
+                entries[key] = entry
+                entries.move_to_end(key)
+                while len(entries) > self.maxsize:
+                    entries.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.stale_puts += 1
+        return entry
+
+    def invalidate(self, tenant_id: str) -> None:
+        with self._lock:
+            if self._shared is not None:
+                self._generations[tenant_id] = self._shared.bump(tenant_id)
+            else:
+                self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            self._entries.pop(tenant_id, None)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for tenant_id in set(self._entries) | set(self._generations):
+                if self._shared is not None:
+                    self._generations[tenant_id] = self._shared.bump(tenant_id)
+                else:
+                    self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "tenants": len(self._entries),
+                "entries": sum(len(e) for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,214 @@
+"""SQLite connection management.
+
+Connections are pooled per database file and configured once, when they are
+opened, so request handlers only pay for a queue pop instead of a file open,
+schema parse and pragma round trip.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from app import archive, metrics
+
+DB_PATH = Path(__file__).resolve().parent.parent / "fair_chance.db"
+
+POOL_SIZE = int(os.environ.get("FAIR_CHANCE_DB_POOL_SIZE", "16"))
+POOL_TIMEOUT_SECONDS = float(os.environ.get("FAIR_CHANCE_DB_POOL_TIMEOUT", "10"))
+BUSY_TIMEOUT_MS = int(os.environ.get("FAIR_CHANCE_DB_BUSY_TIMEOUT_MS", "5000"))
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16384",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection frees up within the pool timeout."""
+
+
+def configure(conn: sqlite3.Connection) -> None:
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each `execute`/`executemany` to the metrics registry."""
+
+    def execute(self, sql: str, parameters: Any = (), /) -> TimedCursor:
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.record_statement(sql, (time.perf_counter() - started) * 1000)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> TimedCursor:
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.record_statement(sql, (time.perf_counter() - started) * 1000)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including `execute` shortcuts) are timed when metrics are on."""
+
+    def cursor(self, factory: Any = None) -> sqlite3.Cursor:
+        return super().cursor(factory or (TimedCursor if metrics.ENABLED else sqlite3.Cursor))
+
+    def execute(self, sql: str, parameters: Any = (), /) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class PooledConnection(TimedConnection):
+    """Connection whose `close()` hands it back to its pool."""
+
+    pool: ConnectionPool | None = None
+
+    def close(self) -> None:
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def discard(self) -> None:
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path: Path | str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT_SECONDS) -> None:
+        self.path = Path(path)
+        self.size = size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self._idle: list[PooledConnection] = []
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(self.path, factory=PooledConnection, check_same_thread=False)
+        configure(conn)
+        archive.attach(conn, self.path)
+        conn.pool = self
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        with self._cond:
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            if self._open >= self.size:
+                self.waits += 1
+                deadline = time.monotonic() + self.timeout
+                while not self._idle:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        raise PoolTimeout(f"No connection to {self.path.name} available after {self.timeout}s")
+                return self._idle.pop()
+            self._open += 1
+            self.misses += 1
+        try:
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn: PooledConnection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._drop(conn)
+            return
+        with self._cond:
+            if self._closed:
+                self._open -= 1
+                conn.discard()
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def _drop(self, conn: PooledConnection) -> None:
+        conn.discard()
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.discard()
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+            }
+
+
+_pools: dict[Path, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: Path | str | None = None, size: int = POOL_SIZE) -> ConnectionPool:
+    """The pool for `path`, created with `size` connections on first use."""
+    key = Path(path) if path is not None else DB_PATH
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key, size)
+    return pool
+
+
+def close_pool(path: Path | str) -> None:
+    with _pools_lock:
+        pool = _pools.pop(Path(path), None)
+    if pool is not None:
+        pool.close()
+
+
+def get_db(path: Path | str | None = None) -> sqlite3.Connection:
+    """Borrow a configured connection; `close()` returns it to the pool."""
+    with metrics.phase("db_acquire"):
+        return get_pool(path).acquire()
+
+
+def close_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats() -> dict[str, dict[str, Any]]:
+    return {pool.path.name: pool.stats() for pool in list(_pools.values())}
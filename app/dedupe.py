@@ -0,0 +1,367 @@
+"""Candidate matching for duplicate employees.
+
+Every employee gets a handful of blocking keys in `employee_match_keys`,
+indexed by `(tenant_id, key)`:
+
+  ph:<soundex>:<soundex>   phonetic codes of both names, sorted so that
+                           swapped first/last names share the key
+  pi:<soundex>:<initial>   phonetic last name plus first initial
+  em:<local part>          email local part, lowercased, dots and +tags dropped
+  tg:<trigram>:<initial>   trigrams of the last name plus first initial
+  tf:<trigram>:<soundex>   trigrams of the first name plus the last name's code
+
+A lookup collects the employees that share a phonetic or email key, or at
+least two trigram keys, with one indexed query, and only those are scored
+(Jaro-Winkler on the names, plus an email match). Nothing is ever compared
+against the whole table, so checking an import of N people costs
+O(N x block size) instead of O(N x employees).
+
+  python -m app.dedupe batch FILE --tenant TENANT_ID [--db PATH] [--threshold 0.88]
+  python -m app.dedupe reindex [--db PATH]
+
+`batch` reads CSV, JSON or NDJSON rows with first_name, last_name and an
+optional email, and reports duplicates inside the file and matches against
+existing employees.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import functools
+import json
+import re
+import sqlite3
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+DEFAULT_THRESHOLD = 0.88
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MIN_TRIGRAM_HITS = 2
+TRIGRAM_KEYS = ("tg:", "tf:")
+# In batch mode, loose blocks (trigrams, surname code + initial) bigger than this are skipped;
+# rows in them still meet through their phonetic-pair and email keys.
+MAX_BATCH_BLOCK = 500
+LOOSE_KEYS = ("tg:", "tf:", "pi:")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS employee_match_keys (
+    tenant_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    PRIMARY KEY (tenant_id, key, employee_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_employee_match_keys_employee ON employee_match_keys(employee_id);
+"""
+
+_SOUNDEX = {c: d for d, letters in {"1": "bfpv", "2": "cgjkqsxz", "3": "dt", "4": "l", "5": "mn", "6": "r"}.items() for c in letters}
+_NON_LETTERS = re.compile(r"[^a-z]")
+
+
+@dataclass(frozen=True)
+class Person:
+    first_name: str
+    last_name: str
+    email: str | None = None
+
+    @classmethod
+    def from_body(cls, body: Any) -> Person:
+        if not isinstance(body, dict):
+            raise ValueError("Body must be a JSON object")
+        first, last, email = body.get("first_name"), body.get("last_name"), body.get("email")
+        if not isinstance(first, str) or not isinstance(last, str) or not (fold(first) or fold(last)):
+            raise ValueError("first_name and last_name are required")
+        if email is not None and not isinstance(email, str):
+            raise ValueError("email must be a string")
+        return cls(first, last, email or None)
+
+
+@functools.lru_cache(maxsize=65536)
+def fold(name: str) -> str:
+    """Lowercase ASCII letters only: accents stripped, spaces, hyphens and apostrophes dropped."""
+    if not name.isascii():
+        name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    return _NON_LETTERS.sub("", name.lower())
+
+
+@functools.lru_cache(maxsize=65536)
+def soundex(name: str) -> str:
+    letters = fold(name)
+    if not letters:
+        return ""
+    code, previous = letters[0].upper(), _SOUNDEX.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX.get(c, "")
+        if digit and digit != previous:
+            code += digit
+        if c not in "hw":  # h and w do not separate letters with the same code
+            previous = digit
+    return (code + "000")[:4]
+
+
+def email_local(email: str | None) -> str:
+    if not email or "@" not in email:
+        return ""
+    return email.split("@", 1)[0].split("+", 1)[0].replace(".", "").lower()
+
+
+def trigrams(name: str) -> set[str]:
+    padded = f"^{fold(name)}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)} if len(padded) > 3 else set()
+
+
+def blocking_keys(person: Person) -> set[str]:
+    first, last = fold(person.first_name), fold(person.last_name)
+    initial, code = first[:1], soundex(last)
+    keys = {"ph:" + ":".join(sorted((soundex(first), code)))}
+    if last:
+        keys.add(f"pi:{code}:{initial}")
+        keys.update(f"tg:{gram}:{initial}" for gram in trigrams(last))
+        keys.update(f"tf:{gram}:{code}" for gram in trigrams(first))
+    if local := email_local(person.email):
+        keys.add("em:" + local)
+    return keys
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b:
+        return 0.0
+    window = max(len(a), len(b)) // 2 - 1
+    matched_b = [False] * len(b)
+    a_hits = []
+    for i, c in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not matched_b[j] and b[j] == c:
+                matched_b[j] = True
+                a_hits.append(c)
+                break
+    if not a_hits:
+        return 0.0
+    b_hits = [c for c, hit in zip(b, matched_b) if hit]
+    m = len(a_hits)
+    transpositions = sum(x != y for x, y in zip(a_hits, b_hits)) / 2
+    jaro = (m / len(a) + m / len(b) + (m - transpositions) / m) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def score(a: Person, b: Person) -> float:
+    """Name similarity in [0, 1] (best of straight and swapped order), raised by a shared email and lowered by differing ones."""
+    af, al, bf, bl = fold(a.first_name), fold(a.last_name), fold(b.first_name), fold(b.last_name)
+    names = max(
+        0.55 * jaro_winkler(al, bl) + 0.45 * jaro_winkler(af, bf),
+        0.55 * jaro_winkler(al, bf) + 0.45 * jaro_winkler(af, bl),
+    )
+    local_a, local_b = email_local(a.email), email_local(b.email)
+    if local_a and local_b:
+        if local_a == local_b:
+            return round(max(min(1.0, names + 0.1), 0.9), 4)
+        names *= 0.95
+    return round(names, 4)
+
+
+def _is_candidate(hits: Counter[str]) -> bool:
+    return any(not key.startswith(TRIGRAM_KEYS) for key in hits) or sum(hits.values()) >= MIN_TRIGRAM_HITS
+
+
+def key_rows(tenant_id: str, employee_id: str, person: Person) -> list[tuple[str, str, str]]:
+    return [(tenant_id, key, employee_id) for key in sorted(blocking_keys(person))]
+
+
+def index_employees(cur: sqlite3.Cursor, tenant_id: str, employees: Iterable[tuple[str, Person]]) -> None:
+    """Write blocking keys for newly inserted employees inside the caller's transaction."""
+    rows = [row for employee_id, person in employees for row in key_rows(tenant_id, employee_id, person)]
+    cur.executemany("INSERT OR IGNORE INTO employee_match_keys(tenant_id,key,employee_id) VALUES(?,?,?)", rows)
+
+
+def rebuild_keys(cur: sqlite3.Cursor) -> int:
+    """Recompute every employee's keys inside the caller's transaction; returns the number of key rows."""
+    cur.execute("DELETE FROM employee_match_keys")
+    written = 0
+    source = cur.connection.execute("SELECT id, tenant_id, first_name, last_name, email FROM employees")
+    while batch := source.fetchmany(5000):
+        rows = [row for emp_id, tenant, f, l, e in batch for row in key_rows(tenant, emp_id, Person(f, l, e))]
+        cur.executemany("INSERT OR IGNORE INTO employee_match_keys(tenant_id,key,employee_id) VALUES(?,?,?)", rows)
+        written += len(rows)
+    return written
+
+
+def candidate_sql(key_count: int) -> str:
+    return (
+        "SELECT employee_id, key FROM employee_match_keys "
+        f"WHERE tenant_id=? AND key IN ({','.join('?' * key_count)})"
+    )
+
+
+def find_matches(
+    cur: sqlite3.Cursor, tenant_id: str, person: Person, threshold: float = DEFAULT_THRESHOLD, limit: int = DEFAULT_LIMIT
+) -> list[dict[str, Any]]:
+    """Rank existing employees in the person's blocks by `score()`, best first."""
+    keys = sorted(blocking_keys(person))
+    cur.execute(candidate_sql(len(keys)), (tenant_id, *keys))
+    hits: dict[str, Counter[str]] = defaultdict(Counter)
+    for employee_id, key in cur.fetchall():
+        hits[employee_id][key] += 1
+    ids = [employee_id for employee_id, keys_hit in hits.items() if _is_candidate(keys_hit)]
+    matches = []
+    for start in range(0, len(ids), 500):
+        chunk = ids[start : start + 500]
+        cur.execute(
+            f"SELECT id, first_name, last_name, email FROM employees WHERE tenant_id=? AND id IN ({','.join('?' * len(chunk))})",
+            (tenant_id, *chunk),
+        )
+        for employee_id, first, last, email in cur.fetchall():
+            similarity = score(person, Person(first, last, email))
+            if similarity >= threshold:
+                matches.append(
+                    {
+                        "id": employee_id,
+                        "first_name": first,
+                        "last_name": last,
+                        "email": email,
+                        "score": similarity,
+                        "matched_on": sorted({key.split(":", 1)[0] for key in hits[employee_id]}),
+                    }
+                )
+    matches.sort(key=lambda m: (-m["score"], m["id"]))
+    return matches[:limit]
+
+
+def parse_search(body: Any) -> tuple[Person, float, int]:
+    """Validate a search body; raises ValueError."""
+    person = Person.from_body(body)
+    threshold, limit = body.get("threshold", DEFAULT_THRESHOLD), body.get("limit", DEFAULT_LIMIT)
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+        raise ValueError("threshold must be a number between 0 and 1")
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return person, float(threshold), limit
+
+
+def dedupe_batch(
+    people: list[Person], cur: sqlite3.Cursor | None = None, tenant_id: str | None = None, threshold: float = DEFAULT_THRESHOLD
+) -> dict[str, Any]:
+    """Cluster duplicates within `people` and, given a cursor, match each row against existing employees."""
+    blocks: dict[str, list[int]] = defaultdict(list)
+    row_keys = [blocking_keys(p) for p in people]
+    for index, keys in enumerate(row_keys):
+        for key in keys:
+            blocks[key].append(index)
+
+    parent = list(range(len(people)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    comparisons = 0
+    skipped: set[str] = set()
+    pairs = []
+    for index, keys in enumerate(row_keys):
+        hits: Counter[int] = Counter()
+        flags: dict[int, bool] = {}
+        for key in keys:
+            block = blocks[key]
+            if len(block) > MAX_BATCH_BLOCK and key.startswith(LOOSE_KEYS):
+                skipped.add(key)
+                continue
+            for other in block:
+                if other > index:
+                    hits[other] += 1
+                    flags[other] = flags.get(other, False) or not key.startswith(TRIGRAM_KEYS)
+        for other, n in hits.items():
+            if flags[other] or n >= MIN_TRIGRAM_HITS:
+                comparisons += 1
+                similarity = score(people[index], people[other])
+                if similarity >= threshold:
+                    pairs.append({"a": index, "b": other, "score": similarity})
+                    parent[root(other)] = root(index)
+
+    clusters: dict[int, list[int]] = defaultdict(list)
+    for index in range(len(people)):
+        clusters[root(index)].append(index)
+    existing = []
+    if cur is not None and tenant_id is not None:
+        for index, person in enumerate(people):
+            matches = find_matches(cur, tenant_id, person, threshold, limit=3)
+            if matches:
+                existing.append({"index": index, "matches": matches})
+    return {
+        "rows": len(people),
+        "comparisons": comparisons,
+        "skipped_blocks": len(skipped),
+        "duplicate_pairs": pairs,
+        "clusters": [members for members in clusters.values() if len(members) > 1],
+        "existing_matches": existing,
+    }
+
+
+def read_people(path: Path) -> Iterator[Person]:
+    with path.open(newline="", encoding="utf-8") as handle:
+        if path.suffix == ".csv":
+            rows: Iterable[Any] = csv.DictReader(handle)
+        elif path.suffix == ".json":
+            rows = json.load(handle)
+        else:
+            rows = (json.loads(line) for line in handle if line.strip())
+        for line_no, row in enumerate(rows, start=1):
+            try:
+                yield Person.from_body(row)
+            except ValueError as exc:
+                raise ValueError(f"{path}:{line_no}: {exc}") from None
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db import DB_PATH, get_db
+    from app.migrations import migrate
+
+    parser = argparse.ArgumentParser(prog="python -m app.dedupe", description="Find duplicate employees.")
+    parser.add_argument("command", choices=["batch", "reindex"])
+    parser.add_argument("file", nargs="?", type=Path, help="CSV, JSON or NDJSON import file (batch)")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--tenant", help="also match against this tenant's employees (batch)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    conn = get_db(args.db)
+    try:
+        migrate(conn)
+        if args.command == "reindex":
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                written = rebuild_keys(cur)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            print(json.dumps({"keys": written}))
+            return 0
+        if args.file is None:
+            parser.error("batch needs an import file")
+        try:
+            people = list(read_people(args.file))
+        except ValueError as exc:
+            print(str(exc), file=sys.stderr)
+            return 2
+        cur = conn.cursor() if args.tenant else None
+        print(json.dumps(dedupe_batch(people, cur, args.tenant, args.threshold), indent=2))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
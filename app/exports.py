@@ -0,0 +1,297 @@
+"""Background export jobs (`POST /exports`, `GET /exports/{exportId}`).
+
+Jobs are recorded in `export_jobs` and run on a small worker pool, off the
+request thread. A job walks the tenant's rows in keyset order, EXPORT_CHUNK_ROWS
+at a time with a short read per chunk, and streams them into a CSV or NDJSON
+file (optionally gzip-compressed), so peak memory does not depend on tenant
+size. Progress is written back every PROGRESS_EVERY_ROWS rows. Finished
+files are served by `GET /exports/{exportId}/download`.
+
+A job is claimed with a conditional status update before it runs, so a job
+that reaches more than one pool (pre-fork workers resuming queued jobs) runs
+once; the claim records the process in `owner_pid`. `requeue_interrupted()`
+turns jobs a dead server left `running` back into `queued` ones. The pre-fork
+supervisor calls it before forking, and again for a worker's pid when that
+worker dies, before the replacement (which resumes them) is forked; workers
+resume `queued` jobs only, since `running` ones belong to a live sibling.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+from app import listing, shards
+from app.db import get_db
+from app.ids import new_id
+from app.records import ApiError, utcnow
+from app.writer import run_write
+
+EXPORT_DIR = Path(os.environ.get("FAIR_CHANCE_EXPORT_DIR", Path(__file__).resolve().parent.parent / "exports"))
+EXPORT_WORKERS = int(os.environ.get("FAIR_CHANCE_EXPORT_WORKERS", "2"))
+EXPORT_CHUNK_ROWS = listing.MAX_LIMIT
+RESUME_STATUSES: tuple[str, ...] = ("queued", "running")
+PROGRESS_EVERY_ROWS = 5000
+DOWNLOAD_BLOCK_BYTES = 64 * 1024
+
+FORMATS = {"csv": ("text/csv", ".csv"), "ndjson": ("application/x-ndjson", ".ndjson")}
+COMPRESSIONS = {None, "gzip"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    requested_by_user_id TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    format TEXT NOT NULL,
+    compression TEXT,
+    filters TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rows_written INTEGER NOT NULL DEFAULT 0,
+    bytes_written INTEGER,
+    file_path TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_tenant_created ON export_jobs(tenant_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_status ON export_jobs(status);
+"""
+
+OWNER_SCHEMA = """
+ALTER TABLE export_jobs ADD COLUMN owner_pid INTEGER;
+"""
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+                _resume_interrupted(_executor)
+    return _executor
+
+
+def start() -> None:
+    """Start the worker pool now (resuming interrupted jobs) instead of on the first export request."""
+    _pool()
+
+
+def _resume_interrupted(pool: ThreadPoolExecutor) -> None:
+    """Requeue jobs left queued or running by a previous process."""
+    for path in shards.all_paths():
+        conn = get_db(path)
+        try:
+            ids = [
+                row[0]
+                for row in conn.execute(
+                    f"SELECT id FROM export_jobs WHERE status IN ({','.join('?' * len(RESUME_STATUSES))})", RESUME_STATUSES
+                )
+            ]
+        finally:
+            conn.close()
+        for job_id in ids:
+            pool.submit(run_job, job_id, path)
+        if not ids:
+            shards.release(path)  # otherwise the last job to finish releases it
+
+
+def requeue_interrupted(cur: sqlite3.Cursor, owner_pid: int | None = None) -> int:
+    """Queue `running` jobs again: all of them, or those claimed by the (dead) process `owner_pid`."""
+    sql = "UPDATE export_jobs SET status='queued', started_at=NULL, rows_written=0, owner_pid=NULL WHERE status='running'"
+    if owner_pid is None:
+        cur.execute(sql)
+    else:
+        cur.execute(sql + " AND owner_pid=?", (owner_pid,))
+    return cur.rowcount
+
+
+def _update(job_id: str, path: Path | None, **fields: Any) -> None:
+    assignments = ", ".join(f"{name}=?" for name in fields)
+    run_write(lambda cur: cur.execute(f"UPDATE export_jobs SET {assignments} WHERE id=?", (*fields.values(), job_id)), path)
+
+
+def create_job(auth: dict[str, str], body: Any) -> dict[str, Any]:
+    if not isinstance(body, dict):
+        raise ApiError(400, "Body must be a JSON object")
+    entity = body.get("entity")
+    fmt = body.get("format", "csv")
+    compression = body.get("compression")
+    filters = body.get("filters") or {}
+    if entity not in listing.LISTS:
+        raise ApiError(400, f"entity must be one of {sorted(listing.LISTS)}")
+    if fmt not in FORMATS:
+        raise ApiError(400, f"format must be one of {sorted(FORMATS)}")
+    if compression not in COMPRESSIONS:
+        raise ApiError(400, "compression must be gzip or null")
+    if not isinstance(filters, dict) or not all(isinstance(v, str) for v in filters.values()):
+        raise ApiError(400, "filters must be an object of string values")
+    if {"cursor", "limit"} & filters.keys():
+        raise ApiError(400, "cursor and limit are not export filters")
+    listing.build_query(listing.LISTS[entity], auth["tenant_id"], filters)
+
+    job = {
+        "id": new_id(),
+        "tenant_id": auth["tenant_id"],
+        "requested_by_user_id": auth["user_id"],
+        "entity": entity,
+        "format": fmt,
+        "compression": compression,
+        "filters": json.dumps(filters),
+        "status": "queued",
+        "rows_written": 0,
+        "created_at": utcnow(),
+    }
+    # Start the pool (and resume older jobs) before inserting, so the new job is submitted exactly once.
+    pool = _pool()
+    path = shards.path_for(auth["tenant_id"])
+    run_write(
+        lambda cur: cur.execute(
+            f"INSERT INTO export_jobs({','.join(job)}) VALUES({','.join('?' * len(job))})", tuple(job.values())
+        ),
+        path,
+    )
+    pool.submit(run_job, job["id"], path)
+    return get_job(auth["tenant_id"], job["id"])
+
+
+def get_job(tenant_id: str, job_id: str) -> dict[str, Any] | None:
+    conn = get_db(shards.path_for(tenant_id))
+    try:
+        row = conn.execute("SELECT * FROM export_jobs WHERE id=? AND tenant_id=?", (job_id, tenant_id)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def job_payload(job: dict[str, Any]) -> dict[str, Any]:
+    payload = {k: v for k, v in job.items() if k not in ("file_path", "tenant_id", "owner_pid")}
+    payload["filters"] = json.loads(job["filters"])
+    payload["download_url"] = f"/api/v1/exports/{job['id']}/download" if job["status"] == "completed" else None
+    return payload
+
+
+def _open(path: Path, compression: str | None) -> IO[str]:
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def _chunks(spec: listing.ListSpec, tenant_id: str, filters: dict[str, str], path: Path | None) -> Iterator[list[Any]]:
+    cursor = None
+    while True:
+        params = {**filters, "limit": str(EXPORT_CHUNK_ROWS)}
+        if cursor:
+            params["cursor"] = cursor
+        sql, args, limit = listing.build_query(spec, tenant_id, params, descending=False)
+        conn = get_db(path)
+        try:
+            rows = conn.execute(sql, args).fetchmany(limit)
+        finally:
+            conn.close()
+        if rows:
+            yield rows
+        if len(rows) < limit:
+            return
+        cursor = listing.encode_cursor(rows[-1][spec.order_column], rows[-1]["id"])
+
+
+def run_job(job_id: str, path: Path | None = None) -> None:
+    """Run one job; the shard stays held while it runs and is released (closed unless a tenant has it open) after."""
+    try:
+        with shards.hold(path):
+            _run(job_id, path)
+    finally:
+        shards.release(path)
+
+
+def _run(job_id: str, path: Path | None) -> None:
+    conn = get_db(path)
+    try:
+        row = conn.execute("SELECT * FROM export_jobs WHERE id=?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or row["status"] not in ("queued", "running"):
+        return
+    job = dict(row)
+    spec = listing.LISTS[job["entity"]]
+    suffix = FORMATS[job["format"]][1] + (".gz" if job["compression"] == "gzip" else "")
+    final = EXPORT_DIR / shards.shard_name(job["tenant_id"]) / f"{job_id}{suffix}"
+    partial = final.with_name(final.name + ".part")
+    claimed = run_write(
+        lambda cur: cur.execute(
+            "UPDATE export_jobs SET status='running', started_at=?, rows_written=0, owner_pid=? WHERE id=? AND status=?",
+            (utcnow(), os.getpid(), job_id, row["status"]),
+        ).rowcount,
+        path,
+    )
+    if not claimed:
+        return
+    try:
+        final.parent.mkdir(parents=True, exist_ok=True)
+        rows_written = 0
+        reported = 0
+        with _open(partial, job["compression"]) as fh:
+            writer = csv.writer(fh) if job["format"] == "csv" else None
+            if writer is not None:
+                writer.writerow(spec.columns)
+            for rows in _chunks(spec, job["tenant_id"], json.loads(job["filters"]), path):
+                if writer is not None:
+                    writer.writerows(tuple(r) for r in rows)
+                else:
+                    fh.writelines(json.dumps(spec.transform(dict(r))) + "\n" for r in rows)
+                rows_written += len(rows)
+                if rows_written - reported >= PROGRESS_EVERY_ROWS:
+                    _update(job_id, path, rows_written=rows_written)
+                    reported = rows_written
+        partial.replace(final)
+        _update(
+            job_id,
+            path,
+            status="completed",
+            rows_written=rows_written,
+            bytes_written=final.stat().st_size,
+            file_path=str(final),
+            finished_at=utcnow(),
+        )
+    except Exception as exc:
+        partial.unlink(missing_ok=True)
+        _update(job_id, path, status="failed", error=str(exc), finished_at=utcnow())
+
+
+def download(job: dict[str, Any]) -> tuple[str, str, Iterator[bytes]]:
+    """Return (content type, filename, byte blocks) for a completed job."""
+    if job["status"] != "completed":
+        raise ApiError(409, f"Export is {job['status']}")
+    path = Path(job["file_path"])
+    if not path.exists():
+        raise ApiError(410, "Export file is no longer available")
+    content_type = "application/gzip" if job["compression"] == "gzip" else FORMATS[job["format"]][0]
+
+    def blocks() -> Iterator[bytes]:
+        with open(path, "rb") as fh:
+            while block := fh.read(DOWNLOAD_BLOCK_BYTES):
+                yield block
+
+    return content_type, path.name, blocks()
+
+
+def shutdown(wait: bool = True) -> None:
+    """Finish the running exports and drop the ones not started; those stay `queued` and resume on the next start."""
+    global _executor
+    with _executor_lock:
+        pool, _executor = _executor, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
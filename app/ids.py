@@ -0,0 +1,92 @@
+"""Time-ordered record ids (ULID layout).
+
+`new_id()` returns 26 Crockford base32 characters: a 48-bit millisecond
+timestamp followed by 80 random bits. Ids sort as plain TEXT in creation
+order, so inserts append to the right edge of the primary key and of every
+index that embeds the id (instead of splitting pages all over the B-tree
+like uuid4), each copy of the key is 26 bytes instead of 36, and `(ts, id)`
+keyset pages break timestamp ties in insertion order.
+
+Within one millisecond a process increments the random part instead of
+drawing a new one, so its ids stay strictly increasing; the state is
+reseeded in forked children so pre-fork workers never share a sequence.
+
+Ids minted before this module (uuid4 text) stay valid: columns are still
+TEXT and every lookup is by equality, so old and new ids coexist.
+`timestamp_ms()` returns None for them, and they sort among the new ones
+arbitrarily, which only affects tie order.
+"""
+from __future__ import annotations
+
+import base64
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+LENGTH = 26
+_RANDOM_BITS = 80
+_DECODE = {c: i for i, c in enumerate(ALPHABET)}
+# base32 in C, remapped from the RFC 4648 alphabet to Crockford's.
+_FROM_RFC4648 = bytes.maketrans(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ234567", ALPHABET.encode("ascii"))
+
+_lock = threading.Lock()
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value: int) -> str:
+    # 130 bits left-aligned in 160 (a whole number of 5-byte groups) -> 32 chars, keep the first 26.
+    return base64.b32encode((value << 30).to_bytes(20, "big")).translate(_FROM_RFC4648)[:LENGTH].decode("ascii")
+
+
+def new_id() -> str:
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms, _last_random = now_ms, int.from_bytes(os.urandom(10), "big")
+        elif _last_random + 1 < 1 << _RANDOM_BITS:
+            _last_random += 1
+        else:
+            # 2^80 ids in one millisecond is not reachable; borrow the next one rather than repeat.
+            _last_ms, _last_random = _last_ms + 1, int.from_bytes(os.urandom(10), "big") >> 1
+        return _encode(_last_ms << _RANDOM_BITS | _last_random)
+
+
+def id_at(at_ms: int, randomness: int) -> str:
+    """The id for a given millisecond and 80 random bits, for generators that choose both (`app.synthetic`)."""
+    return _encode(at_ms << _RANDOM_BITS | randomness & (1 << _RANDOM_BITS) - 1)
+
+
+def min_id(at: datetime) -> str:
+    """The smallest id minted at or after `at`, for `id >= ?` range scans."""
+    return _encode(int(at.timestamp() * 1000) << _RANDOM_BITS)
+
+
+def timestamp_ms(record_id: str) -> int | None:
+    """Creation time of a time-ordered id; None for legacy uuid4 (or other) ids."""
+    if len(record_id) != LENGTH or record_id[0] > "7":
+        return None
+    value = 0
+    for char in record_id:
+        digit = _DECODE.get(char)
+        if digit is None:
+            return None
+        value = value * 32 + digit
+    return value >> _RANDOM_BITS
+
+
+def created_at(record_id: str) -> datetime | None:
+    ms = timestamp_ms(record_id)
+    return datetime.fromtimestamp(ms / 1000, timezone.utc) if ms is not None else None
+
+
+def _reseed() -> None:
+    global _lock, _last_ms, _last_random
+    _lock = threading.Lock()
+    _last_ms, _last_random = -1, 0
+
+
+os.register_at_fork(after_in_child=_reseed)
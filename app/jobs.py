@@ -0,0 +1,353 @@
+"""Durable background jobs in SQLite (AI triage, note summaries).
+
+A job is a row in `jobs`, inserted by `enqueue()` inside the caller's write
+transaction, so it exists exactly when the record it is about does and POST
+handlers only pay for one extra insert. JOB_WORKERS threads claim ready jobs
+with a conditional UPDATE through the writer, run the kind's handler outside
+any transaction (a model call can take seconds), and commit what the handler
+returns together with the job's `succeeded` status.
+
+  dedupe       a unique index over *queued* jobs on (tenant_id, dedupe_key),
+               the hash of kind, entity and payload; enqueueing a job that is
+               already waiting is a no-op
+  concurrency  a claim skips tenants with TENANT_CONCURRENCY jobs running,
+               counted in the database so it holds across pre-fork workers
+  retries      a failed attempt is requeued BACKOFF_BASE_SECONDS * 2^(n-1)
+               later (jittered, capped) until it has used max_attempts
+  leases       a claim holds a job for LEASE_SECONDS; jobs of a worker that
+               died are reclaimed when their lease runs out
+
+Queue depth is a `/metrics` gauge; wait (ready to claimed) and run time are
+histograms per kind, and `stats()` feeds `/dev/stats`.
+
+  FAIR_CHANCE_JOB_WORKERS             worker threads per process (default 2)
+  FAIR_CHANCE_JOB_TENANT_CONCURRENCY  running jobs per tenant (default 2)
+  FAIR_CHANCE_JOB_MAX_ATTEMPTS        attempts before a job fails (default 5)
+  FAIR_CHANCE_JOB_BACKOFF_S           first retry delay (default 2)
+  FAIR_CHANCE_JOB_LEASE_S             claim lease (default 300)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from app import metrics, shards
+from app.db import get_db
+from app.ids import new_id
+from app.writer import run_write
+
+JOB_WORKERS = int(os.environ.get("FAIR_CHANCE_JOB_WORKERS", "2"))
+TENANT_CONCURRENCY = int(os.environ.get("FAIR_CHANCE_JOB_TENANT_CONCURRENCY", "2"))
+MAX_ATTEMPTS = int(os.environ.get("FAIR_CHANCE_JOB_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS = float(os.environ.get("FAIR_CHANCE_JOB_BACKOFF_S", "2"))
+BACKOFF_MAX_SECONDS = 300.0
+LEASE_SECONDS = float(os.environ.get("FAIR_CHANCE_JOB_LEASE_S", "300"))
+POLL_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_queued_dedupe ON jobs(tenant_id, dedupe_key) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_status_ready ON jobs(status, run_after, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_tenant ON jobs(status, tenant_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_tenant_entity ON jobs(tenant_id, entity_id);
+"""
+
+CLAIM_SQL = """
+SELECT id, tenant_id, kind, entity_id, payload, attempts, max_attempts, run_after FROM jobs
+WHERE status = 'queued' AND run_after <= ?
+  AND tenant_id NOT IN (SELECT tenant_id FROM jobs WHERE status = 'running' GROUP BY tenant_id HAVING COUNT(*) >= ?)
+ORDER BY run_after, id LIMIT 1
+"""
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    tenant_id: str
+    kind: str
+    entity_id: str
+    payload: dict[str, Any]
+    attempts: int
+    max_attempts: int
+    ready_at: float
+    lease_until: float
+    path: Path | None
+
+
+# A handler does its reads and slow work, then returns what to write (or None);
+# the queue runs that in the same transaction that marks the job succeeded.
+Handler = Callable[[Job], "Callable[[sqlite3.Cursor], None] | None"]
+HANDLERS: dict[str, Handler] = {}
+
+
+def register(kind: str, handler: Handler) -> None:
+    HANDLERS[kind] = handler
+
+
+def dedupe_key(kind: str, entity_id: str, payload: str) -> str:
+    return hashlib.sha256(f"{kind}\0{entity_id}\0{payload}".encode("utf-8")).hexdigest()[:32]
+
+
+def backoff(attempts: int) -> float:
+    """Delay before retrying after the `attempts`-th failed attempt."""
+    return min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS) * random.uniform(0.5, 1.0)
+
+
+def _retry_or_fail(cur: sqlite3.Cursor, job_id: str, attempts: int, max_attempts: int, error: str, now: float) -> str:
+    if attempts >= max_attempts:
+        cur.execute(
+            "UPDATE jobs SET status='failed', last_error=?, lease_until=NULL, finished_at=? WHERE id=?", (error, now, job_id)
+        )
+        return "failed"
+    try:
+        cur.execute(
+            "UPDATE jobs SET status='queued', last_error=?, lease_until=NULL, run_after=? WHERE id=?",
+            (error, now + backoff(attempts), job_id),
+        )
+        return "retried"
+    except sqlite3.IntegrityError:
+        # An identical job was queued while this one ran; that one does the work.
+        cur.execute(
+            "UPDATE jobs SET status='deduplicated', last_error=?, lease_until=NULL, finished_at=? WHERE id=?",
+            (error, now, job_id),
+        )
+        return "deduplicated"
+
+
+class JobQueue:
+    """Worker threads that claim and run jobs from every database that may hold some."""
+
+    def __init__(self, workers: int = JOB_WORKERS, tenant_concurrency: int = TENANT_CONCURRENCY) -> None:
+        self.workers = workers
+        self.tenant_concurrency = tenant_concurrency
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._active: set[Path | None] = set()
+        self.running = 0
+        self.outcomes: dict[str, int] = {"succeeded": 0, "retried": 0, "failed": 0, "deduplicated": 0, "lease_lost": 0}
+
+    def notify(self, path: Path | None) -> None:
+        """New work in `path`'s database."""
+        with self._lock:
+            self._active.add(path)
+        self._wake.set()
+
+    def start(self) -> None:
+        if any(t.is_alive() for t in self._threads):
+            return
+        self._stop.clear()
+        with self._lock:
+            self._active.update(shards.all_paths())
+        self._threads = [threading.Thread(target=self._work, name=f"job-{n}", daemon=True) for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stop claiming; jobs already running finish (or are reclaimed after their lease)."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim_any()
+            except Exception as exc:  # keep the worker alive; the next poll retries
+                print(f"job claim failed: {exc}", file=sys.stderr)
+                job = None
+            if job is None:
+                if self._wake.wait(POLL_SECONDS):
+                    self._wake.clear()
+                continue
+            self._run(job)
+
+    def _claim_any(self) -> Job | None:
+        with self._lock:
+            paths = list(self._active)
+        random.shuffle(paths)  # no shard starves behind a busy one
+        for path in paths:
+            now = time.time()
+            conn = get_db(path)
+            try:
+                next_ready, next_expiry = conn.execute(
+                    "SELECT (SELECT MIN(run_after) FROM jobs WHERE status='queued'),"
+                    " (SELECT MIN(lease_until) FROM jobs WHERE status='running')"
+                ).fetchone()
+            finally:
+                conn.close()
+            if next_ready is None and next_expiry is None:
+                if path is not None:
+                    with self._lock:
+                        self._active.discard(path)
+                    shards.release(path)
+                continue
+            if (next_ready is None or next_ready > now) and (next_expiry is None or next_expiry > now):
+                continue
+            job = run_write(lambda cur: self._claim(cur, path, now), path)
+            if job is not None:
+                return job
+        return None
+
+    def _claim(self, cur: sqlite3.Cursor, path: Path | None, now: float) -> Job | None:
+        expired = cur.execute(
+            "SELECT id, kind, attempts, max_attempts FROM jobs WHERE status='running' AND lease_until < ?", (now,)
+        ).fetchall()
+        for row in expired:
+            outcome = _retry_or_fail(cur, row["id"], row["attempts"], row["max_attempts"], "lease expired", now)
+            self._count(row["kind"], outcome)
+        row = cur.execute(CLAIM_SQL, (now, self.tenant_concurrency)).fetchone()
+        if row is None:
+            return None
+        lease_until = now + LEASE_SECONDS
+        cur.execute(
+            "UPDATE jobs SET status='running', attempts=attempts+1, lease_until=? WHERE id=? AND status='queued'",
+            (lease_until, row["id"]),
+        )
+        return Job(
+            row["id"], row["tenant_id"], row["kind"], row["entity_id"], json.loads(row["payload"]),
+            row["attempts"] + 1, row["max_attempts"], row["run_after"], lease_until, path,
+        )
+
+    def _run(self, job: Job) -> None:
+        started = time.time()
+        metrics.registry.observe_job(job.kind, "wait", max(started - job.ready_at, 0.0) * 1000)
+        with self._lock:
+            self.running += 1
+        try:
+            store = HANDLERS[job.kind](job)
+
+            def finish(cur: sqlite3.Cursor) -> str:
+                claimed = cur.execute(
+                    "UPDATE jobs SET status='succeeded', lease_until=NULL, last_error=NULL, finished_at=?"
+                    " WHERE id=? AND status='running' AND lease_until=?",
+                    (time.time(), job.id, job.lease_until),
+                ).rowcount
+                if not claimed:
+                    return "lease_lost"  # reclaimed by another worker, which will redo it
+                if store is not None:
+                    store(cur)
+                return "succeeded"
+
+            outcome = run_write(finish, job.path)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"[:500]
+            try:
+                outcome = run_write(
+                    lambda cur: _retry_or_fail(cur, job.id, job.attempts, job.max_attempts, error, time.time()), job.path
+                )
+            except Exception as write_exc:  # the lease runs out and the job is retried then
+                print(f"job {job.id} failed and could not be rescheduled: {write_exc}", file=sys.stderr)
+                outcome = "lease_lost"
+        finally:
+            with self._lock:
+                self.running -= 1
+        metrics.registry.observe_job(job.kind, "run", (time.time() - started) * 1000)
+        self._count(job.kind, outcome)
+        # A finished job may unblock a tenant at its concurrency limit.
+        self._wake.set()
+
+    def _count(self, kind: str, outcome: str) -> None:
+        metrics.registry.count_job(kind, outcome)
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def depth(self) -> dict[tuple[str, str], int]:
+        """Queued and running jobs by (kind, status) across the databases this process knows about."""
+        with self._lock:
+            paths = list(self._active) or [None]
+        totals: dict[tuple[str, str], int] = {}
+        for path in paths:
+            try:
+                conn = get_db(path)
+            except sqlite3.Error:
+                continue
+            try:
+                rows = conn.execute(
+                    "SELECT kind, status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY kind, status"
+                ).fetchall()
+            except sqlite3.Error:  # not migrated yet
+                rows = []
+            finally:
+                conn.close()
+            for kind, status, n in rows:
+                totals[(kind, status)] = totals.get((kind, status), 0) + n
+        return totals
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            base = {"workers": len(self._threads), "running": self.running, **self.outcomes}
+        return {**base, "depth": {f"{kind}:{status}": n for (kind, status), n in sorted(self.depth().items())}}
+
+
+queue = JobQueue()
+metrics.registry.add_gauge(
+    "fair_chance_jobs_depth",
+    "Queued and running background jobs by kind.",
+    lambda: [(f'kind="{kind}",status="{status}"', n) for (kind, status), n in sorted(queue.depth().items())],
+)
+
+
+def enqueue(
+    cur: sqlite3.Cursor,
+    tenant_id: str,
+    kind: str,
+    entity_ids: Iterable[str],
+    payload: dict[str, Any] | None = None,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> int:
+    """Queue a `kind` job per entity in the caller's transaction; returns how many were not already queued."""
+    body = json.dumps(payload or {}, sort_keys=True)
+    now = time.time()
+    rows = [
+        (new_id(), tenant_id, kind, entity_id, body, dedupe_key(kind, entity_id, body), max_attempts, now, now)
+        for entity_id in entity_ids
+    ]
+    if not rows:
+        return 0
+    cur.executemany(
+        "INSERT OR IGNORE INTO jobs(id,tenant_id,kind,entity_id,payload,dedupe_key,status,max_attempts,run_after,enqueued_at)"
+        " VALUES(?,?,?,?,?,?,'queued',?,?,?)",
+        rows,
+    )
+    queue.notify(shards.path_for(tenant_id))
+    return cur.rowcount
+
+
+def start() -> None:
+    queue.start()
+
+
+def stop(timeout: float | None = None) -> None:
+    queue.stop(timeout)
+
+
+def stats() -> dict[str, Any]:
+    return queue.stats()
@@ -0,0 +1,397 @@
+"""Per-tenant KPI counters maintained alongside the writes that change them.
+
+Write handlers call `bump()` in the same transaction as their insert/update,
+so `GET /api/v1/kpis` reads a single `kpi_counters` row. `verify` and
+`rebuild` recompute the counters from the base tables. Cohort requests
+(`?support_category=housing&group_by=risk_level`) are answered by
+`cohort_counters`, three indexed aggregate queries over the referral cohort.
+`coordinator_kpis` computes every coordinator of a tenant in one grouped
+index pass per table:
+
+  python -m app.kpis verify [--db PATH] [--tenant TENANT_ID]
+  python -m app.kpis rebuild [--db PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+from app import archive
+
+OPEN_CASE_STATUSES = ("open", "active_support")
+
+RESPONSE_SLA_HOURS = float(os.environ.get("FAIR_CHANCE_RESPONSE_SLA_HOURS", "48"))
+NOTE_SLA_HOURS = float(os.environ.get("FAIR_CHANCE_NOTE_SLA_HOURS", "72"))
+
+COUNTER_COLUMNS = (
+    "intake_volume",
+    "referrals_assigned",
+    "referrals_responded",
+    "cases_open",
+    "notes_total",
+    "notes_final",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS kpi_counters (
+    tenant_id TEXT PRIMARY KEY,
+    {", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in COUNTER_COLUMNS)}
+);
+"""
+
+_BUMP_SQL = (
+    f"INSERT INTO kpi_counters(tenant_id,{','.join(COUNTER_COLUMNS)}) VALUES(?{',?' * len(COUNTER_COLUMNS)}) "
+    f"ON CONFLICT(tenant_id) DO UPDATE SET {', '.join(f'{c}={c}+excluded.{c}' for c in COUNTER_COLUMNS)}"
+)
+
+
+def bump(cur: sqlite3.Cursor, tenant_id: str, **deltas: int) -> None:
+    unknown = set(deltas) - set(COUNTER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown KPI counters: {sorted(unknown)}")
+    if not any(deltas.values()):
+        return
+    cur.execute(_BUMP_SQL, (tenant_id, *(int(deltas.get(c, 0)) for c in COUNTER_COLUMNS)))
+
+
+def read_counters(cur: sqlite3.Cursor, tenant_id: str) -> dict[str, int]:
+    cur.execute(f"SELECT {','.join(COUNTER_COLUMNS)} FROM kpi_counters WHERE tenant_id=?", (tenant_id,))
+    row = cur.fetchone()
+    return {c: (row[i] if row else 0) for i, c in enumerate(COUNTER_COLUMNS)}
+
+
+def kpi_payload(counters: dict[str, int]) -> dict[str, Any]:
+    assigned = counters["referrals_assigned"]
+    notes_total = counters["notes_total"]
+    return {
+        "intake_volume": counters["intake_volume"],
+        "case_open_count": counters["cases_open"],
+        "employee_engagement_count": notes_total,
+        "referral_response_rate": round(counters["referrals_responded"] / assigned, 4) if assigned else 0.0,
+        "progress_note_submission_rate": round(counters["notes_final"] / notes_total, 4) if notes_total else 0.0,
+    }
+
+
+def compute_counters(cur: sqlite3.Cursor, tenant_id: str | None = None) -> dict[str, dict[str, int]]:
+    """Recompute counters from the base tables, one grouped pass per table.
+
+    With `tenant_id` the passes are restricted to that tenant's index range.
+    Archived rows count too, so the totals match what `bump()` accumulated.
+    """
+    totals: dict[str, dict[str, int]] = {}
+    where, params = ("WHERE tenant_id=? ", (tenant_id,)) if tenant_id is not None else ("", ())
+
+    def row_for(tenant: str) -> dict[str, int]:
+        return totals.setdefault(tenant, dict.fromkeys(COUNTER_COLUMNS, 0))
+
+    referrals = archive.source(cur, "referrals", ("tenant_id", "assigned_coordinator_id", "first_response_at"))
+    cur.execute(
+        f"""
+        SELECT tenant_id, COUNT(*),
+               SUM(assigned_coordinator_id IS NOT NULL),
+               SUM(assigned_coordinator_id IS NOT NULL AND first_response_at IS NOT NULL)
+        FROM {referrals} {where}GROUP BY tenant_id
+        """,
+        params,
+    )
+    for tenant, intake, assigned, responded in cur.fetchall():
+        row_for(tenant).update(intake_volume=intake, referrals_assigned=assigned, referrals_responded=responded)
+    cases = archive.source(cur, "cases", ("tenant_id", "case_status"))
+    cur.execute(
+        f"SELECT tenant_id, SUM(case_status IN ({','.join('?' * len(OPEN_CASE_STATUSES))})) FROM {cases} {where}GROUP BY tenant_id",
+        (*OPEN_CASE_STATUSES, *params),
+    )
+    for tenant, open_count in cur.fetchall():
+        row_for(tenant)["cases_open"] = open_count
+    notes = archive.source(cur, "progress_notes", ("tenant_id", "status"))
+    cur.execute(f"SELECT tenant_id, COUNT(*), SUM(status='final') FROM {notes} {where}GROUP BY tenant_id", params)
+    for tenant, total, final in cur.fetchall():
+        row_for(tenant).update(notes_total=total, notes_final=final)
+    return totals
+
+
+# Maps a table and the columns a query reads to what goes in its FROM clause.
+Source = Callable[[str, Sequence[str]], str]
+
+
+def _hot(table: str, columns: Sequence[str]) -> str:
+    return table
+
+
+def _with_archive(cur: sqlite3.Cursor) -> Source:
+    return lambda table, columns: archive.source(cur, table, columns)
+
+
+# Cohort dimensions are referral attributes; cases and notes join to the
+# cohort through `cases.referral_id`, so direct-engagement cases without a
+# referral are not part of any cohort.
+MAX_CODE_LENGTH = 64
+COHORT_DIMENSIONS = {
+    "support_category": "s.code",
+    "intake_path": "r.intake_path",
+    "risk_level": "r.risk_level",
+}
+
+
+def parse_cohort(params: dict[str, str]) -> tuple[dict[str, str], str | None]:
+    """Split query parameters into cohort filters and an optional `group_by`; raises ValueError."""
+    from app.records import INTAKE_PATHS, RISK_LEVELS
+
+    allowed = {"intake_path": INTAKE_PATHS, "risk_level": RISK_LEVELS}
+    filters = {}
+    group_by = None
+    for name, value in params.items():
+        if name == "group_by":
+            if value not in COHORT_DIMENSIONS:
+                raise ValueError(f"group_by must be one of {sorted(COHORT_DIMENSIONS)}")
+            group_by = value
+        elif name in COHORT_DIMENSIONS and value:
+            if name in allowed and value not in allowed[name]:
+                raise ValueError(f"{name} must be one of {sorted(allowed[name])}")
+            if len(value) > MAX_CODE_LENGTH:
+                raise ValueError(f"{name} must be at most {MAX_CODE_LENGTH} characters")
+            filters[name] = value
+        else:
+            raise ValueError(f"Unsupported query parameter: {name}")
+    return filters, group_by
+
+
+def _cohort_sql(tenant_id: str, filters: dict[str, str], group_by: str | None, source: Source) -> tuple[str, list[Any]]:
+    join = ""
+    args: list[Any] = []
+    if "support_category" in filters or group_by == "support_category":
+        categories = source("referral_support_categories", ("tenant_id", "referral_id", "code"))
+        join = f"JOIN {categories} s ON s.tenant_id = r.tenant_id AND s.referral_id = r.id"
+    where = ["r.tenant_id = ?"]
+    args.append(tenant_id)
+    for name, value in filters.items():
+        where.append(f"{COHORT_DIMENSIONS[name]} = ?")
+        args.append(value)
+    key = COHORT_DIMENSIONS[group_by] if group_by else "NULL"
+    referrals = source(
+        "referrals", ("id", "tenant_id", "intake_path", "risk_level", "assigned_coordinator_id", "first_response_at")
+    )
+    sql = (
+        f"SELECT r.id AS id, {key} AS grp, r.assigned_coordinator_id AS coordinator, r.first_response_at AS responded "
+        f"FROM {referrals} r {join} WHERE {' AND '.join(where)}"
+    )
+    return sql, args
+
+
+def cohort_queries(
+    tenant_id: str, filters: dict[str, str], group_by: str | None = None, source: Source = _hot
+) -> dict[str, tuple[str, list[Any]]]:
+    cohort, args = _cohort_sql(tenant_id, filters, group_by, source)
+    cases = source("cases", ("id", "tenant_id", "referral_id", "case_status"))
+    notes = source("progress_notes", ("case_id", "tenant_id", "status"))
+    open_marks = ",".join("?" * len(OPEN_CASE_STATUSES))
+    return {
+        "referrals": (
+            f"WITH cohort AS ({cohort}) SELECT grp, COUNT(*), SUM(coordinator IS NOT NULL), "
+            "SUM(coordinator IS NOT NULL AND responded IS NOT NULL) FROM cohort GROUP BY grp",
+            args,
+        ),
+        "cases": (
+            f"WITH cohort AS ({cohort}) SELECT cohort.grp, COUNT(*) FROM cohort "
+            f"JOIN {cases} c ON c.referral_id = cohort.id WHERE c.tenant_id = ? AND c.case_status IN ({open_marks}) "
+            "GROUP BY cohort.grp",
+            [*args, tenant_id, *OPEN_CASE_STATUSES],
+        ),
+        "notes": (
+            f"WITH cohort AS ({cohort}) SELECT cohort.grp, COUNT(*), SUM(n.status = 'final') FROM cohort "
+            f"CROSS JOIN {cases} c ON c.referral_id = cohort.id CROSS JOIN {notes} n ON n.case_id = c.id "
+            "WHERE c.tenant_id = ? AND n.tenant_id = ? GROUP BY cohort.grp",
+            [*args, tenant_id, tenant_id],
+        ),
+    }
+
+
+def cohort_counters(
+    cur: sqlite3.Cursor, tenant_id: str, filters: dict[str, str], group_by: str | None = None
+) -> dict[str | None, dict[str, int]]:
+    """Counters for the referral cohort matching `filters`, keyed by `group_by` value (None when ungrouped).
+
+    Archived rows count too, so moving closed cases out does not change a cohort.
+    """
+    totals: dict[str | None, dict[str, int]] = {}
+
+    def row_for(key: str | None) -> dict[str, int]:
+        return totals.setdefault(key, dict.fromkeys(COUNTER_COLUMNS, 0))
+
+    queries = cohort_queries(tenant_id, filters, group_by, _with_archive(cur))
+    cur.execute(*queries["referrals"])
+    for key, intake, assigned, responded in cur.fetchall():
+        row_for(key).update(intake_volume=intake, referrals_assigned=assigned, referrals_responded=responded)
+    cur.execute(*queries["cases"])
+    for key, open_count in cur.fetchall():
+        row_for(key)["cases_open"] = open_count
+    cur.execute(*queries["notes"])
+    for key, total, final in cur.fetchall():
+        row_for(key).update(notes_total=total, notes_final=final)
+    if group_by is None:
+        row_for(None)
+    return totals
+
+
+def parse_sla(params: dict[str, str]) -> tuple[float, float]:
+    """Read `response_sla_hours` / `note_sla_hours` overrides; raises ValueError."""
+    slas = {"response_sla_hours": RESPONSE_SLA_HOURS, "note_sla_hours": NOTE_SLA_HOURS}
+    for name, value in params.items():
+        if name not in slas:
+            raise ValueError(f"Unsupported query parameter: {name}")
+        try:
+            slas[name] = float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+        if not 0 < slas[name] <= 24 * 365:
+            raise ValueError(f"{name} must be between 0 and 8760")
+    return slas["response_sla_hours"], slas["note_sla_hours"]
+
+
+def coordinator_queries(
+    tenant_id: str, response_sla_hours: float, note_sla_hours: float, source: Source = _hot
+) -> dict[str, tuple[str, list[Any]]]:
+    referrals = source("referrals", ("tenant_id", "assigned_coordinator_id", "submitted_at", "first_response_at"))
+    cases = source("cases", ("tenant_id", "assigned_coordinator_id", "case_status"))
+    notes = source("progress_notes", ("tenant_id", "coordinator_id", "status", "interaction_at", "created_at"))
+    open_marks = ",".join("?" * len(OPEN_CASE_STATUSES))
+    return {
+        "referrals": (
+            "SELECT assigned_coordinator_id, COUNT(*), COUNT(first_response_at), "
+            "SUM((julianday(first_response_at) - julianday(submitted_at)) * 24 <= ?) "
+            f"FROM {referrals} WHERE tenant_id = ? AND assigned_coordinator_id IS NOT NULL GROUP BY assigned_coordinator_id",
+            [response_sla_hours, tenant_id],
+        ),
+        "cases": (
+            f"SELECT assigned_coordinator_id, COUNT(*) FROM {cases} WHERE tenant_id = ? AND case_status IN ({open_marks}) "
+            "GROUP BY assigned_coordinator_id",
+            [tenant_id, *OPEN_CASE_STATUSES],
+        ),
+        "notes": (
+            "SELECT coordinator_id, COUNT(*), SUM(status = 'final'), "
+            "SUM(status = 'final' AND (julianday(created_at) - julianday(interaction_at)) * 24 <= ?) "
+            f"FROM {notes} WHERE tenant_id = ? GROUP BY coordinator_id",
+            [note_sla_hours, tenant_id],
+        ),
+    }
+
+
+def coordinator_kpis(
+    cur: sqlite3.Cursor, tenant_id: str, response_sla_hours: float = RESPONSE_SLA_HOURS, note_sla_hours: float = NOTE_SLA_HOURS
+) -> list[dict[str, Any]]:
+    """Per-coordinator response, engagement and documentation KPIs, sorted by coordinator id.
+
+    A note counts as finalized on time when it was saved as final within
+    `note_sla_hours` of the interaction it documents. Archived rows count too.
+    """
+    stats: dict[str, dict[str, int]] = {}
+    fields = (
+        "referrals_assigned", "referrals_responded", "responded_within_sla",
+        "open_cases", "engagements", "notes_final", "notes_final_on_time",
+    )
+
+    def row_for(coordinator: str) -> dict[str, int]:
+        return stats.setdefault(coordinator, dict.fromkeys(fields, 0))
+
+    queries = coordinator_queries(tenant_id, response_sla_hours, note_sla_hours, _with_archive(cur))
+    cur.execute(*queries["referrals"])
+    for coordinator, assigned, responded, within in cur.fetchall():
+        row_for(coordinator).update(
+            referrals_assigned=assigned, referrals_responded=responded, responded_within_sla=within or 0
+        )
+    cur.execute(*queries["cases"])
+    for coordinator, open_cases in cur.fetchall():
+        if coordinator is not None:
+            row_for(coordinator)["open_cases"] = open_cases
+    cur.execute(*queries["notes"])
+    for coordinator, total, final, on_time in cur.fetchall():
+        row_for(coordinator).update(engagements=total, notes_final=final, notes_final_on_time=on_time)
+
+    def rate(numerator: int, denominator: int) -> float:
+        return round(numerator / denominator, 4) if denominator else 0.0
+
+    return [
+        {
+            "coordinator_id": coordinator,
+            **row,
+            "referral_response_rate_within_sla": rate(row["responded_within_sla"], row["referrals_assigned"]),
+            "on_time_note_finalization_rate": rate(row["notes_final_on_time"], row["engagements"]),
+        }
+        for coordinator, row in sorted(stats.items())
+    ]
+
+
+def verify(conn: sqlite3.Connection, tenant_id: str | None = None) -> list[dict[str, Any]]:
+    """Return one entry per tenant/counter whose stored value differs from the base tables."""
+    cur = conn.cursor()
+    expected = compute_counters(cur, tenant_id)
+    if tenant_id is None:
+        cur.execute(f"SELECT tenant_id,{','.join(COUNTER_COLUMNS)} FROM kpi_counters")
+    else:
+        cur.execute(f"SELECT tenant_id,{','.join(COUNTER_COLUMNS)} FROM kpi_counters WHERE tenant_id=?", (tenant_id,))
+    stored = {row[0]: dict(zip(COUNTER_COLUMNS, row[1:])) for row in cur.fetchall()}
+    drift = []
+    for tenant in sorted(set(expected) | set(stored)):
+        want = expected.get(tenant, dict.fromkeys(COUNTER_COLUMNS, 0))
+        have = stored.get(tenant, dict.fromkeys(COUNTER_COLUMNS, 0))
+        for column in COUNTER_COLUMNS:
+            if want[column] != have[column]:
+                drift.append({"tenant_id": tenant, "counter": column, "stored": have[column], "expected": want[column]})
+    return drift
+
+
+def rebuild_rows(cur: sqlite3.Cursor) -> int:
+    """Replace all counters inside the caller's transaction; returns tenant count."""
+    totals = compute_counters(cur)
+    cur.execute("DELETE FROM kpi_counters")
+    cur.executemany(
+        f"INSERT INTO kpi_counters(tenant_id,{','.join(COUNTER_COLUMNS)}) VALUES(?{',?' * len(COUNTER_COLUMNS)})",
+        [(tenant, *(row[c] for c in COUNTER_COLUMNS)) for tenant, row in totals.items()],
+    )
+    return len(totals)
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Recompute every tenant's counters from the base tables in one write transaction."""
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        tenants = rebuild_rows(cur)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return tenants
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db import DB_PATH, get_db
+    from app.migrations import migrate
+
+    parser = argparse.ArgumentParser(prog="python -m app.kpis", description="Verify or rebuild KPI counters.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--tenant", help="verify a single tenant")
+    args = parser.parse_args(argv)
+
+    conn = get_db(args.db)
+    try:
+        migrate(conn)
+        if args.command == "rebuild":
+            tenants = rebuild(conn)
+            print(json.dumps({"rebuilt_tenants": tenants}))
+            return 0
+        drift = verify(conn, args.tenant)
+        print(json.dumps({"drift": drift}, indent=2))
+        return 1 if drift else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Keyset-paginated list queries for referrals, cases and progress notes.
+
+Pages are ordered newest first on `(<timestamp>, id)` and continue from an
+opaque cursor that encodes the last key seen, so every page is an index
+range seek of the same cost no matter how deep it is. Supported query
+parameters:
+
+  limit          page size (default 50, max 500)
+  cursor         `next_cursor` from the previous page
+  status, risk_level, coordinator_id, case_id, employee_id
+                 equality filters (where the resource has them)
+  from, to       ISO date/datetime bounds on the order key; `from` is
+                 inclusive, `to` exclusive
+  include        `archive` to page through archived history as well (see
+                 `app.archive`); each side is read with the same keyset
+                 seek and the two pages are merged
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+from app import archive
+from app.records import ApiError, _is_iso_date, _is_iso_datetime
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def _split_codes(row: dict[str, Any], column: str) -> dict[str, Any]:
+    row[column] = row[column].split(",") if row[column] else []
+    return row
+
+
+def _decode_json(row: dict[str, Any], column: str) -> dict[str, Any]:
+    row[column] = json.loads(row[column]) if row[column] else None
+    return row
+
+
+@dataclass(frozen=True)
+class ListSpec:
+    table: str
+    order_column: str
+    columns: tuple[str, ...]
+    filters: dict[str, str]
+    transform: Callable[[dict[str, Any]], dict[str, Any]] = field(default=lambda row: row)
+
+
+LISTS: dict[str, ListSpec] = {
+    "referrals": ListSpec(
+        table="referrals",
+        order_column="submitted_at",
+        columns=(
+            "id", "intake_path", "source_type", "employee_id", "referral_status", "risk_level", "support_category_codes",
+            "submitted_by_user_id", "assigned_coordinator_id", "submitted_at", "first_response_at",
+            "ai_summary", "ai_priority_score", "ai_triage",
+        ),
+        filters={
+            "status": "referral_status = ?",
+            "risk_level": "risk_level = ?",
+            "coordinator_id": "assigned_coordinator_id = ?",
+            "employee_id": "employee_id = ?",
+        },
+        transform=lambda row: _decode_json(_split_codes(row, "support_category_codes"), "ai_triage"),
+    ),
+    "cases": ListSpec(
+        table="cases",
+        order_column="opened_at",
+        columns=("id", "employee_id", "referral_id", "assigned_coordinator_id", "case_status", "opened_at"),
+        filters={
+            "status": "case_status = ?",
+            "coordinator_id": "assigned_coordinator_id = ?",
+            "employee_id": "employee_id = ?",
+            "risk_level": "referral_id IN (SELECT id FROM {referrals} WHERE tenant_id = cases.tenant_id AND risk_level = ?)",
+        },
+    ),
+    "progress-notes": ListSpec(
+        table="progress_notes",
+        order_column="interaction_at",
+        columns=(
+            "id", "employee_id", "case_id", "coordinator_id", "note_type", "note_start_date", "interaction_at",
+            "meeting_location", "areas_of_need_codes", "summary_of_meeting", "status", "created_at",
+            "ai_summary", "ai_action_items",
+        ),
+        filters={
+            "status": "status = ?",
+            "coordinator_id": "coordinator_id = ?",
+            "case_id": "case_id = ?",
+            "employee_id": "employee_id = ?",
+        },
+        transform=lambda row: _decode_json(_split_codes(row, "areas_of_need_codes"), "ai_action_items"),
+    ),
+}
+
+
+def encode_cursor(key: str, row_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key, row_id]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        key, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise ApiError(400, "Invalid cursor")
+    if not isinstance(key, str) or not isinstance(row_id, str):
+        raise ApiError(400, "Invalid cursor")
+    return key, row_id
+
+
+def build_query(spec: ListSpec, tenant_id: str, params: dict[str, str], descending: bool = True) -> tuple[str, list[Any], int]:
+    """Translate list query parameters into one tenant-scoped keyset SQL query."""
+    direction, after = ("DESC", "<") if descending else ("ASC", ">")
+    where = ["tenant_id = ?"]
+    args: list[Any] = [tenant_id]
+    limit = DEFAULT_LIMIT
+    history = False
+    for name, value in params.items():
+        if name in spec.filters:
+            where.append(spec.filters[name])
+            args.append(value)
+        elif name == "include":
+            if value != "archive":
+                raise ApiError(400, "include must be archive")
+            history = archive.ENABLED
+        elif name in ("from", "to"):
+            if not (_is_iso_date(value) or _is_iso_datetime(value)):
+                raise ApiError(400, f"{name} must be an ISO date or datetime")
+            where.append(f"{spec.order_column} {'>=' if name == 'from' else '<'} ?")
+            args.append(value)
+        elif name == "cursor":
+            key, row_id = decode_cursor(value)
+            where.append(f"({spec.order_column}, id) {after} (?, ?)")
+            args.extend((key, row_id))
+        elif name == "limit":
+            if not value.isdigit() or not 1 <= int(value) <= MAX_LIMIT:
+                raise ApiError(400, f"limit must be between 1 and {MAX_LIMIT}")
+            limit = int(value)
+        else:
+            raise ApiError(400, f"Unsupported query parameter: {name}")
+    columns = ",".join(spec.columns)
+    order = f"ORDER BY {spec.order_column} {direction}, id {direction} LIMIT ?"
+    # One extra row tells us whether another page exists.
+    if not history:
+        conditions = " AND ".join(where).format(referrals="referrals")
+        return f"SELECT {columns} FROM {spec.table} WHERE {conditions} {order}", [*args, limit + 1], limit
+    # Archived cases may point at hot referrals; rows caught mid-move read from the hot side.
+    referrals = (
+        "(SELECT id, tenant_id, risk_level FROM main.referrals "
+        "UNION ALL SELECT id, tenant_id, risk_level FROM archive.referrals)"
+    )
+    hot = f"SELECT {columns} FROM main.{spec.table} WHERE {' AND '.join(where).format(referrals='main.referrals')} {order}"
+    cold = (
+        f"SELECT {columns} FROM archive.{spec.table} WHERE {' AND '.join(where).format(referrals=referrals)} "
+        f"AND NOT EXISTS (SELECT 1 FROM main.{spec.table} h WHERE h.id = {spec.table}.id) {order}"
+    )
+    sql = f"SELECT * FROM ({hot}) UNION ALL SELECT * FROM ({cold}) {order}"
+    return sql, [*args, limit + 1, *args, limit + 1, limit + 1], limit
+
+
+def stream_page(spec: ListSpec, cur: sqlite3.Cursor, limit: int) -> Iterator[bytes]:
+    """Encode an already-executed page query row by row as `{"items": [...], "next_cursor": ...}`."""
+    yield b'{"items": ['
+    last = None
+    next_cursor = None
+    names = [d[0] for d in cur.description]
+    for count, row in enumerate(cur):
+        if count == limit:
+            next_cursor = encode_cursor(last[spec.order_column], last["id"])
+            break
+        last = dict(zip(names, row))
+        yield (b", " if count else b"") + json.dumps(spec.transform(dict(last))).encode("utf-8")
+    yield b'], "next_cursor": ' + json.dumps(next_cursor).encode("utf-8") + b"}"
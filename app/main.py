@@ -1,124 +1,71 @@
 from __future__ import annotations
 
+import argparse
 import json
+import os
+import socket
 import sqlite3
-from datetime import datetime, date
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any
-from urllib.parse import urlparse
-from uuid import uuid4
-
-DB_PATH = Path(__file__).resolve().parent.parent / "fair_chance.db"
-
-TOKENS = {
-    "founder-admin-token": {"user_id": "u-admin", "tenant_id": "tenant-acme", "role": "company_admin"},
-    "coordinator-token": {"user_id": "u-coord", "tenant_id": "tenant-acme", "role": "coordinator"},
-    "manager-token": {"user_id": "u-manager", "tenant_id": "tenant-acme", "role": "manager"},
+from typing import Any, Iterable, Iterator
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from app import (
+    alerts, archive, audit, db, dedupe, exports, jobs, kpis, listing, metrics, migrations, prefork, records, rollups, search, shards,
+)
+from app.aio import KEEPALIVE_TIMEOUT, MAX_BODY_BYTES, AsyncHTTPServer
+from app.auth import RevocationsFull, bearer_claims, cache_stats, parse_auth, revoke, verify_token
+from app.cache import CachedResponse, etag_matches, response_cache
+from app.db import DB_PATH, get_db, pool_stats
+from app.writer import close_writers, run_write, writer_stats
+
+SERVE_MODES = ("threaded", "asyncio")
+
+BULK_CHUNK_SIZE = 500
+MAX_NDJSON_LINE = 1 << 20
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+STREAM_CHUNK_BYTES = 16 * 1024
+FIXED_ROUTES = {
+    "/health",
+    "/metrics",
+    "/api/v1/me",
+    "/api/v1/dev/seed",
+    "/api/v1/dev/stats",
+    "/api/v1/kpis",
+    "/api/v1/kpis/coordinators",
+    "/api/v1/kpis/rollups",
+    "/api/v1/exports",
+    "/api/v1/alerts",
+    "/api/v1/alerts/rules",
+    "/api/v1/progress-notes/search",
+    "/api/v1/employees/search",
+    "/api/v1/auth/revoke",
+    "/api/v1/audit-events",
 }
 
-MEETING_LOCATIONS = {"office", "garage", "newberry", "community", "phone", "video", "text", "email"}
-NOTE_TYPES = {"intake", "coaching_session", "resource_referral", "crisis", "follow_up"}
-RISK_LEVELS = {"low", "medium", "high", "critical"}
-SOURCE_TYPES = {"employee_self", "manager", "coordinator", "hr", "anonymous_other"}
-INTAKE_PATHS = {"referral", "direct_engagement"}
-
-
-def utcnow() -> str:
-    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
-
-
-def get_db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-def init_db() -> None:
-    conn = get_db()
-    cur = conn.cursor()
-    cur.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            tenant_id TEXT NOT NULL,
-            email TEXT NOT NULL,
-            role TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS employees (
-            id TEXT PRIMARY KEY,
-            tenant_id TEXT NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            email TEXT
-        );
-        CREATE TABLE IF NOT EXISTS referrals (
-            id TEXT PRIMARY KEY,
-            tenant_id TEXT NOT NULL,
-            intake_path TEXT NOT NULL,
-            source_type TEXT NOT NULL,
-            employee_id TEXT NOT NULL,
-            referral_status TEXT NOT NULL,
-            risk_level TEXT NOT NULL,
-            support_category_codes TEXT NOT NULL,
-            submitted_by_user_id TEXT NOT NULL,
-            assigned_coordinator_id TEXT,
-            submitted_at TEXT NOT NULL,
-            first_response_at TEXT
-        );
-        CREATE TABLE IF NOT EXISTS cases (
-            id TEXT PRIMARY KEY,
-            tenant_id TEXT NOT NULL,
-            employee_id TEXT NOT NULL,
-            referral_id TEXT,
-            assigned_coordinator_id TEXT NOT NULL,
-            case_status TEXT NOT NULL,
-            opened_at TEXT NOT NULL
-        );
-        CREATE TABLE IF NOT EXISTS progress_notes (
-            id TEXT PRIMARY KEY,
-            tenant_id TEXT NOT NULL,
-            employee_id TEXT NOT NULL,
-            case_id TEXT NOT NULL,
-            coordinator_id TEXT NOT NULL,
-            note_type TEXT NOT NULL,
-            note_start_date TEXT NOT NULL,
-            interaction_at TEXT NOT NULL,
-            meeting_location TEXT NOT NULL,
-            areas_of_need_codes TEXT NOT NULL,
-            summary_of_meeting TEXT,
-            status TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        );
-        """
-    )
-    conn.commit()
-    conn.close()
-
-
-
-
-def _is_iso_date(value: str) -> bool:
-    try:
-        date.fromisoformat(value)
-        return True
-    except ValueError:
-        return False
-
 
-def _is_iso_datetime(value: str) -> bool:
-    normalized = value.replace("Z", "+00:00")
+def init_db(path: Path | None = None) -> None:
+    conn = get_db(path)
     try:
-        datetime.fromisoformat(normalized)
-        return True
-    except ValueError:
-        return False
-
-def parse_auth(header: str | None) -> dict[str, str] | None:
-    if not header or not header.startswith("Bearer "):
-        return None
-    token = header.replace("Bearer ", "", 1).strip()
-    return TOKENS.get(token)
+        migrations.migrate(conn)
+    finally:
+        conn.close()
+
+
+def _seed(cur: sqlite3.Cursor, tenant_id: str) -> None:
+    for u in [
+        ("u-admin", tenant_id, "admin@example.com", "company_admin"),
+        ("u-coord", tenant_id, "coord@example.com", "coordinator"),
+        ("u-manager", tenant_id, "manager@example.com", "manager"),
+    ]:
+        cur.execute("INSERT OR IGNORE INTO users(id,tenant_id,email,role) VALUES(?,?,?,?)", u)
+    employees = [
+        ("e-1", tenant_id, "Ava", "Reed", "ava@example.com"),
+        ("e-2", tenant_id, "Noah", "Cole", "noah@example.com"),
+    ]
+    for e in employees:
+        cur.execute("INSERT OR IGNORE INTO employees(id,tenant_id,first_name,last_name,email) VALUES(?,?,?,?,?)", e)
+    dedupe.index_employees(cur, tenant_id, [(e[0], dedupe.Person(*e[2:])) for e in employees])
 
 
 def normalize_path(raw_path: str) -> str:
@@ -129,35 +76,199 @@ def normalize_path(raw_path: str) -> str:
     return path
 
 
+def route_label(handler: BaseHTTPRequestHandler) -> str:
+    """Map a request to its route template so metrics have one series per route, not per URL."""
+    path = normalize_path(handler.path)
+    if path in FIXED_ROUTES:
+        return path
+    kind = path.removeprefix("/api/v1/")
+    if kind in listing.LISTS or kind.removesuffix("/bulk") in records.INGESTERS:
+        return path
+    if path.startswith("/api/v1/exports/"):
+        return "/api/v1/exports/{id}/download" if path.endswith("/download") else "/api/v1/exports/{id}"
+    return "unmatched"
+
+
 class AppHandler(BaseHTTPRequestHandler):
     server_version = "FairChanceHTTP/0.1"
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers and body go out in separate writes; without TCP_NODELAY the body waits on the client's delayed ACK.
+    disable_nagle_algorithm = True
+    status_code = 0
+
+    def send_response(self, code: int, message: str | None = None) -> None:
+        self.status_code = code
+        super().send_response(code, message)
 
     def _send(self, status: int, body: dict[str, Any]) -> None:
-        payload = json.dumps(body).encode("utf-8")
+        self._send_bytes(status, json.dumps(body).encode("utf-8"))
+
+    def _send_bytes(
+        self, status: int, payload: bytes, headers: dict[str, str] | None = None, content_type: str = "application/json"
+    ) -> None:
         self.send_response(status)
-        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Type", content_type)
         self.send_header("Content-Length", str(len(payload)))
-        self.end_headers()
-        self.wfile.write(payload)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        with metrics.phase("send"):
+            self.end_headers()
+            self.wfile.write(payload)
+
+    def _send_stream(
+        self, status: int, chunks: Iterable[bytes], content_type: str = "application/json", headers: dict[str, str] | None = None
+    ) -> None:
+        """Send a body of unknown length with chunked transfer encoding, coalescing small pieces."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        chunked = self.request_version != "HTTP/1.0"
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.close_connection = True
+        with metrics.phase("send"):
+            self.end_headers()
+            self._write_chunks(chunks, chunked)
+
+    def _write_chunks(self, chunks: Iterable[bytes], chunked: bool) -> None:
+        buffer = bytearray()
+        for piece in chunks:
+            buffer += piece
+            if len(buffer) >= STREAM_CHUNK_BYTES:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(buffer), buffer) if chunked else buffer)
+                buffer.clear()
+        if buffer:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(buffer), buffer) if chunked else buffer)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _send_list(self, kind: str, auth: dict[str, str]) -> None:
+        spec = listing.LISTS[kind]
+        params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+        try:
+            sql, args, limit = listing.build_query(spec, auth["tenant_id"], params)
+        except records.ApiError as exc:
+            self._send(exc.status, {"detail": exc.detail})
+            return
+        conn = get_db(shards.path_for(auth["tenant_id"]))
+        try:
+            cur = conn.execute(sql, args)
+            self._send_stream(200, listing.stream_page(spec, cur, limit))
+        finally:
+            conn.close()
+
+    def _send_cached(self, cached: CachedResponse) -> None:
+        headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(self.headers.get("If-None-Match"), cached.etag):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        self._send_bytes(200, cached.body, headers)
+
+    @staticmethod
+    def _kpi_payload(
+        cur: sqlite3.Cursor, tenant: str, filters: dict[str, str], group_by: str | None, cohort: bool
+    ) -> dict[str, Any]:
+        if not cohort:
+            return kpis.kpi_payload(kpis.read_counters(cur, tenant))
+        totals = kpis.cohort_counters(cur, tenant, filters, group_by)
+        if group_by is None:
+            return {"cohort": filters, **kpis.kpi_payload(totals[None])}
+        groups = [{group_by: k, **kpis.kpi_payload(v)} for k, v in sorted(totals.items(), key=lambda kv: str(kv[0]))]
+        return {"cohort": filters, "group_by": group_by, "groups": groups}
 
     def _read_json(self) -> dict[str, Any] | None:
         length = int(self.headers.get("Content-Length", "0"))
-        raw = self.rfile.read(length) if length else b"{}"
+        if length > MAX_BODY_BYTES:
+            # The body is left unread, so the connection cannot be reused.
+            self.close_connection = True
+            self._send(413, {"detail": f"Request body is larger than {MAX_BODY_BYTES} bytes"})
+            return None
         try:
-            return json.loads(raw.decode("utf-8")) if raw else {}
+            with metrics.phase("parse"):
+                raw = self.rfile.read(length) if length else b"{}"
+                return json.loads(raw.decode("utf-8")) if raw else {}
         except json.JSONDecodeError:
             self._send(400, {"detail": "Invalid JSON body"})
             return None
 
+    @staticmethod
+    def streams_body(command: str, target: str) -> bool:
+        """Bulk imports read their body incrementally (`_bulk_items`), so the asyncio server streams it."""
+        kind = normalize_path(target).removeprefix("/api/v1/")
+        return command == "POST" and kind.endswith("/bulk") and kind.removesuffix("/bulk") in records.INGESTERS
+
+    def _bulk_items(self) -> Iterator[Any]:
+        """Yield bulk items from a JSON array (or `{"items": [...]}`) or an NDJSON stream."""
+        remaining = int(self.headers.get("Content-Length", "0"))
+        if self.headers.get("Content-Type", "").split(";")[0].strip() in NDJSON_TYPES:
+            line_no = 0
+            while remaining > 0:
+                line = self.rfile.readline(min(remaining, MAX_NDJSON_LINE))
+                if not line:
+                    break
+                remaining -= len(line)
+                line_no += 1
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    yield records.ApiError(400, f"Invalid JSON on line {line_no}")
+            return
+        try:
+            payload = json.loads(self.rfile.read(remaining)) if remaining else []
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise records.ApiError(400, "Invalid JSON body")
+        if isinstance(payload, dict):
+            payload = payload.get("items")
+        if not isinstance(payload, list):
+            raise records.ApiError(400, "Bulk body must be a JSON array, an items object or NDJSON")
+        yield from payload
+
+    def _bulk_ingest(self, kind: str, auth: dict[str, str]) -> None:
+        ingest = records.INGESTERS[kind]
+        path = shards.path_for(auth["tenant_id"])
+        results: list[dict[str, Any]] = []
+        inserted = 0
+        try:
+            for chunk in records.chunked(self._bulk_items(), BULK_CHUNK_SIZE):
+                try:
+                    chunk_results = run_write(lambda cur, chunk=chunk: ingest(cur, auth, chunk), path)
+                except sqlite3.Error as exc:
+                    chunk_results = [(500, {"detail": f"Batch write failed: {exc}"})] * len(chunk)
+                for status, body in chunk_results:
+                    inserted += status == 200
+                    results.append({"index": len(results), "status_code": status, **body})
+        except records.ApiError as exc:
+            self._send(exc.status, {"detail": exc.detail})
+            return
+        if inserted:
+            response_cache.invalidate(auth["tenant_id"])
+        self._send(200, {"inserted": inserted, "failed": len(results) - inserted, "results": results})
+
     def _auth(self) -> dict[str, str] | None:
         return parse_auth(self.headers.get("Authorization"))
 
+    @metrics.instrument(route_label)
+    @shards.pinning
     def do_GET(self) -> None:  # noqa: N802
         path = normalize_path(self.path)
         if path == "/health":
             self._send(200, {"status": "ok"})
             return
 
+        if path == "/metrics":
+            # Unauthenticated like /health for scrapers: route templates and statement shapes only, no tenant data.
+            payload = metrics.registry.render().encode("utf-8")
+            self._send_bytes(200, payload, content_type="text/plain; version=0.0.4; charset=utf-8")
+            return
+
         auth = self._auth()
         if auth is None:
             self._send(401, {"detail": "Missing or invalid bearer token"})
@@ -167,253 +278,322 @@ class AppHandler(BaseHTTPRequestHandler):
             self._send(200, auth)
             return
 
-        if path == "/api/v1/kpis":
-            conn = get_db()
-            cur = conn.cursor()
-            tenant = auth["tenant_id"]
-            cur.execute("SELECT COUNT(*) c FROM referrals WHERE tenant_id=?", (tenant,))
-            intake_volume = cur.fetchone()["c"]
-            cur.execute("SELECT COUNT(*) c FROM cases WHERE tenant_id=? AND case_status IN ('open','active_support')", (tenant,))
-            case_open_count = cur.fetchone()["c"]
-            cur.execute("SELECT COUNT(*) c FROM progress_notes WHERE tenant_id=?", (tenant,))
-            engagement = cur.fetchone()["c"]
-            cur.execute("SELECT COUNT(*) c FROM referrals WHERE tenant_id=? AND assigned_coordinator_id IS NOT NULL", (tenant,))
-            assigned = cur.fetchone()["c"]
-            cur.execute("SELECT COUNT(*) c FROM referrals WHERE tenant_id=? AND assigned_coordinator_id IS NOT NULL AND first_response_at IS NOT NULL", (tenant,))
-            responded = cur.fetchone()["c"]
-            cur.execute("SELECT COUNT(*) c FROM progress_notes WHERE tenant_id=?", (tenant,))
-            notes_total = cur.fetchone()["c"]
-            cur.execute("SELECT COUNT(*) c FROM progress_notes WHERE tenant_id=? AND status='final'", (tenant,))
-            notes_final = cur.fetchone()["c"]
-            conn.close()
+        if path == "/api/v1/dev/stats":
             self._send(
                 200,
                 {
-                    "intake_volume": intake_volume,
-                    "case_open_count": case_open_count,
-                    "employee_engagement_count": engagement,
-                    "referral_response_rate": round((responded / assigned), 4) if assigned else 0.0,
-                    "progress_note_submission_rate": round((notes_final / notes_total), 4) if notes_total else 0.0,
+                    "pid": os.getpid(),
+                    "db_pool": pool_stats(),
+                    "response_cache": response_cache.stats(),
+                    "write_queue": writer_stats(),
+                    "auth_cache": cache_stats(),
+                    "audit": audit.stats(),
+                    "shards": shards.stats(),
+                    "jobs": jobs.stats(),
+                    "archive": archive.stats(),
                 },
             )
             return
 
+        if path == "/api/v1/kpis":
+            params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+            try:
+                filters, group_by = kpis.parse_cohort(params)
+            except ValueError as exc:
+                self._send(400, {"detail": str(exc)})
+                return
+            tenant = auth["tenant_id"]
+            # Keys come from the parsed values, so `?a=1&b=2`, `?b=2&a=1` and `?a=1&a=1&b=2` share one entry.
+            canonical = {**filters, "group_by": group_by} if group_by else filters
+            key = "kpis?" + urlencode(sorted(canonical.items())) if params else "kpis"
+            cached = response_cache.get(tenant, key)
+            if cached is None:
+                generation = response_cache.generation(tenant)
+                conn = get_db(shards.path_for(auth["tenant_id"]))
+                try:
+                    payload = self._kpi_payload(conn.cursor(), tenant, filters, group_by, bool(params))
+                finally:
+                    conn.close()
+                cached = response_cache.put(tenant, key, json.dumps(payload).encode("utf-8"), generation)
+            self._send_cached(cached)
+            return
+
+        if path in ("/api/v1/alerts", "/api/v1/alerts/rules"):
+            status = parse_qs(urlparse(self.path).query).get("status", ["firing"])[-1]
+            if status not in ("firing", "resolved"):
+                self._send(400, {"detail": "status must be firing or resolved"})
+                return
+            conn = get_db(shards.path_for(auth["tenant_id"]))
+            try:
+                if path == "/api/v1/alerts":
+                    body = {"status": status, "items": alerts.list_alerts(conn.cursor(), auth["tenant_id"], status)}
+                else:
+                    body = {"items": alerts.list_rules(conn.cursor(), auth["tenant_id"])}
+            finally:
+                conn.close()
+            self._send(200, body)
+            return
+
+        if path == "/api/v1/kpis/coordinators":
+            params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+            try:
+                response_sla, note_sla = kpis.parse_sla(params)
+            except ValueError as exc:
+                self._send(400, {"detail": str(exc)})
+                return
+            tenant = auth["tenant_id"]
+            key = "coordinators?" + urlencode({"response_sla_hours": response_sla, "note_sla_hours": note_sla})
+            cached = response_cache.get(tenant, key)
+            if cached is None:
+                generation = response_cache.generation(tenant)
+                conn = get_db(shards.path_for(auth["tenant_id"]))
+                try:
+                    rows = kpis.coordinator_kpis(conn.cursor(), tenant, response_sla, note_sla)
+                finally:
+                    conn.close()
+                payload = {"response_sla_hours": response_sla, "note_sla_hours": note_sla, "coordinators": rows}
+                cached = response_cache.put(tenant, key, json.dumps(payload).encode("utf-8"), generation)
+            self._send_cached(cached)
+            return
+
+        if path == "/api/v1/kpis/rollups":
+            params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+            try:
+                start, end, granularity = rollups.parse_range(params)
+            except ValueError as exc:
+                self._send(400, {"detail": str(exc)})
+                return
+            tenant = auth["tenant_id"]
+            key = "rollups?" + urlencode({"from": start.isoformat(), "to": end.isoformat(), "granularity": granularity})
+            cached = response_cache.get(tenant, key)
+            if cached is None:
+                generation = response_cache.generation(tenant)
+                conn = get_db(shards.path_for(auth["tenant_id"]))
+                try:
+                    payload = rollups.query(conn.cursor(), tenant, start, end, granularity)
+                finally:
+                    conn.close()
+                cached = response_cache.put(tenant, key, json.dumps(payload).encode("utf-8"), generation)
+            self._send_cached(cached)
+            return
+
+        if path == "/api/v1/progress-notes/search":
+            params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+            conn = get_db(shards.path_for(auth["tenant_id"]))
+            try:
+                body = search.search(conn.cursor(), auth["tenant_id"], params)
+            except records.ApiError as exc:
+                self._send(exc.status, {"detail": exc.detail})
+                return
+            finally:
+                conn.close()
+            self._send(200, body)
+            return
+
+        if path == "/api/v1/audit-events":
+            if auth["role"] != "company_admin":
+                self._send(403, {"detail": "Only company admins can read the audit log"})
+                return
+            params = {k: v[-1] for k, v in parse_qs(urlparse(self.path).query, keep_blank_values=True).items()}
+            conn = get_db(shards.path_for(auth["tenant_id"]))
+            try:
+                body = audit.query(conn.cursor(), auth["tenant_id"], params)
+            except records.ApiError as exc:
+                self._send(exc.status, {"detail": exc.detail})
+                return
+            finally:
+                conn.close()
+            self._send(200, body)
+            return
+
+        kind = path.removeprefix("/api/v1/")
+        if kind in listing.LISTS:
+            self._send_list(kind, auth)
+            return
+
+        if path.startswith("/api/v1/exports/"):
+            export_id, _, action = path.removeprefix("/api/v1/exports/").partition("/")
+            job = exports.get_job(auth["tenant_id"], export_id)
+            if job is None or action not in ("", "download"):
+                self._send(404, {"detail": "Export not found"})
+                return
+            if action == "":
+                self._send(200, exports.job_payload(job))
+                return
+            try:
+                content_type, filename, blocks = exports.download(job)
+            except records.ApiError as exc:
+                self._send(exc.status, {"detail": exc.detail})
+                return
+            self._send_stream(200, blocks, content_type, {"Content-Disposition": f'attachment; filename="{filename}"'})
+            return
+
         self._send(404, {"detail": "Not found"})
 
+    @metrics.instrument(route_label)
+    @shards.pinning
     def do_POST(self) -> None:  # noqa: N802
         path = normalize_path(self.path)
         auth = self._auth()
         if auth is None:
+            # The request body is left unread, so the connection cannot be reused.
+            self.close_connection = True
             self._send(401, {"detail": "Missing or invalid bearer token"})
             return
+
+        kind = path.removeprefix("/api/v1/").removesuffix("/bulk")
+        if path.endswith("/bulk") and kind in records.INGESTERS:
+            self._bulk_ingest(kind, auth)
+            return
+
         body = self._read_json()
         if body is None:
             return
 
         if path == "/api/v1/dev/seed":
-            conn = get_db()
-            cur = conn.cursor()
-            for u in [
-                ("u-admin", auth["tenant_id"], "admin@example.com", "company_admin"),
-                ("u-coord", auth["tenant_id"], "coord@example.com", "coordinator"),
-                ("u-manager", auth["tenant_id"], "manager@example.com", "manager"),
-            ]:
-                cur.execute("INSERT OR IGNORE INTO users(id,tenant_id,email,role) VALUES(?,?,?,?)", u)
-            for e in [
-                ("e-1", auth["tenant_id"], "Ava", "Reed", "ava@example.com"),
-                ("e-2", auth["tenant_id"], "Noah", "Cole", "noah@example.com"),
-            ]:
-                cur.execute("INSERT OR IGNORE INTO employees(id,tenant_id,first_name,last_name,email) VALUES(?,?,?,?,?)", e)
-            conn.commit()
-            conn.close()
+            run_write(lambda cur: _seed(cur, auth["tenant_id"]), shards.path_for(auth["tenant_id"]))
             self._send(200, {"users": 3, "employees": 2})
             return
 
-        if path == "/api/v1/referrals":
-            required = {"intake_path", "source_type", "employee_id", "risk_level", "support_category_codes"}
-            if not required.issubset(body.keys()):
-                self._send(400, {"detail": "Missing required fields"})
-                return
-            if body["intake_path"] not in INTAKE_PATHS or body["source_type"] not in SOURCE_TYPES or body["risk_level"] not in RISK_LEVELS:
-                self._send(400, {"detail": "Invalid intake/source/risk enum"})
-                return
-            if not isinstance(body.get("support_category_codes"), list) or len(body.get("support_category_codes", [])) == 0:
-                self._send(400, {"detail": "support_category_codes must be a non-empty array"})
-                return
-
-            conn = get_db()
-            cur = conn.cursor()
-            cur.execute("SELECT tenant_id FROM employees WHERE id=?", (body["employee_id"],))
-            emp = cur.fetchone()
-            if not emp:
-                conn.close()
-                self._send(404, {"detail": "Employee not found"})
+        if path == "/api/v1/auth/revoke":
+            # Without a token this is a logout: the caller's own signed token stops working.
+            # Admins pass the token itself (not just its id) so its tenant and expiry can be checked.
+            token = body.get("token")
+            if token is not None:
+                if auth["role"] != "company_admin":
+                    self._send(403, {"detail": "Only company admins can revoke other tokens"})
+                    return
+                if not isinstance(token, str) or not token:
+                    self._send(400, {"detail": "token must be a non-empty string"})
+                    return
+                claims = verify_token(token)
+                if claims is None or claims.tenant_id != auth["tenant_id"]:
+                    self._send(404, {"detail": "Token not found"})
+                    return
+            else:
+                claims = bearer_claims(self.headers.get("Authorization"))
+            if claims is None or claims.token_id is None:
+                self._send(400, {"detail": "This token cannot be revoked"})
                 return
-            if emp["tenant_id"] != auth["tenant_id"]:
-                conn.close()
-                self._send(403, {"detail": "Cross-tenant access denied"})
+            token_id = claims.token_id
+            try:
+                revoke(token_id, claims.expires_at)
+            except RevocationsFull:
+                self._send(503, {"detail": "Too many revoked tokens; try again later"})
                 return
-
-            referral_id = str(uuid4())
-            cur.execute(
-                """
-                INSERT INTO referrals(id,tenant_id,intake_path,source_type,employee_id,referral_status,risk_level,
-                                      support_category_codes,submitted_by_user_id,assigned_coordinator_id,submitted_at)
-                VALUES(?,?,?,?,?,?,?,?,?,?,?)
-                """,
-                (
-                    referral_id,
-                    auth["tenant_id"],
-                    body["intake_path"],
-                    body["source_type"],
-                    body["employee_id"],
-                    "submitted",
-                    body["risk_level"],
-                    ",".join(body.get("support_category_codes", [])),
-                    auth["user_id"],
-                    body.get("assigned_coordinator_id"),
-                    utcnow(),
-                ),
-            )
-            conn.commit()
-            conn.close()
-            self._send(200, {"id": referral_id, "referral_status": "submitted"})
+            self._send(200, {"revoked": token_id})
             return
 
-        if path == "/api/v1/cases":
-            required = {"employee_id", "assigned_coordinator_id"}
-            if not required.issubset(body.keys()):
-                self._send(400, {"detail": "Missing required fields"})
+        if path == "/api/v1/employees/search":
+            try:
+                person, threshold, limit = dedupe.parse_search(body)
+            except ValueError as exc:
+                self._send(400, {"detail": str(exc)})
                 return
-            conn = get_db()
-            cur = conn.cursor()
-            cur.execute("SELECT tenant_id FROM employees WHERE id=?", (body["employee_id"],))
-            emp = cur.fetchone()
-            if not emp:
+            conn = get_db(shards.path_for(auth["tenant_id"]))
+            try:
+                matches = dedupe.find_matches(conn.cursor(), auth["tenant_id"], person, threshold, limit)
+            finally:
                 conn.close()
-                self._send(404, {"detail": "Employee not found"})
-                return
-            if emp["tenant_id"] != auth["tenant_id"]:
-                conn.close()
-                self._send(403, {"detail": "Cross-tenant access denied"})
-                return
-
-            referral_id = body.get("referral_id")
-            if referral_id:
-                cur.execute("SELECT tenant_id, first_response_at FROM referrals WHERE id=?", (referral_id,))
-                ref = cur.fetchone()
-                if not ref:
-                    conn.close()
-                    self._send(404, {"detail": "Referral not found"})
-                    return
-                if ref["tenant_id"] != auth["tenant_id"]:
-                    conn.close()
-                    self._send(403, {"detail": "Cross-tenant access denied"})
-                    return
-                cur.execute("SELECT employee_id FROM referrals WHERE id=?", (referral_id,))
-                ref_employee = cur.fetchone()
-                if ref_employee and ref_employee["employee_id"] != body["employee_id"]:
-                    conn.close()
-                    self._send(400, {"detail": "Referral/employee mismatch"})
-                    return
-                cur.execute(
-                    "UPDATE referrals SET referral_status='converted_to_case', first_response_at=COALESCE(first_response_at, ?) WHERE id=?",
-                    (utcnow(), referral_id),
-                )
-
-            case_id = str(uuid4())
-            cur.execute(
-                "INSERT INTO cases(id,tenant_id,employee_id,referral_id,assigned_coordinator_id,case_status,opened_at) VALUES(?,?,?,?,?,?,?)",
-                (case_id, auth["tenant_id"], body["employee_id"], referral_id, body["assigned_coordinator_id"], "open", utcnow()),
-            )
-            conn.commit()
-            conn.close()
-            self._send(200, {"id": case_id, "case_status": "open"})
+            self._send(200, {"candidates": matches})
             return
 
-        if path == "/api/v1/progress-notes":
-            required = {
-                "employee_id",
-                "case_id",
-                "note_type",
-                "note_start_date",
-                "interaction_at",
-                "meeting_location",
-                "areas_of_need_codes",
-            }
-            if not required.issubset(body.keys()):
-                self._send(400, {"detail": "Missing required fields"})
-                return
-            if body["note_type"] not in NOTE_TYPES:
-                self._send(400, {"detail": "Invalid note_type"})
+        if path == "/api/v1/alerts/rules":
+            if auth["role"] != "company_admin":
+                self._send(403, {"detail": "Only company admins can create alert rules"})
                 return
-            if not _is_iso_date(body["note_start_date"]):
-                self._send(400, {"detail": "note_start_date must be ISO date (YYYY-MM-DD)"})
-                return
-            if not _is_iso_datetime(body["interaction_at"]):
-                self._send(400, {"detail": "interaction_at must be ISO datetime"})
-                return
-            if body["meeting_location"] not in MEETING_LOCATIONS:
-                self._send(400, {"detail": "Invalid meeting_location"})
-                return
-            if body.get("status", "draft") not in {"draft", "final"}:
-                self._send(400, {"detail": "Invalid status"})
+            try:
+                rule = run_write(lambda cur: alerts.create_rule(cur, auth["tenant_id"], body), shards.path_for(auth["tenant_id"]))
+            except ValueError as exc:
+                self._send(400, {"detail": str(exc)})
                 return
+            self._send(200, rule)
+            return
 
-            conn = get_db()
-            cur = conn.cursor()
-            cur.execute("SELECT tenant_id, employee_id FROM cases WHERE id=?", (body["case_id"],))
-            case_row = cur.fetchone()
-            if not case_row:
-                conn.close()
-                self._send(404, {"detail": "Case not found"})
-                return
-            if case_row["tenant_id"] != auth["tenant_id"]:
-                conn.close()
-                self._send(403, {"detail": "Cross-tenant access denied"})
-                return
-            if case_row["employee_id"] != body["employee_id"]:
-                conn.close()
-                self._send(400, {"detail": "Employee/case mismatch"})
+        if path == "/api/v1/exports":
+            try:
+                job = exports.create_job(auth, body)
+            except records.ApiError as exc:
+                self._send(exc.status, {"detail": exc.detail})
                 return
+            self._send(202, exports.job_payload(job))
+            return
 
-            note_id = str(uuid4())
-            cur.execute(
-                """
-                INSERT INTO progress_notes(id,tenant_id,employee_id,case_id,coordinator_id,note_type,note_start_date,
-                                           interaction_at,meeting_location,areas_of_need_codes,summary_of_meeting,status,created_at)
-                VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
-                """,
-                (
-                    note_id,
-                    auth["tenant_id"],
-                    body["employee_id"],
-                    body["case_id"],
-                    auth["user_id"],
-                    body["note_type"],
-                    body["note_start_date"],
-                    body["interaction_at"],
-                    body["meeting_location"],
-                    ",".join(body.get("areas_of_need_codes", [])),
-                    body.get("summary_of_meeting"),
-                    body.get("status", "draft"),
-                    utcnow(),
-                ),
-            )
-            conn.commit()
-            conn.close()
-            self._send(200, {"id": note_id, "status": body.get("status", "draft")})
+        kind = path.removeprefix("/api/v1/")
+        if kind in records.INGESTERS:
+            ingest = records.INGESTERS[kind]
+            [(status, result)] = run_write(lambda cur: ingest(cur, auth, [body]), shards.path_for(auth["tenant_id"]))
+            if status == 200:
+                response_cache.invalidate(auth["tenant_id"])
+            self._send(status, result)
             return
 
         self._send(404, {"detail": "Not found"})
 
 
-def run(host: str = "127.0.0.1", port: int = 8000) -> None:
+def make_server(
+    host: str, port: int, mode: str = "threaded", sock: socket.socket | None = None
+) -> ThreadingHTTPServer | AsyncHTTPServer:
+    """Build the server; with `sock` it serves on that already-listening socket (pre-fork workers)."""
+    if mode == "threaded":
+        server = ThreadingHTTPServer((host, port), AppHandler, bind_and_activate=sock is None)
+        if sock is not None:
+            server.socket.close()
+            server.socket = sock
+            server.server_address = sock.getsockname()[:2]
+            server.server_name, server.server_port = host, server.server_address[1]
+            # Joined by server_close(), so a stopping worker drains its in-flight requests.
+            server.daemon_threads = False
+        return server
+    if mode == "asyncio":
+        return AsyncHTTPServer((host, port), AppHandler, sock=sock)
+    raise ValueError(f"Unknown serving mode: {mode}")
+
+
+def serve(server: ThreadingHTTPServer | AsyncHTTPServer, sweeper: bool = True) -> None:
+    """Serve until interrupted, then stop background work and flush pending writes."""
+    if sweeper:
+        alerts.start_sweeper()
+        if archive.ENABLED:
+            archive.start()
+    jobs.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        alerts.stop_sweeper()
+        archive.stop()
+        jobs.stop(timeout=5)
+        exports.shutdown()
+        close_writers()
+
+
+def run(host: str = "127.0.0.1", port: int = 8000, mode: str = "threaded", workers: int = 1) -> None:
     init_db()
-    server = ThreadingHTTPServer((host, port), AppHandler)
-    print(f"Serving Fair Chance API on http://{host}:{port}")
-    server.serve_forever()
+    if workers > 1:
+        supervisor = prefork.Supervisor(
+            host, port, workers, lambda sock, index: serve(make_server(host, port, mode, sock), sweeper=index == 0)
+        )
+        print(f"Serving Fair Chance API on http://{host}:{port} ({mode}, {workers} workers)")
+        supervisor.run()
+        return
+    server = make_server(host, port, mode)
+    print(f"Serving Fair Chance API on http://{host}:{port} ({mode})")
+    serve(server)
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(prog="python -m app.main", description="Run the Fair Chance API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mode", choices=SERVE_MODES, default="threaded")
+    parser.add_argument("--workers", type=int, default=1, help="pre-fork this many server processes (default 1)")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--quiet", action="store_true", help="turn off the per-request access log")
+    args = parser.parse_args()
+    db.DB_PATH = args.db
+    if args.quiet:
+        AppHandler.log_message = lambda self, *a: None  # type: ignore[method-assign]
+    run(args.host, args.port, args.mode, args.workers)
@@ -0,0 +1,311 @@
+"""Latency histograms and request/SQL instrumentation.
+
+`Histogram` counts observations into fixed, roughly log-spaced buckets (in
+milliseconds), so recording is O(log buckets), memory stays constant no
+matter how many samples arrive, and percentiles are read back from the
+cumulative counts instead of a sorted sample list. Histograms with the same
+bounds can be merged, which is how per-worker results are combined.
+
+`instrument` wraps the `do_*` handler methods and `db.TimedCursor` times
+every statement; both feed the process-wide `registry`, which `/metrics`
+renders in Prometheus text format. While a request runs, a thread-local
+trace accumulates time per phase (parse, db_acquire, sql, write_txn, send)
+for the optional slow-request log. Recording is a bisect, a few counter
+bumps and one short lock per observation.
+
+  FAIR_CHANCE_METRICS          1 (default) or 0 to turn instrumentation off
+  FAIR_CHANCE_SLOW_REQUEST_MS  log requests slower than this, with phases
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+ENABLED = os.environ.get("FAIR_CHANCE_METRICS", "1") != "0"
+SLOW_REQUEST_MS = float(os.environ.get("FAIR_CHANCE_SLOW_REQUEST_MS", "0"))
+MAX_STATEMENT_LABEL = 120
+
+# 1-2-5 steps from 50us to 60s; quantiles are accurate to the bucket width.
+DEFAULT_BOUNDS_MS: tuple[float, ...] = tuple(
+    m * 10**e for e in range(-2, 5) for m in (1, 2, 5) if 0.05 <= m * 10**e <= 60_000
+) + (60_000.0,)
+
+
+class Histogram:
+    def __init__(self, bounds: Iterable[float] = DEFAULT_BOUNDS_MS) -> None:
+        self.bounds = tuple(sorted(set(bounds)))
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value_ms: float) -> None:
+        index = bisect.bisect_left(self.bounds, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def merge(self, other: Histogram) -> None:
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different bounds")
+        with self._lock:
+            for i, n in enumerate(other.counts):
+                self.counts[i] += n
+            self.count += other.count
+            self.sum += other.sum
+            self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile by linear interpolation inside its bucket."""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n and seen + n >= rank:
+                    lower = self.bounds[i - 1] if i else 0.0
+                    upper = self.bounds[i] if i < len(self.bounds) else self.max
+                    return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+                seen += n
+            return self.max
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+    def snapshot(self) -> tuple[list[int], int, float]:
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+
+_PLACEHOLDER_RUN = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """Collapse whitespace and `IN (?,?,...)` runs so each statement shape gets one series."""
+    label = _PLACEHOLDER_RUN.sub("?...", _WHITESPACE.sub(" ", sql).strip())
+    return label[:MAX_STATEMENT_LABEL]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: dict[tuple[str, str], Histogram] = {}
+        self.responses: dict[tuple[str, str, int], int] = {}
+        self.statements: dict[str, Histogram] = {}
+        self.jobs: dict[tuple[str, str], Histogram] = {}
+        self.job_outcomes: dict[tuple[str, str], int] = {}
+        self.gauges: list[tuple[str, str, Callable[[], list[tuple[str, float]]]]] = []
+        self.in_flight = 0
+        self.slow_requests = 0
+
+    def _histogram(self, table: dict[Any, Histogram], key: Any) -> Histogram:
+        hist = table.get(key)
+        if hist is None:
+            with self._lock:
+                hist = table.setdefault(key, Histogram())
+        return hist
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def observe_request(self, method: str, route: str, status: int, elapsed_ms: float, slow: bool = False) -> None:
+        """Record a finished request (and close its `request_started`)."""
+        self._histogram(self.requests, (method, route)).observe(elapsed_ms)
+        with self._lock:
+            self.in_flight -= 1
+            key = (method, route, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            self.slow_requests += slow
+
+    def observe_statement(self, sql: str, elapsed_ms: float) -> None:
+        self._histogram(self.statements, statement_label(sql)).observe(elapsed_ms)
+
+    def observe_job(self, kind: str, phase: str, elapsed_ms: float) -> None:
+        """`phase` is "wait" (ready to claimed) or "run" (claimed to finished)."""
+        self._histogram(self.jobs, (kind, phase)).observe(elapsed_ms)
+
+    def count_job(self, kind: str, outcome: str) -> None:
+        with self._lock:
+            self.job_outcomes[(kind, outcome)] = self.job_outcomes.get((kind, outcome), 0) + 1
+
+    def add_gauge(self, name: str, help_text: str, source: Callable[[], list[tuple[str, float]]]) -> None:
+        """Render `name` from `source()`'s (labels, value) pairs, read on every scrape."""
+        with self._lock:
+            self.gauges = [g for g in self.gauges if g[0] != name] + [(name, help_text, source)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests.clear()
+            self.responses.clear()
+            self.statements.clear()
+            self.jobs.clear()
+            self.job_outcomes.clear()
+            self.slow_requests = 0
+
+    def render(self) -> str:
+        """Prometheus text exposition (version 0.0.4); durations in seconds."""
+        with self._lock:
+            requests = sorted(self.requests.items())
+            responses = sorted(self.responses.items())
+            statements = sorted(self.statements.items())
+            jobs = sorted(self.jobs.items())
+            outcomes = sorted(self.job_outcomes.items())
+            gauges = list(self.gauges)
+            in_flight, slow = self.in_flight, self.slow_requests
+        lines = [
+            "# HELP fair_chance_http_requests_in_flight Requests currently being handled.",
+            "# TYPE fair_chance_http_requests_in_flight gauge",
+            f"fair_chance_http_requests_in_flight {in_flight}",
+            "# HELP fair_chance_http_responses_total Responses by route and status code.",
+            "# TYPE fair_chance_http_responses_total counter",
+            *(
+                f'fair_chance_http_responses_total{{method="{m}",route="{_escape(r)}",code="{c}"}} {n}'
+                for (m, r, c), n in responses
+            ),
+            "# HELP fair_chance_slow_requests_total Requests slower than FAIR_CHANCE_SLOW_REQUEST_MS.",
+            "# TYPE fair_chance_slow_requests_total counter",
+            f"fair_chance_slow_requests_total {slow}",
+        ]
+        lines += _render_histograms(
+            "fair_chance_http_request_duration_seconds",
+            "Request handling time by route.",
+            ((f'method="{m}",route="{_escape(r)}"', h) for (m, r), h in requests),
+        )
+        lines += _render_histograms(
+            "fair_chance_sql_duration_seconds",
+            "SQLite execute() time by statement shape.",
+            ((f'statement="{_escape(s)}"', h) for s, h in statements),
+        )
+        lines += _render_histograms(
+            "fair_chance_job_duration_seconds",
+            "Background job queue wait and run time by kind.",
+            ((f'kind="{_escape(k)}",phase="{p}"', h) for (k, p), h in jobs),
+        )
+        lines += [
+            "# HELP fair_chance_jobs_total Finished job attempts by kind and outcome.",
+            "# TYPE fair_chance_jobs_total counter",
+            *(f'fair_chance_jobs_total{{kind="{_escape(k)}",outcome="{o}"}} {n}' for (k, o), n in outcomes),
+        ]
+        for name, help_text, source in gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f"{name}{{{labels}}} {value}" if labels else f"{name} {value}" for labels, value in source()]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histograms(name: str, help_text: str, series: Iterable[tuple[str, Histogram]]) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, hist in series:
+        counts, count, total = hist.snapshot()
+        cumulative = 0
+        for bound, n in zip((*hist.bounds, None), counts):
+            cumulative += n
+            le = "+Inf" if bound is None else repr(bound / 1000)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {total / 1000}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+    return lines
+
+
+registry = Registry()
+
+
+class _Trace:
+    __slots__ = ("phases",)
+
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+
+
+_local = threading.local()
+
+
+class phase:
+    """`with phase("parse"): ...` charges the block's wall time to the current request."""
+
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc: object) -> None:
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.add(self.name, (time.perf_counter() - self.started) * 1000)
+
+
+def record_statement(sql: str, elapsed_ms: float) -> None:
+    registry.observe_statement(sql, elapsed_ms)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.add("sql", elapsed_ms)
+
+
+def instrument(route_of: Callable[[Any], str]) -> Callable[[Callable[[Any], None]], Callable[[Any], None]]:
+    """Decorate `do_GET`/`do_POST`; `route_of(handler)` maps the request to a low-cardinality route label.
+
+    The handler is expected to record its response code in `status_code`; it
+    is reset here because keep-alive connections reuse one handler instance.
+    """
+
+    def decorate(method: Callable[[Any], None]) -> Callable[[Any], None]:
+        if not ENABLED:
+            return method
+
+        @functools.wraps(method)
+        def wrapper(handler: Any) -> None:
+            trace = _local.trace = _Trace()
+            handler.status_code = 0
+            registry.request_started()
+            started = time.perf_counter()
+            try:
+                method(handler)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                _local.trace = None
+                status = getattr(handler, "status_code", 0) or 500
+                route = route_of(handler)
+                slow = bool(SLOW_REQUEST_MS) and elapsed >= SLOW_REQUEST_MS
+                registry.observe_request(handler.command, route, status, elapsed, slow)
+                if slow:
+                    _log_slow(handler.command, route, status, elapsed, trace)
+
+        return wrapper
+
+    return decorate
+
+
+def _log_slow(method: str, route: str, status: int, elapsed_ms: float, trace: _Trace) -> None:
+    other = elapsed_ms - sum(trace.phases.values())
+    parts = [f"{k}={v:.1f}ms" for k, v in sorted(trace.phases.items())] + [f"other={max(other, 0.0):.1f}ms"]
+    sys.stderr.write(f"slow request {method} {route} {status} {elapsed_ms:.1f}ms [{' '.join(parts)}]\n")
@@ -0,0 +1,405 @@
+"""Versioned schema migrations for the SQLite store.
+
+Each migration runs once, inside its own `BEGIN IMMEDIATE` transaction, and
+is recorded in `schema_migrations`. `check_query_plans()` runs `EXPLAIN QUERY
+PLAN` over the request-path queries in `HOT_QUERIES` and reports any that
+fall back to a table scan or sort; on an empty file the planner has no
+statistics, so `python -m app.synthetic generate --check-plans` runs the
+same check against a realistically sized, analyzed dataset.
+
+  python -m app.migrations migrate [--db PATH]
+  python -m app.migrations status [--db PATH]
+  python -m app.migrations check-plans [--db PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from app import ai, alerts, archive, audit, dedupe, exports, jobs, kpis, records, rollups, search
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str = ""
+    backfill: Callable[[sqlite3.Cursor], Any] | None = None
+
+
+def _backfill_code_links(cur: sqlite3.Cursor) -> int:
+    """Split the comma-joined code columns of existing rows into the junction tables."""
+    copied = 0
+    for table, column, link_table, owner in (
+        ("referrals", "support_category_codes", "referral_support_categories", "referral_id"),
+        ("progress_notes", "areas_of_need_codes", "progress_note_areas_of_need", "note_id"),
+    ):
+        source = cur.connection.execute(f"SELECT tenant_id, id, {column} FROM {table} WHERE {column} <> ''")
+        while rows := source.fetchmany(5000):
+            links = [link for tenant, row_id, codes in rows for link in records.code_links(tenant, row_id, codes.split(","))]
+            cur.executemany(f"INSERT OR IGNORE INTO {link_table}(tenant_id,{owner},code) VALUES(?,?,?)", links)
+            copied += len(links)
+    return copied
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        1,
+        "base_schema",
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            email TEXT NOT NULL,
+            role TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS employees (
+            id TEXT PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            email TEXT
+        );
+        CREATE TABLE IF NOT EXISTS referrals (
+            id TEXT PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            intake_path TEXT NOT NULL,
+            source_type TEXT NOT NULL,
+            employee_id TEXT NOT NULL,
+            referral_status TEXT NOT NULL,
+            risk_level TEXT NOT NULL,
+            support_category_codes TEXT NOT NULL,
+            submitted_by_user_id TEXT NOT NULL,
+            assigned_coordinator_id TEXT,
+            submitted_at TEXT NOT NULL,
+            first_response_at TEXT
+        );
+        CREATE TABLE IF NOT EXISTS cases (
+            id TEXT PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            employee_id TEXT NOT NULL,
+            referral_id TEXT,
+            assigned_coordinator_id TEXT NOT NULL,
+            case_status TEXT NOT NULL,
+            opened_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS progress_notes (
+            id TEXT PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            employee_id TEXT NOT NULL,
+            case_id TEXT NOT NULL,
+            coordinator_id TEXT NOT NULL,
+            note_type TEXT NOT NULL,
+            note_start_date TEXT NOT NULL,
+            interaction_at TEXT NOT NULL,
+            meeting_location TEXT NOT NULL,
+            areas_of_need_codes TEXT NOT NULL,
+            summary_of_meeting TEXT,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        """,
+    ),
+    Migration(2, "kpi_counters", kpis.SCHEMA, backfill=kpis.rebuild_rows),
+    Migration(
+        3,
+        "tenant_leading_indexes",
+        """
+        CREATE INDEX IF NOT EXISTS idx_users_tenant ON users(tenant_id);
+        CREATE INDEX IF NOT EXISTS idx_employees_tenant ON employees(tenant_id);
+        CREATE INDEX IF NOT EXISTS idx_referrals_tenant_status ON referrals(tenant_id, referral_status);
+        CREATE INDEX IF NOT EXISTS idx_referrals_tenant_coordinator
+            ON referrals(tenant_id, assigned_coordinator_id, first_response_at);
+        CREATE INDEX IF NOT EXISTS idx_cases_tenant_status ON cases(tenant_id, case_status);
+        CREATE INDEX IF NOT EXISTS idx_cases_referral ON cases(referral_id);
+        CREATE INDEX IF NOT EXISTS idx_progress_notes_tenant_status ON progress_notes(tenant_id, status);
+        CREATE INDEX IF NOT EXISTS idx_progress_notes_case ON progress_notes(case_id);
+        """,
+    ),
+    Migration(
+        4,
+        "keyset_list_indexes",
+        """
+        DROP INDEX IF EXISTS idx_referrals_tenant_status;
+        CREATE INDEX idx_referrals_tenant_status ON referrals(tenant_id, referral_status, submitted_at, id);
+        CREATE INDEX IF NOT EXISTS idx_referrals_tenant_submitted ON referrals(tenant_id, submitted_at, id);
+        CREATE INDEX IF NOT EXISTS idx_referrals_tenant_risk ON referrals(tenant_id, risk_level, submitted_at, id);
+        CREATE INDEX IF NOT EXISTS idx_referrals_tenant_coordinator_submitted
+            ON referrals(tenant_id, assigned_coordinator_id, submitted_at, id);
+        DROP INDEX IF EXISTS idx_cases_tenant_status;
+        CREATE INDEX idx_cases_tenant_status ON cases(tenant_id, case_status, opened_at, id);
+        CREATE INDEX IF NOT EXISTS idx_cases_tenant_opened ON cases(tenant_id, opened_at, id);
+        CREATE INDEX IF NOT EXISTS idx_cases_tenant_coordinator ON cases(tenant_id, assigned_coordinator_id, opened_at, id);
+        DROP INDEX IF EXISTS idx_progress_notes_tenant_status;
+        CREATE INDEX idx_progress_notes_tenant_status ON progress_notes(tenant_id, status, interaction_at, id);
+        DROP INDEX IF EXISTS idx_progress_notes_case;
+        CREATE INDEX idx_progress_notes_case ON progress_notes(case_id, interaction_at, id);
+        CREATE INDEX IF NOT EXISTS idx_progress_notes_tenant_interaction ON progress_notes(tenant_id, interaction_at, id);
+        CREATE INDEX IF NOT EXISTS idx_progress_notes_tenant_coordinator
+            ON progress_notes(tenant_id, coordinator_id, interaction_at, id);
+        """,
+    ),
+    Migration(5, "export_jobs", exports.SCHEMA),
+    Migration(
+        6,
+        "code_junction_tables",
+        """
+        CREATE TABLE IF NOT EXISTS referral_support_categories (
+            tenant_id TEXT NOT NULL,
+            referral_id TEXT NOT NULL,
+            code TEXT NOT NULL,
+            PRIMARY KEY (referral_id, code)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_referral_support_categories_tenant_code
+            ON referral_support_categories(tenant_id, code, referral_id);
+        CREATE TABLE IF NOT EXISTS progress_note_areas_of_need (
+            tenant_id TEXT NOT NULL,
+            note_id TEXT NOT NULL,
+            code TEXT NOT NULL,
+            PRIMARY KEY (note_id, code)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_progress_note_areas_of_need_tenant_code
+            ON progress_note_areas_of_need(tenant_id, code, note_id);
+        CREATE INDEX IF NOT EXISTS idx_referrals_tenant_intake ON referrals(tenant_id, intake_path, risk_level);
+        """,
+        backfill=_backfill_code_links,
+    ),
+    Migration(7, "kpi_daily_rollups", rollups.SCHEMA, backfill=rollups.rebuild_rows),
+    Migration(
+        8,
+        "coordinator_kpi_indexes",
+        """
+        DROP INDEX IF EXISTS idx_referrals_tenant_coordinator;
+        CREATE INDEX idx_referrals_tenant_coordinator
+            ON referrals(tenant_id, assigned_coordinator_id, first_response_at, submitted_at);
+        CREATE INDEX IF NOT EXISTS idx_progress_notes_tenant_coordinator_status
+            ON progress_notes(tenant_id, coordinator_id, status, interaction_at, created_at);
+        """,
+    ),
+    Migration(9, "alerts", alerts.SCHEMA),
+    Migration(10, "progress_note_search", search.SCHEMA, backfill=search.rebuild_index),
+    Migration(11, "employee_match_keys", dedupe.SCHEMA, backfill=dedupe.rebuild_keys),
+    Migration(12, "audit_events", audit.SCHEMA),
+    Migration(13, "background_jobs", jobs.SCHEMA),
+    Migration(14, "ai_outputs", ai.SCHEMA),
+    # Daily rows used to take the first ten characters of a timestamp, i.e. the client's local day.
+    Migration(15, "utc_rollup_days", backfill=rollups.rebuild_rows),
+    Migration(16, "export_job_owners", exports.OWNER_SCHEMA),
+]
+
+# Request-path query shapes. Every entry must be answerable without a full
+# table scan or a sort of the whole result; `check_query_plans()` enforces that.
+HOT_QUERIES: dict[str, tuple[str, tuple[Any, ...]]] = {
+    "employee_by_id": ("SELECT tenant_id FROM employees WHERE id=?", ("e-1",)),
+    "employees_for_tenant": ("SELECT id FROM employees WHERE tenant_id=?", ("t",)),
+    "referral_by_id": ("SELECT tenant_id, first_response_at, assigned_coordinator_id, employee_id FROM referrals WHERE id=?", ("r",)),
+    "case_by_id": ("SELECT tenant_id, employee_id FROM cases WHERE id=?", ("c",)),
+    "cases_for_referral": ("SELECT id FROM cases WHERE referral_id=?", ("r",)),
+    "notes_for_case": ("SELECT id FROM progress_notes WHERE case_id=?", ("c",)),
+    "kpi_counters_for_tenant": ("SELECT * FROM kpi_counters WHERE tenant_id=?", ("t",)),
+    "tenant_referral_counts": (
+        "SELECT COUNT(*), SUM(assigned_coordinator_id IS NOT NULL) FROM referrals WHERE tenant_id=?",
+        ("t",),
+    ),
+    "tenant_referrals_by_status": ("SELECT COUNT(*) FROM referrals WHERE tenant_id=? AND referral_status=?", ("t", "submitted")),
+    "tenant_open_cases": (
+        "SELECT COUNT(*) FROM cases WHERE tenant_id=? AND case_status IN ('open','active_support')",
+        ("t",),
+    ),
+    "tenant_note_counts": ("SELECT COUNT(*), SUM(status='final') FROM progress_notes WHERE tenant_id=?", ("t",)),
+    "tenant_final_notes": ("SELECT COUNT(*) FROM progress_notes WHERE tenant_id=? AND status='final'", ("t",)),
+    "list_referrals_page": (
+        "SELECT id FROM referrals WHERE tenant_id = ? AND (submitted_at, id) < (?, ?) ORDER BY submitted_at DESC, id DESC LIMIT 51",
+        ("t", "2026-01-01", "r"),
+    ),
+    "list_referrals_by_status": (
+        "SELECT id FROM referrals WHERE tenant_id = ? AND referral_status = ? ORDER BY submitted_at DESC, id DESC LIMIT 51",
+        ("t", "submitted"),
+    ),
+    "list_referrals_by_coordinator": (
+        "SELECT id FROM referrals WHERE tenant_id = ? AND assigned_coordinator_id = ? AND submitted_at >= ? "
+        "ORDER BY submitted_at DESC, id DESC LIMIT 51",
+        ("t", "u", "2026-01-01"),
+    ),
+    "list_cases_page": (
+        "SELECT id FROM cases WHERE tenant_id = ? AND case_status = ? AND (opened_at, id) < (?, ?) ORDER BY opened_at DESC, id DESC LIMIT 51",
+        ("t", "open", "2026-01-01", "c"),
+    ),
+    "list_notes_page": (
+        "SELECT id FROM progress_notes WHERE tenant_id = ? AND (interaction_at, id) < (?, ?) ORDER BY interaction_at DESC, id DESC LIMIT 51",
+        ("t", "2026-01-01", "n"),
+    ),
+    "employee_match_candidates": (dedupe.candidate_sql(3), ("t", "ph:A100:R300", "pi:R300:a", "em:ava")),
+    "employees_by_ids_for_tenant": ("SELECT id, first_name, last_name, email FROM employees WHERE tenant_id=? AND id IN (?,?)", ("t", "e-1", "e-2")),
+    "export_job_by_id": ("SELECT * FROM export_jobs WHERE id=? AND tenant_id=?", ("x", "t")),
+    **{
+        f"cohort_{part}_{variant}": kpis.cohort_queries("t", filters, group_by)[part]
+        for variant, filters, group_by in (
+            ("by_category", {"support_category": "housing"}, None),
+            ("group_risk", {"intake_path": "referral"}, "risk_level"),
+            ("group_category", {}, "support_category"),
+        )
+        for part in ("referrals", "cases", "notes")
+    },
+    **{f"coordinator_kpis_{part}": q for part, q in kpis.coordinator_queries("t", 48, 72).items()},
+    "alert_rules_for_tenant": ("SELECT id, name, severity, condition FROM alert_rules WHERE tenant_id=?", ("t",)),
+    "alert_deadlines_due": (
+        "SELECT rule_id, entity_id, tenant_id, started_at FROM alert_deadlines WHERE due_at <= ? ORDER BY due_at LIMIT ?",
+        ("2026-01-01T00:00:00Z", 500),
+    ),
+    "alert_deadlines_clear": ("DELETE FROM alert_deadlines WHERE tenant_id=? AND entity_id=?", ("t", "r")),
+    "alerts_resolve": (
+        "UPDATE alerts SET status='resolved', resolved_at=? WHERE rule_id=? AND entity_id=? AND status='firing'",
+        ("2026-01-01T00:00:00Z", "x", "r"),
+    ),
+    "alerts_for_tenant": (
+        "SELECT a.id FROM alerts a JOIN alert_rules r ON r.id = a.rule_id "
+        "WHERE a.tenant_id=? AND a.status=? ORDER BY a.fired_at DESC LIMIT ?",
+        ("t", "firing", 100),
+    ),
+    "kpi_daily_range": (
+        "SELECT day, metric, value FROM kpi_daily WHERE tenant_id=? AND day>=? AND day<?",
+        ("t", "2026-01-01", "2026-04-01"),
+    ),
+    "list_notes_for_case": (
+        "SELECT id FROM progress_notes WHERE tenant_id = ? AND case_id = ? ORDER BY interaction_at DESC, id DESC LIMIT 51",
+        ("t", "c"),
+    ),
+    "audit_events_range": (
+        "SELECT id FROM audit_events WHERE tenant_id = ? AND occurred_at >= ? AND occurred_at < ? AND (occurred_at, id) > (?, ?) "
+        "ORDER BY occurred_at, id LIMIT 51",
+        ("t", "2026-01-01", "2026-02-01", "2026-01-05", "a"),
+    ),
+    "audit_events_for_entity": (
+        "SELECT id FROM audit_events WHERE tenant_id = ? AND entity_id = ? ORDER BY occurred_at, id LIMIT 51",
+        ("t", "r"),
+    ),
+    "job_claim": (jobs.CLAIM_SQL, (0.0, 2)),
+    "job_expired_leases": ("SELECT id FROM jobs WHERE status='running' AND lease_until < ?", (0.0,)),
+}
+
+
+def _now() -> str:
+    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+
+def _statements(sql: str) -> Iterator[str]:
+    """Split a script into complete statements (trigger bodies stay intact)."""
+    buffer = ""
+    for part in sql.split(";"):
+        buffer += part + ";"
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip(" \n\t;"):
+                yield buffer.strip()
+            buffer = ""
+    if buffer.strip(" \n\t;"):
+        raise MigrationError(f"Incomplete SQL statement: {buffer.strip()[:80]}")
+
+
+def applied_versions(cur: sqlite3.Cursor) -> set[int]:
+    cur.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def migrate(conn: sqlite3.Connection, migrations: list[Migration] | None = None) -> list[int]:
+    """Apply pending migrations in version order; returns the versions applied."""
+    cur = conn.cursor()
+    if conn.in_transaction:
+        conn.commit()
+    pending = [m for m in sorted(migrations or MIGRATIONS, key=lambda m: m.version) if m.version not in applied_versions(cur)]
+    conn.commit()
+    applied = []
+    for migration in pending:
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock.
+            if migration.version in applied_versions(cur):
+                conn.rollback()
+                continue
+            for statement in _statements(migration.sql):
+                cur.execute(statement)
+            if migration.backfill is not None:
+                migration.backfill(cur)
+            cur.execute(
+                "INSERT INTO schema_migrations(version,name,applied_at) VALUES(?,?,?)",
+                (migration.version, migration.name, _now()),
+            )
+            conn.commit()
+        except Exception as exc:
+            conn.rollback()
+            raise MigrationError(f"Migration {migration.version} ({migration.name}) failed: {exc}") from exc
+        applied.append(migration.version)
+    if archive.attached(cur):
+        # The archive copies of the case tables follow whatever the hot schema now is.
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            archive.sync_schema(cur)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return applied
+
+
+def status(conn: sqlite3.Connection) -> list[dict[str, Any]]:
+    cur = conn.cursor()
+    done = applied_versions(cur)
+    conn.commit()
+    return [{"version": m.version, "name": m.name, "applied": m.version in done} for m in MIGRATIONS]
+
+
+def check_query_plans(conn: sqlite3.Connection, queries: dict[str, tuple[str, tuple[Any, ...]]] | None = None) -> list[dict[str, Any]]:
+    """Return the hot queries whose plan contains a full table scan or an ORDER BY sort."""
+    cur = conn.cursor()
+    offenders = []
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        details = [row[3] for row in cur.fetchall()]
+        scans = [
+            d for d in details
+            if (d.startswith("SCAN ") and not d.startswith("SCAN CONSTANT ROW")) or d.startswith("USE TEMP B-TREE FOR ORDER BY")
+        ]
+        if scans:
+            offenders.append({"query": name, "plan": details})
+    return offenders
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db import DB_PATH, get_db
+
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="Manage the SQLite schema.")
+    parser.add_argument("command", choices=["migrate", "status", "check-plans"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = get_db(args.db)
+    try:
+        if args.command == "migrate":
+            print(json.dumps({"applied": migrate(conn)}))
+            return 0
+        if args.command == "status":
+            print(json.dumps(status(conn), indent=2))
+            return 0
+        migrate(conn)
+        offenders = check_query_plans(conn)
+        print(json.dumps({"checked": len(HOT_QUERIES), "scans": offenders}, indent=2))
+        return 1 if offenders else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Pre-fork serving: one supervisor process, N worker processes, one port.
+
+`python -m app.main --workers N` runs a `Supervisor`: it migrates the
+database, binds the listening socket and forks N workers, each running the
+usual threaded (or asyncio) server on the inherited socket, so request
+parsing, validation and JSON encoding spread over N interpreters instead of
+sharing one GIL. With FAIR_CHANCE_REUSEPORT=1 every worker binds its own
+SO_REUSEPORT socket instead and the kernel spreads connections between them.
+
+Workers share the WAL-mode SQLite file. Each has its own connection pool and
+group-commit writer; write transactions from different workers serialize on
+SQLite's write lock (busy_timeout). State that must agree across workers sits
+in anonymous shared memory created before the fork:
+
+  SharedCounters     response-cache generations, so a write handled by one
+                     worker invalidates the tenant's cached reads in all
+  SharedRevocations  revoked token ids, so a logout holds on every worker
+
+Metrics, /dev/stats and the cache contents stay per worker. The alert sweeper
+runs in worker 0 only; interrupted export jobs are requeued by the supervisor
+(all of them before forking, a dead worker's own before its replacement is
+forked) and resumed by worker 0 or the replacement. Every worker runs `jobs`
+workers; claims are conditional updates, so each background job runs in one
+of them.
+
+The supervisor restarts workers that exit unexpectedly, backing off while
+they keep dying within MIN_UPTIME_SECONDS. SIGTERM or SIGINT starts a
+graceful shutdown: workers stop accepting, finish in-flight requests, flush
+their writer and audit buffer and exit; any still running after
+SHUTDOWN_GRACE_SECONDS are killed.
+
+  FAIR_CHANCE_REUSEPORT           1 for one SO_REUSEPORT socket per worker
+  FAIR_CHANCE_SHUTDOWN_GRACE_S    drain time before workers are killed (30)
+"""
+from __future__ import annotations
+
+import mmap
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+import zlib
+from typing import Any, Callable
+
+from app import auth, db, exports, shards
+from app.cache import response_cache
+
+REUSE_PORT = os.environ.get("FAIR_CHANCE_REUSEPORT", "0") == "1"
+SHUTDOWN_GRACE_SECONDS = int(os.environ.get("FAIR_CHANCE_SHUTDOWN_GRACE_S", "30"))
+MIN_UPTIME_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+LISTEN_BACKLOG = 1024
+GENERATION_SLOTS = 4096
+REVOCATION_SLOTS = 65536
+
+
+class SharedCounters:
+    """Fixed array of uint64 counters in shared memory, addressed by a hash of the key.
+
+    Keys that share a slot share a counter; for cache generations that only
+    means an occasional extra invalidation.
+    """
+
+    def __init__(self, slots: int = GENERATION_SLOTS) -> None:
+        self.slots = slots
+        self._mem = mmap.mmap(-1, 8 * slots)
+        self._lock = multiprocessing.Lock()
+
+    def _offset(self, key: str) -> int:
+        return 8 * (zlib.crc32(key.encode("utf-8")) % self.slots)
+
+    def get(self, key: str) -> int:
+        return struct.unpack_from("Q", self._mem, self._offset(key))[0]
+
+    def bump(self, key: str) -> int:
+        offset = self._offset(key)
+        with self._lock:
+            value = struct.unpack_from("Q", self._mem, offset)[0] + 1
+            struct.pack_into("Q", self._mem, offset, value)
+        return value
+
+
+class SharedRevocations:
+    """Append-only table of revoked token-id digests in shared memory (`auth.RevocationLog`).
+
+    A header holds (epoch, count); each entry is a 16-byte digest and its
+    expiry. Every process remembers how far it has read, so `changes()` is one
+    header read unless something was revoked. A full table is compacted down to
+    its unexpired entries and the epoch bumped, which sends readers back to
+    the start.
+    """
+
+    HEADER = struct.Struct("QQ")
+    ENTRY = struct.Struct("16sd")
+
+    def __init__(self, slots: int = REVOCATION_SLOTS) -> None:
+        self.slots = slots
+        self._mem = mmap.mmap(-1, self.HEADER.size + self.ENTRY.size * slots)
+        self._lock = multiprocessing.Lock()
+        self._seen = (0, 0)
+
+    def _entry(self, index: int) -> tuple[bytes, float]:
+        return self.ENTRY.unpack_from(self._mem, self.HEADER.size + self.ENTRY.size * index)
+
+    def publish(self, digest: bytes, expires_at: float) -> None:
+        with self._lock:
+            epoch, count = self.HEADER.unpack_from(self._mem, 0)
+            if count == self.slots:
+                cutoff = time.time() - auth.CLOCK_SKEW_SECONDS
+                live = [entry for entry in map(self._entry, range(count)) if entry[1] >= cutoff]
+                if len(live) == self.slots:
+                    raise OverflowError(f"More than {self.slots} unexpired revocations")
+                for index, entry in enumerate(live):
+                    self.ENTRY.pack_into(self._mem, self.HEADER.size + self.ENTRY.size * index, *entry)
+                epoch, count = epoch + 1, len(live)
+            self.ENTRY.pack_into(self._mem, self.HEADER.size + self.ENTRY.size * count, digest, expires_at)
+            self.HEADER.pack_into(self._mem, 0, epoch, count + 1)
+
+    def changes(self) -> list[tuple[bytes, float]] | None:
+        if self.HEADER.unpack_from(self._mem, 0) == self._seen:
+            return None
+        with self._lock:
+            epoch, count = self.HEADER.unpack_from(self._mem, 0)
+            start = self._seen[1] if epoch == self._seen[0] else 0
+            entries = [self._entry(index) for index in range(start, count)]
+            self._seen = (epoch, count)
+        return entries
+
+
+class WorkerShutdown(KeyboardInterrupt):
+    """Raised in a worker's main thread on SIGTERM, so serving unwinds through its cleanup like Ctrl-C."""
+
+
+def _shutdown_worker(signum: int, frame: Any) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise WorkerShutdown()
+
+
+def listen(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG, reuse_port=reuse_port)
+    # Workers race to accept; the losers must get EAGAIN instead of blocking in accept().
+    sock.setblocking(False)
+    return sock
+
+
+class Supervisor:
+    """Forks `workers` processes that each call `target(sock, index)` and keeps them running."""
+
+    def __init__(
+        self, host: str, port: int, workers: int, target: Callable[[socket.socket, int], None], reuse_port: bool = REUSE_PORT
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.target = target
+        self.reuse_port = reuse_port
+        self.generations = SharedCounters()
+        self.revocations = SharedRevocations()
+        self.children: dict[int, tuple[int, float]] = {}
+        self.restarts = 0
+        self.stopping = False
+        self._sock: socket.socket | None = None
+        self._backoff = [0.0] * workers
+
+    def run(self) -> None:
+        # Interrupted exports go back to `queued` while no worker can be running them.
+        self._requeue_exports()
+        if self.reuse_port:
+            # Only resolves port 0; an open socket nobody accepts on would still get its share of connections.
+            with listen(self.host, self.port, reuse_port=True) as probe:
+                self.port = probe.getsockname()[1]
+        else:
+            self._sock = listen(self.host, self.port)
+            self.port = self._sock.getsockname()[1]
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGALRM, self._kill)
+        for index in range(self.workers):
+            self._spawn(index)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index, started = self.children.pop(pid, (None, 0.0))
+            if index is None or self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            print(f"Worker {index} (pid {pid}) exited with {code}; restarting", file=sys.stderr)
+            self._requeue_exports(pid)
+            if time.monotonic() - started < MIN_UPTIME_SECONDS:
+                self._backoff[index] = min(max(self._backoff[index] * 2, 0.1), MAX_BACKOFF_SECONDS)
+                time.sleep(self._backoff[index])
+            else:
+                self._backoff[index] = 0.0
+            if not self.stopping:
+                self.restarts += 1
+                # The replacement resumes them, and any the dead worker had queued but not started.
+                self._spawn(index, resume_exports=True)
+        signal.alarm(0)
+        if self._sock is not None:
+            self._sock.close()
+
+    @staticmethod
+    def _requeue_exports(pid: int | None = None) -> int:
+        """Queue again the exports a dead worker (every worker, before the first fork) left running."""
+        requeued = 0
+        for path in shards.all_paths():
+            conn = db.get_db(path)
+            try:
+                requeued += exports.requeue_interrupted(conn.cursor(), pid)
+                conn.commit()
+            finally:
+                conn.close()
+        # Nothing that holds a SQLite handle may cross the fork.
+        db.close_pools()
+        return requeued
+
+    def _spawn(self, index: int, resume_exports: bool = False) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (index, time.monotonic())
+            return
+        code = 0
+        try:
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, _shutdown_worker)
+            signal.signal(signal.SIGINT, _shutdown_worker)
+            response_cache.share_generations(self.generations)
+            auth.authenticator.share_revocations(self.revocations)
+            exports.RESUME_STATUSES = ("queued",)
+            if index == 0 or resume_exports:
+                exports.start()
+            sock = self._sock if self._sock is not None else listen(self.host, self.port, reuse_port=True)
+            self.target(sock, index)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _stop(self, signum: int, frame: Any) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        signal.alarm(SHUTDOWN_GRACE_SECONDS)
+
+    def _kill(self, signum: int, frame: Any) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
@@ -0,0 +1,365 @@
+"""Validation and persistence for employees, referrals, cases and progress notes.
+
+The single-record POST handlers and the bulk ingestion endpoints both go
+through the `ingest_*` functions, so every row gets the same enum, ISO-date
+and tenant/ownership checks. Ownership lookups are resolved once per batch
+with `IN (...)` queries and rows are written with `executemany`; callers own
+the transaction.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator
+
+from app import ai, alerts, audit, dedupe, kpis, rollups
+from app.ids import new_id
+
+MEETING_LOCATIONS = {"office", "garage", "newberry", "community", "phone", "video", "text", "email"}
+NOTE_TYPES = {"intake", "coaching_session", "resource_referral", "crisis", "follow_up"}
+RISK_LEVELS = {"low", "medium", "high", "critical"}
+SOURCE_TYPES = {"employee_self", "manager", "coordinator", "hr", "anonymous_other"}
+INTAKE_PATHS = {"referral", "direct_engagement"}
+NOTE_STATUSES = {"draft", "final"}
+
+REFERRAL_REQUIRED = {"intake_path", "source_type", "employee_id", "risk_level", "support_category_codes"}
+CASE_REQUIRED = {"employee_id", "assigned_coordinator_id"}
+PROGRESS_NOTE_REQUIRED = {
+    "employee_id",
+    "case_id",
+    "note_type",
+    "note_start_date",
+    "interaction_at",
+    "meeting_location",
+    "areas_of_need_codes",
+}
+
+LOOKUP_CHUNK = 500
+
+EMPLOYEE_COLUMNS = ("id", "tenant_id", "first_name", "last_name", "email")
+REFERRAL_COLUMNS = (
+    "id", "tenant_id", "intake_path", "source_type", "employee_id", "referral_status", "risk_level",
+    "support_category_codes", "submitted_by_user_id", "assigned_coordinator_id", "submitted_at",
+)
+CASE_COLUMNS = ("id", "tenant_id", "employee_id", "referral_id", "assigned_coordinator_id", "case_status", "opened_at")
+NOTE_COLUMNS = (
+    "id", "tenant_id", "employee_id", "case_id", "coordinator_id", "note_type", "note_start_date",
+    "interaction_at", "meeting_location", "areas_of_need_codes", "summary_of_meeting", "status", "created_at",
+)
+
+Result = tuple[int, dict[str, Any]]
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+    def result(self) -> Result:
+        return self.status, {"detail": self.detail}
+
+
+def utcnow() -> str:
+    return datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+
+
+def _is_iso_date(value: str) -> bool:
+    try:
+        date.fromisoformat(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_iso_datetime(value: str) -> bool:
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return True
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    chunk: list[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def fetch_by_ids(cur: sqlite3.Cursor, table: str, columns: tuple[str, ...], ids: Iterable[Any]) -> dict[str, dict[str, Any]]:
+    """Load `columns` for every id in `ids` with one `IN (...)` query per LOOKUP_CHUNK ids."""
+    unique = list(dict.fromkeys(i for i in ids if isinstance(i, str)))
+    found: dict[str, dict[str, Any]] = {}
+    for chunk in chunked(unique, LOOKUP_CHUNK):
+        cur.execute(f"SELECT id,{','.join(columns)} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        for row in cur.fetchall():
+            found[row[0]] = dict(zip(columns, tuple(row)[1:]))
+    return found
+
+
+def code_links(tenant_id: str, owner_id: str, codes: Iterable[str]) -> list[tuple[str, str, str]]:
+    """Junction rows for a code list, duplicates dropped (the table's key is owner + code)."""
+    return [(tenant_id, owner_id, code) for code in dict.fromkeys(codes)]
+
+
+def _ids(items: list[Any], key: str) -> list[Any]:
+    return [item.get(key) for item in items if isinstance(item, dict)]
+
+
+def _owned(row: dict[str, Any] | None, auth: dict[str, str], missing: str) -> dict[str, Any]:
+    if row is None:
+        raise ApiError(404, missing)
+    if row["tenant_id"] != auth["tenant_id"]:
+        raise ApiError(403, "Cross-tenant access denied")
+    return row
+
+
+def _require_object(body: Any) -> dict[str, Any]:
+    if isinstance(body, ApiError):
+        raise body
+    if not isinstance(body, dict):
+        raise ApiError(400, "Each item must be a JSON object")
+    return body
+
+
+def check_referral(body: Any) -> None:
+    body = _require_object(body)
+    if not REFERRAL_REQUIRED.issubset(body.keys()):
+        raise ApiError(400, "Missing required fields")
+    if body["intake_path"] not in INTAKE_PATHS or body["source_type"] not in SOURCE_TYPES or body["risk_level"] not in RISK_LEVELS:
+        raise ApiError(400, "Invalid intake/source/risk enum")
+    codes = body.get("support_category_codes")
+    if not isinstance(codes, list) or len(codes) == 0 or not all(isinstance(c, str) for c in codes):
+        raise ApiError(400, "support_category_codes must be a non-empty array")
+
+
+def check_case(body: Any) -> None:
+    body = _require_object(body)
+    if not CASE_REQUIRED.issubset(body.keys()):
+        raise ApiError(400, "Missing required fields")
+
+
+def check_progress_note(body: Any) -> None:
+    body = _require_object(body)
+    if not PROGRESS_NOTE_REQUIRED.issubset(body.keys()):
+        raise ApiError(400, "Missing required fields")
+    if body["note_type"] not in NOTE_TYPES:
+        raise ApiError(400, "Invalid note_type")
+    if not _is_iso_date(body["note_start_date"]):
+        raise ApiError(400, "note_start_date must be ISO date (YYYY-MM-DD)")
+    if not _is_iso_datetime(body["interaction_at"]):
+        raise ApiError(400, "interaction_at must be ISO datetime")
+    if body["meeting_location"] not in MEETING_LOCATIONS:
+        raise ApiError(400, "Invalid meeting_location")
+    if body.get("status", "draft") not in NOTE_STATUSES:
+        raise ApiError(400, "Invalid status")
+    codes = body["areas_of_need_codes"]
+    if not isinstance(codes, list) or not all(isinstance(c, str) for c in codes):
+        raise ApiError(400, "areas_of_need_codes must be an array")
+
+
+def ingest_employees(cur: sqlite3.Cursor, auth: dict[str, str], items: list[Any]) -> list[Result]:
+    results: list[Result] = []
+    rows = []
+    people = []
+    for body in items:
+        try:
+            person = dedupe.Person.from_body(_require_object(body))
+        except ApiError as exc:
+            results.append(exc.result())
+            continue
+        except ValueError as exc:
+            results.append((400, {"detail": str(exc)}))
+            continue
+        employee_id = new_id()
+        rows.append((employee_id, auth["tenant_id"], person.first_name, person.last_name, person.email))
+        people.append((employee_id, person))
+        results.append((200, {"id": employee_id}))
+    cur.executemany("INSERT INTO employees(id,tenant_id,first_name,last_name,email) VALUES(?,?,?,?,?)", rows)
+    dedupe.index_employees(cur, auth["tenant_id"], people)
+    audit.emit(cur, auth, "employee", "create", [(row[0], audit.diff_of(EMPLOYEE_COLUMNS, row)) for row in rows], utcnow())
+    return results
+
+
+def ingest_referrals(cur: sqlite3.Cursor, auth: dict[str, str], items: list[Any]) -> list[Result]:
+    now = utcnow()
+    employees = fetch_by_ids(cur, "employees", ("tenant_id",), _ids(items, "employee_id"))
+    results: list[Result] = []
+    rows = []
+    categories = []
+    assigned = 0
+    for body in items:
+        try:
+            check_referral(body)
+            _owned(employees.get(body["employee_id"]), auth, "Employee not found")
+        except ApiError as exc:
+            results.append(exc.result())
+            continue
+        referral_id = new_id()
+        rows.append(
+            (
+                referral_id,
+                auth["tenant_id"],
+                body["intake_path"],
+                body["source_type"],
+                body["employee_id"],
+                "submitted",
+                body["risk_level"],
+                ",".join(body["support_category_codes"]),
+                auth["user_id"],
+                body.get("assigned_coordinator_id"),
+                now,
+            )
+        )
+        categories += code_links(auth["tenant_id"], referral_id, body["support_category_codes"])
+        assigned += body.get("assigned_coordinator_id") is not None
+        results.append((200, {"id": referral_id, "referral_status": "submitted"}))
+    cur.executemany(
+        """
+        INSERT INTO referrals(id,tenant_id,intake_path,source_type,employee_id,referral_status,risk_level,
+                              support_category_codes,submitted_by_user_id,assigned_coordinator_id,submitted_at)
+        VALUES(?,?,?,?,?,?,?,?,?,?,?)
+        """,
+        rows,
+    )
+    cur.executemany("INSERT INTO referral_support_categories(tenant_id,referral_id,code) VALUES(?,?,?)", categories)
+    kpis.bump(cur, auth["tenant_id"], intake_volume=len(rows), referrals_assigned=assigned)
+    rollups.bump_days(
+        cur,
+        auth["tenant_id"],
+        [("intake_volume", now)] * len(rows) + [("referrals_assigned", now)] * assigned,
+    )
+    if rows:
+        alerts.on_write(cur, auth["tenant_id"], "referrals", opened=[(row[0], now) for row in rows])
+    audit.emit(cur, auth, "referral", "create", [(row[0], audit.diff_of(REFERRAL_COLUMNS, row)) for row in rows], now)
+    ai.queue_triage(cur, auth["tenant_id"], [row[0] for row in rows])
+    return results
+
+
+def ingest_cases(cur: sqlite3.Cursor, auth: dict[str, str], items: list[Any]) -> list[Result]:
+    now = utcnow()
+    employees = fetch_by_ids(cur, "employees", ("tenant_id",), _ids(items, "employee_id"))
+    referrals = fetch_by_ids(
+        cur,
+        "referrals",
+        ("tenant_id", "employee_id", "referral_status", "first_response_at", "assigned_coordinator_id"),
+        _ids(items, "referral_id"),
+    )
+    results: list[Result] = []
+    rows = []
+    conversions = []
+    changes = []
+    responded = 0
+    for body in items:
+        try:
+            check_case(body)
+            _owned(employees.get(body["employee_id"]), auth, "Employee not found")
+            referral_id = body.get("referral_id")
+            if referral_id:
+                ref = _owned(referrals.get(referral_id), auth, "Referral not found")
+                if ref["employee_id"] != body["employee_id"]:
+                    raise ApiError(400, "Referral/employee mismatch")
+        except ApiError as exc:
+            results.append(exc.result())
+            continue
+        if referral_id:
+            conversions.append((now, referral_id))
+            responded += ref["assigned_coordinator_id"] is not None and ref["first_response_at"] is None
+            diff = {"referral_status": [ref["referral_status"], "converted_to_case"]}
+            if ref["first_response_at"] is None:
+                diff["first_response_at"] = [None, now]
+            changes.append((referral_id, diff))
+            # Later rows in the same batch must see this referral as responded.
+            ref["first_response_at"] = ref["first_response_at"] or now
+            ref["referral_status"] = "converted_to_case"
+        case_id = new_id()
+        rows.append((case_id, auth["tenant_id"], body["employee_id"], referral_id, body["assigned_coordinator_id"], "open", now))
+        results.append((200, {"id": case_id, "case_status": "open"}))
+    cur.executemany(
+        "UPDATE referrals SET referral_status='converted_to_case', first_response_at=COALESCE(first_response_at, ?) WHERE id=?",
+        conversions,
+    )
+    cur.executemany(
+        "INSERT INTO cases(id,tenant_id,employee_id,referral_id,assigned_coordinator_id,case_status,opened_at) VALUES(?,?,?,?,?,?,?)",
+        rows,
+    )
+    kpis.bump(cur, auth["tenant_id"], cases_open=len(rows), referrals_responded=responded)
+    rollups.bump_days(cur, auth["tenant_id"], [("cases_opened", now)] * len(rows) + [("referrals_responded", now)] * responded)
+    if rows:
+        alerts.on_write(cur, auth["tenant_id"], "cases", closed=[referral_id for _, referral_id in conversions])
+    audit.emit(cur, auth, "case", "create", [(row[0], audit.diff_of(CASE_COLUMNS, row)) for row in rows], now)
+    audit.emit(cur, auth, "referral", "update", changes, now)
+    return results
+
+
+def ingest_progress_notes(cur: sqlite3.Cursor, auth: dict[str, str], items: list[Any]) -> list[Result]:
+    now = utcnow()
+    cases = fetch_by_ids(cur, "cases", ("tenant_id", "employee_id"), _ids(items, "case_id"))
+    results: list[Result] = []
+    rows = []
+    areas = []
+    events = []
+    final = 0
+    for body in items:
+        try:
+            check_progress_note(body)
+            case_row = _owned(cases.get(body["case_id"]), auth, "Case not found")
+            if case_row["employee_id"] != body["employee_id"]:
+                raise ApiError(400, "Employee/case mismatch")
+        except ApiError as exc:
+            results.append(exc.result())
+            continue
+        note_id = new_id()
+        status = body.get("status", "draft")
+        rows.append(
+            (
+                note_id,
+                auth["tenant_id"],
+                body["employee_id"],
+                body["case_id"],
+                auth["user_id"],
+                body["note_type"],
+                body["note_start_date"],
+                body["interaction_at"],
+                body["meeting_location"],
+                ",".join(body["areas_of_need_codes"]),
+                body.get("summary_of_meeting"),
+                status,
+                now,
+            )
+        )
+        areas += code_links(auth["tenant_id"], note_id, body["areas_of_need_codes"])
+        events.append(("notes_total", body["interaction_at"]))
+        if status == "final":
+            events.append(("notes_final", body["interaction_at"]))
+        final += status == "final"
+        results.append((200, {"id": note_id, "status": status}))
+    cur.executemany(
+        """
+        INSERT INTO progress_notes(id,tenant_id,employee_id,case_id,coordinator_id,note_type,note_start_date,
+                                   interaction_at,meeting_location,areas_of_need_codes,summary_of_meeting,status,created_at)
+        VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """,
+        rows,
+    )
+    cur.executemany("INSERT INTO progress_note_areas_of_need(tenant_id,note_id,code) VALUES(?,?,?)", areas)
+    kpis.bump(cur, auth["tenant_id"], notes_total=len(rows), notes_final=final)
+    rollups.bump_days(cur, auth["tenant_id"], events)
+    if rows:
+        alerts.on_write(cur, auth["tenant_id"], "progress_notes")
+    audit.emit(cur, auth, "progress_note", "create", [(row[0], audit.diff_of(NOTE_COLUMNS, row)) for row in rows], now)
+    ai.queue_summaries(cur, auth["tenant_id"], [row[0] for row in rows if row[10]])
+    return results
+
+
+INGESTERS = {
+    "employees": ingest_employees,
+    "referrals": ingest_referrals,
+    "cases": ingest_cases,
+    "progress-notes": ingest_progress_notes,
+}
@@ -0,0 +1,272 @@
+"""Daily KPI rollups per tenant and metric.
+
+Write paths call `bump_days()` in the same transaction as their inserts, so
+`kpi_daily` always holds one row per tenant, UTC day and metric that had
+activity. Events are bucketed by the day they happened: referrals by
+`submitted_at`, responses by `first_response_at`, cases by `opened_at`,
+notes by `interaction_at`. Timestamps are stored as the client sent them and
+converted to UTC only to pick the bucket (`day_of`). Week, month and quarter
+answers are summed from the daily rows, so a range query reads at most a few
+hundred index entries however many raw rows sit behind them.
+
+  python -m app.rollups backfill [--db PATH] [--tenant TENANT_ID]
+  python -m app.rollups verify [--db PATH] [--tenant TENANT_ID]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from app import archive
+
+METRICS = (
+    "intake_volume",
+    "referrals_assigned",
+    "referrals_responded",
+    "cases_opened",
+    "notes_total",
+    "notes_final",
+)
+GRANULARITIES = ("day", "week", "month", "quarter")
+MAX_RANGE_DAYS = 3660
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kpi_daily (
+    tenant_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, day, metric)
+) WITHOUT ROWID;
+"""
+
+_BUMP_SQL = (
+    "INSERT INTO kpi_daily(tenant_id,day,metric,value) VALUES(?,?,?,?) "
+    "ON CONFLICT(tenant_id,day,metric) DO UPDATE SET value=value+excluded.value"
+)
+
+# (metric, table, timestamp column, extra condition) for recomputing from raw rows.
+_SOURCES = (
+    ("intake_volume", "referrals", "submitted_at", "1"),
+    ("referrals_assigned", "referrals", "submitted_at", "assigned_coordinator_id IS NOT NULL"),
+    (
+        "referrals_responded",
+        "referrals",
+        "first_response_at",
+        "assigned_coordinator_id IS NOT NULL AND first_response_at IS NOT NULL",
+    ),
+    ("cases_opened", "cases", "opened_at", "1"),
+    ("notes_total", "progress_notes", "interaction_at", "1"),
+    ("notes_final", "progress_notes", "interaction_at", "status='final'"),
+)
+# Columns the sources read, so archived rows can be unioned in (see `archive.source`).
+_SOURCE_COLUMNS = {
+    "referrals": ("tenant_id", "submitted_at", "first_response_at", "assigned_coordinator_id"),
+    "cases": ("tenant_id", "opened_at"),
+    "progress_notes": ("tenant_id", "interaction_at", "status"),
+}
+
+
+def day_of(timestamp: str) -> str:
+    """UTC day of an ISO timestamp (`2026-02-01T22:00:00-05:00` -> `2026-02-02`); naive ones are taken as UTC."""
+    if len(timestamp) == 20 and timestamp[10] == "T" and timestamp[19] == "Z":
+        return timestamp[:10]  # already in the stored UTC form
+    moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date().isoformat()
+
+
+def _sql_day(timestamp: str | None) -> str | None:
+    try:
+        return day_of(timestamp) if timestamp is not None else None
+    except ValueError:
+        return None  # unparseable: no expected bucket, so a stored one shows up as drift
+
+
+def bump_days(cur: sqlite3.Cursor, tenant_id: str, events: Iterable[tuple[str, str]]) -> None:
+    """Add one to each `(metric, timestamp)` event's daily bucket, one upsert per distinct bucket."""
+    buckets = Counter((day_of(ts), metric) for metric, ts in events)
+    unknown = {metric for _, metric in buckets} - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown rollup metrics: {sorted(unknown)}")
+    cur.executemany(_BUMP_SQL, [(tenant_id, day, metric, n) for (day, metric), n in buckets.items()])
+
+
+def compute_days(cur: sqlite3.Cursor, tenant_id: str | None = None) -> dict[tuple[str, str, str], int]:
+    """Recompute `{(tenant, day, metric): value}` from the base tables, one grouped pass per metric.
+
+    Archived rows count too, so the totals match what `bump_days()` accumulated.
+    """
+    where, params = ("tenant_id=? AND ", (tenant_id,)) if tenant_id is not None else ("", ())
+    # Bucket exactly as `bump_days()` does, whatever offset or format a row was stored with.
+    cur.connection.create_function("utc_day", 1, _sql_day, deterministic=True)
+    totals: dict[tuple[str, str, str], int] = {}
+    for metric, table, column, condition in _SOURCES:
+        rows = archive.source(cur, table, _SOURCE_COLUMNS[table])
+        cur.execute(
+            f"SELECT tenant_id, utc_day({column}) AS day, COUNT(*) FROM {rows} "
+            f"WHERE {where}{column} IS NOT NULL AND {condition} GROUP BY 1, 2 HAVING day IS NOT NULL",
+            params,
+        )
+        for tenant, day, value in cur.fetchall():
+            totals[(tenant, day, metric)] = value
+    return totals
+
+
+def rebuild_rows(cur: sqlite3.Cursor, tenant_id: str | None = None) -> int:
+    """Replace the daily rows (all tenants, or one) inside the caller's transaction; returns row count."""
+    totals = compute_days(cur, tenant_id)
+    if tenant_id is None:
+        cur.execute("DELETE FROM kpi_daily")
+    else:
+        cur.execute("DELETE FROM kpi_daily WHERE tenant_id=?", (tenant_id,))
+    cur.executemany(
+        "INSERT INTO kpi_daily(tenant_id,day,metric,value) VALUES(?,?,?,?)",
+        [(*key, value) for key, value in totals.items()],
+    )
+    return len(totals)
+
+
+def verify(conn: sqlite3.Connection, tenant_id: str | None = None) -> list[dict[str, Any]]:
+    """Return one entry per tenant/day/metric whose stored value differs from the base tables."""
+    cur = conn.cursor()
+    expected = compute_days(cur, tenant_id)
+    if tenant_id is None:
+        cur.execute("SELECT tenant_id, day, metric, value FROM kpi_daily")
+    else:
+        cur.execute("SELECT tenant_id, day, metric, value FROM kpi_daily WHERE tenant_id=?", (tenant_id,))
+    stored = {(t, d, m): v for t, d, m, v in cur.fetchall()}
+    return [
+        {"tenant_id": t, "day": d, "metric": m, "stored": stored.get((t, d, m), 0), "expected": expected.get((t, d, m), 0)}
+        for t, d, m in sorted(set(expected) | set(stored))
+        if stored.get((t, d, m), 0) != expected.get((t, d, m), 0)
+    ]
+
+
+def period_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def _next_period(start: date, granularity: str) -> date:
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    months = 1 if granularity == "month" else 3
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def periods(start: date, end: date, granularity: str) -> Iterator[tuple[date, date]]:
+    """Calendar-aligned `[period_start, period_end)` buckets covering `[start, end)`, clipped to the range."""
+    current = start
+    while current < end:
+        following = min(_next_period(period_start(current, granularity), granularity), end)
+        yield current, following
+        current = following
+
+
+def parse_range(params: dict[str, str]) -> tuple[date, date, str]:
+    """Validate `from`, `to` (ISO dates, `to` exclusive) and `granularity`; raises ValueError."""
+    unknown = set(params) - {"from", "to", "granularity"}
+    if unknown:
+        raise ValueError(f"Unsupported query parameter: {sorted(unknown)[0]}")
+    try:
+        start, end = date.fromisoformat(params["from"]), date.fromisoformat(params["to"])
+    except KeyError:
+        raise ValueError("from and to are required")
+    except ValueError:
+        raise ValueError("from and to must be ISO dates (YYYY-MM-DD)")
+    granularity = params.get("granularity", "day")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {list(GRANULARITIES)}")
+    if not start < end or (end - start).days > MAX_RANGE_DAYS:
+        raise ValueError(f"from must be before to, at most {MAX_RANGE_DAYS} days apart")
+    return start, end, granularity
+
+
+def _rates(values: dict[str, int]) -> dict[str, Any]:
+    assigned, notes = values["referrals_assigned"], values["notes_total"]
+    return {
+        **values,
+        "referral_response_rate": round(values["referrals_responded"] / assigned, 4) if assigned else 0.0,
+        "progress_note_submission_rate": round(values["notes_final"] / notes, 4) if notes else 0.0,
+    }
+
+
+def query(cur: sqlite3.Cursor, tenant_id: str, start: date, end: date, granularity: str) -> dict[str, Any]:
+    """Sum the daily rows in `[start, end)` into calendar buckets; every bucket is present, zeros included."""
+    cur.execute(
+        "SELECT day, metric, value FROM kpi_daily WHERE tenant_id=? AND day>=? AND day<?",
+        (tenant_id, start.isoformat(), end.isoformat()),
+    )
+    ends = dict(periods(start, end, granularity))
+    buckets = {s: dict.fromkeys(METRICS, 0) for s in ends}
+    for day, metric, value in cur.fetchall():
+        # The first bucket is clipped to `start`, so days before its calendar start map onto it.
+        key = max(period_start(date.fromisoformat(day), granularity), start)
+        if metric in buckets[key]:
+            buckets[key][metric] += value
+    totals = {metric: sum(b[metric] for b in buckets.values()) for metric in METRICS}
+    return {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "granularity": granularity,
+        "totals": _rates(totals),
+        "periods": [
+            {"period_start": s.isoformat(), "period_end": ends[s].isoformat(), **_rates(values)} for s, values in buckets.items()
+        ],
+    }
+
+
+def backfill(conn: sqlite3.Connection, tenant_id: str | None = None) -> int:
+    """Recompute daily rows from the base tables in one write transaction."""
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        rows = rebuild_rows(cur, tenant_id)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db import DB_PATH, get_db
+    from app.migrations import migrate
+
+    parser = argparse.ArgumentParser(prog="python -m app.rollups", description="Backfill or verify daily KPI rollups.")
+    parser.add_argument("command", choices=["backfill", "verify"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--tenant", help="limit to a single tenant")
+    args = parser.parse_args(argv)
+
+    conn = get_db(args.db)
+    try:
+        migrate(conn)
+        if args.command == "backfill":
+            print(json.dumps({"daily_rows": backfill(conn, args.tenant)}))
+            return 0
+        drift = verify(conn, args.tenant)
+        print(json.dumps({"drift": drift}, indent=2))
+        return 1 if drift else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
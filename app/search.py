@@ -0,0 +1,210 @@
+"""Full-text search over progress-note summaries.
+
+`progress_notes_fts` is an external-content FTS5 index over
+`progress_notes.summary_of_meeting`, keyed by the note's rowid and kept in
+sync by insert/update/delete triggers, so the text is stored once and every
+write path (single, bulk, amendments) is covered without application code.
+The Porter stemmer lets "evictions" find "eviction".
+
+Searches rank by bm25 and page with a `(rank, id)` keyset cursor. Snippets
+are only built for the rows on the returned page. Every query joins back to
+`progress_notes` on `tenant_id`, so matches from other tenants never leave
+SQLite. Snippets are raw note text with `<mark>` around hits, not escaped
+HTML.
+
+`VACUUM` may renumber rowids of `progress_notes` (it has a TEXT primary
+key); run `rebuild` afterwards.
+
+  python -m app.search rebuild [--db PATH]
+  python -m app.search check [--db PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Any
+
+from app.listing import DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, encode_cursor
+from app.records import ApiError, _is_iso_date, _is_iso_datetime
+
+MAX_TERMS = 16
+MAX_QUERY_LENGTH = 256
+SNIPPET_TOKENS = 16
+
+SCHEMA = """
+CREATE VIEW IF NOT EXISTS progress_notes_search AS
+    SELECT rowid AS note_rowid, summary_of_meeting, hex(tenant_id) AS tenant_key FROM progress_notes;
+CREATE VIRTUAL TABLE IF NOT EXISTS progress_notes_fts USING fts5(
+    summary_of_meeting,
+    tenant_key,
+    content='progress_notes_search',
+    content_rowid='note_rowid',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+INSERT INTO progress_notes_fts(progress_notes_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)');
+CREATE TRIGGER IF NOT EXISTS progress_notes_fts_insert AFTER INSERT ON progress_notes BEGIN
+    INSERT INTO progress_notes_fts(rowid, summary_of_meeting, tenant_key)
+    VALUES (new.rowid, new.summary_of_meeting, hex(new.tenant_id));
+END;
+CREATE TRIGGER IF NOT EXISTS progress_notes_fts_delete AFTER DELETE ON progress_notes BEGIN
+    INSERT INTO progress_notes_fts(progress_notes_fts, rowid, summary_of_meeting, tenant_key)
+    VALUES ('delete', old.rowid, old.summary_of_meeting, hex(old.tenant_id));
+END;
+CREATE TRIGGER IF NOT EXISTS progress_notes_fts_update AFTER UPDATE OF summary_of_meeting, tenant_id ON progress_notes BEGIN
+    INSERT INTO progress_notes_fts(progress_notes_fts, rowid, summary_of_meeting, tenant_key)
+    VALUES ('delete', old.rowid, old.summary_of_meeting, hex(old.tenant_id));
+    INSERT INTO progress_notes_fts(rowid, summary_of_meeting, tenant_key)
+    VALUES (new.rowid, new.summary_of_meeting, hex(new.tenant_id));
+END;
+"""
+
+FILTERS = {"case_id": "n.case_id = ?", "employee_id": "n.employee_id = ?"}
+COLUMNS = ("id", "case_id", "employee_id", "coordinator_id", "note_type", "interaction_at", "status")
+
+# `"a phrase"`, or a bare word with an optional trailing `*` for prefix search.
+_TERM = re.compile(r'"([^"]*)"|([^\s"]+)')
+_WORD = re.compile(r"\w+")
+
+
+def match_expression(q: str) -> str:
+    """Turn user input into an FTS5 query: every term quoted, all terms required.
+
+    Operators, column filters and stray punctuation in the input are treated
+    as text, so no user string can produce an FTS5 syntax error.
+    """
+    if len(q) > MAX_QUERY_LENGTH:
+        raise ApiError(400, f"q must be at most {MAX_QUERY_LENGTH} characters")
+    terms = []
+    for phrase, word in _TERM.findall(q):
+        tokens = _WORD.findall(phrase or word)
+        if not tokens:
+            continue
+        prefix = "*" if word.endswith("*") and len(tokens) == 1 else ""
+        terms.append('"' + " ".join(tokens) + '"' + prefix)
+    if not terms:
+        raise ApiError(400, "q must contain at least one word")
+    if len(terms) > MAX_TERMS:
+        raise ApiError(400, f"q may contain at most {MAX_TERMS} terms")
+    return " ".join(terms)
+
+
+def build_query(tenant_id: str, params: dict[str, str]) -> tuple[str, list[Any], str, int]:
+    """Translate search parameters into one tenant-scoped ranked query; returns (sql, args, match, limit)."""
+    if "q" not in params:
+        raise ApiError(400, "q is required")
+    match = match_expression(params["q"])
+    # The tenant token narrows the match inside the index; the join condition is what guarantees isolation.
+    where = ["progress_notes_fts MATCH ?", "n.tenant_id = ?"]
+    args: list[Any] = [f'tenant_key : "{tenant_id.encode("utf-8").hex().upper()}" AND summary_of_meeting : ({match})', tenant_id]
+    limit = DEFAULT_LIMIT
+    for name, value in params.items():
+        if name == "q":
+            continue
+        if name in FILTERS:
+            where.append(FILTERS[name])
+            args.append(value)
+        elif name in ("from", "to"):
+            if not (_is_iso_date(value) or _is_iso_datetime(value)):
+                raise ApiError(400, f"{name} must be an ISO date or datetime")
+            where.append(f"n.interaction_at {'>=' if name == 'from' else '<'} ?")
+            args.append(value)
+        elif name == "cursor":
+            rank, note_id = decode_cursor(value)
+            try:
+                args.extend((float(rank), note_id))
+            except ValueError:
+                raise ApiError(400, "Invalid cursor")
+            where.append("(f.rank, n.id) > (?, ?)")
+        elif name == "limit":
+            if not value.isdigit() or not 1 <= int(value) <= MAX_LIMIT:
+                raise ApiError(400, f"limit must be between 1 and {MAX_LIMIT}")
+            limit = int(value)
+        else:
+            raise ApiError(400, f"Unsupported query parameter: {name}")
+    sql = (
+        f"SELECT n.rowid, f.rank, {','.join('n.' + c for c in COLUMNS)} "
+        "FROM progress_notes_fts f JOIN progress_notes n ON n.rowid = f.rowid "
+        f"WHERE {' AND '.join(where)} ORDER BY f.rank, n.id LIMIT ?"
+    )
+    return sql, [*args, limit + 1], args[0], limit
+
+
+def search(cur: sqlite3.Cursor, tenant_id: str, params: dict[str, str]) -> dict[str, Any]:
+    sql, args, match, limit = build_query(tenant_id, params)
+    cur.execute(sql, args)
+    rows = cur.fetchall()
+    page, more = rows[:limit], len(rows) > limit
+    snippets: dict[int, str] = {}
+    if page:
+        rowids = [row[0] for row in page]
+        cur.execute(
+            f"SELECT rowid, snippet(progress_notes_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) "
+            f"FROM progress_notes_fts WHERE progress_notes_fts MATCH ? AND rowid IN ({','.join('?' * len(rowids))})",
+            [match, *rowids],
+        )
+        snippets = dict(cur.fetchall())
+    items = [
+        {**dict(zip(COLUMNS, row[2:])), "score": round(-row[1], 6), "snippet": snippets.get(row[0], "")} for row in page
+    ]
+    next_cursor = encode_cursor(repr(page[-1][1]), page[-1][2]) if more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def rebuild_index(cur: sqlite3.Cursor) -> None:
+    """Re-index every note from `progress_notes` inside the caller's transaction."""
+    cur.execute("INSERT INTO progress_notes_fts(progress_notes_fts) VALUES ('rebuild')")
+    cur.execute("INSERT INTO progress_notes_fts(progress_notes_fts) VALUES ('optimize')")
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Rebuild the index in one write transaction; returns the number of notes indexed."""
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        rebuild_index(cur)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return cur.execute("SELECT COUNT(*) FROM progress_notes").fetchone()[0]
+
+
+def check(conn: sqlite3.Connection) -> str | None:
+    """Compare the index with `progress_notes`; returns the error text, or None when they agree."""
+    try:
+        conn.execute("INSERT INTO progress_notes_fts(progress_notes_fts, rank) VALUES ('integrity-check', 1)")
+        conn.commit()
+    except sqlite3.DatabaseError as exc:
+        conn.rollback()
+        return str(exc)
+    return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db import DB_PATH, get_db
+    from app.migrations import migrate
+
+    parser = argparse.ArgumentParser(prog="python -m app.search", description="Rebuild or check the progress-note search index.")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    conn = get_db(args.db)
+    try:
+        migrate(conn)
+        if args.command == "rebuild":
+            print(json.dumps({"indexed": rebuild(conn)}))
+            return 0
+        error = check(conn)
+        print(json.dumps({"ok": error is None, "error": error}))
+        return 1 if error else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
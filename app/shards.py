@@ -0,0 +1,378 @@
+"""Per-tenant SQLite files (the "tenant" storage mode).
+
+With FAIR_CHANCE_STORAGE=tenant each tenant's rows live in their own file,
+SHARD_DIR/<tenant>.db, so a large tenant's bulk import or export only locks
+and grows its own database and its indexes only hold its own rows. Request
+handlers resolve the file with `path_for(tenant_id)` and hand it to
+`get_db()` / `run_write()`; in the default "shared" mode it returns None,
+which those read as DB_PATH.
+
+Shards are prepared lazily, the first time a process touches a tenant: a
+missing file is created by copying an empty, fully migrated template (much
+cheaper than running every migration per tenant), an existing one is brought
+up to date with `migrate()`. Open tenants are tracked in a bounded LRU; past
+MAX_OPEN_SHARDS the least recently used tenant's connection pool and writer
+thread are closed, so 1,000s of tenants cost a bounded number of file
+handles and threads. Request handlers wrapped in `pinning` hold every shard
+they resolved until they return, and background work holds the file it is
+visiting with `hold(path)`: a shard evicted meanwhile is closed when its last
+holder finishes, instead of `get_db()` quietly opening a fresh, never-closed
+pool for it. Background visits end with `release(path)`.
+
+Rows keep their tenant_id column and every query still filters on it, so the
+same SQL, indexes and plan checks serve both modes and shards can be merged
+back.
+
+  FAIR_CHANCE_STORAGE          shared (default) or tenant
+  FAIR_CHANCE_SHARD_DIR        directory of tenant files (default shards/)
+  FAIR_CHANCE_MAX_OPEN_SHARDS  open tenants per process (default 128)
+  FAIR_CHANCE_SHARD_POOL_SIZE  pooled connections per open tenant (default 4)
+
+  python -m app.shards split [--db PATH] [--dir PATH]
+  python -m app.shards list [--dir PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+from app import archive, db, writer
+
+STORAGE = os.environ.get("FAIR_CHANCE_STORAGE", "shared")
+SHARD_DIR = Path(os.environ.get("FAIR_CHANCE_SHARD_DIR", Path(__file__).resolve().parent.parent / "shards"))
+MAX_OPEN_SHARDS = int(os.environ.get("FAIR_CHANCE_MAX_OPEN_SHARDS", "128"))
+SHARD_POOL_SIZE = int(os.environ.get("FAIR_CHANCE_SHARD_POOL_SIZE", "4"))
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+TEMPLATE_PREFIX = ".template-v"
+
+T = TypeVar("T")
+_scope = threading.local()
+
+
+def shard_name(tenant_id: str) -> str:
+    """File stem for a tenant: the id itself when it is filename-safe, else a digest of it."""
+    if _SAFE_NAME.match(tenant_id) and not tenant_id.startswith(TEMPLATE_PREFIX):
+        return tenant_id
+    return "t-" + hashlib.sha256(tenant_id.encode("utf-8")).hexdigest()[:32]
+
+
+def _create_exclusive(source: Path, target: Path) -> bool:
+    """Copy `source` to `target` unless `target` exists; atomic across processes."""
+    staging = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}")
+    try:
+        with open(source, "rb") as src, open(staging, "wb") as dst:
+            while block := src.read(1 << 20):
+                dst.write(block)
+        os.link(staging, target)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        staging.unlink(missing_ok=True)
+
+
+class ShardCache:
+    """LRU of open tenant shards; evicting a tenant closes its pool and writer."""
+
+    def __init__(self, directory: Path = SHARD_DIR, max_open: int = MAX_OPEN_SHARDS, pool_size: int = SHARD_POOL_SIZE) -> None:
+        self.directory = Path(directory)
+        self.max_open = max_open
+        self.pool_size = pool_size
+        self._open: OrderedDict[str, Path] = OrderedDict()
+        self._pins: dict[Path, int] = {}
+        self._retired: set[Path] = set()
+        self._current: set[Path] = set()
+        self._lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+        self._template: Path | None = None
+        self.hits = self.opens = self.evictions = self.created = 0
+
+    def path_for(self, tenant_id: str) -> Path:
+        with self._lock:
+            path = self._open.get(tenant_id)
+            if path is not None:
+                self._open.move_to_end(tenant_id)
+                self.hits += 1
+                self._pin(path)
+                return path
+        path = self.directory / f"{shard_name(tenant_id)}.db"
+        if path not in self._current:
+            self._prepare(path)
+        evicted = []
+        with self._lock:
+            if tenant_id not in self._open:
+                self.opens += 1
+            self._open[tenant_id] = path
+            self._open.move_to_end(tenant_id)
+            self._retired.discard(path)
+            self._pin(path)
+            while len(self._open) > self.max_open:
+                stale = self._open.popitem(last=False)[1]
+                self.evictions += 1
+                if self._pins.get(stale):
+                    self._retired.add(stale)
+                else:
+                    evicted.append(stale)
+        # After the pin, so an eviction racing with this call retires the pool instead of closing it under us.
+        db.get_pool(path, self.pool_size)
+        for stale in evicted:
+            writer.close_writer(stale)
+            db.close_pool(stale)
+        return path
+
+    def _pin(self, path: Path) -> None:
+        held = getattr(_scope, "held", None)
+        if held is not None:
+            self._pins[path] = self._pins.get(path, 0) + 1
+            held.append((self, path))
+
+    def unpin(self, path: Path) -> None:
+        """Drop one pin; the last one on a shard evicted while pinned closes it."""
+        with self._lock:
+            remaining = self._pins.get(path, 0) - 1
+            if remaining > 0:
+                self._pins[path] = remaining
+                return
+            self._pins.pop(path, None)
+            if path not in self._retired:
+                return
+            self._retired.discard(path)
+        writer.close_writer(path)
+        db.close_pool(path)
+
+    def _prepare(self, path: Path) -> None:
+        from app import migrations  # migrations imports the modules that import this one
+
+        with self._prepare_lock:
+            if path in self._current:
+                return
+            if not path.exists():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.created += _create_exclusive(self._template_path(), path)
+            conn = sqlite3.connect(path, factory=db.TimedConnection)
+            try:
+                db.configure(conn)
+                archive.attach(conn, path)
+                migrations.migrate(conn)
+            finally:
+                conn.close()
+            self._current.add(path)
+
+    def _template_path(self) -> Path:
+        """An empty database at the latest schema version, created once per directory and version."""
+        from app import migrations
+
+        if self._template is None:
+            latest = max(m.version for m in migrations.MIGRATIONS)
+            template = self.directory / f"{TEMPLATE_PREFIX}{latest}.db"
+            if not template.exists():
+                staging = template.with_name(f"{template.name}.{os.getpid()}")
+                staging.unlink(missing_ok=True)
+                conn = sqlite3.connect(staging)
+                try:
+                    db.configure(conn)
+                    migrations.migrate(conn)
+                    # Copies must be self-contained files, not a main file plus a WAL.
+                    conn.execute("PRAGMA journal_mode=DELETE")
+                finally:
+                    conn.close()
+                try:
+                    os.link(staging, template)
+                except FileExistsError:
+                    pass
+                finally:
+                    staging.unlink(missing_ok=True)
+            self._template = template
+        return self._template
+
+    @contextlib.contextmanager
+    def hold(self, path: Path) -> Iterator[None]:
+        """Pin `path` for a background task, so an eviction meanwhile retires it instead of closing it."""
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            self.unpin(path)
+
+    def release(self, path: Path) -> None:
+        """Close `path`'s pool and writer if no tenant holds it open (after a background visit)."""
+        with self._lock:
+            if path in self._open.values() or self._pins.get(path):
+                return
+        writer.close_writer(path)
+        db.close_pool(path)
+
+    def paths(self) -> list[Path]:
+        """Every tenant shard on disk, open or not."""
+        if not self.directory.exists():
+            return []
+        return sorted(p for p in self.directory.glob("*.db") if not p.name.startswith("."))
+
+    def close(self) -> None:
+        with self._lock:
+            paths = [*self._open.values(), *self._retired]
+            self._open.clear()
+            self._retired.clear()
+        for path in paths:
+            writer.close_writer(path)
+            db.close_pool(path)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "max_open": self.max_open,
+                "pinned": len(self._pins),
+                "retired": len(self._retired),
+                "hits": self.hits,
+                "opens": self.opens,
+                "evictions": self.evictions,
+                "created": self.created,
+            }
+
+
+shards = ShardCache()
+
+
+def configure(storage: str = STORAGE, directory: Path = SHARD_DIR, max_open: int = MAX_OPEN_SHARDS) -> ShardCache:
+    """Switch storage mode (tests, benchmarks); closes the shards the old cache had open."""
+    global STORAGE, shards
+    if storage not in ("shared", "tenant"):
+        raise ValueError(f"Unknown storage mode: {storage}")
+    shards.close()
+    STORAGE = storage
+    shards = ShardCache(directory, max_open)
+    return shards
+
+
+def path_for(tenant_id: str) -> Path | None:
+    """Database file for a tenant's reads and writes; None means the shared DB_PATH."""
+    if STORAGE == "shared":
+        return None
+    return shards.path_for(tenant_id)
+
+
+def pinning(method: Callable[..., T]) -> Callable[..., T]:
+    """Decorate a request handler so the shards it resolves stay open until it returns."""
+
+    @functools.wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        outer = getattr(_scope, "held", None)
+        _scope.held = held = []
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _scope.held = outer
+            for cache, path in held:
+                cache.unpin(path)
+
+    return wrapper
+
+
+def all_paths() -> list[Path | None]:
+    """Every database holding tenant rows, for background jobs that visit all tenants."""
+    if STORAGE == "shared":
+        return [None]
+    return list(shards.paths())
+
+
+@contextlib.contextmanager
+def hold(path: Path | None) -> Iterator[None]:
+    if path is None or STORAGE != "tenant":
+        yield
+        return
+    with shards.hold(path):
+        yield
+
+
+def release(path: Path | None) -> None:
+    if path is not None and STORAGE == "tenant":
+        shards.release(path)
+
+
+def stats() -> dict[str, Any]:
+    return {"storage": STORAGE, **(shards.stats() if STORAGE == "tenant" else {})}
+
+
+def tenant_tables(cur: sqlite3.Cursor) -> list[tuple[str, list[str]]]:
+    """Ordinary tables with a tenant_id column, with their column lists (FTS shadow tables are skipped)."""
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND sql NOT LIKE 'CREATE VIRTUAL%' ORDER BY name")
+    tables = []
+    for (name,) in cur.fetchall():
+        columns = [row[1] for row in cur.execute(f"PRAGMA table_info('{name}')").fetchall()]
+        if "tenant_id" in columns:
+            tables.append((name, columns))
+    return tables
+
+
+def split(source: Path, cache: ShardCache) -> dict[str, dict[str, int]]:
+    """Copy each tenant's rows from the shared file into its own shard; returns rows copied per tenant and table.
+
+    Triggers on the shard (the search index) fire as rows arrive. Shards that
+    already hold rows for a table are skipped for that table, so a split that
+    was interrupted can be rerun.
+    """
+    conn = sqlite3.connect(source)
+    try:
+        cur = conn.cursor()
+        tables = tenant_tables(cur)
+        tenants = sorted({row[0] for name, _ in tables for row in cur.execute(f"SELECT DISTINCT tenant_id FROM {name}")})
+    finally:
+        conn.close()
+    report: dict[str, dict[str, int]] = {}
+    for tenant_id in tenants:
+        path = cache.path_for(tenant_id)
+        shard = sqlite3.connect(path)
+        try:
+            db.configure(shard)
+            shard.execute("ATTACH DATABASE ? AS src", (str(source),))
+            copied = {}
+            with shard:
+                for name, columns in tables:
+                    if shard.execute(f"SELECT 1 FROM main.{name} WHERE tenant_id=? LIMIT 1", (tenant_id,)).fetchone():
+                        continue
+                    column_list = ",".join(columns)
+                    copied[name] = shard.execute(
+                        f"INSERT INTO main.{name}({column_list}) SELECT {column_list} FROM src.{name} WHERE tenant_id=?",
+                        (tenant_id,),
+                    ).rowcount
+            shard.execute("DETACH DATABASE src")
+        finally:
+            shard.close()
+        report[tenant_id] = copied
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.shards", description="Manage per-tenant database files.")
+    parser.add_argument("command", choices=["split", "list"])
+    parser.add_argument("--db", type=Path, default=db.DB_PATH, help="shared database to split")
+    parser.add_argument("--dir", type=Path, default=SHARD_DIR)
+    args = parser.parse_args(argv)
+    cache = ShardCache(args.dir, max_open=8)
+    try:
+        if args.command == "split":
+            report = split(args.db, cache)
+            print(json.dumps({"tenants": len(report), "rows": sum(sum(t.values()) for t in report.values())}, indent=2))
+        else:
+            print(json.dumps([{"shard": p.name, "bytes": p.stat().st_size} for p in cache.paths()], indent=2))
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
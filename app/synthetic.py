@@ -0,0 +1,410 @@
+"""Deterministic synthetic datasets at production-like volumes.
+
+`generate()` fills a freshly migrated database straight through SQLite
+(no API round trips): tenants whose sizes follow a Zipf curve, their
+coordinators and employees, referrals with skewed risk levels and support
+categories (most converted to cases, some left unanswered), and cases with
+years of progress notes (more notes for riskier cases). The same preset and
+seed always produce the same rows and ids, so benchmark runs compare like
+with like. The largest tenant is `tenant-acme` with coordinator `u-coord`,
+so the dev tokens in `app.auth` see the heaviest data.
+
+Rows are inserted in the order they were created, like a production table
+fills, so the time-ordered ids (`ids.id_at`) append to the right edge of
+each primary key. Secondary indexes and the search triggers are dropped for
+the load and rebuilt afterwards, then the derived tables (KPI counters,
+daily rollups, match keys, the search index) are recomputed and `ANALYZE`
+runs, so the query planner sees realistic statistics.
+
+  python -m app.synthetic generate [--preset 1k|1m|10m] [--db PATH] [--seed N] [--check-plans]
+  python -m app.synthetic generate --notes 250000 --tenants 12 --years 3 --db /tmp/mid.db
+
+The target must not hold any records yet; an interrupted run leaves a
+half-built file that should be deleted.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import heapq
+import itertools
+import json
+import random
+import sqlite3
+import sys
+import time
+from bisect import bisect
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from app import db, dedupe, ids, kpis, migrations, records, rollups, search
+
+
+@dataclass(frozen=True)
+class Preset:
+    notes: int
+    tenants: int
+    years: float
+
+
+PRESETS = {
+    "1k": Preset(notes=1_000, tenants=3, years=1),
+    "1m": Preset(notes=1_000_000, tenants=40, years=5),
+    "10m": Preset(notes=10_000_000, tenants=200, years=8),
+}
+
+# Generated history ends here rather than at the wall clock, so a seed means the same rows on every run.
+END = datetime(2026, 10, 1, tzinfo=timezone.utc)
+DEV_TENANT = "tenant-acme"
+
+TENANT_SKEW = 1.1
+CASES_PER_COORDINATOR = 400
+EMPLOYEES_PER_CASE = 0.7
+MEAN_NOTES_PER_CASE = 8
+MEAN_CASE_DAYS = 150
+REFERRED_CASE_SHARE = 0.8
+UNCONVERTED_REFERRALS_PER_CASE = 0.25
+SUMMARY_SHARE = 0.75
+BATCH = 50_000
+
+RISK_WEIGHTS = {"low": 45, "medium": 33, "high": 17, "critical": 5}
+# Riskier cases get more contact; the weighted mean is ~1 so the overall notes per case hold.
+RISK_NOTE_FACTORS = {"low": 0.6, "medium": 1.0, "high": 1.6, "critical": 2.5}
+CATEGORY_WEIGHTS = {
+    "housing": 30, "transportation": 18, "financial": 14, "childcare": 10, "legal": 8,
+    "mental_health": 7, "food": 5, "healthcare": 4, "education": 2, "substance_use": 2,
+}
+CATEGORY_COUNT_WEIGHTS = {1: 60, 2: 30, 3: 10}
+SOURCE_WEIGHTS = {"manager": 40, "employee_self": 25, "hr": 20, "coordinator": 10, "anonymous_other": 5}
+# Every case starts with an intake note; these weight the ones after it.
+NOTE_TYPE_WEIGHTS = {"coaching_session": 55, "follow_up": 22, "resource_referral": 17, "crisis": 6}
+LOCATION_WEIGHTS = {
+    "office": 30, "phone": 20, "video": 15, "garage": 10, "newberry": 8, "community": 8, "text": 6, "email": 3,
+}
+
+FIRST_NAMES = (
+    "Ava Noah Mia Liam Zoe Eli Maya Owen Lena Jude Rosa Omar Iris Theo Nina Abel Cora Ivan June Luis "
+    "Ruth Amir Tess Caleb Gia Hugo Lila Marco Nora Raul Sage Troy Vera Wade Yara Dion Faye Gabe Hana Kofi"
+).split()
+LAST_NAMES = (
+    "Reed Cole Diaz Nguyen Patel Okafor Kim Lopez Brooks Hayes Shah Ward Silva Banks Price Moreno Tran Fox "
+    "Grant Lane Ortiz Pierce Quinn Rhodes Stone Tate Vance Walsh Young Abbott Bishop Cruz Dunn Ellis Flores"
+).split()
+WORDS = (
+    "discussed reviewed scheduled followed called met talked planned budget rent landlord lease deposit utility "
+    "bill childcare school transport license court hearing attorney probation resume interview shift schedule "
+    "overtime paycheck benefits clinic prescription counseling recovery meeting family support goal progress "
+    "week month application form voucher shelter food pantry credit debt savings account phone laptop training"
+).split()
+RARE_WORDS = ("eviction", "bus pass", "expungement", "food stamps", "garnishment")
+
+_TABLES = ("employees", "referrals", "referral_support_categories", "cases", "progress_notes", "progress_note_areas_of_need")
+_INSERTS = {
+    "employees": f"INSERT INTO employees({','.join(records.EMPLOYEE_COLUMNS)}) VALUES({','.join('?' * len(records.EMPLOYEE_COLUMNS))})",
+    "referrals": (
+        f"INSERT INTO referrals({','.join(records.REFERRAL_COLUMNS)},first_response_at) "
+        f"VALUES({','.join('?' * (len(records.REFERRAL_COLUMNS) + 1))})"
+    ),
+    "referral_support_categories": "INSERT INTO referral_support_categories(tenant_id,referral_id,code) VALUES(?,?,?)",
+    "cases": f"INSERT INTO cases({','.join(records.CASE_COLUMNS)}) VALUES({','.join('?' * len(records.CASE_COLUMNS))})",
+    "progress_notes": f"INSERT INTO progress_notes({','.join(records.NOTE_COLUMNS)}) VALUES({','.join('?' * len(records.NOTE_COLUMNS))})",
+    "progress_note_areas_of_need": "INSERT INTO progress_note_areas_of_need(tenant_id,note_id,code) VALUES(?,?,?)",
+}
+_BULK_PRAGMAS = ("PRAGMA synchronous=OFF", "PRAGMA cache_size=-262144", "PRAGMA wal_autocheckpoint=10000")
+# Referrals are submitted up to this long before the case they turn into opens.
+_MAX_LEAD_S = 10 * 86400
+
+_days: dict[int, str] = {}
+
+
+def _ts(seconds: float) -> str:
+    """ISO UTC timestamp as the API stores it, with the date part cached per day."""
+    whole = int(seconds)
+    day, rest = divmod(whole, 86400)
+    prefix = _days.get(day)
+    if prefix is None:
+        prefix = _days[day] = datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y-%m-%d")
+    hours, rest = divmod(rest, 3600)
+    return f"{prefix}T{hours:02d}:{rest // 60:02d}:{rest % 60:02d}Z"
+
+
+class _Picker:
+    """Weighted choice from a fixed table, without rebuilding cumulative weights per draw."""
+
+    def __init__(self, weights: dict[Any, float]) -> None:
+        self.values = list(weights)
+        self.cumulative = list(itertools.accumulate(weights.values()))
+
+    def __call__(self, rng: random.Random) -> Any:
+        return self.values[bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+
+
+@dataclass
+class _Tenant:
+    id: str
+    coordinators: list[str]
+    employees: list[str]
+
+
+class _Loader:
+    """Orders generated rows by id (creation time) and writes them in batches.
+
+    A case's notes are generated when the case opens but were created over the
+    following months, so rows wait in a heap until no later case can produce
+    an earlier id. Junction rows are keyed by their owner's id.
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.pending: list[tuple[str, int, str, tuple[Any, ...]]] = []
+        self.batches: dict[str, list[tuple[Any, ...]]] = {table: [] for table in _TABLES}
+        self.buffered = 0
+        self.counts = dict.fromkeys(_TABLES, 0)
+        self.sequence = itertools.count()
+
+    def add(self, key: str, table: str, row: tuple[Any, ...]) -> None:
+        heapq.heappush(self.pending, (key, next(self.sequence), table, row))
+
+    def release(self, before: str | None = None) -> None:
+        """Queue every row keyed below `before` (all of them for None) for writing."""
+        pending = self.pending
+        while pending and (before is None or pending[0][0] < before):
+            _, _, table, row = heapq.heappop(pending)
+            self.batches[table].append(row)
+            self.buffered += 1
+            if self.buffered >= BATCH:
+                self.flush()
+
+    def write(self, table: str, rows: list[tuple[Any, ...]]) -> None:
+        self.batches[table].extend(rows)
+        self.buffered += len(rows)
+        self.flush()
+
+    def flush(self) -> None:
+        with self.conn:
+            for table, rows in self.batches.items():
+                if rows:
+                    self.conn.executemany(_INSERTS[table], rows)
+                    self.counts[table] += len(rows)
+                    rows.clear()
+        self.buffered = 0
+
+
+def _tenants(rng: random.Random, count: int, cases: int, start_ms: int, loader: _Loader) -> tuple[list[_Tenant], list[float]]:
+    """Tenants with Zipf-skewed shares of the cases, plus their users and employees."""
+    shares = [1 / (rank + 1) ** TENANT_SKEW for rank in range(count)]
+    total = sum(shares)
+    tenants, users, employees = [], [], []
+    ms = start_ms
+    for rank, share in enumerate(shares):
+        tenant_id = DEV_TENANT if rank == 0 else f"t-{rank:04d}"
+        expected = cases * share / total
+        coordinators = [f"u-{tenant_id}-{n:03d}" for n in range(max(1, round(expected / CASES_PER_COORDINATOR)))]
+        if rank == 0:
+            coordinators[0] = "u-coord"
+            users += [("u-admin", tenant_id, "admin@example.com", "company_admin"), ("u-manager", tenant_id, "manager@example.com", "manager")]
+        users += [(user_id, tenant_id, f"{user_id}@example.com", "coordinator") for user_id in coordinators]
+        people = []
+        for n in range(max(5, round(expected * EMPLOYEES_PER_CASE))):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            email = f"{first}.{last}{n}@{tenant_id}.example.com".lower() if rng.random() < 0.8 else None
+            employee_id = ids.id_at(ms, rng.getrandbits(80))
+            ms += 1
+            employees.append((employee_id, tenant_id, first, last, email))
+            people.append(employee_id)
+        tenants.append(_Tenant(tenant_id, coordinators, people))
+    loader.conn.executemany("INSERT OR IGNORE INTO users(id,tenant_id,email,role) VALUES(?,?,?,?)", users)
+    loader.write("employees", employees)
+    return tenants, list(itertools.accumulate(shares))
+
+
+def _categories(rng: random.Random, pick: _Picker, count: int) -> list[str]:
+    chosen: dict[str, None] = {}
+    while len(chosen) < count:
+        chosen[pick(rng)] = None
+    return list(chosen)
+
+
+def _summary(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(8, 40))
+    if rng.random() < 0.02:
+        words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+    return " ".join(words).capitalize() + "."
+
+
+def _referral(
+    rng: random.Random, loader: _Loader, picks: dict[str, _Picker], tenant: _Tenant, employee_id: str,
+    submitted: float, risk: str, categories: list[str], coordinator: str | None, responded: float | None, status: str,
+) -> str:
+    referral_id = ids.id_at(int(submitted * 1000), rng.getrandbits(80))
+    intake_path = "referral" if rng.random() < 0.85 else "direct_engagement"
+    loader.add(referral_id, "referrals", (
+        referral_id, tenant.id, intake_path, picks["source"](rng), employee_id, status, risk, ",".join(categories),
+        rng.choice(tenant.coordinators), coordinator, _ts(submitted), _ts(responded) if responded is not None else None,
+    ))
+    for row in records.code_links(tenant.id, referral_id, categories):
+        loader.add(referral_id, "referral_support_categories", row)
+    return referral_id
+
+
+def _drop_bulk_indexes(conn: sqlite3.Connection) -> list[tuple[str, str, str]]:
+    """Drop the secondary indexes and triggers of the bulk tables; returns what to recreate."""
+    saved = conn.execute(
+        f"SELECT type, name, sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+        f"AND tbl_name IN ({','.join('?' * len(_TABLES))})",
+        _TABLES,
+    ).fetchall()
+    for kind, name, _ in saved:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    return [tuple(row) for row in saved]
+
+
+def generate(
+    path: Path | str, preset: Preset, seed: int = 0, end: datetime = END, check_plans: bool = False
+) -> dict[str, Any]:
+    """Fill an empty database at `path` with `preset`'s volumes; returns row counts and timings."""
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    picks = {
+        "risk": _Picker(RISK_WEIGHTS), "category": _Picker(CATEGORY_WEIGHTS), "category_count": _Picker(CATEGORY_COUNT_WEIGHTS),
+        "source": _Picker(SOURCE_WEIGHTS), "note_type": _Picker(NOTE_TYPE_WEIGHTS), "location": _Picker(LOCATION_WEIGHTS),
+    }
+    conn = sqlite3.connect(path)
+    db.configure(conn)
+    # Nothing generated here forms a cycle, and a collector pass over the pending rows costs more the further it gets.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        migrations.migrate(conn)
+        for table in _TABLES:
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                raise ValueError(f"{path} already has {table}; generate into a fresh database")
+        for pragma in _BULK_PRAGMAS:
+            conn.execute(pragma)
+        saved = _drop_bulk_indexes(conn)
+        loader = _Loader(conn)
+        try:
+            end_s = end.timestamp()
+            span_s = preset.years * 365 * 86400
+            start_s = end_s - span_s
+            cases = max(1, preset.notes // MEAN_NOTES_PER_CASE)
+            tenants, tenant_weights = _tenants(rng, preset.tenants, cases, int(start_s * 1000) - 86_400_000, loader)
+            remaining = preset.notes
+            for k in range(cases):
+                opened = start_s + span_s * (k + rng.random()) / cases
+                loader.release(ids.id_at(int((opened - _MAX_LEAD_S) * 1000), 0))
+                tenant = tenants[bisect(tenant_weights, rng.random() * tenant_weights[-1])]
+                coordinator = rng.choice(tenant.coordinators)
+                employee_id = rng.choice(tenant.employees)
+                risk = picks["risk"](rng)
+                categories = _categories(rng, picks["category"], picks["category_count"](rng))
+
+                referral_id = None
+                if rng.random() < REFERRED_CASE_SHARE:
+                    submitted = opened - rng.uniform(3600, _MAX_LEAD_S)
+                    responded = min(submitted + rng.expovariate(1 / (30 * 3600)), opened)
+                    referral_id = _referral(
+                        rng, loader, picks, tenant, employee_id, submitted, risk, categories, coordinator, responded,
+                        "converted_to_case",
+                    )
+                if rng.random() < UNCONVERTED_REFERRALS_PER_CASE:
+                    # Still waiting: not always assigned, and the recent ones mostly not answered yet.
+                    assigned = rng.choice(tenant.coordinators) if rng.random() < 0.7 else None
+                    waited = rng.expovariate(1 / (40 * 3600))
+                    responded = opened + waited if assigned and rng.random() < 0.8 and opened + waited < end_s else None
+                    _referral(
+                        rng, loader, picks, tenant, rng.choice(tenant.employees), opened, picks["risk"](rng),
+                        _categories(rng, picks["category"], 1), assigned, responded, "submitted",
+                    )
+
+                closes = opened + rng.expovariate(1 / (MEAN_CASE_DAYS * 86400)) * RISK_NOTE_FACTORS[risk]
+                status = "closed" if closes < end_s else rng.choice(("open", "active_support"))
+                case_id = ids.id_at(int(opened * 1000), rng.getrandbits(80))
+                loader.add(case_id, "cases", (case_id, tenant.id, employee_id, referral_id, coordinator, status, _ts(opened)))
+
+                # Draw around the mean that is still left, so the total lands exactly on `preset.notes`.
+                left = cases - k
+                mean = remaining / left * RISK_NOTE_FACTORS[risk]
+                if left == 1:
+                    count = remaining
+                else:
+                    count = min(1 + int(rng.expovariate(1 / mean)) if mean > 1 else 1, remaining - (left - 1))
+                remaining -= count
+                window = min(closes, end_s) - opened
+                for j in range(count):
+                    interaction = min(opened + (window * (j + rng.random()) / count if j else rng.uniform(0, 3600)), end_s)
+                    created = min(interaction + rng.expovariate(1 / (20 * 3600)), end_s)
+                    final = rng.random() < (0.5 if end_s - interaction < 7 * 86400 else 0.93)
+                    note_id = ids.id_at(int(created * 1000), rng.getrandbits(80))
+                    areas = categories[:rng.randint(1, len(categories))]
+                    if rng.random() < 0.1:
+                        areas = list(dict.fromkeys([*areas, picks["category"](rng)]))
+                    at = _ts(interaction)
+                    loader.add(note_id, "progress_notes", (
+                        note_id, tenant.id, employee_id, case_id, coordinator, picks["note_type"](rng) if j else "intake",
+                        at[:10], at, picks["location"](rng), ",".join(areas),
+                        _summary(rng) if rng.random() < SUMMARY_SHARE else None, "final" if final else "draft", _ts(created),
+                    ))
+                    for row in records.code_links(tenant.id, note_id, areas):
+                        loader.add(note_id, "progress_note_areas_of_need", row)
+            loader.release()
+            loader.flush()
+        finally:
+            loaded = time.perf_counter()
+            for _, _, sql in saved:
+                conn.execute(sql)
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        kpis.rebuild_rows(cur)
+        rollups.rebuild_rows(cur)
+        dedupe.rebuild_keys(cur)
+        search.rebuild_index(cur)
+        conn.commit()
+        conn.execute("ANALYZE")
+        offenders = migrations.check_query_plans(conn) if check_plans else None
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+        if collecting:
+            gc.enable()
+    finished = time.perf_counter()
+    rows = sum(loader.counts.values())
+    report: dict[str, Any] = {
+        "preset": {"notes": preset.notes, "tenants": preset.tenants, "years": preset.years, "seed": seed},
+        "rows": loader.counts,
+        "load_s": round(loaded - started, 1),
+        "index_s": round(finished - loaded, 1),
+        "total_s": round(finished - started, 1),
+        "rows_per_s": round(rows / (loaded - started)),
+    }
+    if offenders is not None:
+        report["scans"] = offenders
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.synthetic", description="Generate a synthetic dataset.")
+    parser.add_argument("command", choices=["generate"])
+    parser.add_argument("--db", type=Path, default=db.DB_PATH)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="1k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--notes", type=int, help="override the preset's note count")
+    parser.add_argument("--tenants", type=int, help="override the preset's tenant count")
+    parser.add_argument("--years", type=float, help="override the preset's history length")
+    parser.add_argument("--check-plans", action="store_true", help="run the hot query plan check on the result")
+    args = parser.parse_args(argv)
+
+    overrides = {name: getattr(args, name) for name in ("notes", "tenants", "years") if getattr(args, name) is not None}
+    try:
+        report = generate(args.db, replace(PRESETS[args.preset], **overrides), args.seed, check_plans=args.check_plans)
+    except ValueError as exc:
+        print(json.dumps({"error": str(exc)}))
+        return 1
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("scans") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
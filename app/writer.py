@@ -0,0 +1,321 @@
+"""Group-commit write queue.
+
+Request handlers submit write units (callables taking a cursor) instead of
+committing on their own connections. A single writer thread per database
+file drains the queue, runs everything that arrived within the batching
+window inside one transaction (each unit under its own SAVEPOINT, so one
+failing unit does not roll back its neighbours), commits once and then
+resolves every caller's future. Reads keep using pooled connections.
+
+Subsystems that piggyback on the write transaction (the audit log) register
+`TransactionHooks`; they see each transaction begin, each unit's savepoint
+and rollback, and the commit or abort, in both write modes.
+
+  FAIR_CHANCE_WRITE_MODE       queue (default) or direct
+  FAIR_CHANCE_WRITE_WINDOW_MS  how long the writer waits for more units
+  FAIR_CHANCE_WRITE_MAX_BATCH  upper bound on units per transaction
+  FAIR_CHANCE_WRITE_TIMEOUT_S  how long `run_write` waits for its commit (default 30);
+                               a unit that times out may still commit later
+
+A writer that cannot open its database fails every queued unit with the
+error and closes, so the next write starts a fresh writer.
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Protocol, TypeVar
+
+from app import archive, db, metrics
+
+T = TypeVar("T")
+
+WRITE_MODE = os.environ.get("FAIR_CHANCE_WRITE_MODE", "queue")
+WRITE_WINDOW_MS = float(os.environ.get("FAIR_CHANCE_WRITE_WINDOW_MS", "2"))
+WRITE_MAX_BATCH = int(os.environ.get("FAIR_CHANCE_WRITE_MAX_BATCH", "256"))
+WRITE_TIMEOUT_SECONDS = float(os.environ.get("FAIR_CHANCE_WRITE_TIMEOUT_S", "30"))
+
+BATCH_SIZE_BUCKETS = (1, 4, 16, 64, 256)
+
+_STOP = object()
+
+
+class TransactionHooks(Protocol):
+    def begin(self) -> None: ...
+    def savepoint(self) -> Any: ...
+    def rollback_to(self, mark: Any) -> None: ...
+    def before_commit(self, cur: sqlite3.Cursor) -> None: ...
+    def after_commit(self) -> None: ...
+    def abort(self) -> None: ...
+    def close(self) -> None: ...
+
+
+_hooks: list[TransactionHooks] = []
+
+
+def register_hooks(hooks: TransactionHooks) -> None:
+    if hooks not in _hooks:
+        _hooks.append(hooks)
+
+
+def unregister_hooks(hooks: TransactionHooks) -> None:
+    if hooks in _hooks:
+        _hooks.remove(hooks)
+
+
+class _Unit:
+    __slots__ = ("fn", "future", "enqueued_at")
+
+    def __init__(self, fn: Callable[[sqlite3.Cursor], Any]) -> None:
+        self.fn = fn
+        self.future: Future[Any] = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class WriteQueue:
+    def __init__(self, path: Path | str, window_ms: float = WRITE_WINDOW_MS, max_batch: int = WRITE_MAX_BATCH) -> None:
+        self.path = Path(path)
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._depth = 0
+        self.max_depth = 0
+        self.batches = 0
+        self.units = 0
+        self.failed_units = 0
+        self.failed_batches = 0
+        self.max_batch_seen = 0
+        self.commit_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.batch_sizes = dict.fromkeys((*BATCH_SIZE_BUCKETS, "inf"), 0)
+
+    def submit(self, fn: Callable[[sqlite3.Cursor], T]) -> Future[T]:
+        unit = _Unit(fn)
+        # Under the lock, so every unit is queued ahead of close()'s _STOP or goes to a fresh writer.
+        with self._start_lock:
+            if not self._closed:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name=f"writer-{self.path.name}", daemon=True)
+                    self._thread.start()
+                with self._stats_lock:
+                    self._depth += 1
+                    self.max_depth = max(self.max_depth, self._depth)
+                self._queue.put(unit)
+                return unit.future
+        return get_writer(self.path).submit(fn)
+
+    def run(self, fn: Callable[[sqlite3.Cursor], T], timeout: float | None = WRITE_TIMEOUT_SECONDS) -> T:
+        """Submit `fn` and block until its batch has committed; re-raises its exception."""
+        return self.submit(fn).result(timeout)
+
+    def close(self, timeout: float | None = 10) -> None:
+        """Commit everything already queued, then stop the writer thread; later units go to a new writer."""
+        with self._start_lock:
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+            self._thread = None
+
+    def _loop(self) -> None:
+        try:
+            conn = sqlite3.connect(self.path, factory=db.TimedConnection)
+            try:
+                db.configure(conn)
+                archive.attach(conn, self.path)
+            except BaseException:
+                conn.close()
+                raise
+        except Exception as exc:
+            self._fail_pending(exc)
+            return
+        stopping = False
+        try:
+            while not stopping:
+                first = self._queue.get()
+                if first is _STOP:
+                    break
+                batch = [first]
+                deadline = time.monotonic() + self.window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        unit = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if unit is _STOP:
+                        stopping = True
+                        break
+                    batch.append(unit)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _fail_pending(self, exc: Exception) -> None:
+        """Close this writer (later units go to a new one) and fail everything already queued with `exc`."""
+        with self._start_lock:
+            self._closed = True
+        with self._stats_lock:
+            self.failed_batches += 1
+        while True:
+            try:
+                unit = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if unit is not _STOP:
+                with self._stats_lock:
+                    self._depth -= 1
+                unit.future.set_exception(exc)
+
+    def _commit(self, conn: sqlite3.Connection, batch: list[_Unit]) -> None:
+        started = time.perf_counter()
+        with self._stats_lock:
+            self._depth -= len(batch)
+            self.wait_seconds += sum(started - u.enqueued_at for u in batch)
+        cur = conn.cursor()
+        outcomes: list[tuple[_Unit, Any, BaseException | None]] = []
+        try:
+            for hooks in _hooks:
+                hooks.begin()
+            cur.execute("BEGIN IMMEDIATE")
+            for unit in batch:
+                cur.execute("SAVEPOINT unit")
+                marks = [hooks.savepoint() for hooks in _hooks]
+                try:
+                    result = unit.fn(cur)
+                except Exception as exc:
+                    cur.execute("ROLLBACK TO unit")
+                    cur.execute("RELEASE unit")
+                    for hooks, mark in zip(_hooks, marks):
+                        hooks.rollback_to(mark)
+                    outcomes.append((unit, None, exc))
+                else:
+                    cur.execute("RELEASE unit")
+                    outcomes.append((unit, result, None))
+            for hooks in _hooks:
+                hooks.before_commit(cur)
+            conn.commit()
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.rollback()
+            for hooks in _hooks:
+                hooks.abort()
+            with self._stats_lock:
+                self.failed_batches += 1
+            for unit in batch:
+                unit.future.set_exception(exc)
+            return
+        for hooks in _hooks:
+            hooks.after_commit()
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.batches += 1
+            self.units += len(batch)
+            self.failed_units += sum(1 for _, _, exc in outcomes if exc is not None)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.commit_seconds += elapsed
+            bucket = next((b for b in BATCH_SIZE_BUCKETS if len(batch) <= b), "inf")
+            self.batch_sizes[bucket] += 1
+        for unit, result, exc in outcomes:
+            if exc is None:
+                unit.future.set_result(result)
+            else:
+                unit.future.set_exception(exc)
+
+    def stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "queue_depth": self._depth,
+                "max_queue_depth": self.max_depth,
+                "batches": self.batches,
+                "units": self.units,
+                "failed_units": self.failed_units,
+                "failed_batches": self.failed_batches,
+                "avg_batch_size": round(self.units / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_histogram": {f"le_{k}": v for k, v in self.batch_sizes.items()},
+                "avg_queue_wait_ms": round(self.wait_seconds * 1000 / self.units, 3) if self.units else 0.0,
+                "avg_commit_ms": round(self.commit_seconds * 1000 / self.batches, 3) if self.batches else 0.0,
+            }
+
+
+_writers: dict[Path, WriteQueue] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: Path | str | None = None) -> WriteQueue:
+    key = Path(path) if path is not None else db.DB_PATH
+    writer = _writers.get(key)
+    if writer is None or writer._closed:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None or writer._closed:
+                writer = _writers[key] = WriteQueue(key)
+    return writer
+
+
+def run_write(fn: Callable[[sqlite3.Cursor], T], path: Path | str | None = None) -> T:
+    """Run `fn` in a committed write transaction, through the writer thread unless WRITE_MODE is direct."""
+    if WRITE_MODE != "direct":
+        with metrics.phase("write_txn"):
+            return get_writer(path).run(fn)
+    conn = db.get_db(path)
+    try:
+        for hooks in _hooks:
+            hooks.begin()
+        cur = conn.cursor()
+        try:
+            result = fn(cur)
+            for hooks in _hooks:
+                hooks.before_commit(cur)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            for hooks in _hooks:
+                hooks.abort()
+            raise
+        for hooks in _hooks:
+            hooks.after_commit()
+        return result
+    finally:
+        conn.close()
+
+
+def close_writer(path: Path | str) -> None:
+    """Commit what is queued for `path` and stop its writer thread."""
+    with _writers_lock:
+        writer = _writers.pop(Path(path), None)
+    if writer is not None:
+        writer.close()
+
+
+def close_writers() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+    # After the writers, so whatever their last batches handed over is flushed too.
+    for hooks in _hooks:
+        hooks.close()
+
+
+def writer_stats() -> dict[str, Any]:
+    return {"mode": WRITE_MODE, "writers": {w.path.name: w.stats() for w in list(_writers.values())}}
+
+
+atexit.register(close_writers)
@@ -0,0 +1,92 @@
+"""Benchmark hot/cold archival (`app.archive`) on years of case history.
+
+Fills a throwaway database with an `app.synthetic` preset (cases opened over
+several years and inserted in the order they were created, older ones mostly
+closed), then:
+
+  before   hot-table rows and B-tree bytes, plus latency of the tenant-wide
+           KPI queries that still scan a tenant's whole history
+           (coordinator KPIs and a cohort count) for the ten largest tenants
+  run      one archival pass: rows moved and rows per second
+  after    the same sizes and latencies on the now smaller hot tables
+
+  python scripts/bench_archive.py --preset 1m
+  python scripts/bench_archive.py --preset 1m --notes 800000 --tenants 20 --years 6
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+from app import archive, db, kpis, synthetic
+from app.writer import close_writers
+
+
+def _latency_ms(fn: Any, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(sorted(timings)[len(timings) // 2], 2)
+
+
+def measure(path: Path, args: argparse.Namespace) -> dict[str, Any]:
+    conn = db.get_db(path)
+    try:
+        cur = conn.cursor()
+        tenants = [row[0] for row in cur.execute("SELECT tenant_id FROM kpi_counters ORDER BY notes_total DESC LIMIT 10")]
+        sizes = archive.sizes(conn)
+        return {
+            "hot_rows": {table: sizes[table]["main"]["rows"] for table in archive.TABLES},
+            "hot_mb": {table: round(sizes[table]["main"]["bytes"] / 2**20, 1) for table in archive.TABLES},
+            "coordinator_kpis_p50_ms": _latency_ms(lambda: [kpis.coordinator_kpis(cur, t) for t in tenants], args.repeat),
+            "cohort_housing_p50_ms": _latency_ms(
+                lambda: [kpis.cohort_counters(cur, t, {"support_category": "housing"}) for t in tenants], args.repeat
+            ),
+        }
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(synthetic.PRESETS), default="1m")
+    parser.add_argument("--notes", type=int, help="override the preset's note count")
+    parser.add_argument("--tenants", type=int, help="override the preset's tenant count")
+    parser.add_argument("--years", type=float, help="override the preset's history length")
+    parser.add_argument("--retention-days", type=float, default=730)
+    parser.add_argument("--batch", type=int, default=archive.BATCH)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    overrides = {name: getattr(args, name) for name in ("notes", "tenants", "years") if getattr(args, name) is not None}
+    preset = replace(synthetic.PRESETS[args.preset], **overrides)
+    archive.ENABLED = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        generated = synthetic.generate(path, preset, args.seed)
+        before = measure(path, args)
+        report = archive.run(path, args.retention_days, args.batch, now=synthetic.END)
+        after = measure(path, args)
+        close_writers()
+        db.close_pools()
+        print(json.dumps({
+            "dataset": generated["preset"], "rows": generated["rows"], "generate_s": generated["total_s"],
+            "before": before, "archive_run": report, "after": after,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compare connect-per-request against the pooled connection manager.
+
+Each simulated request borrows a connection, validates an employee with a
+primary-key lookup, inserts a referral row, commits and releases the
+connection, which mirrors the shape of `POST /api/v1/referrals`.
+
+  python scripts/bench_db_pool.py --threads 8 --requests 2000
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from app.db import ConnectionPool
+from app.main import init_db
+
+
+def _request(conn: sqlite3.Connection) -> None:
+    cur = conn.cursor()
+    cur.execute("SELECT tenant_id FROM employees WHERE id=?", ("e-1",))
+    tenant = cur.fetchone()[0]
+    cur.execute(
+        """
+        INSERT INTO referrals(id,tenant_id,intake_path,source_type,employee_id,referral_status,risk_level,
+                              support_category_codes,submitted_by_user_id,submitted_at)
+        VALUES(?,?,?,?,?,?,?,?,?,?)
+        """,
+        (str(uuid4()), tenant, "referral", "manager", "e-1", "submitted", "low", "housing", "u-admin", "2026-01-01T00:00:00Z"),
+    )
+    conn.commit()
+
+
+def _run(label: str, threads: int, requests: int, work) -> dict:
+    latencies: list[float] = []
+    lock = threading.Lock()
+    per_thread = requests // threads
+
+    def worker() -> None:
+        local = []
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            work()
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "mode": label,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        init_db(path)
+        seed = sqlite3.connect(path)
+        seed.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES('e-1','tenant-bench','Ava','Reed')")
+        seed.commit()
+        seed.close()
+
+        def connect_per_request() -> None:
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                _request(conn)
+            finally:
+                conn.close()
+
+        pool = ConnectionPool(path, size=args.threads)
+
+        def pooled() -> None:
+            conn = pool.acquire()
+            try:
+                _request(conn)
+            finally:
+                conn.close()
+
+        results = [
+            _run("connect_per_request", args.threads, args.requests, connect_per_request),
+            _run("pooled", args.threads, args.requests, pooled),
+        ]
+        results[1]["pool"] = pool.stats()
+        pool.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
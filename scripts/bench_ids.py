@@ -0,0 +1,101 @@
+"""Benchmark time-ordered ids (`app.ids`) against uuid4 text primary keys.
+
+For each scheme, inserts `--rows` rows shaped like `referrals` (TEXT primary
+key, tenant list index that embeds the id) into a fresh database configured
+like the app's, `--batch` rows per transaction. Reports id generation cost,
+overall and final-window insert throughput (random keys slow down once the
+primary-key B-tree outgrows the page cache), file size and the size of each
+B-tree from `dbstat`.
+
+  python scripts/bench_ids.py --rows 10000000
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+from uuid import uuid4
+
+from app import db, ids
+
+SCHEMA = """
+CREATE TABLE referrals (
+    id TEXT PRIMARY KEY,
+    tenant_id TEXT NOT NULL,
+    employee_id TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    submitted_at TEXT NOT NULL
+);
+CREATE INDEX idx_referrals_tenant_submitted ON referrals(tenant_id, submitted_at, id);
+"""
+
+SCHEMES: dict[str, Callable[[], str]] = {"uuid4": lambda: str(uuid4()), "ulid": ids.new_id}
+
+
+def run(scheme: str, path: Path, args: argparse.Namespace) -> dict[str, Any]:
+    make_id = SCHEMES[scheme]
+    started = time.perf_counter()
+    for _ in range(100_000):
+        make_id()
+    generate_us = (time.perf_counter() - started) / 100_000 * 1e6
+
+    conn = sqlite3.connect(path)
+    db.configure(conn)
+    conn.executescript(SCHEMA)
+    rng = random.Random(args.seed)
+    window = max(args.rows // 10, args.batch)
+    inserted, window_started, window_rate = 0, time.perf_counter(), 0.0
+    started = time.perf_counter()
+    while inserted < args.rows:
+        n = min(args.batch, args.rows - inserted)
+        rows = [
+            (make_id(), f"t-{rng.randrange(args.tenants)}", f"e-{rng.randrange(100_000)}", "low", f"2026-01-01T00:00:{i % 60:02d}Z")
+            for i in range(n)
+        ]
+        with conn:
+            conn.executemany("INSERT INTO referrals VALUES(?,?,?,?,?)", rows)
+        inserted += n
+        if inserted % window == 0 or inserted == args.rows:
+            now = time.perf_counter()
+            window_rate = window / (now - window_started)
+            window_started = now
+    elapsed = time.perf_counter() - started
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    conn.close()
+    return {
+        "scheme": scheme,
+        "id_bytes": len(make_id()),
+        "generate_us": round(generate_us, 2),
+        "rows_per_s": round(args.rows / elapsed, 1),
+        "last_window_rows_per_s": round(window_rate, 1),
+        "file_mb": round(path.stat().st_size / 2**20, 1),
+        "btree_mb": {name: round(size / 2**20, 1) for name, size in sorted(sizes.items()) if not name.startswith("sqlite_schema")},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [run(scheme, Path(tmp) / f"{scheme}.db", args) for scheme in SCHEMES]
+    print(json.dumps({"rows": args.rows, "runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
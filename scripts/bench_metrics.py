@@ -0,0 +1,73 @@
+"""Measure the per-call cost of the metrics instrumentation.
+
+Times a primary-key SELECT through a plain sqlite3 connection and through
+`db.TimedConnection`, and a no-op handler with and without
+`metrics.instrument`, then reports the added microseconds per call. For the
+end-to-end effect, compare `scripts/loadtest.py` runs with
+FAIR_CHANCE_METRICS=0 and 1.
+
+  python scripts/bench_metrics.py --iterations 200000
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import sqlite3
+import time
+
+from app import metrics
+from app.db import TimedConnection
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) * 1e6 / iterations
+
+
+class _Handler:
+    command = "GET"
+    path = "/api/v1/kpis"
+    status_code = 0
+
+    def do_GET(self) -> None:  # noqa: N802
+        with metrics.phase("send"):
+            self.status_code = 200
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    def connect(factory: type[sqlite3.Connection]) -> sqlite3.Connection:
+        conn = sqlite3.connect(":memory:", factory=factory)
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+        conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, str(i)) for i in range(1000)])
+        return conn
+
+    plain, timed = connect(sqlite3.Connection), connect(TimedConnection)
+    select = "SELECT v FROM t WHERE id = ?"
+    handler = _Handler()
+    wrapped = metrics.instrument(lambda h: h.path)(_Handler.do_GET)
+
+    results = {
+        "sql_plain_us": _per_call_us(lambda: plain.execute(select, (7,)).fetchone(), args.iterations),
+        "sql_timed_us": _per_call_us(lambda: timed.execute(select, (7,)).fetchone(), args.iterations),
+        "handler_plain_us": _per_call_us(lambda: _Handler.do_GET(handler), args.iterations),
+        "handler_instrumented_us": _per_call_us(lambda: wrapped(handler), args.iterations),
+    }
+    results = {k: round(v, 3) for k, v in results.items()}
+    results["sql_overhead_us"] = round(results["sql_timed_us"] - results["sql_plain_us"], 3)
+    results["request_overhead_us"] = round(results["handler_instrumented_us"] - results["handler_plain_us"], 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
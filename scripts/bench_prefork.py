@@ -0,0 +1,132 @@
+"""Benchmark throughput scaling of the pre-fork server from 1 to N workers.
+
+For each worker count, starts `python -m app.main --workers N` against a
+fresh database, seeds it like `loadtest.py`, then drives the load-test mix
+from `--clients` client processes (each with `--concurrency` keep-alive
+connections, so the client side is not the single-GIL bottleneck) for
+`--duration` seconds. Reports throughput, latency percentiles, errors and
+the speed-up over the first worker count.
+
+  python scripts/bench_prefork.py --workers 1,2,4,8 --clients 8 --duration 15
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from loadtest import DEFAULT_MIX, RouteStats, _setup, _thread_worker, build_routes, parse_mix
+
+from app.metrics import Histogram
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _client(port: int, case_ids: list[str], mix: dict[str, int], duration: float, concurrency: int, seed: int) -> dict[str, Any]:
+    routes = build_routes(case_ids)
+    deadline = time.perf_counter() + duration
+    stats = [{name: RouteStats() for name in mix} for _ in range(concurrency)]
+    threads = [
+        threading.Thread(target=_thread_worker, args=("127.0.0.1", port, routes, mix, deadline, seed + i, stats[i]))
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = RouteStats()
+    for per_thread in stats:
+        for route in per_thread.values():
+            total.merge(route)
+    # Histograms hold a lock, so ship the raw counts back to the parent.
+    return {"counts": total.latency.counts, "count": total.latency.count, "sum": total.latency.sum,
+            "max": total.latency.max, "errors": total.errors}
+
+
+def _wait_ready(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Server on port {port} did not come up")
+
+
+def run(workers: int, args: argparse.Namespace, tmp: Path) -> dict[str, Any]:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.main", "--workers", str(workers), "--port", str(args.port),
+         "--mode", args.server_mode, "--db", str(tmp / f"bench-{workers}.db"), "--quiet"],
+        cwd=ROOT, stdout=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(args.port)
+        case_ids = _setup("127.0.0.1", args.port)
+        started = time.perf_counter()
+        with multiprocessing.get_context("fork").Pool(args.clients) as pool:
+            results = pool.starmap(
+                _client,
+                [(args.port, case_ids, args.mix, args.duration, args.concurrency, args.seed + 1000 * i) for i in range(args.clients)],
+            )
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(60)
+    latency = Histogram()
+    errors = 0
+    for result in results:
+        latency.counts = [a + b for a, b in zip(latency.counts, result["counts"])]
+        latency.count += result["count"]
+        latency.sum += result["sum"]
+        latency.max = max(latency.max, result["max"])
+        errors += result["errors"]
+    summary = latency.summary()
+    return {
+        "workers": workers,
+        "requests": summary.pop("count"),
+        "throughput_rps": round(latency.count / elapsed, 1),
+        "errors": errors,
+        **summary,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=f"1,2,4,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--server-mode", choices=("threaded", "asyncio"), default="threaded")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    counts = sorted({int(n) for n in args.workers.split(",") if n.strip()})
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [run(n, args, Path(tmp)) for n in counts]
+    base = runs[0]["throughput_rps"] or 1.0
+    for result in runs:
+        result["speedup"] = round(result["throughput_rps"] / base, 2)
+    print(json.dumps({"cpus": os.cpu_count(), "mix": args.mix, "runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark progress-note search against the old `LIKE` scan.
+
+Builds a throwaway database with `--notes` synthetic notes spread over
+`--tenants` tenants (the search triggers are live, so the load time includes
+indexing), then times first-page searches through `search.search()` and the
+equivalent `summary_of_meeting LIKE '%term%'` query for each term.
+
+  python scripts/bench_search.py --notes 1000000 --tenants 20
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app import search
+from app.db import get_db
+from app.main import init_db
+from app.metrics import Histogram
+
+WORDS = (
+    "discussed reviewed scheduled followed called met talked planned budget rent landlord lease deposit utility "
+    "bill childcare school transport license court hearing attorney probation resume interview shift schedule "
+    "overtime paycheck benefits clinic prescription counseling recovery meeting family support goal progress "
+    "week month application form voucher shelter food pantry credit debt savings account phone laptop training"
+).split()
+RARE = ("eviction", "bus pass", "expungement", "food stamps")
+TERMS = ("eviction", "\"bus pass\"", "expungement", "garnishment", "court hearing", "rent", "landl*")
+
+
+def _summary(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(12, 60))
+    if rng.random() < 0.02:
+        words.insert(rng.randrange(len(words)), rng.choice(RARE))
+    return " ".join(words).capitalize() + "."
+
+
+def load(path: Path, notes: int, tenants: int, seed: int) -> float:
+    rng = random.Random(seed)
+    init_db(path)
+    conn = get_db(path)
+    started = time.perf_counter()
+    batch = []
+    for i in range(notes):
+        tenant = f"t-{i % tenants}"
+        day = 1 + i * 7 // notes % 28
+        batch.append((
+            f"n-{i:08d}", tenant, f"e-{i % 5000}", f"c-{i % 20000}", "u-coord", "coaching_session", "2026-01-01",
+            f"2026-{1 + i % 12:02d}-{day:02d}T10:00:00Z", "office", "", _summary(rng), "final", "2026-01-01T00:00:00Z",
+        ))
+        if len(batch) == 10_000 or i == notes - 1:
+            conn.executemany(
+                "INSERT INTO progress_notes(id,tenant_id,employee_id,case_id,coordinator_id,note_type,note_start_date,"
+                "interaction_at,meeting_location,areas_of_need_codes,summary_of_meeting,status,created_at) "
+                "VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                batch,
+            )
+            conn.commit()
+            batch.clear()
+    elapsed = time.perf_counter() - started
+    search.rebuild(conn)  # merge the incremental segments, as a maintenance window would
+    conn.close()
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        load_s = load(path, args.notes, args.tenants, args.seed)
+        conn = get_db(path)
+        cur = conn.cursor()
+        results: dict[str, dict] = {}
+        for term in TERMS:
+            fts, like = Histogram(), Histogram()
+            like_term = "%" + term.strip('"*') + "%"
+            for r in range(args.repeat):
+                tenant = f"t-{r % args.tenants}"
+                started = time.perf_counter()
+                page = search.search(cur, tenant, {"q": term, "limit": "20"})
+                fts.observe((time.perf_counter() - started) * 1000)
+                if r < 3:  # the scan is slow enough that a few samples suffice
+                    started = time.perf_counter()
+                    cur.execute(
+                        "SELECT id FROM progress_notes WHERE tenant_id=? AND summary_of_meeting LIKE ? "
+                        "ORDER BY interaction_at DESC LIMIT 20",
+                        (tenant, like_term),
+                    ).fetchall()
+                    like.observe((time.perf_counter() - started) * 1000)
+            results[term] = {"fts": fts.summary(), "like": like.summary(), "first_page": len(page["items"])}
+        size_mb = sum(f.stat().st_size for f in Path(tmp).iterdir()) / 1e6
+        conn.close()
+    print(json.dumps({"notes": args.notes, "load_s": round(load_s, 1), "db_mb": round(size_mb, 1), "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Benchmark per-tenant shards against the shared database with 1,000+ tenants.
+
+Three measurements, each in a throwaway directory:
+
+  first touch   preparing a tenant's file the first time it is seen (a copy
+                of the migrated template) vs running every migration
+  random reads  a small indexed read for a random tenant, shared file vs
+                shards behind an LRU smaller than the tenant count, so the
+                shard numbers include eviction and reopen churn
+  isolation     write latency of small tenants while one large tenant bulk
+                imports, shared file vs shards
+
+  python scripts/bench_shards.py --tenants 1000 --max-open 128 --reads 20000
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from app import db, migrations, records, shards
+from app.main import init_db
+from app.metrics import Histogram
+from app.writer import close_writers, run_write
+
+READ_SQL = "SELECT COUNT(*) FROM employees WHERE tenant_id=? AND last_name=?"
+
+
+def _auth(tenant_id: str) -> dict[str, str]:
+    return {"tenant_id": tenant_id, "user_id": "u-bench", "role": "coordinator"}
+
+
+def _employees(n: int, rng: random.Random) -> list[dict[str, str]]:
+    return [{"first_name": f"F{rng.randrange(10_000)}", "last_name": f"L{rng.randrange(100)}"} for _ in range(n)]
+
+
+def _summary(latency: Histogram) -> dict[str, Any]:
+    return {k: v for k, v in latency.summary().items() if k in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms")}
+
+
+def first_touch(tmp: Path, tenants: int) -> dict[str, Any]:
+    cache = shards.ShardCache(tmp / "first-touch", max_open=tenants)
+    cache.path_for("warm-template")
+    started = time.perf_counter()
+    for i in range(tenants):
+        cache.path_for(f"t-{i}")
+    template = (time.perf_counter() - started) / tenants
+    cache.close()
+    started = time.perf_counter()
+    for i in range(min(tenants, 50)):
+        conn = sqlite3.connect(tmp / f"migrated-{i}.db")
+        db.configure(conn)
+        migrations.migrate(conn)
+        conn.close()
+    migrated = (time.perf_counter() - started) / min(tenants, 50)
+    return {"template_copy_ms": round(template * 1000, 2), "full_migrate_ms": round(migrated * 1000, 2)}
+
+
+def _seed(tenants: int, per_tenant: int, path_for: Any, seed: int) -> None:
+    rng = random.Random(seed)
+    for i in range(tenants):
+        tenant = f"t-{i}"
+        run_write(lambda cur, t=tenant: records.ingest_employees(cur, _auth(t), _employees(per_tenant, rng)), path_for(tenant))
+
+
+def random_reads(tmp: Path, args: argparse.Namespace) -> dict[str, Any]:
+    results = {}
+    for mode in ("shared", "tenant"):
+        shared = tmp / f"reads-{mode}.db"
+        init_db(shared)
+        cache = shards.ShardCache(tmp / f"reads-{mode}", max_open=args.max_open)
+        path_for = (lambda t: shared) if mode == "shared" else cache.path_for
+        _seed(args.tenants, args.per_tenant, path_for, args.seed)
+        rng = random.Random(args.seed)
+        latency = Histogram()
+        started = time.perf_counter()
+        for _ in range(args.reads):
+            tenant = f"t-{rng.randrange(args.tenants)}"
+            began = time.perf_counter()
+            conn = db.get_db(path_for(tenant))
+            try:
+                conn.execute(READ_SQL, (tenant, f"L{rng.randrange(100)}")).fetchone()
+            finally:
+                conn.close()
+            latency.observe((time.perf_counter() - began) * 1000)
+        elapsed = time.perf_counter() - started
+        results[mode] = {"reads_per_s": round(args.reads / elapsed, 1), **_summary(latency)}
+        if mode == "tenant":
+            results[mode]["lru"] = cache.stats()
+        cache.close()
+        close_writers()
+        db.close_pools()
+    return results
+
+
+def isolation(tmp: Path, args: argparse.Namespace) -> dict[str, Any]:
+    results = {}
+    for mode in ("shared", "tenant"):
+        shared = tmp / f"isolation-{mode}.db"
+        init_db(shared)
+        cache = shards.ShardCache(tmp / f"isolation-{mode}", max_open=args.max_open)
+        path_for = (lambda t: shared) if mode == "shared" else cache.path_for
+        small = [f"t-{i}" for i in range(1, 33)]
+        for tenant in ["t-0", *small]:
+            path_for(tenant)
+        stop = threading.Event()
+        imported = [0]
+
+        def bulk() -> None:
+            rng = random.Random(args.seed)
+            path = path_for("t-0")
+            while not stop.is_set():
+                run_write(lambda cur: records.ingest_employees(cur, _auth("t-0"), _employees(500, rng)), path)
+                imported[0] += 500
+
+        importer = threading.Thread(target=bulk)
+        importer.start()
+        rng = random.Random(args.seed + 1)
+        latency = Histogram()
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            tenant = rng.choice(small)
+            began = time.perf_counter()
+            run_write(lambda cur: records.ingest_employees(cur, _auth(tenant), _employees(1, rng)), path_for(tenant))
+            latency.observe((time.perf_counter() - began) * 1000)
+        stop.set()
+        importer.join()
+        results[mode] = {"bulk_rows": imported[0], "small_tenant_writes": _summary(latency)}
+        cache.close()
+        close_writers()
+        db.close_pools()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--per-tenant", type=int, default=20, help="employees seeded per tenant")
+    parser.add_argument("--max-open", type=int, default=128)
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of the isolation run per mode")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = {
+            "tenants": args.tenants,
+            "max_open": args.max_open,
+            "first_touch": first_touch(Path(tmp), args.tenants),
+            "random_reads": random_reads(Path(tmp), args),
+            "isolation": isolation(Path(tmp), args),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Concurrent mixed-workload load test.
+
+Starts the API in-process against a throwaway database, seeds a tenant, then
+drives a weighted mix of reads and writes from N concurrent keep-alive
+clients (threads or asyncio tasks) for a fixed duration. Latencies go into
+per-route histograms; the JSON report carries throughput, p50/p95/p99 and
+error rates per route. With `--baseline`, routes that regress past
+`--threshold` are listed and the exit status is 1.
+
+  python scripts/loadtest.py --duration 20 --concurrency 32 --out results.json
+  python scripts/loadtest.py --server-mode asyncio --client asyncio --baseline results.json
+  python scripts/loadtest.py --mix create_referral=1,get_kpis=10
+  python scripts/loadtest.py --preset 1m --db /tmp/loadtest-1m.db
+
+`--preset` first fills the database with an `app.synthetic` dataset, whose
+largest tenant is the one the load-test token belongs to, so reads and
+writes run against realistic volumes instead of an empty store.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import argparse
+import asyncio
+import http.client
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from app import db, synthetic
+from app.main import SERVE_MODES, AppHandler, init_db, make_server
+from app.metrics import Histogram
+from app.writer import close_writers
+
+TOKEN = "founder-admin-token"
+HEADERS = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+SETUP_CASES = 200
+
+DEFAULT_MIX = {
+    "create_referral": 3,
+    "create_case": 1,
+    "create_progress_note": 3,
+    "get_kpis": 5,
+    "list_referrals": 2,
+}
+
+Request = tuple[str, str, "dict[str, Any] | None"]
+
+
+def _referral(rng: random.Random) -> dict[str, Any]:
+    return {
+        "intake_path": rng.choice(["referral", "direct_engagement"]),
+        "source_type": rng.choice(["employee_self", "manager", "hr"]),
+        "employee_id": "e-1",
+        "risk_level": rng.choice(["low", "medium", "high"]),
+        "support_category_codes": rng.sample(["housing", "transportation", "finances", "childcare"], 2),
+    }
+
+
+def _note(rng: random.Random, case_ids: list[str]) -> dict[str, Any]:
+    return {
+        "employee_id": "e-1",
+        "case_id": rng.choice(case_ids),
+        "note_type": "coaching_session",
+        "note_start_date": "2026-02-01",
+        "interaction_at": f"2026-02-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00:00Z",
+        "meeting_location": rng.choice(["office", "phone", "video"]),
+        "areas_of_need_codes": ["housing"],
+        "status": rng.choice(["draft", "final"]),
+    }
+
+
+def build_routes(case_ids: list[str]) -> dict[str, Callable[[random.Random], Request]]:
+    return {
+        "create_referral": lambda rng: ("POST", "/api/v1/referrals", _referral(rng)),
+        "create_case": lambda rng: ("POST", "/api/v1/cases", {"employee_id": "e-1", "assigned_coordinator_id": "u-coord"}),
+        "create_progress_note": lambda rng: ("POST", "/api/v1/progress-notes", _note(rng, case_ids)),
+        "get_kpis": lambda rng: ("GET", "/api/v1/kpis", None),
+        "list_referrals": lambda rng: ("GET", "/api/v1/referrals?limit=50", None),
+    }
+
+
+def parse_mix(spec: str) -> dict[str, int]:
+    mix = {}
+    for part in filter(None, spec.split(",")):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+class RouteStats:
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.errors = 0
+        self.statuses: dict[str, int] = {}
+
+    def record(self, elapsed_ms: float, status: int | None) -> None:
+        self.latency.observe(elapsed_ms)
+        key = str(status) if status is not None else "exception"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+
+    def merge(self, other: RouteStats) -> None:
+        self.latency.merge(other.latency)
+        self.errors += other.errors
+        for key, n in other.statuses.items():
+            self.statuses[key] = self.statuses.get(key, 0) + n
+
+
+def _encode(method: str, path: str, payload: dict[str, Any] | None, host: str) -> bytes:
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in HEADERS.items())
+    return head.encode("latin-1") + b"\r\n" + body
+
+
+def _thread_worker(
+    host: str, port: int, routes: dict[str, Callable[[random.Random], Request]], mix: dict[str, int],
+    deadline: float, seed: int, stats: dict[str, RouteStats],
+) -> None:
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, payload = routes[name](rng)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=HEADERS)
+            resp = conn.getresponse()
+            resp.read()
+            status: int | None = resp.status
+        except (OSError, http.client.HTTPException):
+            status = None
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        stats[name].record((time.perf_counter() - started) * 1000, status)
+    conn.close()
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, _, header_block = head.partition(b"\r\n")
+    status = int(status_line.split()[1])
+    headers = http.client.parse_headers(io.BytesIO(header_block))
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif status != 304:
+        await reader.readexactly(int(headers.get("Content-Length", "0")))
+    return status
+
+
+async def _async_worker(
+    host: str, port: int, routes: dict[str, Callable[[random.Random], Request]], mix: dict[str, int],
+    deadline: float, seed: int, stats: dict[str, RouteStats],
+) -> None:
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    reader, writer = await asyncio.open_connection(host, port)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        request = _encode(*routes[name](rng), f"{host}:{port}")
+        started = time.perf_counter()
+        try:
+            writer.write(request)
+            status: int | None = await asyncio.wait_for(_read_response(reader), 30)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            status = None
+            writer.close()
+            reader, writer = await asyncio.open_connection(host, port)
+        stats[name].record((time.perf_counter() - started) * 1000, status)
+    writer.close()
+
+
+def _setup(host: str, port: int) -> list[str]:
+    """Seed the tenant and create the cases that progress notes attach to."""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.request("POST", "/api/v1/dev/seed", body=b"{}", headers=HEADERS)
+    conn.getresponse().read()
+    items = [{"employee_id": "e-1", "assigned_coordinator_id": "u-coord"}] * SETUP_CASES
+    conn.request("POST", "/api/v1/cases/bulk", body=json.dumps(items).encode("utf-8"), headers=HEADERS)
+    results = json.loads(conn.getresponse().read())["results"]
+    conn.close()
+    return [r["id"] for r in results if r["status_code"] == 200]
+
+
+def run_load(
+    server_mode: str, client: str, concurrency: int, duration: float, mix: dict[str, int], seed: int = 0
+) -> dict[str, Any]:
+    init_db()
+    server = make_server("127.0.0.1", 0, server_mode)
+    host, port = server.server_address[:2]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        routes = build_routes(_setup(host, port))
+        unknown = set(mix) - set(routes)
+        if unknown:
+            raise SystemExit(f"Unknown routes in mix: {sorted(unknown)}; choose from {sorted(routes)}")
+        per_worker = [{name: RouteStats() for name in mix} for _ in range(concurrency)]
+        started = time.perf_counter()
+        deadline = started + duration
+        if client == "threads":
+            workers = [
+                threading.Thread(target=_thread_worker, args=(host, port, routes, mix, deadline, seed + i, per_worker[i]))
+                for i in range(concurrency)
+            ]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        else:
+
+            async def main() -> None:
+                await asyncio.gather(
+                    *(_async_worker(host, port, routes, mix, deadline, seed + i, per_worker[i]) for i in range(concurrency))
+                )
+
+            asyncio.run(main())
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    combined = {name: RouteStats() for name in mix}
+    total = RouteStats()
+    for stats in per_worker:
+        for name, route in stats.items():
+            combined[name].merge(route)
+            total.merge(route)
+
+    def report(route: RouteStats) -> dict[str, Any]:
+        summary = route.latency.summary()
+        return {
+            "requests": summary.pop("count"),
+            "throughput_rps": round(route.latency.count / elapsed, 1),
+            "errors": route.errors,
+            "error_rate": round(route.errors / route.latency.count, 4) if route.latency.count else 0.0,
+            **summary,
+            "statuses": dict(sorted(route.statuses.items())),
+        }
+
+    return {
+        "config": {
+            "server_mode": server_mode,
+            "client": client,
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "mix": mix,
+            "seed": seed,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": report(total),
+        "routes": {name: report(route) for name, route in combined.items()},
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """List routes whose p95/p99 grew, throughput fell or error rate rose past `threshold`."""
+    regressions = []
+    for name, base in baseline.get("routes", {}).items():
+        current = results["routes"].get(name)
+        if current is None:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and current[key] > base[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {base[key]} -> {current[key]}")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput_rps {base['throughput_rps']} -> {current['throughput_rps']}")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error_rate {base['error_rate']} -> {current['error_rate']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load after setup")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--client", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--server-mode", choices=SERVE_MODES, default="threaded")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="name=weight,... (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", type=Path, help="database file (default: a temporary one)")
+    parser.add_argument("--preset", choices=sorted(synthetic.PRESETS), help="generate this synthetic dataset first")
+    parser.add_argument("--out", type=Path, help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", type=Path, help="report from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    parser.add_argument("--access-log", action="store_true", help="keep the per-request stderr log (off by default)")
+    args = parser.parse_args()
+
+    if not args.access_log:
+        AppHandler.log_message = lambda self, *a: None  # type: ignore[method-assign]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Handlers use the default database, so point it at the load-test file before anything opens it.
+        db.DB_PATH = args.db or Path(tmp) / "loadtest.db"
+        if args.preset:
+            synthetic.generate(db.DB_PATH, synthetic.PRESETS[args.preset], args.seed)
+        try:
+            results = run_load(args.server_mode, args.client, args.concurrency, args.duration, args.mix, args.seed)
+            results["config"]["preset"] = args.preset
+        finally:
+            close_writers()
+            db.close_pools()
+
+    if args.baseline:
+        results["regressions"] = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        args.out.write_text(text + "\n")
+    if results.get("regressions"):
+        print("\n".join(["Regressions:", *results["regressions"]]), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app import alerts, records
+from app.db import get_db
+from app.main import init_db, make_server
+
+PORT = 8141
+
+
+def test_compile_condition():
+    cond = alerts.compile_condition("referral_response_rate < 0.8")
+    assert cond.predicate(0.5) and not cond.predicate(0.9)
+    assert alerts.compile_condition("referral_response_rate < 0.8") is cond  # parsed once
+    assert alerts.compile_condition("time_to_case_assignment_hours > 24").deadline
+    for bad in ("weekly_session_attendance_rate < 0.6", "intake_volume >", "time_to_case_assignment_hours < 5"):
+        with pytest.raises(ValueError):
+            alerts.compile_condition(bad)
+
+
+def test_alerts_fire_and_resolve_incrementally(tmp_path):
+    path = tmp_path / "alerts.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    auth = {"tenant_id": "t-1", "user_id": "u-1"}
+    cur.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES('e-1','t-1','Ava','Reed')")
+    ratio = alerts.create_rule(cur, "t-1", {"name": "Slow responses", "condition": "referral_response_rate < 0.5"})
+    sla = alerts.create_rule(cur, "t-1", {
+        "name": "Assignment SLA Breach", "condition": "time_to_case_assignment_hours > 24", "severity": "high",
+    })
+
+    [(_, referral)] = records.ingest_referrals(cur, auth, [{
+        "intake_path": "referral", "source_type": "manager", "employee_id": "e-1", "risk_level": "low",
+        "support_category_codes": ["housing"], "assigned_coordinator_id": "u-coord",
+    }])
+    firing = alerts.list_alerts(cur, "t-1")
+    assert [(a["rule_id"], a["value"]) for a in firing] == [(ratio["id"], 0.0)]
+    [(due_at,)] = cur.execute("SELECT due_at FROM alert_deadlines WHERE entity_id=?", (referral["id"],)).fetchall()
+
+    assert alerts.sweep(cur, now="2000-01-01T00:00:00Z") == 0
+    assert alerts.sweep(cur, now=due_at) == 1
+    assert {a["rule_id"] for a in alerts.list_alerts(cur, "t-1")} == {ratio["id"], sla["id"]}
+    assert cur.execute("SELECT COUNT(*) FROM alert_deadlines").fetchone()[0] == 0
+
+    records.ingest_cases(cur, auth, [{"employee_id": "e-1", "assigned_coordinator_id": "u-coord", "referral_id": referral["id"]}])
+    assert alerts.list_alerts(cur, "t-1") == []
+    resolved = alerts.list_alerts(cur, "t-1", "resolved")
+    assert {a["rule_name"] for a in resolved} == {"Slow responses", "Assignment SLA Breach"}
+    assert all(a["resolved_at"] for a in resolved)
+    conn.close()
+
+
+def test_only_company_admins_create_alert_rules():
+    init_db()
+    server = make_server("127.0.0.1", PORT, "threaded")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.05)
+
+    def post(token):
+        body = json.dumps({"name": "Slow responses", "condition": "referral_response_rate < 0.5"}).encode()
+        req = urllib.request.Request(f"http://127.0.0.1:{PORT}/api/v1/alerts/rules", method="POST", data=body,
+                                     headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    try:
+        assert post("coordinator-token") == 403
+        assert post("manager-token") == 403
+        assert post("founder-admin-token") == 200
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,148 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app import archive, db, kpis, listing, migrations, records, rollups
+from app.cache import response_cache
+from app.main import init_db
+from app.writer import close_writers, run_write
+
+AUTH = {"tenant_id": "t-1", "user_id": "u-coord", "role": "coordinator"}
+# Everything the tests create is far older than two years at this point.
+LATER = datetime(2031, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture()
+def archive_db(tmp_path, monkeypatch):
+    path = tmp_path / "archive.db"
+    monkeypatch.setattr(archive, "ENABLED", True)
+    monkeypatch.setattr(db, "DB_PATH", path)
+    init_db(path)
+    yield path
+    close_writers()
+    db.close_pool(path)
+
+
+def _case(employee_id, referral_id=None, notes=(), closed=True):
+    def unit(cur):
+        [(_, case)] = records.ingest_cases(cur, AUTH, [{
+            "employee_id": employee_id, "referral_id": referral_id, "assigned_coordinator_id": "u-coord",
+        }])
+        for interaction_at in notes:
+            records.ingest_progress_notes(cur, AUTH, [{
+                "employee_id": employee_id, "case_id": case["id"], "note_type": "coaching_session",
+                "note_start_date": interaction_at[:10], "interaction_at": interaction_at, "meeting_location": "office",
+                "areas_of_need_codes": ["housing"],
+            }])
+        if closed:
+            # There is no close endpoint yet; this is what one would do.
+            cur.execute("UPDATE cases SET case_status='closed' WHERE id=?", (case["id"],))
+            kpis.bump(cur, AUTH["tenant_id"], cases_open=-1)
+        return case["id"]
+    return run_write(unit)
+
+
+def _referral(employee_id):
+    [(_, referral)] = run_write(lambda cur: records.ingest_referrals(cur, AUTH, [{
+        "intake_path": "referral", "source_type": "manager", "employee_id": employee_id, "risk_level": "high",
+        "support_category_codes": ["housing"],
+    }]))
+    return referral["id"]
+
+
+def _ids(conn, kind, params=None):
+    spec = listing.LISTS[kind]
+    sql, args, _ = listing.build_query(spec, "t-1", {"limit": "500", **(params or {})})
+    return sorted(row["id"] for row in conn.execute(sql, args))
+
+
+def test_closed_cases_move_with_their_notes_and_referrals_and_totals_hold(archive_db):
+    [(_, employee)] = run_write(lambda cur: records.ingest_employees(cur, AUTH, [{"first_name": "Ava", "last_name": "Reed"}]))
+    done = _case(employee["id"], _referral(employee["id"]), notes=["2026-01-05T10:00:00Z", "2026-02-05T10:00:00Z"])
+    active = _case(employee["id"], _referral(employee["id"]), notes=["2026-01-06T10:00:00Z"], closed=False)
+    recent = _case(employee["id"], notes=["2030-06-01T10:00:00Z"])
+    # Two cases from one referral: it stays hot while the open one points at it.
+    shared = _referral(employee["id"])
+    paired_closed = _case(employee["id"], shared)
+    paired_open = _case(employee["id"], shared, closed=False)
+
+    report = archive.run(archive_db, retention_days=730, batch=2, now=LATER)
+    assert report["moved"] == {
+        "referrals": 1, "referral_support_categories": 1, "cases": 2, "progress_notes": 2, "progress_note_areas_of_need": 2,
+    }
+    assert report["batches"] == 3
+
+    conn = db.get_db(archive_db)
+    try:
+        assert _ids(conn, "cases") == sorted([active, recent, paired_open])
+        assert _ids(conn, "cases", {"include": "archive"}) == sorted([done, active, recent, paired_closed, paired_open])
+        assert len(_ids(conn, "progress-notes", {"include": "archive", "case_id": done})) == 2
+        assert _ids(conn, "progress-notes", {"case_id": done}) == []
+        assert _ids(conn, "cases", {"include": "archive", "risk_level": "high"}) == sorted([done, active, paired_closed, paired_open])
+        assert len(_ids(conn, "referrals")) == 2 and len(_ids(conn, "referrals", {"include": "archive"})) == 3
+        # Counters and daily rollups were never touched, and still match the (hot + archived) rows.
+        assert kpis.verify(conn) == [] and rollups.verify(conn) == []
+        assert kpis.read_counters(conn.cursor(), "t-1")["notes_total"] == 4
+        sizes = archive.sizes(conn)
+        assert sizes["progress_notes"]["archive"]["rows"] == 2 and sizes["progress_notes"]["main"]["rows"] == 2
+    finally:
+        conn.close()
+
+    # A second pass finds nothing new.
+    assert sum(archive.run(archive_db, retention_days=730, now=LATER)["moved"].values()) == 0
+
+
+def test_a_case_that_changes_mid_move_stays_hot(archive_db):
+    [(_, employee)] = run_write(lambda cur: records.ingest_employees(cur, AUTH, [{"first_name": "Noah", "last_name": "Cole"}]))
+    case_id = _case(employee["id"], notes=["2026-01-05T10:00:00Z"])
+    cutoff = archive.cutoff_for(730, LATER)
+    run_write(archive.sync_schema)
+    _, copied = run_write(lambda cur: archive.copy_batch(cur, 0, 10, cutoff))
+    assert copied == [case_id]
+    run_write(lambda cur: cur.execute("UPDATE cases SET case_status='active_support' WHERE id=?", (case_id,)))
+    assert sum(run_write(lambda cur: archive.delete_batch(cur, copied)).values()) == 0
+
+    conn = db.get_db(archive_db)
+    try:
+        # The stale archived copy is shadowed by the hot row everywhere.
+        assert conn.execute("SELECT case_status FROM archive.cases").fetchone()[0] == "closed"
+        assert _ids(conn, "cases", {"include": "archive"}) == [case_id]
+        assert kpis.compute_counters(conn.cursor(), "t-1")["t-1"]["notes_total"] == 1
+        # Hot schema changes reach the archive on the next migrate.
+        conn.execute("ALTER TABLE cases ADD COLUMN closed_reason TEXT")
+        migrations.migrate(conn)
+        assert "closed_reason" in {row[1] for row in conn.execute("PRAGMA archive.table_info(cases)")}
+    finally:
+        conn.close()
+
+
+def test_cohort_and_coordinator_kpis_hold_and_cached_kpis_are_dropped(archive_db):
+    [(_, employee)] = run_write(lambda cur: records.ingest_employees(cur, AUTH, [{"first_name": "Ava", "last_name": "Reed"}]))
+    _case(employee["id"], _referral(employee["id"]), notes=["2026-01-05T10:00:00Z", "2026-02-05T10:00:00Z"])
+    _case(employee["id"], _referral(employee["id"]), notes=["2026-01-06T10:00:00Z"], closed=False)
+
+    def snapshot():
+        conn = db.get_db(archive_db)
+        try:
+            cur = conn.cursor()
+            return (
+                kpis.cohort_counters(cur, "t-1", {}),
+                kpis.cohort_counters(cur, "t-1", {"support_category": "housing"}, "risk_level"),
+                kpis.coordinator_kpis(cur, "t-1"),
+            )
+        finally:
+            conn.close()
+
+    before = snapshot()
+    assert before[0][None]["notes_total"] == 3 and before[1]["high"]["intake_volume"] == 2
+    generation = response_cache.generation("t-1")
+    response_cache.put("t-1", "kpis", b"{}", generation)
+
+    assert archive.run(archive_db, retention_days=730, now=LATER)["moved"]["cases"] == 1
+    assert snapshot() == before
+    assert response_cache.get("t-1", "kpis") is None and response_cache.generation("t-1") > generation
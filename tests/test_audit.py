@@ -0,0 +1,170 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app import audit, records
+from app.db import get_db
+from app.main import init_db, make_server
+from app.writer import WriteQueue
+
+PORT = 8101
+AUTH = {"tenant_id": "t-1", "user_id": "u-coord", "role": "coordinator"}
+REFERRAL = {
+    "intake_path": "referral", "source_type": "manager", "risk_level": "high",
+    "support_category_codes": ["housing"], "assigned_coordinator_id": "u-coord",
+}
+
+
+def _write_history(path):
+    writer = WriteQueue(path, window_ms=20)
+    [(_, employee)] = writer.run(lambda cur: records.ingest_employees(cur, AUTH, [{"first_name": "Ava", "last_name": "Reed"}]))
+    [(_, referral)] = writer.run(lambda cur: records.ingest_referrals(cur, AUTH, [{**REFERRAL, "employee_id": employee["id"]}]))
+
+    def fails(cur):
+        records.ingest_referrals(cur, AUTH, [{**REFERRAL, "employee_id": employee["id"]}])
+        raise RuntimeError("unit rolled back")
+
+    failed = writer.submit(fails)
+    case = writer.submit(lambda cur: records.ingest_cases(
+        cur, AUTH, [{"employee_id": employee["id"], "referral_id": referral["id"], "assigned_coordinator_id": "u-coord"}]
+    ))
+    with pytest.raises(RuntimeError):
+        failed.result(5)
+    [(_, case)] = case.result(5)
+    writer.close()
+    return employee["id"], referral["id"], case["id"]
+
+
+def _all(cur, tenant, **params):
+    items, cursor = [], None
+    while True:
+        page = audit.query(cur, tenant, {**params, "limit": "2", **({"cursor": cursor} if cursor else {})})
+        items += page["items"]
+        if not (cursor := page["next_cursor"]):
+            return items
+
+
+def test_db_sink_records_committed_writes_only(tmp_path):
+    path = tmp_path / "audit.db"
+    init_db(path)
+    employee_id, referral_id, case_id = _write_history(path)
+
+    conn = get_db(path)
+    cur = conn.cursor()
+    events = _all(cur, "t-1")
+    assert [(e["entity_type"], e["action"], e["entity_id"]) for e in events if e["entity_type"] != "case"] == [
+        ("employee", "create", employee_id), ("referral", "create", referral_id), ("referral", "update", referral_id),
+    ]
+    assert [e["entity_id"] for e in events if e["entity_type"] == "case"] == [case_id]
+    update = next(e for e in events if e["action"] == "update")
+    assert update["actor_id"] == "u-coord"
+    assert update["diff"]["referral_status"] == ["submitted", "converted_to_case"]
+    assert update["diff"]["first_response_at"][0] is None
+    assert next(e for e in events if e["entity_type"] == "employee")["diff"] == {"first_name": [None, "Ava"], "last_name": [None, "Reed"]}
+
+    assert [e["entity_id"] for e in _all(cur, "t-1", entity_id=referral_id)] == [referral_id, referral_id]
+    assert _all(cur, "t-1", to="2000-01-01") == [] and _all(cur, "t-2") == []
+    assert len(_all(cur, "t-1", **{"from": events[0]["occurred_at"][:10]})) == 4
+    for params in ({"from": "yesterday"}, {"limit": "0"}, {"cursor": "garbage"}, {"sort": "desc"}):
+        with pytest.raises(records.ApiError):
+            audit.query(cur, "t-1", params)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        cur.execute("UPDATE audit_events SET actor_id='someone-else'")
+    with pytest.raises(sqlite3.IntegrityError):
+        cur.execute("DELETE FROM audit_events")
+    conn.rollback()
+    conn.close()
+
+
+@pytest.mark.parametrize("durability", ["batch", "sync"])
+def test_file_sink_flushes_on_close_and_checksums(tmp_path, durability):
+    path = tmp_path / "audit.db"
+    init_db(path)
+    log = audit.configure("file", durability, tmp_path / "segments")
+    try:
+        employee_id, referral_id, _ = _write_history(path)
+        log.close()  # clean shutdown: nothing may stay buffered
+        assert log.stats()["buffered"] == 0 and log.stats()["written"] == 4
+
+        conn = get_db(path)
+        cur = conn.cursor()
+        assert cur.execute("SELECT COUNT(*) FROM audit_events").fetchone()[0] == 0
+        events = _all(cur, "t-1")
+        assert [e["entity_id"] for e in events if e["entity_type"] == "referral"] == [referral_id, referral_id]
+        assert _all(cur, "t-1", actor_id="u-coord", entity_type="employee")[0]["entity_id"] == employee_id
+        conn.close()
+
+        assert audit.main(["verify", "--dir", str(tmp_path / "segments")]) == 0
+        [(_, segment)] = log.segments.segments()
+        lines = segment.read_bytes().splitlines(keepends=True)
+        segment.write_bytes(b"".join(lines[:-1]) + lines[-1].replace(b"u-coord", b"u-evil"))
+        assert audit.main(["verify", "--dir", str(tmp_path / "segments")]) == 1
+        assert len(list(log.segments.scan("t-1", None, None))) == 3
+    finally:
+        audit.configure()
+
+
+def test_file_sink_pages_merge_process_chains_lazily(tmp_path, monkeypatch):
+    path = tmp_path / "audit.db"
+    init_db(path)
+    log = audit.configure("file", "sync", tmp_path / "segments")
+    try:
+        auth = dict(AUTH, user_id="u-admin")
+        times = [f"2026-03-0{day}T09:00:00Z" for day in range(1, 7)]
+        for pid, days in ((111, times[0::2]), (222, times[1::2])):
+            monkeypatch.setattr(audit.os, "getpid", lambda pid=pid: pid)
+            chain = audit.SegmentLog(tmp_path / "segments", segment_bytes=1)
+            for at in days:
+                chain.append([audit._event(auth, "case", at, "create", {}, at)])
+            chain.close()
+        monkeypatch.undo()
+
+        opened = []
+        read = audit.SegmentLog.read
+        monkeypatch.setattr(audit.SegmentLog, "read", staticmethod(lambda p: opened.append(p) or read(p)))
+        conn = get_db(path)
+        page = audit.query(conn.cursor(), "t-1", {"limit": "1"})
+        assert [e["occurred_at"] for e in page["items"]] == times[:1] and page["next_cursor"]
+        assert len(opened) < len(times)  # one page does not read every segment
+
+        assert [e["entity_id"] for e in _all(conn.cursor(), "t-1")] == times
+        conn.close()
+    finally:
+        audit.configure()
+
+
+def test_audit_events_endpoint_is_admin_only():
+    init_db()
+    server = make_server("127.0.0.1", PORT, "threaded")
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    def get(path, token):
+        req = urllib.request.Request(f"http://127.0.0.1:{PORT}{path}", headers={"Authorization": f"Bearer {token}"})
+        try:
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                return resp.status, json.loads(resp.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read().decode("utf-8"))
+
+    try:
+        assert get("/api/v1/audit-events", "coordinator-token")[0] == 403
+        status, body = get("/api/v1/audit-events?from=2026-01-01&limit=5", "founder-admin-token")
+        assert status == 200 and len(body["items"]) <= 5
+        assert all(e["tenant_id"] == "tenant-acme" for e in body["items"])
+        assert get("/api/v1/audit-events?from=soon", "founder-admin-token")[0] == 400
+    finally:
+        server.shutdown()
+        server.server_close()
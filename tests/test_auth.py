@@ -0,0 +1,131 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app import auth, prefork
+from app.main import init_db, make_server
+
+PORT = 8091
+BASE = f"http://127.0.0.1:{PORT}"
+SECRET = "test-secret"
+
+
+def _request(method: str, path: str, token: str, payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    req = urllib.request.Request(BASE + path, method=method, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf-8"))
+
+
+def test_hmac_tokens_verify_and_cache_until_expiry_or_revocation():
+    verifier = auth.HmacVerifier(SECRET)
+    authenticator = auth.Authenticator([auth.DevTokenVerifier(), verifier], auth.ClaimsCache(maxsize=2))
+    token = auth.issue_token("u-1", "t-1", "coordinator", secret=SECRET)
+    claims = authenticator.authenticate(token)
+    assert claims.as_auth() == {"user_id": "u-1", "tenant_id": "t-1", "role": "coordinator"}
+    assert authenticator.authenticate(token) == claims
+    assert authenticator.authenticate("coordinator-token").user_id == "u-coord"
+
+    header, payload, signature = token.split(".")
+    assert authenticator.authenticate(f"{header}.{payload}.{signature[:-2]}AA") is None
+    assert authenticator.authenticate(auth.issue_token("u-1", "t-1", "coordinator", secret="other")) is None
+    assert authenticator.authenticate(auth.issue_token("u-1", "t-1", "coordinator", ttl_seconds=-60, secret=SECRET)) is None
+    assert authenticator.authenticate(verifier.sign({"sub": "u-1", "tenant_id": "t-1", "role": "root", "exp": 2e9, "jti": "x"})) is None
+
+    stats = authenticator.stats()
+    assert (stats["hits"], stats["rejected"]) == (1, 4)
+
+    authenticator.revoke(claims.token_id, claims.expires_at)
+    assert authenticator.authenticate(token) is None
+
+    # Expired entries are not served from the cache; the LRU stays bounded.
+    short = auth.Claims("u-2", "t-1", "manager", time.time() - 60, "short")
+    authenticator.cache.put(b"digest", short)
+    assert authenticator.cache.get(b"digest", time.time()) is None
+    for n in range(3):
+        authenticator.authenticate(auth.issue_token(f"u-{n}", "t-1", "manager", secret=SECRET))
+    assert authenticator.cache.stats()["size"] == 2 and authenticator.cache.stats()["evictions"] >= 1
+
+    with pytest.raises(auth.AuthError):
+        auth.issue_token("u-1", "t-1", "root", secret=SECRET)
+    with pytest.raises(auth.AuthError):
+        auth.issue_token("u-1", "t-1", "manager", ttl_seconds=auth.MAX_TTL_SECONDS + 1, secret=SECRET)
+    long_lived = {"sub": "u-1", "tenant_id": "t-1", "role": "manager", "exp": time.time() + auth.MAX_TTL_SECONDS * 2, "jti": "y"}
+    assert authenticator.authenticate(verifier.sign(long_lived)) is None
+
+    # A revocation without a known expiry is kept no longer than any token can live.
+    authenticator.revoke("no-expiry")
+    assert authenticator.is_revoked("no-expiry")
+    assert not authenticator.is_revoked("no-expiry", time.time() + auth.MAX_TTL_SECONDS + 2 * auth.CLOCK_SKEW_SECONDS + 1)
+
+
+def test_expired_revocations_are_pruned_without_being_looked_up():
+    authenticator = auth.Authenticator([])
+    past = time.time() - auth.CLOCK_SKEW_SECONDS - 1
+    for n in range(100):
+        authenticator.revoke(f"old-{n}", past)
+    authenticator.revoke("again", past)
+    authenticator.revoke("again", time.time() + 60)  # revoked again: the earlier expiry must not drop it
+    authenticator.revoke("live", time.time() + 60)
+    assert authenticator.stats()["revoked"] == 2
+    assert authenticator.is_revoked("again") and authenticator.is_revoked("live")
+
+
+def test_dev_tokens_are_off_once_a_secret_is_set_unless_opted_in(monkeypatch):
+    monkeypatch.delenv("FAIR_CHANCE_DEV_TOKENS", raising=False)
+    assert auth.configure(secret=SECRET).authenticate("founder-admin-token") is None
+    assert auth.configure(secret="").authenticate("founder-admin-token") is not None
+    monkeypatch.setenv("FAIR_CHANCE_DEV_TOKENS", "1")
+    assert auth.configure(secret=SECRET).authenticate("founder-admin-token") is not None
+    auth.configure()
+
+
+def test_signed_token_over_http_and_logout(monkeypatch):
+    monkeypatch.setenv("FAIR_CHANCE_DEV_TOKENS", "1")
+    auth.configure(secret=SECRET)
+    init_db()
+    server = make_server("127.0.0.1", PORT, "threaded")
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+    try:
+        token = auth.issue_token("u-coord", "tenant-acme", "coordinator", secret=SECRET)
+        for _ in range(3):
+            assert _request("GET", "/api/v1/me", token) == (200, {"user_id": "u-coord", "tenant_id": "tenant-acme", "role": "coordinator"})
+        other = auth.issue_token("u-manager", "tenant-acme", "manager", secret=SECRET)
+        foreign = auth.issue_token("u-x", "tenant-other", "manager", secret=SECRET)
+        assert _request("POST", "/api/v1/auth/revoke", token, {"token": other})[0] == 403
+        assert _request("POST", "/api/v1/auth/revoke", "founder-admin-token", {})[0] == 400
+        assert _request("POST", "/api/v1/auth/revoke", "founder-admin-token", {"token": foreign})[0] == 404
+        assert _request("GET", "/api/v1/me", other)[0] == 200
+        assert _request("POST", "/api/v1/auth/revoke", "founder-admin-token", {"token": other})[0] == 200
+        assert _request("GET", "/api/v1/me", other)[0] == 401
+        assert _request("POST", "/api/v1/auth/revoke", token, {})[0] == 200
+        assert _request("GET", "/api/v1/me", token)[0] == 401
+
+        status, stats = _request("GET", "/api/v1/dev/stats", "founder-admin-token")
+        assert status == 200 and stats["auth_cache"]["hit_rate"] > 0 and stats["auth_cache"]["revoked"] == 2
+
+        # A full shared table is a retryable 503, not a 500.
+        auth.authenticator.share_revocations(prefork.SharedRevocations(slots=1))
+        first, second = (auth.issue_token(f"u-{n}", "tenant-acme", "manager", secret=SECRET) for n in range(2))
+        assert _request("POST", "/api/v1/auth/revoke", first, {})[0] == 200
+        assert _request("POST", "/api/v1/auth/revoke", second, {})[0] == 503
+        assert _request("GET", "/api/v1/me", second)[0] == 401  # still revoked in this process
+    finally:
+        server.shutdown()
+        server.server_close()
+        auth.configure()
@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from app import kpis
+from app.db import get_db
+from app.main import AppHandler, init_db
+
+PORT = 8031
+BASE = f"http://127.0.0.1:{PORT}"
+
+
+def _post(path: str, data: bytes, content_type: str = "application/json") -> dict:
+    headers = {"Authorization": "Bearer founder-admin-token", "Content-Type": content_type}
+    req = urllib.request.Request(BASE + path, method="POST", data=data, headers=headers)
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def test_bulk_ingest_json_and_ndjson():
+    init_db()
+    server = ThreadingHTTPServer(("127.0.0.1", PORT), AppHandler)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    referral = {
+        "intake_path": "referral",
+        "source_type": "hr",
+        "employee_id": "e-1",
+        "risk_level": "high",
+        "support_category_codes": ["housing"],
+        "assigned_coordinator_id": "u-coord",
+    }
+    try:
+        _post("/api/v1/dev/seed", b"{}")
+        out = _post("/api/v1/referrals/bulk", json.dumps([referral, {**referral, "risk_level": "extreme"}, {**referral, "employee_id": "nobody"}]).encode())
+        assert out["inserted"] == 1 and out["failed"] == 2
+        assert [r["status_code"] for r in out["results"]] == [200, 400, 404]
+        referral_id = out["results"][0]["id"]
+
+        cases = _post("/api/v1/cases/bulk", json.dumps({"items": [
+            {"employee_id": "e-1", "assigned_coordinator_id": "u-coord", "referral_id": referral_id},
+            {"employee_id": "e-1", "assigned_coordinator_id": "u-coord", "referral_id": referral_id},
+            {"employee_id": "e-2", "assigned_coordinator_id": "u-coord", "referral_id": referral_id},
+        ]}).encode())
+        assert [r["status_code"] for r in cases["results"]] == [200, 200, 400]
+        case_id = cases["results"][0]["id"]
+
+        note = {
+            "employee_id": "e-1",
+            "case_id": case_id,
+            "note_type": "follow_up",
+            "note_start_date": "2026-02-02",
+            "interaction_at": "2026-02-02T10:00:00Z",
+            "meeting_location": "phone",
+            "areas_of_need_codes": ["housing"],
+            "status": "final",
+        }
+        lines = [json.dumps(note), "{not json", json.dumps({**note, "note_start_date": "02/02/2026"}), json.dumps(note)]
+        notes = _post("/api/v1/progress-notes/bulk", "\n".join(lines).encode(), "application/x-ndjson")
+        assert [r["status_code"] for r in notes["results"]] == [200, 400, 400, 200]
+        assert notes["results"][1]["detail"] == "Invalid JSON on line 2"
+
+        conn = get_db()
+        assert kpis.verify(conn, "tenant-acme") == []
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
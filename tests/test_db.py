@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import threading
+
+import pytest
+
+from app.db import ConnectionPool, PoolTimeout
+
+
+def test_pool_reuses_configured_connections(tmp_path):
+    pool = ConnectionPool(tmp_path / "pool.db", size=2)
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    conn.execute("CREATE TABLE t (x)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()  # uncommitted work is rolled back on release
+
+    again = pool.acquire()
+    assert again is conn
+    assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    again.close()
+
+    stats = pool.stats()
+    assert stats["open"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+    pool.close()
+    assert pool.stats()["open"] == 0
+
+
+def test_pool_waits_when_exhausted(tmp_path):
+    pool = ConnectionPool(tmp_path / "pool.db", size=1, timeout=5)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    threading.Timer(0.05, held.close).start()
+    waiter.join(5)
+    assert got == [held]
+    assert pool.stats()["waits"] == 1
+
+    short = ConnectionPool(tmp_path / "pool.db", size=1, timeout=0.01)
+    short.acquire()
+    with pytest.raises(PoolTimeout):
+        short.acquire()
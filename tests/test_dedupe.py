@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import random
+import string
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from app import dedupe, records
+from app.db import get_db
+from app.main import init_db, make_server
+from app.dedupe import Person
+
+PORT = 8131
+
+
+def test_phonetic_and_similarity_helpers():
+    assert [dedupe.soundex(n) for n in ("Robert", "Rupert", "Ashcraft", "Tymczak", "Pfister")] == ["R163", "R163", "A261", "T522", "P236"]
+    assert dedupe.email_local("Ava.Reed+HR@example.com") == "avareed"
+    assert dedupe.jaro_winkler("martha", "marhta") == pytest.approx(0.9611, abs=1e-4)
+    assert dedupe.score(Person("José", "Núñez"), Person("Jose", "Nunez")) == 1.0
+    assert dedupe.score(Person("Reed", "Ava"), Person("Ava", "Reed")) == 1.0
+    assert dedupe.score(Person("Noah", "Cole"), Person("Ava", "Reed")) < 0.6
+
+
+def test_find_matches_scores_only_the_candidate_block(tmp_path):
+    path = tmp_path / "dedupe.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    auth = {"tenant_id": "t-1", "user_id": "u-1"}
+    results = records.ingest_employees(cur, auth, [
+        {"first_name": "Katherine", "last_name": "Smith"},
+        {"first_name": "Jon", "last_name": "Smith", "email": "jsmith@example.com"},
+        {"first_name": "Noah", "last_name": "Cole"},
+        {"first_name": "Ava"},
+    ])
+    records.ingest_employees(cur, {"tenant_id": "t-2", "user_id": "u-2"}, [{"first_name": "Catherine", "last_name": "Smith"}])
+    conn.commit()
+    assert [status for status, _ in results] == [200, 200, 200, 400]
+    katherine, jon = results[0][1]["id"], results[1][1]["id"]
+
+    matches = dedupe.find_matches(cur, "t-1", Person("Catherine", "Smith"))
+    assert [m["id"] for m in matches] == [katherine]
+    assert matches[0]["matched_on"] == ["tf"]
+    assert dedupe.find_matches(cur, "t-1", Person("John", "Smyth", "j.smith+intake@example.org"))[0]["id"] == jon
+    assert dedupe.find_matches(cur, "t-1", Person("Zed", "Quark")) == []
+
+    cur.execute("DELETE FROM employee_match_keys")
+    assert dedupe.rebuild_keys(cur) > 0
+    conn.commit()
+    assert [m["id"] for m in dedupe.find_matches(cur, "t-1", Person("Catherine", "Smith"))] == [katherine]
+
+    with pytest.raises(ValueError):
+        dedupe.parse_search({"first_name": "A", "last_name": "B", "limit": 0})
+    conn.close()
+
+
+def test_search_endpoint_finds_a_seeded_employee_with_swapped_names():
+    init_db()
+    server = make_server("127.0.0.1", PORT, "threaded")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.05)
+    headers = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
+
+    def post(path, payload):
+        req = urllib.request.Request(f"http://127.0.0.1:{PORT}{path}", method="POST", data=json.dumps(payload).encode(), headers=headers)
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.loads(resp.read())
+
+    try:
+        post("/api/v1/dev/seed", {})
+        candidates = post("/api/v1/employees/search", {"first_name": "Reed", "last_name": "Ava"})["candidates"]
+        assert candidates[0]["id"] == "e-1" and candidates[0]["score"] == 1.0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_batch_clusters_an_import_without_comparing_every_pair(tmp_path):
+    rng = random.Random(3)
+    word = lambda: "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))).title()
+    people = [{"first_name": word(), "last_name": word()} for _ in range(300)]
+    people += [
+        {"first_name": "Maria", "last_name": "Garcia", "email": "maria.garcia@example.com"},
+        {"first_name": "María", "last_name": "García"},
+        {"first_name": "Garcia", "last_name": "Maria"},
+        {"first_name": "M", "last_name": "Lopez", "email": "mariagarcia+work@example.com"},
+    ]
+    source = tmp_path / "import.jsonl"
+    source.write_text("\n".join(json.dumps(p) for p in people))
+    result = dedupe.dedupe_batch(list(dedupe.read_people(source)))
+    assert result["rows"] == 304
+    assert result["clusters"] == [[300, 301, 302, 303]]
+    assert result["comparisons"] < 304 * 303 // 2 // 10
@@ -0,0 +1,163 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import csv
+import gzip
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from app import db, exports, records, shards
+from app.db import get_db
+from app.main import _seed, init_db, make_server
+from app.writer import run_write
+
+PORT = 8061
+BASE = f"http://127.0.0.1:{PORT}"
+HEADERS = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
+
+
+def _request(method: str, path: str, payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(BASE + path, method=method, data=data, headers=HEADERS)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def _wait_for(export_id: str) -> dict:
+    for _ in range(200):
+        _, _, body = _request("GET", f"/api/v1/exports/{export_id}")
+        job = json.loads(body)
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("export did not finish")
+
+
+def test_export_jobs_stream_finished_files():
+    init_db()
+    server = make_server("127.0.0.1", PORT, "threaded")
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        _request("POST", "/api/v1/dev/seed", {})
+        _request("POST", "/api/v1/referrals", {
+            "intake_path": "referral",
+            "source_type": "manager",
+            "employee_id": "e-1",
+            "risk_level": "low",
+            "support_category_codes": ["housing", "finances"],
+        })
+        conn = get_db()
+        expected = conn.execute("SELECT COUNT(*) FROM referrals WHERE tenant_id='tenant-acme'").fetchone()[0]
+        conn.close()
+
+        status, _, body = _request("POST", "/api/v1/exports", {"entity": "referrals", "format": "ndjson", "compression": "gzip"})
+        assert status == 202
+        job = _wait_for(json.loads(body)["id"])
+        assert job["status"] == "completed" and job["rows_written"] == expected
+
+        status, headers, body = _request("GET", job["download_url"])
+        assert status == 200
+        assert headers["Transfer-Encoding"] == "chunked"
+        rows = [json.loads(line) for line in gzip.decompress(body).decode("utf-8").splitlines()]
+        assert len(rows) == expected
+        assert [r["submitted_at"] for r in rows] == sorted(r["submitted_at"] for r in rows)
+        assert isinstance(rows[0]["support_category_codes"], list)
+
+        status, _, body = _request("POST", "/api/v1/exports", {"entity": "cases", "format": "csv", "filters": {"status": "open"}})
+        job = _wait_for(json.loads(body)["id"])
+        _, _, body = _request("GET", job["download_url"])
+        table = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+        assert table[0][0] == "id" and len(table) == job["rows_written"] + 1
+
+        assert _request("POST", "/api/v1/exports", {"entity": "users"})[0] == 400
+        assert _request("GET", "/api/v1/exports/missing")[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_shutdown_finishes_running_exports_and_leaves_queued_ones(monkeypatch):
+    exports.shutdown()
+    started, release, ran = threading.Event(), threading.Event(), []
+
+    def run_job(job_id, path=None):
+        started.set()
+        release.wait(5)
+        ran.append(job_id)
+
+    monkeypatch.setattr(exports, "EXPORT_WORKERS", 1)
+    monkeypatch.setattr(exports, "run_job", run_job)
+    monkeypatch.setattr(exports.shards, "all_paths", lambda: [])
+    pool = exports._pool()
+    for job_id in ("a", "b", "c"):
+        pool.submit(exports.run_job, job_id, None)
+    assert started.wait(5)
+    threading.Timer(0.1, release.set).start()
+    exports.shutdown()
+    assert ran == ["a"]
+
+
+def test_an_export_keeps_its_shard_through_an_eviction_and_releases_it_after(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", tmp_path / "exports")
+    monkeypatch.setattr(exports, "EXPORT_CHUNK_ROWS", 2)
+    shards.configure("tenant", tmp_path / "shards", max_open=1)
+    try:
+        auth = {"tenant_id": "tenant-acme", "user_id": "u-admin", "role": "company_admin"}
+        path = shards.path_for("tenant-acme")
+        run_write(lambda cur: _seed(cur, "tenant-acme"), path)
+        referral = {"intake_path": "referral", "source_type": "manager", "employee_id": "e-1", "risk_level": "low",
+                    "support_category_codes": ["housing"]}
+        run_write(lambda cur: records.ingest_referrals(cur, auth, [referral] * 5), path)
+        run_write(lambda cur: cur.execute(
+            "INSERT INTO export_jobs(id, tenant_id, requested_by_user_id, entity, format, filters, status, created_at)"
+            " VALUES ('job-1', 'tenant-acme', 'u-admin', 'referrals', 'csv', '{}', 'queued', '2026-01-01T00:00:00Z')"
+        ), path)
+        pools = len(db._pools)
+
+        chunks = exports._chunks
+
+        def evicting_chunks(*args):
+            for n, rows in enumerate(chunks(*args)):
+                if n == 1:
+                    shards.path_for("tenant-other")  # evicts tenant-acme mid-export
+                yield rows
+
+        monkeypatch.setattr(exports, "_chunks", evicting_chunks)
+        exports.run_job("job-1", path)
+
+        assert path not in db._pools and len(db._pools) == pools
+        assert shards.stats()["retired"] == shards.stats()["pinned"] == 0
+        job = exports.get_job("tenant-acme", "job-1")
+        assert job["status"] == "completed" and job["rows_written"] == 5
+    finally:
+        shards.configure("shared")
+
+
+def test_export_files_stay_under_the_export_dir_whatever_the_tenant_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", tmp_path / "exports")
+    path = tmp_path / "exports.db"
+    init_db(path)
+    run_write(lambda cur: cur.execute(
+        "INSERT INTO export_jobs(id, tenant_id, requested_by_user_id, entity, format, filters, status, created_at)"
+        " VALUES ('job-1', '../../escape', 'u-admin', 'cases', 'csv', '{}', 'queued', '2026-01-01T00:00:00Z')"
+    ), path)
+    exports.run_job("job-1", path)
+    conn = get_db(path)
+    try:
+        status, file_path = conn.execute("SELECT status, file_path FROM export_jobs WHERE id='job-1'").fetchone()
+    finally:
+        conn.close()
+    assert status == "completed"
+    assert _P(file_path).resolve().parent.parent == (tmp_path / "exports").resolve()
@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from app import ids, records
+from app.main import init_db
+
+AUTH = {"tenant_id": "t-1", "user_id": "u-coord", "role": "coordinator"}
+
+
+def test_ids_are_compact_strictly_increasing_and_carry_their_time():
+    before = time.time_ns() // 1_000_000
+    batch = [ids.new_id() for _ in range(20_000)]
+    after = time.time_ns() // 1_000_000
+    assert len(set(batch)) == len(batch) and batch == sorted(batch)
+    assert all(len(i) == ids.LENGTH and set(i) <= set(ids.ALPHABET) for i in batch)
+    assert before <= ids.timestamp_ms(batch[0]) <= ids.timestamp_ms(batch[-1]) <= after
+
+    at = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    assert ids.min_id(at) < ids.min_id(at + timedelta(milliseconds=1))
+    assert ids.created_at(ids.min_id(at)) == at
+    assert ids.min_id(at) < batch[0]
+    assert ids.timestamp_ms(str(uuid4())) is None and ids.timestamp_ms("e-1") is None
+
+
+def test_forked_children_do_not_share_a_sequence():
+    ids.new_id()
+    read, write = os.pipe()
+    children = []
+    for _ in range(2):
+        pid = os.fork()
+        if pid == 0:
+            os.write(write, (",".join(ids.new_id() for _ in range(100)) + "\n").encode())
+            os._exit(0)
+        children.append(pid)
+    for pid in children:
+        os.waitpid(pid, 0)
+    os.close(write)
+    with os.fdopen(read) as fh:
+        minted = [i for line in fh for i in line.strip().split(",")]
+    assert len(minted) == 200 and len(set(minted)) == 200
+
+
+def test_legacy_uuid_rows_keep_working(tmp_path):
+    path = tmp_path / "ids.db"
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    legacy = str(uuid4())
+    conn.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES(?,?,?,?)", (legacy, "t-1", "Ava", "Reed"))
+    cur = conn.cursor()
+    [(status, referral)] = records.ingest_referrals(cur, AUTH, [{
+        "intake_path": "referral", "source_type": "manager", "employee_id": legacy, "risk_level": "low",
+        "support_category_codes": ["housing"],
+    }])
+    conn.commit()
+    assert status == 200 and ids.timestamp_ms(referral["id"]) is not None
+    assert conn.execute("SELECT employee_id FROM referrals WHERE id=?", (referral["id"],)).fetchone()[0] == legacy
+    conn.close()
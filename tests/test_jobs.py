@@ -0,0 +1,158 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import threading
+import time
+
+import pytest
+
+from app import ai, db, jobs, metrics, records
+from app.main import init_db
+from app.writer import close_writers, run_write
+
+AUTH = {"tenant_id": "t-1", "user_id": "u-coord", "role": "coordinator"}
+
+
+@pytest.fixture()
+def queue_db(tmp_path, monkeypatch):
+    path = tmp_path / "jobs.db"
+    init_db(path)
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(jobs, "BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "POLL_SECONDS", 0.05)
+    yield path
+    close_writers()
+    db.close_pool(path)
+
+
+def _wait(path, done, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = db.get_db(path)
+        try:
+            rows = [dict(r) for r in conn.execute("SELECT * FROM jobs ORDER BY enqueued_at, id")]
+        finally:
+            conn.close()
+        if done(rows):
+            return rows
+        time.sleep(0.02)
+    raise AssertionError(f"jobs did not finish: {rows}")
+
+
+def _finished(rows):
+    return rows and all(r["status"] not in ("queued", "running") for r in rows)
+
+
+def test_triage_and_note_summary_are_written_back(queue_db):
+    [(_, employee)] = run_write(lambda cur: records.ingest_employees(cur, AUTH, [{"first_name": "Ava", "last_name": "Reed"}]))
+    [(_, referral)] = run_write(lambda cur: records.ingest_referrals(cur, AUTH, [{
+        "intake_path": "referral", "source_type": "manager", "employee_id": employee["id"], "risk_level": "high",
+        "support_category_codes": ["housing", "transportation"],
+    }]))
+    [(_, case)] = run_write(lambda cur: records.ingest_cases(cur, AUTH, [{"employee_id": employee["id"], "assigned_coordinator_id": "u-coord"}]))
+    [(_, note)] = run_write(lambda cur: records.ingest_progress_notes(cur, AUTH, [{
+        "employee_id": employee["id"], "case_id": case["id"], "note_type": "coaching_session",
+        "note_start_date": "2026-03-01", "interaction_at": "2026-03-01T10:00:00Z", "meeting_location": "office",
+        "areas_of_need_codes": ["housing"],
+        "summary_of_meeting": "Reviewed the lease. Landlord wants a deposit. Ava will submit the voucher form by Friday.",
+    }]))
+    # An identical pending job is not queued twice.
+    assert run_write(lambda cur: jobs.enqueue(cur, "t-1", ai.TRIAGE, [referral["id"]])) == 0
+    assert [r["kind"] for r in _wait(queue_db, lambda rows: len(rows) == 2)] == [ai.TRIAGE, ai.NOTE_SUMMARY]
+
+    queue = jobs.JobQueue(workers=2)
+    queue.start()
+    try:
+        rows = _wait(queue_db, _finished)
+    finally:
+        queue.stop()
+    assert [r["status"] for r in rows] == ["succeeded", "succeeded"] and queue.outcomes["succeeded"] == 2
+
+    conn = db.get_db(queue_db)
+    try:
+        stored = dict(conn.execute("SELECT ai_summary, ai_priority_score, ai_triage FROM referrals WHERE id=?", (referral["id"],)).fetchone())
+        summary = dict(conn.execute("SELECT ai_summary, ai_action_items FROM progress_notes WHERE id=?", (note["id"],)).fetchone())
+        actors = [r[0] for r in conn.execute("SELECT actor_id FROM audit_events WHERE action='update' AND tenant_id='t-1'")]
+    finally:
+        conn.close()
+    # The stand-in is deterministic, so the stored output is exactly the model's.
+    expected = ai.LocalModel().triage({
+        "intake_path": "referral", "source_type": "manager", "risk_level": "high",
+        "support_category_codes": ["housing", "transportation"], "assigned_coordinator_id": None,
+    })
+    assert stored["ai_summary"] == expected["summary"] and stored["ai_priority_score"] == expected["priority_score"] == 75.0
+    assert json.loads(stored["ai_triage"])["urgency"] == "high"
+    assert summary["ai_summary"] == "Reviewed the lease. Landlord wants a deposit."
+    assert [item["text"] for item in json.loads(summary["ai_action_items"])] == ["Ava will submit the voucher form by Friday"]
+    assert actors == [ai.SYSTEM_USER, ai.SYSTEM_USER]
+
+
+def test_failures_retry_with_backoff_then_fail(queue_db):
+    calls = {"flaky": 0, "broken": 0}
+
+    def flaky(job):
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise TimeoutError("model timed out")
+        return None
+
+    def broken(job):
+        calls["broken"] += 1
+        raise ValueError("unparseable model output")
+
+    jobs.register("test_flaky", flaky)
+    jobs.register("test_broken", broken)
+    run_write(lambda cur: jobs.enqueue(cur, "t-1", "test_flaky", ["x"], max_attempts=3))
+    run_write(lambda cur: jobs.enqueue(cur, "t-1", "test_broken", ["y"], max_attempts=2))
+    queue = jobs.JobQueue(workers=1)
+    queue.start()
+    try:
+        rows = {r["kind"]: r for r in _wait(queue_db, _finished)}
+    finally:
+        queue.stop()
+    assert rows["test_flaky"]["status"] == "succeeded" and rows["test_flaky"]["attempts"] == 3
+    assert rows["test_broken"]["status"] == "failed" and rows["test_broken"]["attempts"] == 2
+    assert rows["test_broken"]["last_error"] == "ValueError: unparseable model output"
+    assert queue.outcomes["retried"] == 3 and queue.outcomes["failed"] == 1
+    assert 'fair_chance_jobs_total{kind="test_flaky",outcome="retried"}' in metrics.registry.render()
+
+
+def test_tenant_concurrency_limit_and_expired_leases(queue_db):
+    running, peak, release = {}, {}, threading.Event()
+    lock = threading.Lock()
+
+    def slow(job):
+        with lock:
+            running[job.tenant_id] = running.get(job.tenant_id, 0) + 1
+            peak[job.tenant_id] = max(peak.get(job.tenant_id, 0), running[job.tenant_id])
+        release.wait(5)
+        with lock:
+            running[job.tenant_id] -= 1
+        return None
+
+    jobs.register("test_slow", slow)
+    run_write(lambda cur: jobs.enqueue(cur, "busy", "test_slow", [f"b-{i}" for i in range(5)]))
+    run_write(lambda cur: jobs.enqueue(cur, "quiet", "test_slow", ["q-0"]))
+    # A job whose worker died: still `running`, lease long gone.
+    run_write(lambda cur: cur.execute(
+        "INSERT INTO jobs(id,tenant_id,kind,entity_id,payload,dedupe_key,status,attempts,max_attempts,run_after,lease_until,enqueued_at)"
+        " VALUES('orphan','quiet','test_slow','q-1','{}','k','running',1,5,0,1,0)"
+    ))
+    queue = jobs.JobQueue(workers=4, tenant_concurrency=2)
+    queue.start()
+    try:
+        # Four workers, but "busy" may only hold two; the rest go to "quiet".
+        _wait(queue_db, lambda rows: sum(r["status"] == "running" for r in rows) == 4)
+        assert "# TYPE fair_chance_jobs_depth gauge" in metrics.registry.render()
+        assert queue.stats()["depth"]["test_slow:running"] == 4
+        release.set()
+        rows = _wait(queue_db, _finished)
+    finally:
+        release.set()
+        queue.stop()
+    assert peak == {"busy": 2, "quiet": 2}
+    assert all(r["status"] == "succeeded" for r in rows)
+    assert {r["id"]: r["attempts"] for r in rows}["orphan"] == 2
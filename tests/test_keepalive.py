@@ -0,0 +1,142 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import http.client
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from app import aio
+from app.main import SERVE_MODES, init_db, make_server
+
+PORT = 8041
+
+
+@pytest.mark.parametrize("mode", SERVE_MODES)
+def test_persistent_connection_serves_many_requests(mode):
+    init_db()
+    server = make_server("127.0.0.1", PORT, mode)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=5)
+        headers = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
+        conn.request("POST", "/api/v1/dev/seed", body=b"{}", headers=headers)
+        resp = conn.getresponse()
+        assert resp.status == 200 and resp.version == 11
+        resp.read()
+        sock = conn.sock
+        for _ in range(5):
+            conn.request("GET", "/api/v1/kpis", headers=headers)
+            resp = conn.getresponse()
+            assert resp.status == 200
+            json.loads(resp.read())
+        conn.request("POST", "/api/v1/referrals", body=b'{"x": 1}', headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        assert resp.status == 401
+        resp.read()
+        assert conn.sock is None or conn.sock is sock
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_asyncio_mode_answers_pipelined_requests_in_order():
+    server = make_server("127.0.0.1", PORT + 1, "asyncio")
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        with socket.create_connection(("127.0.0.1", PORT + 1), timeout=5) as sock:
+            auth = b"Authorization: Bearer coordinator-token\r\n"
+            sock.sendall(
+                b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n"
+                + b"GET /api/v1/me HTTP/1.1\r\nHost: x\r\n" + auth + b"\r\n"
+                + b"GET /nope HTTP/1.1\r\nHost: x\r\n" + auth + b"Connection: close\r\n\r\n"
+            )
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+        statuses = re.findall(rb"HTTP/1\.1 (\d{3}) ", data)
+        assert statuses == [b"200", b"200", b"404"]
+        assert b'"user_id": "u-coord"' in data
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_asyncio_mode_caps_bodies_but_streams_bulk_imports(monkeypatch):
+    monkeypatch.setattr(aio, "MAX_BODY_BYTES", 1024)
+    init_db()
+    server = make_server("127.0.0.1", PORT + 2, "asyncio")
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        headers = {"Authorization": "Bearer coordinator-token", "Content-Type": "application/json"}
+        conn = http.client.HTTPConnection("127.0.0.1", PORT + 2, timeout=5)
+        conn.request("POST", "/api/v1/referrals", body=b" " * 2048 + b"{}", headers=headers)
+        resp = conn.getresponse()
+        assert resp.status == 413
+        resp.read()
+        conn.close()
+
+        rows = b"".join(b'{"first_name": "Pat", "last_name": "Lee%d"}\n' % n for n in range(200))
+        assert len(rows) > 1024
+        conn = http.client.HTTPConnection("127.0.0.1", PORT + 2, timeout=5)
+        conn.request("POST", "/api/v1/employees/bulk", body=rows, headers={**headers, "Content-Type": "application/x-ndjson"})
+        resp = conn.getresponse()
+        assert resp.status == 200 and json.loads(resp.read())["inserted"] == 200
+        conn.request("GET", "/api/v1/me", headers=headers)
+        resp = conn.getresponse()
+        assert resp.status == 200
+        resp.read()
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_asyncio_mode_drops_a_client_that_stops_reading(monkeypatch):
+    monkeypatch.setattr(aio, "KEEPALIVE_TIMEOUT", 0.3)
+    outcome = []
+
+    class Flood(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            try:
+                for _ in range(4096):  # far more than the socket buffers hold
+                    self.wfile.write(b"x" * 65536)
+                outcome.append("sent")
+            except ConnectionError:
+                outcome.append("aborted")
+                raise
+
+    server = aio.AsyncHTTPServer(("127.0.0.1", PORT + 3), Flood)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        with socket.create_connection(("127.0.0.1", PORT + 3), timeout=5) as sock:
+            sock.sendall(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n")
+            deadline = time.monotonic() + 5
+            while not outcome and time.monotonic() < deadline:
+                time.sleep(0.05)
+        assert outcome == ["aborted"]
+    finally:
+        server.shutdown()
+        server.server_close()
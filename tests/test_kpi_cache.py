@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from app.cache import ResponseCache
+from app.main import AppHandler, init_db
+
+PORT = 8021
+BASE = f"http://127.0.0.1:{PORT}"
+HEADERS = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
+
+
+def _request(method: str, path: str, payload: dict | None = None, headers: dict | None = None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(BASE + path, method=method, data=data, headers={**HEADERS, **(headers or {})})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_kpis_etag_and_invalidation():
+    init_db()
+    server = ThreadingHTTPServer(("127.0.0.1", PORT), AppHandler)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        _request("POST", "/api/v1/dev/seed", {})
+        status, headers, body = _request("GET", "/api/v1/kpis")
+        assert status == 200
+        etag = headers["ETag"]
+
+        status, headers, body = _request("GET", "/api/v1/kpis", headers={"If-None-Match": etag})
+        assert status == 304
+        assert body == b""
+        assert headers["ETag"] == etag
+
+        _request("POST", "/api/v1/referrals", {
+            "intake_path": "direct_engagement",
+            "source_type": "employee_self",
+            "employee_id": "e-2",
+            "risk_level": "low",
+            "support_category_codes": ["finances"],
+        })
+        status, headers, body = _request("GET", "/api/v1/kpis", headers={"If-None-Match": etag})
+        assert status == 200
+        assert headers["ETag"] != etag
+
+        status, headers, body = _request("GET", "/api/v1/kpis?group_by=support_category&intake_path=direct_engagement")
+        assert status == 200
+        cohort = json.loads(body)
+        assert cohort["cohort"] == {"intake_path": "direct_engagement"}
+        assert any(g["support_category"] == "finances" and g["intake_volume"] >= 1 for g in cohort["groups"])
+        status, _, _ = _request("GET", "/api/v1/kpis?group_by=support_category&intake_path=direct_engagement",
+                                headers={"If-None-Match": headers["ETag"]})
+        assert status == 304
+        assert _request("GET", "/api/v1/kpis?group_by=shoe_size")[0] == 400
+        assert _request("GET", "/api/v1/kpis?risk_level=extreme")[0] == 400
+
+        status, headers, body = _request("GET", "/api/v1/kpis/coordinators?response_sla_hours=24")
+        assert status == 200 and json.loads(body)["response_sla_hours"] == 24.0
+        assert _request("GET", "/api/v1/kpis/coordinators?response_sla_hours=24", headers={"If-None-Match": headers["ETag"]})[0] == 304
+
+        # Spellings of the same query share one cache entry.
+        _, _, stats = _request("GET", "/api/v1/dev/stats")
+        entries = json.loads(stats)["response_cache"]["entries"]
+        for query in ("response_sla_hours=24.0", "note_sla_hours=72&response_sla_hours=024", "response_sla_hours=1&response_sla_hours=24"):
+            assert _request("GET", f"/api/v1/kpis/coordinators?{query}")[0] == 200
+        _, _, stats = _request("GET", "/api/v1/dev/stats")
+        assert json.loads(stats)["response_cache"]["entries"] == entries
+
+        _, _, stats = _request("GET", "/api/v1/dev/stats")
+        cache_stats = json.loads(stats)["response_cache"]
+        assert cache_stats["hits"] >= 1 and cache_stats["invalidations"] >= 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stale_put_is_not_cached():
+    cache = ResponseCache()
+    generation = cache.generation("t-1")
+    cache.invalidate("t-1")
+    cache.put("t-1", "kpis", b"{}", generation)
+    assert cache.get("t-1", "kpis") is None
+    assert cache.stats()["stale_puts"] == 1
+
+
+def test_entries_are_bounded_per_tenant_least_recently_used_first():
+    cache = ResponseCache(maxsize=2)
+    for key in ("a", "b"):
+        cache.put("t-1", key, b"{}", cache.generation("t-1"))
+    cache.get("t-1", "a")
+    cache.put("t-1", "c", b"{}", cache.generation("t-1"))
+    cache.put("t-2", "a", b"{}", cache.generation("t-2"))
+    assert cache.get("t-1", "b") is None
+    assert cache.get("t-1", "a") is not None and cache.get("t-1", "c") is not None
+    assert cache.stats()["entries"] == 3 and cache.stats()["evictions"] == 1
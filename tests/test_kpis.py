@@ -0,0 +1,123 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import pytest
+
+from app import kpis, records
+from app.db import get_db
+from app.main import init_db
+
+
+def test_counters_verify_and_rebuild(tmp_path):
+    path = tmp_path / "kpis.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO referrals(id,tenant_id,intake_path,source_type,employee_id,referral_status,risk_level,"
+        "support_category_codes,submitted_by_user_id,assigned_coordinator_id,submitted_at) "
+        "VALUES('r-1','t-1','referral','manager','e-1','submitted','low','housing','u-1','u-coord','2026-01-01T00:00:00Z')"
+    )
+    kpis.bump(cur, "t-1", intake_volume=1, referrals_assigned=1)
+    cur.execute(
+        "INSERT INTO progress_notes(id,tenant_id,employee_id,case_id,coordinator_id,note_type,note_start_date,"
+        "interaction_at,meeting_location,areas_of_need_codes,status,created_at) "
+        "VALUES('n-1','t-1','e-1','c-1','u-coord','intake','2026-01-01','2026-01-01T00:00:00Z','office','housing','final','2026-01-01T00:00:00Z')"
+    )
+    conn.commit()
+
+    assert kpis.verify(conn) == [
+        {"tenant_id": "t-1", "counter": "notes_total", "stored": 0, "expected": 1},
+        {"tenant_id": "t-1", "counter": "notes_final", "stored": 0, "expected": 1},
+    ]
+
+    assert kpis.rebuild(conn) == 1
+    assert kpis.verify(conn) == []
+    payload = kpis.kpi_payload(kpis.read_counters(cur, "t-1"))
+    assert payload["intake_volume"] == 1
+    assert payload["employee_engagement_count"] == 1
+    assert payload["progress_note_submission_rate"] == 1.0
+    assert kpis.read_counters(cur, "t-missing") == dict.fromkeys(kpis.COUNTER_COLUMNS, 0)
+    conn.close()
+
+
+def test_cohort_counters_use_junction_tables(tmp_path):
+    path = tmp_path / "cohort.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    auth = {"tenant_id": "t-1", "user_id": "u-1"}
+    cur.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES('e-1','t-1','Ava','Reed')")
+    referral = {"intake_path": "referral", "source_type": "manager", "employee_id": "e-1", "assigned_coordinator_id": "u-coord"}
+    results = records.ingest_referrals(cur, auth, [
+        {**referral, "risk_level": "low", "support_category_codes": ["housing", "finances", "housing"]},
+        {**referral, "risk_level": "high", "support_category_codes": ["housing"]},
+        {**referral, "risk_level": "high", "support_category_codes": ["childcare"], "intake_path": "direct_engagement"},
+    ])
+    ids = [body["id"] for _, body in results]
+    [(_, case)] = records.ingest_cases(cur, auth, [{"employee_id": "e-1", "assigned_coordinator_id": "u-coord", "referral_id": ids[1]}])
+    records.ingest_progress_notes(cur, auth, [{
+        "employee_id": "e-1", "case_id": case["id"], "note_type": "intake", "note_start_date": "2026-01-01",
+        "interaction_at": "2026-01-01T10:00:00Z", "meeting_location": "office", "areas_of_need_codes": ["housing"],
+        "status": "final",
+    }])
+    conn.commit()
+
+    assert cur.execute("SELECT COUNT(*) FROM referral_support_categories").fetchone()[0] == 4
+    housing = kpis.cohort_counters(cur, "t-1", {"support_category": "housing"})[None]
+    assert housing["intake_volume"] == 2 and housing["cases_open"] == 1 and housing["notes_final"] == 1
+    assert housing["referrals_responded"] == 1
+
+    by_risk = kpis.cohort_counters(cur, "t-1", {"intake_path": "referral"}, "risk_level")
+    assert {k: v["intake_volume"] for k, v in by_risk.items()} == {"low": 1, "high": 1}
+    by_category = kpis.cohort_counters(cur, "t-1", {}, "support_category")
+    assert {k: v["intake_volume"] for k, v in by_category.items()} == {"housing": 2, "finances": 1, "childcare": 1}
+    assert kpis.cohort_counters(cur, "t-1", {"support_category": "none"})[None] == dict.fromkeys(kpis.COUNTER_COLUMNS, 0)
+
+    assert kpis.parse_cohort({"risk_level": "high", "group_by": "intake_path"}) == ({"risk_level": "high"}, "intake_path")
+    with pytest.raises(ValueError):
+        kpis.parse_cohort({"group_by": "location"})
+    conn.close()
+
+
+def test_coordinator_kpis_grouped_with_sla(tmp_path):
+    path = tmp_path / "coordinators.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    referral = "INSERT INTO referrals(id,tenant_id,intake_path,source_type,employee_id,referral_status,risk_level," \
+        "support_category_codes,submitted_by_user_id,assigned_coordinator_id,submitted_at,first_response_at) " \
+        "VALUES(?,'t-1','referral','manager','e-1','submitted','low','housing','u-1',?,'2026-01-01T00:00:00Z',?)"
+    cur.executemany(referral, [
+        ("r-1", "u-a", "2026-01-01T12:00:00Z"),
+        ("r-2", "u-a", "2026-01-05T00:00:00Z"),
+        ("r-3", "u-a", None),
+        ("r-4", "u-b", "2026-01-02T00:00:00Z"),
+        ("r-5", None, None),
+    ])
+    note = "INSERT INTO progress_notes(id,tenant_id,employee_id,case_id,coordinator_id,note_type,note_start_date," \
+        "interaction_at,meeting_location,areas_of_need_codes,status,created_at) " \
+        "VALUES(?,'t-1','e-1','c-1',?,'intake','2026-01-01','2026-01-01T00:00:00Z','office','',?,?)"
+    cur.executemany(note, [
+        ("n-1", "u-a", "final", "2026-01-01T08:00:00Z"),
+        ("n-2", "u-a", "final", "2026-01-10T00:00:00Z"),
+        ("n-3", "u-b", "draft", "2026-01-01T01:00:00Z"),
+    ])
+    conn.commit()
+
+    rows = {r["coordinator_id"]: r for r in kpis.coordinator_kpis(cur, "t-1", response_sla_hours=48, note_sla_hours=24)}
+    assert set(rows) == {"u-a", "u-b"}
+    a, b = rows["u-a"], rows["u-b"]
+    assert (a["referrals_assigned"], a["referrals_responded"], a["responded_within_sla"]) == (3, 2, 1)
+    assert a["referral_response_rate_within_sla"] == round(1 / 3, 4)
+    assert (a["engagements"], a["notes_final"], a["notes_final_on_time"]) == (2, 2, 1)
+    assert b["referral_response_rate_within_sla"] == 1.0 and b["on_time_note_finalization_rate"] == 0.0
+
+    wider = {r["coordinator_id"]: r for r in kpis.coordinator_kpis(cur, "t-1", response_sla_hours=120)}
+    assert wider["u-a"]["responded_within_sla"] == 2
+    assert kpis.parse_sla({"note_sla_hours": "12"}) == (kpis.RESPONSE_SLA_HOURS, 12.0)
+    with pytest.raises(ValueError):
+        kpis.parse_sla({"response_sla_hours": "-1"})
+    conn.close()
@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from app.db import get_db
+from app.main import init_db, make_server
+
+PORT = 8051
+BASE = f"http://127.0.0.1:{PORT}"
+HEADERS = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
+
+
+def _request(method: str, path: str, payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(BASE + path, method=method, data=data, headers=HEADERS)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf-8"))
+
+
+def test_keyset_pagination_walks_every_row_once():
+    init_db()
+    server = make_server("127.0.0.1", PORT, "threaded")
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    time.sleep(0.05)
+
+    try:
+        _request("POST", "/api/v1/dev/seed", {})
+        referral = {
+            "intake_path": "referral",
+            "source_type": "coordinator",
+            "employee_id": "e-2",
+            "risk_level": "critical",
+            "support_category_codes": ["transportation", "finances"],
+        }
+        status, _ = _request("POST", "/api/v1/referrals/bulk", [referral] * 7)
+        assert status == 200
+
+        seen = []
+        cursor = None
+        while True:
+            query = "?risk_level=critical&limit=3" + (f"&cursor={cursor}" if cursor else "")
+            status, page = _request("GET", "/api/v1/referrals" + query)
+            assert status == 200
+            assert len(page["items"]) <= 3
+            seen.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        conn = get_db()
+        expected = conn.execute("SELECT COUNT(*) FROM referrals WHERE tenant_id='tenant-acme' AND risk_level='critical'").fetchone()[0]
+        conn.close()
+        assert len(seen) == expected >= 7
+        assert len({r["id"] for r in seen}) == len(seen)
+        keys = [(r["submitted_at"], r["id"]) for r in seen]
+        assert keys == sorted(keys, reverse=True)
+        assert seen[0]["support_category_codes"] == ["transportation", "finances"]
+
+        status, page = _request("GET", "/api/v1/progress-notes?status=final&from=2026-01-01&limit=2")
+        assert status == 200 and "items" in page
+        assert _request("GET", "/api/v1/cases?cursor=garbage")[0] == 400
+        assert _request("GET", "/api/v1/cases?sort=name")[0] == 400
+        assert _request("GET", "/api/v1/referrals?limit=0")[0] == 400
+
+        status, page = _request("GET", "/api/v1/progress-notes/search?q=housing&limit=5")
+        assert status == 200 and set(page) == {"items", "next_cursor"}
+        assert _request("GET", "/api/v1/progress-notes/search")[0] == 400
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from app.main import init_db, make_server
+from app.metrics import Histogram
+
+
+def test_histogram_quantiles_and_merge():
+    a, b = Histogram(), Histogram()
+    for v in range(1, 501):
+        a.observe(v / 10)  # 0.1 .. 50 ms
+    for v in range(501, 1001):
+        b.observe(v / 10)  # 50.1 .. 100 ms
+    a.merge(b)
+
+    summary = a.summary()
+    assert summary["count"] == 1000
+    assert summary["max_ms"] == 100.0
+    assert summary["mean_ms"] == pytest.approx(50.05)
+    # Quantiles are estimated within their 1-2-5 bucket.
+    assert 20 <= summary["p50_ms"] <= 100
+    assert 50 <= summary["p95_ms"] <= 100
+    assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"] <= summary["max_ms"]
+
+    assert Histogram().quantile(0.99) == 0.0
+    with pytest.raises(ValueError):
+        a.merge(Histogram(bounds=(1, 10)))
+
+
+def test_metrics_endpoint_exposes_route_and_sql_histograms():
+    base = "http://127.0.0.1:8071"
+    headers = {"Authorization": "Bearer founder-admin-token"}
+    init_db()
+    server = make_server("127.0.0.1", 8071, "threaded")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.05)
+    try:
+        for path in ("/api/v1/kpis", "/api/v1/referrals?limit=5", "/api/v1/exports/does-not-exist"):
+            try:
+                urllib.request.urlopen(urllib.request.Request(base + path, headers=headers), timeout=5).read()
+            except urllib.error.HTTPError:
+                pass
+        # A request is observed after its response is sent, so the last one may not be counted (or finished) yet.
+        deadline = time.monotonic() + 5
+        while True:
+            with urllib.request.urlopen(base + "/metrics", timeout=5) as resp:
+                assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                text = resp.read().decode("utf-8")
+            settled = 'route="/api/v1/exports/{id}",code="404"' in text and "fair_chance_http_requests_in_flight 1\n" in text
+            if settled or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert 'fair_chance_http_responses_total{method="GET",route="/api/v1/kpis",code="200"}' in text
+    assert 'fair_chance_http_responses_total{method="GET",route="/api/v1/exports/{id}",code="404"}' in text
+    assert 'fair_chance_http_request_duration_seconds_bucket{method="GET",route="/api/v1/referrals",le="+Inf"}' in text
+    assert 'fair_chance_sql_duration_seconds_count{statement="SELECT * FROM export_jobs WHERE id=? AND tenant_id=?"}' in text
+    assert "fair_chance_http_requests_in_flight 1" in text  # the scrape itself
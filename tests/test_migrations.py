@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import sqlite3
+
+from app import migrations
+from app.db import get_db
+
+
+def test_migrate_is_idempotent_and_upgrades_legacy_schema(tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.executescript(migrations.MIGRATIONS[0].sql)
+    legacy.execute(
+        "INSERT INTO progress_notes(id,tenant_id,employee_id,case_id,coordinator_id,note_type,note_start_date,"
+        "interaction_at,meeting_location,areas_of_need_codes,status,created_at) "
+        "VALUES('n-1','t-1','e-1','c-1','u-coord','intake','2026-01-01','2026-01-01T00:00:00Z','office','housing,food,housing','final','2026-01-01T00:00:00Z')"
+    )
+    legacy.commit()
+    legacy.close()
+
+    conn = get_db(path)
+    assert migrations.migrate(conn) == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.migrate(conn) == []
+    assert all(row["applied"] for row in migrations.status(conn))
+    assert tuple(conn.execute("SELECT notes_total, notes_final FROM kpi_counters WHERE tenant_id='t-1'").fetchone()) == (1, 1)
+    assert {r[0] for r in conn.execute("SELECT code FROM progress_note_areas_of_need WHERE note_id='n-1'")} == {"housing", "food"}
+    assert migrations.check_query_plans(conn) == []
+    conn.close()
+
+
+def test_check_query_plans_reports_scans(tmp_path):
+    conn = get_db(tmp_path / "plans.db")
+    migrations.migrate(conn)
+    conn.execute("DROP INDEX idx_employees_tenant")
+    conn.execute("DROP INDEX idx_progress_notes_tenant_interaction")
+    offenders = migrations.check_query_plans(conn)
+    assert {o["query"] for o in offenders} == {"employees_for_tenant", "list_notes_page"}
+    conn.close()
@@ -0,0 +1,135 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import http.client
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import time
+
+from app import auth, prefork
+from app.cache import ResponseCache
+
+PORT = 8111
+ROOT = _P(__file__).resolve().parents[1]
+SECRET = "prefork-secret"
+REFERRAL = {
+    "intake_path": "direct_engagement", "source_type": "employee_self", "employee_id": "e-2",
+    "risk_level": "low", "support_category_codes": ["finances"],
+}
+
+
+def test_shared_state_is_seen_across_a_fork():
+    generations, revocations = prefork.SharedCounters(slots=8), prefork.SharedRevocations(slots=4)
+    first, second = ResponseCache(), ResponseCache()
+    first.share_generations(generations)
+    second.share_generations(generations)
+    second.put("t-1", "kpis", b"{}", second.generation("t-1"))
+
+    authenticator = auth.Authenticator([auth.DevTokenVerifier({"tok": {"user_id": "u", "tenant_id": "t-1", "role": "manager"}})])
+    authenticator.share_revocations(revocations)
+    authenticator.cache.put(b"digest", auth.Claims("u", "t-1", "manager", time.time() + 60, "jti-1"))
+
+    pid = os.fork()
+    if pid == 0:
+        first.invalidate("t-1")
+        for n in range(6):  # past capacity: expired entries are compacted away
+            revocations.publish(auth.token_id_digest(f"old-{n}"), 0.0)
+        revocations.publish(auth.token_id_digest("jti-1"), time.time() + 60)
+        os._exit(0)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    assert second.get("t-1", "kpis") is None
+    assert authenticator.authenticate("tok") is not None
+    assert authenticator.is_revoked("jti-1") and authenticator.cache.get(b"digest", time.time()) is None
+    assert not authenticator.is_revoked("old-0")
+
+
+def _call(conn, method, path, token="founder-admin-token", payload=None):
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    conn.request(method, path, body=body, headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read() or b"null")
+
+
+def _connections_by_pid(wanted, deadline):
+    """Keep-alive connections stay on one worker; open them until `wanted` distinct workers answer."""
+    by_pid = {}
+    while len(by_pid) < wanted and time.monotonic() < deadline:
+        conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=5)
+        try:
+            pid = _call(conn, "GET", "/api/v1/dev/stats")[1]["pid"]
+        except OSError:
+            time.sleep(0.1)
+            continue
+        if pid in by_pid:
+            conn.close()
+        else:
+            by_pid[pid] = conn
+        time.sleep(0.01)
+    return by_pid
+
+
+def test_prefork_server_shares_cache_invalidation_and_revocation(tmp_path):
+    env = {**os.environ, "FAIR_CHANCE_AUTH_SECRET": SECRET, "FAIR_CHANCE_DEV_TOKENS": "1", "FAIR_CHANCE_SHUTDOWN_GRACE_S": "10",
+           "FAIR_CHANCE_EXPORT_DIR": str(tmp_path / "exports")}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "app.main", "--workers", "2", "--port", str(PORT), "--db", str(tmp_path / "prefork.db"), "--quiet"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        by_pid = _connections_by_pid(2, time.monotonic() + 30)
+        assert len(by_pid) == 2, "both workers should accept connections"
+        a, b = by_pid.values()
+        _call(a, "POST", "/api/v1/dev/seed", payload={})
+
+        # Warm both workers' caches, write through one, read the change from the other.
+        before = [_call(conn, "GET", "/api/v1/kpis")[1] for conn in (a, b)]
+        assert before[0] == before[1]
+        assert _call(a, "POST", "/api/v1/referrals", payload=REFERRAL)[0] == 200
+        after = _call(b, "GET", "/api/v1/kpis")[1]
+        assert after != before[1]
+
+        token = auth.issue_token("u-coord", "tenant-acme", "coordinator", secret=SECRET)
+        assert _call(b, "GET", "/api/v1/me", token)[0] == 200
+        assert _call(a, "POST", "/api/v1/auth/revoke", token, {})[0] == 200
+        assert _call(b, "GET", "/api/v1/me", token)[0] == 401
+
+        # A killed worker is replaced, and the export it was running is queued again and finished.
+        victim = next(iter(by_pid))
+        db = sqlite3.connect(tmp_path / "prefork.db")
+        with db:
+            db.execute(
+                "INSERT INTO export_jobs(id, tenant_id, requested_by_user_id, entity, format, filters, status, created_at,"
+                " started_at, owner_pid) VALUES ('orphan', 'tenant-acme', 'u-admin', 'referrals', 'csv', '{}', 'running',"
+                " '2026-01-01T00:00:00Z', '2026-01-01T00:00:00Z', ?)",
+                (victim,),
+            )
+        db.close()
+        os.kill(victim, signal.SIGKILL)
+        for conn in by_pid.values():
+            conn.close()
+        replacements = _connections_by_pid(2, time.monotonic() + 30)
+        assert victim not in replacements and len(replacements) == 2
+        conn = next(iter(replacements.values()))
+        deadline = time.monotonic() + 30
+        while _call(conn, "GET", "/api/v1/exports/orphan")[1]["status"] != "completed" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert _call(conn, "GET", "/api/v1/exports/orphan")[1]["status"] == "completed"
+        for conn in replacements.values():
+            conn.close()
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            code = proc.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            raise
+        stderr = proc.stderr.read().decode()
+        proc.stderr.close()
+    assert code == 0, stderr
+    assert "restarting" in stderr
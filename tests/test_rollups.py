@@ -0,0 +1,100 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+from datetime import date
+
+import pytest
+
+from app import migrations, records, rollups
+from app.db import get_db
+from app.main import init_db
+
+
+def test_daily_rollups_compose_into_periods(tmp_path):
+    path = tmp_path / "rollups.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    auth = {"tenant_id": "t-1", "user_id": "u-1"}
+    cur.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES('e-1','t-1','Ava','Reed')")
+    [(_, referral)] = records.ingest_referrals(cur, auth, [{
+        "intake_path": "referral", "source_type": "manager", "employee_id": "e-1", "risk_level": "low",
+        "support_category_codes": ["housing"], "assigned_coordinator_id": "u-coord",
+    }])
+    [(_, case)] = records.ingest_cases(cur, auth, [
+        {"employee_id": "e-1", "assigned_coordinator_id": "u-coord", "referral_id": referral["id"]},
+    ])
+    note = {
+        "employee_id": "e-1", "case_id": case["id"], "note_type": "intake", "note_start_date": "2026-01-01",
+        "meeting_location": "office", "areas_of_need_codes": [],
+    }
+    records.ingest_progress_notes(cur, auth, [
+        {**note, "interaction_at": "2026-01-30T10:00:00Z", "status": "final"},
+        {**note, "interaction_at": "2026-02-02T10:00:00Z"},
+        {**note, "interaction_at": "2026-04-01T10:00:00Z", "status": "final"},
+    ])
+    conn.commit()
+    assert rollups.verify(conn) == []
+
+    result = rollups.query(cur, "t-1", date(2026, 1, 15), date(2026, 7, 1), "quarter")
+    assert [(p["period_start"], p["period_end"]) for p in result["periods"]] == [
+        ("2026-01-15", "2026-04-01"),
+        ("2026-04-01", "2026-07-01"),
+    ]
+    assert [p["notes_total"] for p in result["periods"]] == [2, 1]
+    assert result["periods"][0]["progress_note_submission_rate"] == 0.5
+    assert result["totals"]["notes_final"] == 2
+
+    weeks = rollups.query(cur, "t-1", date(2026, 1, 26), date(2026, 2, 9), "week")["periods"]
+    assert [(p["period_start"], p["notes_total"]) for p in weeks] == [("2026-01-26", 1), ("2026-02-02", 1)]
+
+    # Drift is reported and repaired by the backfill.
+    cur.execute("DELETE FROM kpi_daily WHERE metric='notes_total'")
+    conn.commit()
+    assert {d["metric"] for d in rollups.verify(conn, "t-1")} == {"notes_total"}
+    assert rollups.backfill(conn) > 0
+    assert rollups.verify(conn) == []
+
+    assert rollups.parse_range({"from": "2026-01-01", "to": "2026-04-01", "granularity": "month"})[2] == "month"
+    for bad in ({"from": "2026-01-01"}, {"from": "2026-02-01", "to": "2026-01-01"}, {"from": "x", "to": "y"},
+                {"from": "2026-01-01", "to": "2026-02-01", "granularity": "year"}):
+        with pytest.raises(ValueError):
+            rollups.parse_range(bad)
+    conn.close()
+
+
+def test_note_times_keep_their_offset_and_are_bucketed_by_utc_day(tmp_path):
+    path = tmp_path / "offsets.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    auth = {"tenant_id": "t-1", "user_id": "u-1"}
+    cur.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES('e-1','t-1','Ava','Reed')")
+    [(_, case)] = records.ingest_cases(cur, auth, [{"employee_id": "e-1", "assigned_coordinator_id": "u-coord"}])
+    note = {
+        "employee_id": "e-1", "case_id": case["id"], "note_type": "intake", "note_start_date": "2026-02-01",
+        "meeting_location": "office", "areas_of_need_codes": [],
+    }
+    records.ingest_progress_notes(cur, auth, [
+        {**note, "interaction_at": "2026-02-01T22:00:00-05:00"},
+        {**note, "interaction_at": "20260201T100000"},
+    ])
+    conn.commit()
+    stored = sorted(row[0] for row in cur.execute("SELECT interaction_at FROM progress_notes"))
+    assert stored == ["2026-02-01T22:00:00-05:00", "20260201T100000"]
+    days = dict(cur.execute("SELECT day, value FROM kpi_daily WHERE metric='notes_total'").fetchall())
+    assert days == {"2026-02-01": 1, "2026-02-02": 1}
+    assert rollups.verify(conn) == []
+    assert rollups.query(cur, "t-1", date(2026, 2, 2), date(2026, 2, 3), "day")["totals"]["notes_total"] == 1
+
+    # Daily rows bucketed by the local day before the fix are rebuilt by migration 15.
+    cur.execute("UPDATE kpi_daily SET day='2026-02-01', value=2 WHERE metric='notes_total' AND day='2026-02-01'")
+    cur.execute("DELETE FROM kpi_daily WHERE metric='notes_total' AND day='2026-02-02'")
+    cur.execute("DELETE FROM schema_migrations WHERE version=15")
+    conn.commit()
+    assert rollups.verify(conn) != []
+    migrations.migrate(conn)
+    assert rollups.verify(conn) == []
+    conn.close()
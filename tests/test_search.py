@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import pytest
+
+from app import records, search
+from app.db import get_db
+from app.main import init_db
+
+
+def _notes(cur, tenant_id, summaries):
+    auth = {"tenant_id": tenant_id, "user_id": "u-coord"}
+    cur.execute("INSERT INTO employees(id,tenant_id,first_name,last_name) VALUES(?,?,'Ava','Reed')", (f"e-{tenant_id}", tenant_id))
+    [(_, case)] = records.ingest_cases(cur, auth, [{"employee_id": f"e-{tenant_id}", "assigned_coordinator_id": "u-coord"}])
+    note = {
+        "employee_id": f"e-{tenant_id}", "case_id": case["id"], "note_type": "coaching_session",
+        "note_start_date": "2026-03-01", "meeting_location": "office", "areas_of_need_codes": [],
+    }
+    results = records.ingest_progress_notes(cur, auth, [
+        {**note, "interaction_at": f"2026-03-{day:02d}T10:00:00Z", "summary_of_meeting": text}
+        for day, text in enumerate(summaries, start=1)
+    ])
+    return case["id"], [body["id"] for _, body in results]
+
+
+def test_search_ranks_pages_and_stays_in_tenant(tmp_path):
+    path = tmp_path / "search.db"
+    init_db(path)
+    conn = get_db(path)
+    cur = conn.cursor()
+    case_id, ids = _notes(cur, "t-1", [
+        "Discussed the eviction notice and next steps with the landlord.",
+        "Evictions court date set; eviction eviction paperwork reviewed.",
+        "Picked up a monthly bus pass for the commute.",
+        "General check-in, nothing urgent.",
+    ] + [f"Follow-up {i} on eviction paperwork." for i in range(5)])
+    _notes(cur, "t-2", ["Other tenant: eviction hearing moved."])
+    conn.commit()
+
+    result = search.search(cur, "t-1", {"q": "evictions"})
+    found = [item["id"] for item in result["items"]]
+    assert set(found) == set(ids) - {ids[2], ids[3]}
+    assert found[0] == ids[1]  # most occurrences ranks first
+    assert "<mark>" in result["items"][0]["snippet"]
+    assert result["next_cursor"] is None
+
+    seen, cursor = [], None
+    while True:
+        page = search.search(cur, "t-1", {"q": "eviction", "limit": "2", **({"cursor": cursor} if cursor else {})})
+        seen += [item["id"] for item in page["items"]]
+        if not (cursor := page["next_cursor"]):
+            break
+    assert seen == found
+
+    assert [i["id"] for i in search.search(cur, "t-1", {"q": '"bus pass"'})["items"]] == [ids[2]]
+    assert search.search(cur, "t-1", {"q": "bus pas*"})["items"][0]["id"] == ids[2]
+    assert search.search(cur, "t-1", {"q": "eviction", "from": "2026-03-02", "to": "2026-03-03"})["items"][0]["id"] == ids[1]
+    assert search.search(cur, "t-1", {"q": "eviction", "case_id": "elsewhere"})["items"] == []
+    assert len(search.search(cur, "t-1", {"q": "eviction", "case_id": case_id})["items"]) == len(found)
+    assert search.search(cur, "t-1", {"q": 'summary_of_meeting: NOT "('})["items"] == []
+
+    # Amendments are re-indexed by the triggers.
+    cur.execute("UPDATE progress_notes SET summary_of_meeting='Housing voucher approved' WHERE id=?", (ids[3],))
+    conn.commit()
+    assert [i["id"] for i in search.search(cur, "t-1", {"q": "voucher"})["items"]] == [ids[3]]
+    assert search.check(conn) is None
+
+    for params in ({}, {"q": "  !! "}, {"q": "x", "cursor": "garbage"}, {"q": "x", "sort": "date"}, {"q": "x", "limit": "0"}):
+        with pytest.raises(records.ApiError):
+            search.search(cur, "t-1", params)
+
+    cur.execute("DELETE FROM progress_notes_fts")
+    conn.commit()
+    assert search.check(conn) is not None
+    assert search.rebuild(conn) == 10
+    assert search.check(conn) is None
+    conn.close()
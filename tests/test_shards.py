@@ -0,0 +1,141 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import json
+import sqlite3
+import threading
+import time
+import urllib.request
+
+from app import db, records, shards, writer
+from app.main import init_db, make_server
+from app.writer import WriteQueue
+
+PORT = 8121
+HEADERS = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
+
+
+def _count(path, table, tenant_id):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE tenant_id=?", (tenant_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_shards_are_created_from_a_template_and_evicted_lru(tmp_path):
+    cache = shards.ShardCache(tmp_path / "shards", max_open=2)
+    try:
+        a = cache.path_for("tenant-a")
+        assert a.name == "tenant-a.db" and a.exists()
+        assert shards.shard_name("../etc/passwd").startswith("t-")
+        conn = sqlite3.connect(a)
+        assert conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()[0] > 1
+        conn.close()
+
+        writer.run_write(lambda cur: records.ingest_employees(
+            cur, {"tenant_id": "tenant-a", "user_id": "u", "role": "coordinator"}, [{"first_name": "A", "last_name": "B"}]
+        ), a)
+        assert a in db._pools and a in writer._writers
+
+        cache.path_for("tenant-b")
+        cache.path_for("tenant-a")
+        cache.path_for("tenant-c")  # evicts b, the least recently used
+        assert cache.stats()["evictions"] == 1 and a in db._pools
+        cache.path_for("tenant-d")
+        assert a not in db._pools and a not in writer._writers
+
+        # Reopening after eviction finds the rows and does not recreate the file.
+        created = cache.stats()["created"]
+        assert _count(cache.path_for("tenant-a"), "employees", "tenant-a") == 1
+        assert cache.stats()["created"] == created == 4
+    finally:
+        cache.close()
+
+
+def test_a_shard_evicted_mid_request_stays_open_until_the_request_returns(tmp_path):
+    cache = shards.ShardCache(tmp_path / "shards", max_open=1, pool_size=2)
+
+    @shards.pinning
+    def request():
+        a = cache.path_for("tenant-a")
+        cache.path_for("tenant-a")
+        shards.pinning(lambda: cache.path_for("tenant-b"))()  # another request evicts a
+        assert cache.stats()["retired"] == 1 and db._pools[a].size == 2
+        conn = db.get_db(a)
+        conn.close()
+        return a
+
+    try:
+        a = request()
+        assert a not in db._pools and cache.stats()["pinned"] == cache.stats()["retired"] == 0
+    finally:
+        cache.close()
+
+
+def test_split_copies_each_tenants_rows_into_its_own_shard(tmp_path):
+    source = tmp_path / "shared.db"
+    init_db(source)
+    queue = WriteQueue(source)
+    for tenant_id, n in (("t-1", 3), ("t-2", 2)):
+        auth = {"tenant_id": tenant_id, "user_id": "u", "role": "coordinator"}
+        employees = queue.run(lambda cur: records.ingest_employees(
+            cur, auth, [{"first_name": f"F{i}", "last_name": "L"} for i in range(n)]
+        ))
+        queue.run(lambda cur: records.ingest_referrals(cur, auth, [{
+            "intake_path": "direct_engagement", "source_type": "employee_self", "employee_id": employees[0][1]["id"],
+            "risk_level": "low", "support_category_codes": ["finances"],
+        }]))
+    queue.close()
+
+    cache = shards.ShardCache(tmp_path / "shards")
+    try:
+        report = shards.split(source, cache)
+        assert report["t-1"]["employees"] == 3 and report["t-2"]["employees"] == 2
+        for tenant_id in ("t-1", "t-2"):
+            path = cache.path_for(tenant_id)
+            for table in ("employees", "referrals", "audit_events"):
+                assert _count(path, table, tenant_id) == _count(source, table, tenant_id)
+            other = "t-2" if tenant_id == "t-1" else "t-1"
+            assert _count(path, "employees", other) == 0
+        # A rerun copies nothing twice.
+        assert not any(any(copied.values()) for copied in shards.split(source, cache).values())
+        assert _count(cache.path_for("t-1"), "employees", "t-1") == 3
+    finally:
+        cache.close()
+
+
+def _request(method, path, payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{PORT}{path}", method=method, data=data, headers=HEADERS)
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def test_tenant_storage_routes_requests_to_the_tenants_file(tmp_path):
+    shared = tmp_path / "shared.db"
+    init_db(shared)
+    original = db.DB_PATH
+    db.DB_PATH = shared
+    shards.configure("tenant", tmp_path / "shards", max_open=4)
+    server = make_server("127.0.0.1", PORT, "threaded")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.05)
+    try:
+        _request("POST", "/api/v1/dev/seed", {})
+        referral = _request("POST", "/api/v1/referrals", {
+            "intake_path": "direct_engagement", "source_type": "employee_self", "employee_id": "e-1",
+            "risk_level": "low", "support_category_codes": ["finances"],
+        })
+        assert referral["id"] in [item["id"] for item in _request("GET", "/api/v1/referrals?limit=100")["items"]]
+        shard = tmp_path / "shards" / "tenant-acme.db"
+        assert _count(shard, "referrals", "tenant-acme") >= 1
+        assert _count(shared, "referrals", "tenant-acme") == 0
+        assert _request("GET", "/api/v1/dev/stats")["shards"]["open"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        shards.configure("shared")
+        db.DB_PATH = original
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import sqlite3
+
+import pytest
+
+from app import kpis, rollups, search, synthetic
+from app.main import init_db
+
+
+def _dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            table: conn.execute(f"SELECT * FROM {table}").fetchall()
+            for table in ("referrals", "cases", "progress_notes", "progress_note_areas_of_need")
+        }
+    finally:
+        conn.close()
+
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return set(conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_stat%'"))
+    finally:
+        conn.close()
+
+
+def test_presets_are_deterministic_and_leave_a_consistent_indexed_database(tmp_path):
+    first, second, other = tmp_path / "a.db", tmp_path / "b.db", tmp_path / "c.db"
+    report = synthetic.generate(first, synthetic.PRESETS["1k"], seed=3, check_plans=True)
+    synthetic.generate(second, synthetic.PRESETS["1k"], seed=3)
+    synthetic.generate(other, synthetic.PRESETS["1k"], seed=4)
+    assert report["rows"]["progress_notes"] == 1000 and report["scans"] == []
+    assert _dump(first) == _dump(second) != _dump(other)
+
+    # Every index and trigger dropped for the load is back, exactly as migrations created it.
+    empty = tmp_path / "empty.db"
+    init_db(empty)
+    assert _schema(first) == _schema(empty)
+
+    conn = sqlite3.connect(first)
+    try:
+        assert kpis.verify(conn) == [] and rollups.verify(conn) == []
+        rows = dict(conn.execute("SELECT tenant_id, COUNT(*) FROM progress_notes GROUP BY 1"))
+        assert max(rows, key=rows.get) == synthetic.DEV_TENANT
+        # Rows went in creation order, so rowid order is id order.
+        ids = [row[0] for row in conn.execute("SELECT id FROM progress_notes ORDER BY rowid")]
+        assert ids == sorted(ids)
+        risks = dict(conn.execute("SELECT risk_level, COUNT(*) FROM referrals GROUP BY 1"))
+        assert risks["low"] > risks["medium"] > risks["high"] > risks["critical"]
+        conn.row_factory = sqlite3.Row
+        found = search.search(conn.cursor(), synthetic.DEV_TENANT, {"q": "rent"})["items"]
+        assert found and all("<mark>rent</mark>" in item["snippet"].lower() for item in found)
+    finally:
+        conn.close()
+
+    with pytest.raises(ValueError):
+        synthetic.generate(first, synthetic.PRESETS["1k"])
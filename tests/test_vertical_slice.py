@@ -8,15 +8,21 @@ import threading
 import time
 import urllib.request
 import urllib.error
-from http.server import ThreadingHTTPServer
 
-from app.main import AppHandler, init_db
+import pytest
+
+from app.main import SERVE_MODES, init_db, make_server
 
 PORT = 8011
 BASE = f"http://127.0.0.1:{PORT}"
 HEADERS = {"Authorization": "Bearer founder-admin-token", "Content-Type": "application/json"}
 
 
+@pytest.fixture(params=SERVE_MODES)
+def serve_mode(request) -> str:
+    return request.param
+
+
 def _request(method: str, path: str, payload: dict | None = None) -> dict:
     data = json.dumps(payload).encode("utf-8") if payload is not None else None
     req = urllib.request.Request(BASE + path, method=method, data=data, headers=HEADERS)
@@ -24,9 +30,9 @@ def _request(method: str, path: str, payload: dict | None = None) -> dict:
         return json.loads(resp.read().decode("utf-8"))
 
 
-def test_end_to_end_vertical_slice():
+def test_end_to_end_vertical_slice(serve_mode):
     init_db()
-    server = ThreadingHTTPServer(("127.0.0.1", PORT), AppHandler)
+    server = make_server("127.0.0.1", PORT, serve_mode)
     t = threading.Thread(target=server.serve_forever, daemon=True)
     t.start()
     time.sleep(0.05)
@@ -83,9 +89,9 @@ def test_end_to_end_vertical_slice():
         server.server_close()
 
 
-def test_validation_errors_return_400():
+def test_validation_errors_return_400(serve_mode):
     init_db()
-    server = ThreadingHTTPServer(("127.0.0.1", PORT + 1), AppHandler)
+    server = make_server("127.0.0.1", PORT + 1, serve_mode)
     t = threading.Thread(target=server.serve_forever, daemon=True)
     t.start()
     time.sleep(0.05)
@@ -142,9 +148,9 @@ def test_validation_errors_return_400():
         server.server_close()
 
 
-def test_trailing_slash_routes_do_not_404():
+def test_trailing_slash_routes_do_not_404(serve_mode):
     init_db()
-    server = ThreadingHTTPServer(("127.0.0.1", PORT + 2), AppHandler)
+    server = make_server("127.0.0.1", PORT + 2, serve_mode)
     t = threading.Thread(target=server.serve_forever, daemon=True)
     t.start()
     time.sleep(0.05)
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path as _P
+
+sys.path.insert(0, str(_P(__file__).resolve().parents[1]))
+
+import sqlite3
+import threading
+
+import pytest
+
+from app import writer as writer_module
+from app.writer import WriteQueue
+
+
+def test_group_commit_coalesces_and_isolates_failures(tmp_path):
+    path = tmp_path / "writer.db"
+    setup = sqlite3.connect(path)
+    setup.execute("CREATE TABLE t (x INTEGER PRIMARY KEY)")
+    setup.close()
+    writer = WriteQueue(path, window_ms=20, max_batch=64)
+
+    futures = []
+    lock = threading.Lock()
+
+    def submit(i: int) -> None:
+        future = writer.submit(lambda cur: cur.execute("INSERT INTO t VALUES (?)", (i,)).rowcount)
+        with lock:
+            futures.append(future)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duplicate = writer.submit(lambda cur: cur.execute("INSERT INTO t VALUES (0)"))
+    assert all(f.result(5) == 1 for f in futures)
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result(5)
+    writer.close()
+
+    stats = writer.stats()
+    assert stats["units"] == 41 and stats["failed_units"] == 1
+    assert stats["batches"] < stats["units"]
+    assert stats["queue_depth"] == 0
+    check = sqlite3.connect(path)
+    assert check.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 40
+    check.close()
+
+
+def test_a_writer_that_cannot_open_its_database_fails_queued_units_and_is_replaced(tmp_path):
+    path = tmp_path / "missing" / "writer.db"
+    first = writer_module.get_writer(path)
+    with pytest.raises(sqlite3.OperationalError):
+        first.run(lambda cur: cur.execute("SELECT 1"), timeout=5)
+    assert first._closed and first.stats()["queue_depth"] == 0
+
+    path.parent.mkdir()
+    assert writer_module.run_write(lambda cur: cur.execute("SELECT 1").fetchone()[0], path) == 1
+    assert writer_module.get_writer(path) is not first
+    writer_module.close_writer(path)